@@ -0,0 +1,431 @@
+"""Offline benchmark of the review pipeline.
+
+Reviews, generates guides for and publishes synthetic PRs of increasing size, using in-memory git clients and
+fake AI models, so that no network access (nor API keys) is needed. For every PR size, it reports the wall time
+and peak memory of every phase (review, guide, publish), and the duration and rendered prompt size of every stage
+recorded in the spans of the review and the guide.
+
+Results can be saved as JSON and used as a baseline of later runs (e.g., before and after a dependency upgrade),
+failing if any phase got slower or used more memory than the allowed regression.
+"""
+
+import json
+import logging
+import pathlib
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import cached_property
+
+import click
+import httpx
+from lgtm_ai.ai.agent import (
+    get_guide_agent_with_settings,
+    get_reviewer_agent_with_settings,
+    get_summarizing_agent_with_settings,
+)
+from lgtm_ai.ai.schemas import Review, ReviewGuide
+from lgtm_ai.base.schemas import ContextMode, DiffFormat, PRSource, PRUrl, SummarizingDiff
+from lgtm_ai.base.tracing import StageSpan, collect_spans, span
+from lgtm_ai.config.constants import DEFAULT_INPUT_TOKEN_LIMIT
+from lgtm_ai.config.handler import ResolvedConfig
+from lgtm_ai.formatters.markdown import MarkDownFormatter
+from lgtm_ai.git.parser import DiffFileMetadata, DiffResult, ModifiedLine
+from lgtm_ai.git_client.base import GitClient
+from lgtm_ai.git_client.schemas import ContextBranch, IssueContent, PRDiff, PRMetadata
+from lgtm_ai.review import CodeReviewer
+from lgtm_ai.review.context import ContextRetriever
+from lgtm_ai.review.guide import ReviewGuideGenerator
+from pydantic import BaseModel, HttpUrl
+from pydantic_ai.messages import ModelMessage, ModelResponse, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+from pydantic_ai.models.test import TestModel
+from rich.console import Console
+from rich.table import Table
+
+DEFAULT_SIZES = (10, 100, 1_000, 10_000)
+FILE_LINES = 200
+HUNK_START = 20
+HUNK_LINES = 10
+FILES_PER_COMMENT = 10
+MAX_COMMENTS = 100
+
+logging.basicConfig(level=logging.WARNING)
+
+
+class PhaseResult(BaseModel):
+    name: str
+    wall_ms: float
+    peak_memory_bytes: int | None = None
+
+
+class BenchmarkResult(BaseModel):
+    files: int
+    phases: list[PhaseResult]
+    stages: list[StageSpan]
+
+
+class SyntheticGitClient(GitClient):
+    """In-memory git client serving a synthetic PR that changes `files` Python files.
+
+    Publishing renders the review and the guide with the given formatter, as the real clients do, and keeps
+    the rendered bodies in memory instead of sending them anywhere.
+    """
+
+    def __init__(self, files: int) -> None:
+        self.formatter = MarkDownFormatter()
+        self.files = files
+        self.published: list[str] = []
+
+    @cached_property
+    def file_paths(self) -> list[str]:
+        return [f"src/package_{i // 100}/module_{i}.py" for i in range(self.files)]
+
+    def get_diff_from_url(self, pr_url: PRUrl) -> PRDiff:
+        return PRDiff(
+            id=pr_url.pr_number,
+            diff=[_get_file_diff(path) for path in self.file_paths],
+            changed_files=self.file_paths,
+            target_branch="main",
+            source_branch="feature",
+            head_sha="0" * 40,
+        )
+
+    def get_pr_metadata(self, pr_url: PRUrl) -> PRMetadata:
+        return PRMetadata(title="refactor: rename the value of every module", description="Synthetic benchmark PR.")
+
+    def get_issue_content(self, issues_url: HttpUrl, issue_id: str) -> IssueContent | None:
+        return None
+
+    def get_file_contents(self, pr_url: PRUrl, file_path: str, branch_name: ContextBranch) -> str | None:
+        return _get_file_contents(file_path, new=branch_name == "source")
+
+    def get_last_reviewed_sha(self, pr_url: PRUrl) -> str | None:
+        return None
+
+    def get_diff_since(self, pr_url: PRUrl, base_sha: str) -> PRDiff | None:
+        return None
+
+    def publish_review(self, pr_url: PRUrl, review: Review) -> None:
+        with span("publish_review", source="benchmark", comments=len(review.review_response.comments)) as attributes:
+            bodies = [self.formatter.format_review_summary_section(review)]
+            bodies.extend(self.formatter.format_review_comment(comment) for comment in review.review_response.comments)
+            attributes["bytes"] = sum(len(body) for body in bodies)
+        self.published.extend(bodies)
+
+    def publish_guide(self, pr_url: PRUrl, guide: ReviewGuide) -> None:
+        with span("publish_guide", source="benchmark") as attributes:
+            body = self.formatter.format_guide(guide)
+            attributes["bytes"] = len(body)
+        self.published.append(body)
+
+
+def _get_file_contents(file_path: str, *, new: bool) -> str:
+    name = "new_value" if new else "value"
+    return "\n".join(
+        f"{name}_{line} = compute('{file_path}', {line})"
+        if HUNK_START <= line < HUNK_START + HUNK_LINES
+        else f"# {line}"
+        for line in range(1, FILE_LINES + 1)
+    )
+
+
+def _get_file_diff(file_path: str) -> DiffResult:
+    modified_lines = []
+    for i, line in enumerate(range(HUNK_START, HUNK_START + HUNK_LINES)):
+        modified_lines.append(
+            ModifiedLine(
+                line=f"value_{line} = compute('{file_path}', {line})",
+                line_number=line,
+                relative_line_number=i + 1,
+                modification_type="removed",
+                hunk_start_old=HUNK_START,
+                hunk_start_new=HUNK_START,
+            )
+        )
+    for i, line in enumerate(range(HUNK_START, HUNK_START + HUNK_LINES)):
+        modified_lines.append(
+            ModifiedLine(
+                line=f"new_value_{line} = compute('{file_path}', {line})",
+                line_number=line,
+                relative_line_number=HUNK_LINES + i + 1,
+                modification_type="added",
+                hunk_start_old=HUNK_START,
+                hunk_start_new=HUNK_START,
+            )
+        )
+    return DiffResult(
+        metadata=DiffFileMetadata(
+            new_file=False, deleted_file=False, renamed_file=False, new_path=file_path, old_path=file_path
+        ),
+        modified_lines=modified_lines,
+    )
+
+
+def _get_review_model(file_paths: list[str]) -> FunctionModel:
+    """Model answering every review (and summary) request with one comment every `FILES_PER_COMMENT` files."""
+    comments = [
+        {
+            "old_path": path,
+            "new_path": path,
+            "comment": f"`new_value_{HUNK_START}` is never used in `{path}`.",
+            "category": "Correctness",
+            "severity": "MEDIUM",
+            "line_number": HUNK_START,
+            "relative_line_number": HUNK_LINES + 1,
+            "is_comment_on_new_path": True,
+            "programming_language": "Python",
+            "quote_snippet": f"new_value_{HUNK_START} = compute('{path}', {HUNK_START})",
+        }
+        for path in file_paths[::FILES_PER_COMMENT][:MAX_COMMENTS]
+    ]
+
+    def review(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        args = {"summary": "Values are renamed in every module.", "comments": comments, "raw_score": 4}
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, args)])
+
+    return FunctionModel(review, model_name="benchmark")
+
+
+def _get_offline_httpx_client() -> httpx.Client:
+    def _refuse_request(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError(f"The benchmark runs offline, refusing request to {request.url}", request=request)
+
+    return httpx.Client(transport=httpx.MockTransport(_refuse_request))
+
+
+@contextmanager
+def _measure(name: str, phases: list[PhaseResult], *, trace_memory: bool) -> Iterator[None]:
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall_ms = round((time.perf_counter() - start) * 1000, 3)
+        peak_memory = None
+        if trace_memory:
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        phases.append(PhaseResult(name=name, wall_ms=wall_ms, peak_memory_bytes=peak_memory))
+
+
+def run_benchmark(
+    files: int,
+    *,
+    prompt_token_budget: int,
+    review_shard_tokens: int | None,
+    trace_memory: bool,
+    context_mode: ContextMode = ContextMode.file,
+    diff_format: DiffFormat = DiffFormat.json,
+    summarizing_diff: SummarizingDiff = SummarizingDiff.full,
+) -> BenchmarkResult:
+    """Review, generate a guide for and publish a synthetic PR changing `files` files."""
+    pr_url = PRUrl(
+        full_url=f"https://github.com/lgtm/benchmark/pull/{files}",
+        base_url="https://github.com",
+        repo_path="lgtm/benchmark",
+        pr_number=files,
+        source=PRSource.github,
+    )
+    git_client = SyntheticGitClient(files)
+    # The AI input limit is not enforced, as the fake models only estimate the tokens of the prompts
+    config = ResolvedConfig(
+        ai_api_key="",
+        git_api_key="",
+        ai_input_tokens_limit=None,
+        prompt_token_budget=prompt_token_budget,
+        review_shard_tokens=review_shard_tokens,
+        context_mode=context_mode,
+        diff_format=diff_format,
+        summarizing_diff=summarizing_diff,
+    )
+    code_reviewer = CodeReviewer(
+        reviewer_agent=get_reviewer_agent_with_settings(diff_format=diff_format),
+        summarizing_agent=get_summarizing_agent_with_settings(diff_format=diff_format),
+        model=_get_review_model(git_client.file_paths),
+        git_client=git_client,
+        context_retriever=ContextRetriever(
+            git_client=git_client,
+            issues_client=git_client,
+            httpx_client=_get_offline_httpx_client(),
+            context_mode=context_mode,
+        ),
+        config=config,
+    )
+    guide_generator = ReviewGuideGenerator(
+        guide_agent=get_guide_agent_with_settings(), model=TestModel(), git_client=git_client, config=config
+    )
+    guide_generator.context_retriever = ContextRetriever(
+        git_client=git_client,
+        issues_client=git_client,
+        httpx_client=_get_offline_httpx_client(),
+        context_mode=context_mode,
+    )
+
+    phases: list[PhaseResult] = []
+    with _measure("review", phases, trace_memory=trace_memory):
+        review = code_reviewer.review(pr_url)
+    with _measure("guide", phases, trace_memory=trace_memory):
+        guide = guide_generator.generate_review_guide(pr_url)
+    with collect_spans() as publish_spans, _measure("publish", phases, trace_memory=trace_memory):
+        git_client.publish_review(pr_url, review)
+        git_client.publish_guide(pr_url, guide)
+    return BenchmarkResult(
+        files=files, phases=phases, stages=[*review.metadata.spans, *guide.metadata.spans, *publish_spans]
+    )
+
+
+_REGRESSION_METRICS: list[tuple[str, Callable[[PhaseResult], float | None]]] = [
+    ("wall time", lambda phase: phase.wall_ms),
+    ("peak memory", lambda phase: phase.peak_memory_bytes),
+]
+
+
+def find_regressions(
+    results: list[BenchmarkResult], baseline: list[BenchmarkResult], *, max_regression: float
+) -> list[str]:
+    """Compare the phases of the results with those of the baseline with the same number of files."""
+    baseline_phases = {(result.files, phase.name): phase for result in baseline for phase in result.phases}
+    regressions = []
+    for result in results:
+        for phase in result.phases:
+            if not (previous := baseline_phases.get((result.files, phase.name))):
+                continue
+            for metric, get_value in _REGRESSION_METRICS:
+                value, previous_value = get_value(phase), get_value(previous)
+                if value is not None and previous_value and value > previous_value * (1 + max_regression):
+                    regressions.append(
+                        f"{phase.name} ({result.files} files): {metric} went from {previous_value} to {value}"
+                    )
+    return regressions
+
+
+def _print_results(results: list[BenchmarkResult], console: Console) -> None:
+    phases = Table(title="Phases")
+    for column in ("Files", "Phase", "Wall time (ms)", "Peak memory (MiB)"):
+        phases.add_column(column, justify="right", no_wrap=True)
+    stages = Table(title="Stages")
+    for column in ("Files", "Stage", "Duration (ms)", "Size (bytes)", "Estimated tokens"):
+        stages.add_column(column, justify="right", no_wrap=True)
+
+    for result in results:
+        for phase in result.phases:
+            peak_memory = f"{phase.peak_memory_bytes / 2**20:.1f}" if phase.peak_memory_bytes is not None else "-"
+            phases.add_row(str(result.files), phase.name, f"{phase.wall_ms:.1f}", peak_memory)
+        for stage in result.stages:
+            stages.add_row(
+                str(result.files),
+                stage.name,
+                f"{stage.duration_ms:.1f}",
+                str(stage.attributes.get("bytes", "-")),
+                str(stage.attributes.get("estimated_tokens", "-")),
+            )
+    console.print(phases)
+    console.print(stages)
+
+
+@click.command()
+@click.option(
+    "--sizes",
+    multiple=True,
+    type=click.IntRange(min=1),
+    default=DEFAULT_SIZES,
+    show_default=True,
+    help="Number of changed files of the synthetic PRs to benchmark. Can be given multiple times.",
+)
+@click.option(
+    "--prompt-token-budget",
+    type=click.IntRange(min=1),
+    default=DEFAULT_INPUT_TOKEN_LIMIT,
+    show_default=True,
+    help="Maximum (estimated) number of tokens of a single review prompt.",
+)
+@click.option(
+    "--review-shard-tokens",
+    type=click.IntRange(min=1),
+    help="If given, large PRs are reviewed in shards of this (estimated) number of tokens.",
+)
+@click.option(
+    "--context-mode",
+    type=click.Choice([mode.value for mode in ContextMode]),
+    default=ContextMode.file.value,
+    show_default=True,
+    help="How much of every changed file is sent as context.",
+)
+@click.option(
+    "--diff-format",
+    type=click.Choice([diff_format.value for diff_format in DiffFormat]),
+    default=DiffFormat.json.value,
+    show_default=True,
+    help="Format of the diff in the prompts.",
+)
+@click.option(
+    "--summarizing-diff",
+    type=click.Choice([summarizing_diff.value for summarizing_diff in SummarizingDiff]),
+    default=SummarizingDiff.full.value,
+    show_default=True,
+    help="How much of the diff is sent to the summarizing agent.",
+)
+@click.option(
+    "--trace-memory/--no-trace-memory",
+    default=True,
+    show_default=True,
+    help="Measure the peak memory of every phase. Tracing memory slows down the benchmark noticeably.",
+)
+@click.option("--output-file", type=click.Path(dir_okay=False, path_type=pathlib.Path), help="Save results as JSON.")
+@click.option(
+    "--baseline",
+    type=click.Path(exists=True, dir_okay=False, path_type=pathlib.Path),
+    help="JSON results of a previous run to compare with.",
+)
+@click.option(
+    "--max-regression",
+    type=click.FloatRange(min=0),
+    default=0.25,
+    show_default=True,
+    help="Maximum allowed relative increase of wall time or peak memory over the baseline.",
+)
+def main(
+    sizes: tuple[int, ...],
+    prompt_token_budget: int,
+    review_shard_tokens: int | None,
+    context_mode: str,
+    diff_format: str,
+    summarizing_diff: str,
+    trace_memory: bool,
+    output_file: pathlib.Path | None,
+    baseline: pathlib.Path | None,
+    max_regression: float,
+) -> None:
+    console = Console()
+    results = []
+    for files in sizes:
+        console.print(f"Benchmarking a PR with {files} changed files...")
+        results.append(
+            run_benchmark(
+                files,
+                prompt_token_budget=prompt_token_budget,
+                review_shard_tokens=review_shard_tokens,
+                trace_memory=trace_memory,
+                context_mode=ContextMode(context_mode),
+                diff_format=DiffFormat(diff_format),
+                summarizing_diff=SummarizingDiff(summarizing_diff),
+            )
+        )
+    _print_results(results, console)
+
+    if output_file:
+        output_file.write_text(json.dumps([result.model_dump(mode="json") for result in results], indent=2))
+        console.print(f"Results saved to {output_file}")
+
+    if baseline:
+        baseline_results = [BenchmarkResult.model_validate(result) for result in json.loads(baseline.read_text())]
+        if regressions := find_regressions(results, baseline_results, max_regression=max_regression):
+            raise click.ClickException("Performance regressions found:\n" + "\n".join(regressions))
+        console.print(f"No regressions over {baseline} (maximum allowed: {max_regression:.0%})")
+
+
+if __name__ == "__main__":
+    main()
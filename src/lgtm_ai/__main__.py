@@ -1,8 +1,11 @@
+import asyncio
 import functools
 import logging
+import pathlib
+import re
 from collections.abc import Callable
 from importlib.metadata import version
-from typing import Any, assert_never, get_args
+from typing import Any, TextIO, assert_never, get_args
 from urllib.parse import urlparse
 
 import click
@@ -13,10 +16,11 @@ from lgtm_ai.ai.agent import (
     get_reviewer_agent_with_settings,
     get_summarizing_agent_with_settings,
 )
-from lgtm_ai.ai.schemas import AgentSettings, CommentCategory, SupportedAIModelsList
+from lgtm_ai.ai.schemas import AgentSettings, CommentCategory, ReviewComment, SupportedAIModelsList
 from lgtm_ai.base.constants import DEFAULT_HTTPX_TIMEOUT
 from lgtm_ai.base.exceptions import NothingToReviewError
-from lgtm_ai.base.schemas import IssuesPlatform, LocalRepository, OutputFormat, PRUrl
+from lgtm_ai.base.schemas import IssuesPlatform, LocalRepository, OutputFormat, PRSource, PRUrl
+from lgtm_ai.base.tracing import enable_opentelemetry_export
 from lgtm_ai.base.utils import git_source_supports_multiline_suggestions
 from lgtm_ai.config.constants import DEFAULT_INPUT_TOKEN_LIMIT
 from lgtm_ai.config.handler import CliOptions, ConfigHandler, ResolvedConfig
@@ -25,11 +29,16 @@ from lgtm_ai.formatters.json import JsonFormatter
 from lgtm_ai.formatters.markdown import MarkDownFormatter
 from lgtm_ai.formatters.pretty import PrettyFormatter
 from lgtm_ai.git_client.base import GitClient
+from lgtm_ai.git_client.http_cache import HttpCache
 from lgtm_ai.git_client.utils import get_git_client
 from lgtm_ai.jira.jira import JiraIssuesClient
 from lgtm_ai.review import CodeReviewer
+from lgtm_ai.review.batch import BatchReviewer, BatchReviewResult
 from lgtm_ai.review.context import ContextRetriever, IssuesClient
 from lgtm_ai.review.guide import ReviewGuideGenerator
+from lgtm_ai.server.http import WebhookServer
+from lgtm_ai.server.scheduler import ReviewScheduler
+from lgtm_ai.server.webhooks import ReviewJob
 from lgtm_ai.validators import (
     IntOrNoLimitType,
     ModelChoice,
@@ -154,6 +163,18 @@ def _common_options[**P, T](func: Callable[P, T]) -> Callable[P, T]:
     default=None,
     help="If reviewing a local repository, what to compare against (branch, commit, or HEAD for working dir). Default: HEAD",
 )
+@click.option(
+    "--incremental",
+    is_flag=True,
+    default=None,
+    help="Only review the changes pushed to the PR since the last review published by lgtm. Defaults to False.",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    default=None,
+    help="Print review comments as soon as they are generated, before the final review is ready. With `--output-format json`, the output is JSON Lines. Defaults to False.",
+)
 def review(target: PRUrl | LocalRepository, config: str | None, verbose: int, **config_kwargs: object) -> None:
     """Review a Pull Request or local repository using AI.
 
@@ -176,6 +197,7 @@ def review(target: PRUrl | LocalRepository, config: str | None, verbose: int, **
         cli_args=CliOptions(**config_kwargs),
         config_file=config,
     ).resolve_config(target)
+    _configure_tracing(resolved_config)
 
     agent_extra_settings = AgentSettings(retries=resolved_config.ai_retries)
     formatter: Formatter[Any] = MarkDownFormatter(
@@ -186,25 +208,45 @@ def review(target: PRUrl | LocalRepository, config: str | None, verbose: int, **
         token=resolved_config.git_api_key,
         formatter=formatter,
         url=target.base_url if isinstance(target, PRUrl) else None,
+        diff_limits=resolved_config.diff_limits,
+        context_archive=resolved_config.context_archive,
+        http_cache=_get_http_cache(resolved_config),
+        rate_limits=resolved_config.git_rate_limits,
     )
     issues_client = _get_issues_client(resolved_config, git_client, formatter)
 
     code_reviewer = CodeReviewer(
-        reviewer_agent=get_reviewer_agent_with_settings(agent_extra_settings),
-        summarizing_agent=get_summarizing_agent_with_settings(agent_extra_settings),
+        reviewer_agent=get_reviewer_agent_with_settings(agent_extra_settings, diff_format=resolved_config.diff_format),
+        summarizing_agent=get_summarizing_agent_with_settings(
+            agent_extra_settings,
+            diff_format=resolved_config.diff_format,
+            summarizing_diff=resolved_config.summarizing_diff,
+        ),
         model=get_ai_model(
             model_name=resolved_config.model, api_key=resolved_config.ai_api_key, model_url=resolved_config.model_url
         ),
         context_retriever=ContextRetriever(
-            git_client=git_client, issues_client=issues_client, httpx_client=httpx.Client(timeout=DEFAULT_HTTPX_TIMEOUT)
+            git_client=git_client,
+            issues_client=issues_client,
+            httpx_client=httpx.Client(timeout=DEFAULT_HTTPX_TIMEOUT),
+            max_workers=resolved_config.context_workers,
+            max_workers_per_host=resolved_config.context_workers_per_host,
+            context_mode=resolved_config.context_mode,
+            context_window_lines=resolved_config.context_window_lines,
         ),
         git_client=git_client,
         config=resolved_config,
     )
 
-    formatter, printer = _get_formatter_and_printer(resolved_config.output_format)
+    formatter, printer = _get_formatter_and_printer(resolved_config.output_format, stream=resolved_config.stream)
+    on_comment = None
+    if resolved_config.stream and not resolved_config.silent:
+
+        def on_comment(comment: ReviewComment) -> None:
+            printer(formatter.format_review_comment(comment))
+
     try:
-        review = code_reviewer.review(target=target)
+        review = code_reviewer.review(target=target, on_comment=on_comment)
     except NothingToReviewError:
         if not resolved_config.silent:
             printer(formatter.empty_review_message())
@@ -223,6 +265,160 @@ def review(target: PRUrl | LocalRepository, config: str | None, verbose: int, **
         logger.info("Review published successfully")
 
 
+@click.argument("targets", nargs=-1)
+@cli.command(name="review-batch")
+@_common_options
+@click.option(
+    "--targets-file",
+    type=click.File("r"),
+    help="File with the URLs of the pull requests to review, one per line. Use `-` to read them from stdin.",
+)
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False, writable=True, path_type=pathlib.Path),
+    help="Directory where the JSON result of every review is written. If not given, results are printed as JSON Lines.",
+)
+@click.option(
+    "--technologies",
+    multiple=True,
+    help="List of technologies the reviewer is an expert in. If not provided, the reviewer will be an expert of all technologies in the given PR.",
+)
+@click.option(
+    "--categories",
+    multiple=True,
+    type=click.Choice(get_args(CommentCategory)),
+    help="List of categories the reviewer should focus on. If not provided, the reviewer will focus on all categories.",
+)
+@click.option(
+    "--concurrency",
+    "batch_concurrency",
+    type=click.IntRange(min=1),
+    help="Maximum number of pull requests reviewed concurrently. Defaults to 4.",
+)
+def review_batch(
+    targets: tuple[str, ...],
+    targets_file: TextIO | None,
+    output_dir: pathlib.Path | None,
+    config: str | None,
+    verbose: int,
+    **config_kwargs: object,
+) -> None:
+    """Review many Pull Requests concurrently using AI.
+
+    TARGETS are the URLs of the pull requests to review. They can also be given with `--targets-file`.
+
+    Clients, connection pools and AI agents are shared between all the reviews. The result of every review is
+    always JSON, regardless of `--output-format`.
+    """
+    _set_logging_level(logger, verbose)
+    ctx = click.get_current_context()
+    urls = [*targets, *_read_targets_file(targets_file)]
+    if not urls:
+        raise click.UsageError("No pull request URLs given. Pass them as arguments or with `--targets-file`.")
+    target_parser = TargetParser(allow_git_repo=False)
+    pr_urls: list[PRUrl] = []
+    for url in urls:
+        target = target_parser(ctx, "targets", url)
+        if not isinstance(target, PRUrl):
+            raise click.BadParameter("Only pull request URLs can be reviewed in batch")
+        pr_urls.append(target)
+
+    logger.info("lgtm-ai version: %s", __version__)
+    logger.info("Starting review of %d pull requests", len(pr_urls))
+    # Configuration does not depend on the PR URL, so it is resolved only once
+    resolved_config = ConfigHandler(
+        cli_args=CliOptions(**config_kwargs),
+        config_file=config,
+    ).resolve_config(pr_urls[0])
+    _configure_tracing(resolved_config)
+
+    get_code_reviewer = _get_shared_code_reviewer_factory(resolved_config)
+
+    def write_result(result: BatchReviewResult) -> None:
+        output = result.model_dump_json(exclude={"review": {"pr_diff"}})
+        if output_dir:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            (output_dir / _get_batch_result_file_name(result.url)).write_text(output)
+        elif not resolved_config.silent:
+            print(output, flush=True)
+
+    results = BatchReviewer(
+        get_code_reviewer,
+        concurrency=resolved_config.batch_concurrency,
+        publish=resolved_config.publish,
+    ).review(pr_urls, on_result=write_result)
+
+    failed = [result.url for result in results if result.error]
+    logger.info("Batch review completed: %d reviewed, %d failed", len(results) - len(failed), len(failed))
+    if failed:
+        raise click.ClickException(f"Failed to review {len(failed)} pull requests: {', '.join(failed)}")
+
+
+@cli.command()
+@_common_options
+@click.option("--host", default="127.0.0.1", show_default=True, help="Host to listen on for webhooks.")
+@click.option(
+    "--port", type=click.IntRange(min=0, max=65535), default=8080, show_default=True, help="Port to listen on."
+)
+@click.option(
+    "--workers",
+    "server_workers",
+    type=click.IntRange(min=1),
+    help="Number of workers reviewing pull requests concurrently. Defaults to 4.",
+)
+@click.option(
+    "--webhook-secret",
+    help="Secret that webhooks must be signed with (GitHub) or include as token (GitLab). Strongly recommended.",
+)
+@click.option(
+    "--technologies",
+    multiple=True,
+    help="List of technologies the reviewer is an expert in. If not provided, the reviewer will be an expert of all technologies in the given PR.",
+)
+@click.option(
+    "--categories",
+    multiple=True,
+    type=click.Choice(get_args(CommentCategory)),
+    help="List of categories the reviewer should focus on. If not provided, the reviewer will focus on all categories.",
+)
+def serve(host: str, port: int, config: str | None, verbose: int, **config_kwargs: object) -> None:
+    """Run a server that reviews Pull Requests when it receives GitHub or GitLab webhooks.
+
+    Reviews are queued and performed by a pool of workers that share clients and AI agents. Many pushes to
+    the same PR while its review is queued result in a single review, and a review in progress is cancelled
+    if new commits are pushed to its PR. Use `--publish` to publish the reviews; otherwise they are printed
+    as JSON Lines.
+    """
+    _set_logging_level(logger, verbose)
+    logger.info("lgtm-ai version: %s", __version__)
+    resolved_config = ConfigHandler(cli_args=CliOptions(**config_kwargs), config_file=config).resolve_config()
+    _configure_tracing(resolved_config)
+    if not resolved_config.webhook_secret:
+        logger.warning("No webhook secret configured, anyone with access to the server can trigger reviews.")
+
+    batch_reviewer = BatchReviewer(
+        _get_shared_code_reviewer_factory(resolved_config),
+        concurrency=resolved_config.server_workers,
+        publish=resolved_config.publish,
+    )
+
+    async def review_job(job: ReviewJob) -> None:
+        result = await batch_reviewer.review_target(job.target, head_sha=job.head_sha)
+        if not resolved_config.silent:
+            print(result.model_dump_json(exclude={"review": {"pr_diff"}}), flush=True)
+
+    async def run_server() -> None:
+        async with ReviewScheduler(review_job, workers=resolved_config.server_workers) as scheduler:
+            server = await WebhookServer(scheduler, secret=resolved_config.webhook_secret).start(host, port)
+            async with server:
+                await server.serve_forever()
+
+    try:
+        asyncio.run(run_server())
+    except KeyboardInterrupt:
+        logger.info("Server stopped")
+
+
 @click.argument("target", required=True, callback=TargetParser(allow_git_repo=False))
 @cli.command()
 @_common_options
@@ -248,9 +444,17 @@ def guide(
         cli_args=CliOptions(**config_kwargs),
         config_file=config,
     ).resolve_config(target)
+    _configure_tracing(resolved_config)
     agent_extra_settings = AgentSettings(retries=resolved_config.ai_retries)
     git_client = get_git_client(
-        source=target.source, token=resolved_config.git_api_key, formatter=MarkDownFormatter(), url=target.base_url
+        source=target.source,
+        token=resolved_config.git_api_key,
+        formatter=MarkDownFormatter(),
+        url=target.base_url,
+        diff_limits=resolved_config.diff_limits,
+        context_archive=resolved_config.context_archive,
+        http_cache=_get_http_cache(resolved_config),
+        rate_limits=resolved_config.git_rate_limits,
     )
     review_guide = ReviewGuideGenerator(
         guide_agent=get_guide_agent_with_settings(agent_extra_settings),
@@ -280,6 +484,70 @@ def guide(
         logger.info("Review Guide published successfully")
 
 
+def _get_shared_code_reviewer_factory(resolved_config: ResolvedConfig) -> Callable[[PRUrl], CodeReviewer]:
+    """Get a factory of code reviewers that share agents, AI model and connection pools.
+
+    One code reviewer (and git client) is created per git service, and reused for all its PRs.
+    """
+    agent_extra_settings = AgentSettings(retries=resolved_config.ai_retries)
+    reviewer_agent = get_reviewer_agent_with_settings(agent_extra_settings, diff_format=resolved_config.diff_format)
+    summarizing_agent = get_summarizing_agent_with_settings(
+        agent_extra_settings,
+        diff_format=resolved_config.diff_format,
+        summarizing_diff=resolved_config.summarizing_diff,
+    )
+    model = get_ai_model(
+        model_name=resolved_config.model, api_key=resolved_config.ai_api_key, model_url=resolved_config.model_url
+    )
+    httpx_client = httpx.Client(timeout=DEFAULT_HTTPX_TIMEOUT)
+
+    @functools.cache
+    def get_git_service_code_reviewer(source: PRSource, base_url: str) -> CodeReviewer:
+        formatter = MarkDownFormatter(add_ranges_to_suggestions=git_source_supports_multiline_suggestions(source))
+        git_client = get_git_client(
+            source=source,
+            token=resolved_config.git_api_key,
+            formatter=formatter,
+            url=base_url,
+            diff_limits=resolved_config.diff_limits,
+            context_archive=resolved_config.context_archive,
+            http_cache=_get_http_cache(resolved_config),
+            rate_limits=resolved_config.git_rate_limits,
+        )
+        return CodeReviewer(
+            reviewer_agent=reviewer_agent,
+            summarizing_agent=summarizing_agent,
+            model=model,
+            context_retriever=ContextRetriever(
+                git_client=git_client,
+                issues_client=_get_issues_client(resolved_config, git_client, formatter),
+                httpx_client=httpx_client,
+                max_workers=resolved_config.context_workers,
+                max_workers_per_host=resolved_config.context_workers_per_host,
+                context_mode=resolved_config.context_mode,
+                context_window_lines=resolved_config.context_window_lines,
+            ),
+            git_client=git_client,
+            config=resolved_config,
+        )
+
+    return lambda target: get_git_service_code_reviewer(target.source, target.base_url)
+
+
+def _read_targets_file(targets_file: TextIO | None) -> list[str]:
+    """Read the URLs in the targets file, ignoring empty lines and comments (starting with `#`)."""
+    if not targets_file:
+        return []
+    lines = (line.strip() for line in targets_file)
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def _get_batch_result_file_name(pr_url: str) -> str:
+    """Get a file name for the result of reviewing the given PR that is unique within a batch."""
+    parsed = urlparse(pr_url)
+    return re.sub(r"[^\w.-]+", "_", f"{parsed.netloc}{parsed.path}").strip("_") + ".json"
+
+
 def _set_logging_level(logger: logging.Logger, verbose: int) -> None:
     if verbose == 0:
         logger.setLevel(logging.ERROR)
@@ -290,19 +558,36 @@ def _set_logging_level(logger: logging.Logger, verbose: int) -> None:
     logger.debug("Logging level set to %s", logging.getLevelName(logger.level))
 
 
-def _get_formatter_and_printer(output_format: OutputFormat) -> tuple[Formatter[Any], Callable[[Any], None]]:
-    """Get the formatter and the print method based on the output format."""
+def _configure_tracing(resolved_config: ResolvedConfig) -> None:
+    if resolved_config.opentelemetry:
+        logger.debug("Exporting spans through OpenTelemetry")
+        enable_opentelemetry_export()
+
+
+def _get_formatter_and_printer(
+    output_format: OutputFormat, *, stream: bool = False
+) -> tuple[Formatter[Any], Callable[[Any], None]]:
+    """Get the formatter and the print method based on the output format.
+
+    When streaming, JSON output is printed as JSON Lines (one object per line).
+    """
     if output_format == OutputFormat.pretty:
         console = Console()
         return PrettyFormatter(), console.print
     elif output_format == OutputFormat.markdown:
         return MarkDownFormatter(), print
     elif output_format == OutputFormat.json:
-        return JsonFormatter(), print
+        return JsonFormatter(indent=None if stream else 2), print
     else:
         assert_never(output_format)
 
 
+def _get_http_cache(resolved_config: ResolvedConfig) -> HttpCache | None:
+    if not resolved_config.http_cache_dir:
+        return None
+    return HttpCache(resolved_config.http_cache_dir, max_size=resolved_config.http_cache_max_size)
+
+
 def _get_issues_client(
     resolved_config: ResolvedConfig, git_client: GitClient | None, formatter: Formatter[Any]
 ) -> IssuesClient | None:
@@ -323,6 +608,8 @@ def _get_issues_client(
                 token=resolved_config.issues_api_key,
                 formatter=formatter,
                 url=f"{parsed_issues_url.scheme}://{parsed_issues_url.netloc}",
+                http_cache=_get_http_cache(resolved_config),
+                rate_limits=resolved_config.git_rate_limits,
             )
     elif resolved_config.issues_platform == IssuesPlatform.jira:
         if not resolved_config.issues_api_key or not resolved_config.issues_user:
@@ -2,7 +2,15 @@ import logging
 from typing import Any, TypeGuard, cast, get_args
 
 from lgtm_ai.ai.exceptions import InvalidModelName, MissingAIAPIKey, MissingModelUrl
-from lgtm_ai.ai.prompts import GUIDE_SYSTEM_PROMPT, REVIEWER_SYSTEM_PROMPT, SUMMARIZING_SYSTEM_PROMPT
+from lgtm_ai.ai.prompts import (
+    GUIDE_SYSTEM_PROMPT,
+    REVIEWER_SYSTEM_PROMPT,
+    REVIEWER_SYSTEM_PROMPT_COMPACT_DIFF,
+    SUMMARIZING_SYSTEM_PROMPT,
+    SUMMARIZING_SYSTEM_PROMPT_COMPACT_DIFF,
+    SUMMARIZING_SYSTEM_PROMPT_COMPACT_DIFF_EXCERPTS,
+    SUMMARIZING_SYSTEM_PROMPT_DIFF_EXCERPTS,
+)
 from lgtm_ai.ai.schemas import (
     AgentSettings,
     DeepSeekModel,
@@ -16,21 +24,25 @@ from lgtm_ai.ai.schemas import (
     SupportedGeminiModel,
 )
 from lgtm_ai.ai.utils import match_model_by_wildcard, select_latest_gemini_model
+from lgtm_ai.base.schemas import DiffFormat, SummarizingDiff
 from openai.types import ChatModel
 from pydantic_ai import Agent, RunContext
 from pydantic_ai.models import Model
-from pydantic_ai.models.anthropic import AnthropicModel
+from pydantic_ai.models.anthropic import AnthropicModel, AnthropicModelSettings
 from pydantic_ai.models.google import GoogleModel
 from pydantic_ai.models.mistral import LatestMistralModelNames, MistralModel
-from pydantic_ai.models.openai import OpenAIChatModel
+from pydantic_ai.models.openai import OpenAIChatModel, OpenAIChatModelSettings
 from pydantic_ai.providers.anthropic import AnthropicProvider
 from pydantic_ai.providers.deepseek import DeepSeekProvider
 from pydantic_ai.providers.google import GoogleProvider
 from pydantic_ai.providers.mistral import MistralProvider
 from pydantic_ai.providers.openai import OpenAIProvider
+from pydantic_ai.settings import ModelSettings
 
 logger = logging.getLogger("lgtm.ai")
 
+_OPENAI_API_URL = "https://api.openai.com/"
+
 
 def get_ai_model(model_name: SupportedAIModels | str, api_key: str, model_url: str | None = None) -> Model:  # noqa: C901
     def _is_gemini_model(model_name: SupportedAIModels) -> TypeGuard[SupportedGeminiModel]:
@@ -77,12 +89,30 @@ def get_ai_model(model_name: SupportedAIModels | str, api_key: str, model_url: s
         raise MissingModelUrl(model_name=model_name)
 
 
+def get_prompt_caching_settings(model: Model, *, cache_key: str) -> ModelSettings:
+    """Get the model settings that enable provider-side prompt caching for the given model, if it needs any.
+
+    Anthropic only caches prompts with explicit cache breakpoints, which are set after the system prompt and
+    after the user prompt. OpenAI caches prompt prefixes automatically, but routing requests with the same
+    `cache_key` to the same servers increases the cache hits. Gemini, Mistral and DeepSeek cache prefixes
+    automatically, and custom OpenAI-compatible endpoints may not support any caching parameters.
+    """
+    if isinstance(model, AnthropicModel):
+        return AnthropicModelSettings(anthropic_cache_instructions=True, anthropic_cache_messages=True)
+    if isinstance(model, OpenAIChatModel) and model.base_url.startswith(_OPENAI_API_URL):
+        return OpenAIChatModelSettings(openai_prompt_cache_key=cache_key)
+    return ModelSettings()
+
+
 def get_reviewer_agent_with_settings(
-    agent_settings: AgentSettings | None = None,
+    agent_settings: AgentSettings | None = None, *, diff_format: DiffFormat = DiffFormat.json
 ) -> Agent[ReviewerDeps, ReviewResponse]:
+    """Get the reviewer agent, with a system prompt that explains the given format of the diffs it receives."""
     extra_settings = _process_extra_settings(agent_settings)
     agent = Agent(
-        system_prompt=REVIEWER_SYSTEM_PROMPT,
+        system_prompt=REVIEWER_SYSTEM_PROMPT_COMPACT_DIFF
+        if diff_format == DiffFormat.compact
+        else REVIEWER_SYSTEM_PROMPT,
         deps_type=ReviewerDeps,
         output_type=ReviewResponse,
         **extra_settings,
@@ -94,10 +124,20 @@ def get_reviewer_agent_with_settings(
 
 def get_summarizing_agent_with_settings(
     agent_settings: AgentSettings | None = None,
+    *,
+    diff_format: DiffFormat = DiffFormat.json,
+    summarizing_diff: SummarizingDiff = SummarizingDiff.full,
 ) -> Agent[SummarizingDeps, ReviewResponse]:
+    """Get the summarizing agent, with a system prompt that explains the given format and kind of diff it receives."""
     extra_settings = _process_extra_settings(agent_settings)
+    system_prompts = {
+        (DiffFormat.json, SummarizingDiff.full): SUMMARIZING_SYSTEM_PROMPT,
+        (DiffFormat.compact, SummarizingDiff.full): SUMMARIZING_SYSTEM_PROMPT_COMPACT_DIFF,
+        (DiffFormat.json, SummarizingDiff.excerpts): SUMMARIZING_SYSTEM_PROMPT_DIFF_EXCERPTS,
+        (DiffFormat.compact, SummarizingDiff.excerpts): SUMMARIZING_SYSTEM_PROMPT_COMPACT_DIFF_EXCERPTS,
+    }
     agent = Agent(
-        system_prompt=SUMMARIZING_SYSTEM_PROMPT,
+        system_prompt=system_prompts[diff_format, summarizing_diff],
         deps_type=SummarizingDeps,
         output_type=ReviewResponse,
         **extra_settings,
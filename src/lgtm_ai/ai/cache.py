@@ -0,0 +1,130 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import time
+from importlib.metadata import version
+from typing import Final
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger("lgtm.ai")
+
+LGTM_VERSION: Final[str] = version("lgtm-ai")
+
+
+class _CacheEntry(BaseModel):
+    created_at: float
+    response: dict[str, object]
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache of validated LLM responses.
+
+    Every entry is stored in its own JSON file named after its key. Entries older than `ttl` seconds are ignored
+    and removed, and when the cache grows over `max_size` bytes the least recently used entries are evicted.
+
+    The cache never raises on I/O errors: a broken cache behaves like an empty one.
+    """
+
+    def __init__(self, directory: pathlib.Path, *, max_size: int, ttl: int) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+
+    @staticmethod
+    def make_key(
+        *,
+        agent_name: str,
+        model_name: str,
+        system_prompt_deps: object,
+        user_prompt: str,
+        settings: dict[str, object],
+    ) -> str:
+        """Build the cache key of an agent run.
+
+        The system prompts of lgtm agents are fully determined by the lgtm version and the dependencies
+        passed to the agent, so those are used in place of the rendered system prompt.
+        """
+        payload = json.dumps(
+            {
+                "lgtm_version": LGTM_VERSION,
+                "agent": agent_name,
+                "model": model_name,
+                "system_prompt_deps": repr(system_prompt_deps),
+                "user_prompt": user_prompt,
+                "settings": settings,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get[T: BaseModel](self, key: str, output_type: type[T]) -> T | None:
+        """Return the cached response for the given key, or None if there is no valid entry for it."""
+        path = self._get_path(key)
+        try:
+            entry = _CacheEntry.model_validate_json(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValidationError):
+            logger.warning("Ignoring unreadable LLM response cache entry %s", path)
+            self._remove(path)
+            return None
+
+        if time.time() - entry.created_at > self.ttl:
+            logger.debug("LLM response cache entry %s has expired", key)
+            self._remove(path)
+            return None
+
+        try:
+            response = output_type.model_validate(entry.response)
+        except ValidationError:
+            logger.warning("Ignoring LLM response cache entry %s, it does not match the expected output", path)
+            self._remove(path)
+            return None
+
+        with contextlib.suppress(OSError):
+            # Access times are not reliable (noatime mounts), so the modification time tracks recency for LRU
+            os.utime(path)
+        return response
+
+    def set(self, key: str, response: BaseModel) -> None:
+        """Store a response in the cache, evicting old entries if the cache is over its maximum size."""
+        entry = _CacheEntry(created_at=time.time(), response=response.model_dump(mode="json"))
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Write atomically so that concurrent lgtm runs never read half-written entries
+            with tempfile.NamedTemporaryFile("wb", dir=self.directory, suffix=".tmp", delete=False) as tmp_file:
+                tmp_file.write(entry.model_dump_json().encode())
+            os.replace(tmp_file.name, self._get_path(key))
+        except OSError as err:
+            logger.warning("Failed to write to the LLM response cache in %s: %s", self.directory, err)
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        try:
+            entries = [(path, path.stat()) for path in self.directory.glob("*.json")]
+        except OSError:
+            return
+
+        total_size = sum(stat.st_size for _, stat in entries)
+        for path, stat in sorted(entries, key=lambda entry: entry[1].st_mtime):
+            if total_size <= self.max_size:
+                break
+            logger.debug("Evicting LLM response cache entry %s", path)
+            self._remove(path)
+            total_size -= stat.st_size
+
+    def _get_path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}.json"
+
+    def _remove(self, path: pathlib.Path) -> None:
+        try:
+            path.unlink(missing_ok=True)
+        except OSError:
+            logger.warning("Failed to remove LLM response cache entry %s", path)
@@ -28,33 +28,48 @@ def _get_full_category_explanation() -> str:
     return "\n".join(lines)
 
 
-REVIEWER_SYSTEM_PROMPT = f"""
-You are a senior software developer making code reviews for your colleagues.
-
-You will receive:
-- The metadata of the PR, including the title and description.
-- A git diff which corresponds to a PR made by one of these colleagues, and you must make a full review of the code.
-    - The git diff format will be a list of changes in JSON format, with the following structure:
+_JSON_DIFF_EXPLANATION = """    - The git diff format will be a list of changes in JSON format, with the following structure:
         ```json
-        {{
-            "metadata": {{
+        {
+            "metadata": {
                 "new_file": boolean,
                 "deleted_file": boolean,
                 "renamed_file": boolean,
                 "new_path": "file/path",
                 "old_path": "file/path",
-            }},
+            },
             "modified_lines": [
-                {{
+                {
                     "line": "code contents of the line",
                     "line_number": number,
                     "modification_type": "added" | "removed", // Whether the line is added or removed in the PR. A line being modified usually is represented by a removal and an addition.
-                }},
+                },
                 ...
             ],
-        }}
+        }
+        ```
+"""
+
+_COMPACT_DIFF_EXPLANATION = """    - The git diff format will be a compact annotated diff. Every changed file starts with a header line:
         ```
-- `Context`, which consists on the contents of each of the changed files in the source (PR) branch or the target branch. This should help you to understand the context of the PR.
+        FILE <new path> [old_path=<old path>] [new_file] [deleted_file] [renamed_file]
+        ```
+      followed by its hunks. Every hunk starts with a `@@ -<hunk_start_old> +<hunk_start_new> @@` line, and then has one line per modified line:
+        ```
+        <+ or -> <line_number> <relative_line_number> | <code contents of the line>
+        ```
+      `+` lines are added in the PR and numbered as in the new file; `-` lines are removed and numbered as in the old file. A line being modified usually is represented by a removal and an addition.
+"""
+
+
+def _get_reviewer_system_prompt(diff_explanation: str) -> str:
+    return f"""
+You are a senior software developer making code reviews for your colleagues.
+
+You will receive:
+- The metadata of the PR, including the title and description.
+- A git diff which corresponds to a PR made by one of these colleagues, and you must make a full review of the code.
+{diff_explanation}- `Context`, which consists on the contents of each of the changed files in the source (PR) branch or the target branch. This should help you to understand the context of the PR.
 - Optionally, `User Story` that the PR is implementing, which will consist of a title and a description. You must evaluate whether the PR is correctly implementing the user story (in its totality or partially).
 - Optionally, `Additional context` that the author of the PR has provided, which may contain a prompt (to give you a hint on what to use it for), and some content.
 
@@ -81,6 +96,16 @@ Score the quality of the PR between 1 and 5, where:
 """
 
 
+REVIEWER_SYSTEM_PROMPT = _get_reviewer_system_prompt(_JSON_DIFF_EXPLANATION)
+REVIEWER_SYSTEM_PROMPT_COMPACT_DIFF = _get_reviewer_system_prompt(_COMPACT_DIFF_EXPLANATION)
+"""Variant of `REVIEWER_SYSTEM_PROMPT` for diffs serialized in the compact format."""
+
+
+_SUMMARIZING_FULL_DIFF_EXPLANATION = "You will receive both the Review and the PR diff. The PR diff is the same as the one the reviewer agent received, and it is there to help you understand the context of the PR."
+
+_SUMMARIZING_DIFF_EXCERPTS_EXPLANATION = "You will receive both the Review and excerpts of the PR diff. The excerpts only contain the modified lines around the comments of the review, not the whole diff that the reviewer agent received, and they are there to help you understand the context of the comments. The rest of the PR is not shown to you: do not remove comments, or decrease their severity, only because they refer to code that you cannot see."
+
+
 SUMMARIZING_SYSTEM_PROMPT = f"""
     You are working within a team of AI agents that are reviewing code Pull Requests in a development team.
     You are an agent that will edit a Pull Request review, created by another AI agent.
@@ -122,10 +147,27 @@ SUMMARIZING_SYSTEM_PROMPT = f"""
     Be more lenient than the reviewer: it tends to be too strict and nitpicky with the score. Have a more human approach to the review when it comes to scoring.
     You are not allowed to decrease the score, only increase it or keep it the same.
 
-    You will receive both the Review and the PR diff. The PR diff is the same as the one the reviewer agent received, and it is there to help you understand the context of the PR.
+    {_SUMMARIZING_FULL_DIFF_EXPLANATION}
 """
 
 
+SUMMARIZING_SYSTEM_PROMPT_COMPACT_DIFF = SUMMARIZING_SYSTEM_PROMPT.replace(
+    "(`hunk_start_new` and `hunk_start_old` in the modified lines;",
+    "(`@@ -<hunk_start_old> +<hunk_start_new> @@` lines of the diff;",
+)
+"""Variant of `SUMMARIZING_SYSTEM_PROMPT` for diffs serialized in the compact format."""
+
+SUMMARIZING_SYSTEM_PROMPT_DIFF_EXCERPTS = SUMMARIZING_SYSTEM_PROMPT.replace(
+    _SUMMARIZING_FULL_DIFF_EXPLANATION, _SUMMARIZING_DIFF_EXCERPTS_EXPLANATION
+)
+"""Variant of `SUMMARIZING_SYSTEM_PROMPT` for the `excerpts` summarizing diff."""
+
+SUMMARIZING_SYSTEM_PROMPT_COMPACT_DIFF_EXCERPTS = SUMMARIZING_SYSTEM_PROMPT_COMPACT_DIFF.replace(
+    _SUMMARIZING_FULL_DIFF_EXPLANATION, _SUMMARIZING_DIFF_EXCERPTS_EXPLANATION
+)
+"""Variant of `SUMMARIZING_SYSTEM_PROMPT_COMPACT_DIFF` for the `excerpts` summarizing diff."""
+
+
 GUIDE_SYSTEM_PROMPT = """
 You are an AI agent that assists software developers in reviewing code changes by generating a structured reviewer guide.
 
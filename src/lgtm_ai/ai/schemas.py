@@ -5,7 +5,8 @@ from functools import cached_property
 from typing import Annotated, Final, Literal, Self, get_args
 from uuid import uuid4
 
-from lgtm_ai.git_client.schemas import PRDiff
+from lgtm_ai.base.tracing import StageSpan
+from lgtm_ai.git_client.schemas import PRDiff, RateLimitBudget
 from openai.types import ChatModel
 from pydantic import AfterValidator, BaseModel, Field, computed_field, model_validator
 from pydantic_ai.models.mistral import LatestMistralModelNames
@@ -185,10 +186,33 @@ class GuideResponse(BaseModel):
     references: Annotated[list[GuideReference], Field(description="References to external resources")]
 
 
+class TrimmedSection(BaseModel):
+    """A section of the review prompt that was dropped or truncated to fit in the prompt token budget."""
+
+    section: Literal["context", "additional_context"]
+    name: str
+    action: Literal["dropped", "truncated"]
+    original_tokens: int
+    final_tokens: int
+
+
+class CacheStats(BaseModel):
+    """Hits and misses of the LLM response cache during a single lgtm run."""
+
+    hits: int = 0
+    misses: int = 0
+
+
 class PublishMetadata(BaseModel):
     model_name: str
     usage: RunUsage
     config: dict[str, object] | None = None
+    trimmed_sections: list[TrimmedSection] = []
+    head_sha: str | None = None
+    reviewed_since_sha: str | None = None
+    cache: CacheStats | None = None
+    git_rate_limit: RateLimitBudget | None = None
+    spans: list[StageSpan] = []
 
     @cached_property
     def created_at(self) -> str:
@@ -1,3 +1,6 @@
 from typing import Final
 
 DEFAULT_HTTPX_TIMEOUT: Final[int] = 3
+
+CHARS_PER_TOKEN: Final[int] = 4
+"""Rough number of characters per token, used to estimate prompt sizes without calling any tokenizer."""
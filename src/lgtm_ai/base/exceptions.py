@@ -17,3 +17,17 @@ class NothingToReviewError(LGTMException):
     def __init__(self, exclude: tuple[str, ...] | None = None) -> None:
         exclude = exclude or ()
         super().__init__(f"Nothing to review after excluding file patterns {', '.join(exclude)}.")
+
+
+class NoChangesSinceLastReviewError(NothingToReviewError):
+    def __init__(self, reviewed_sha: str) -> None:
+        LGTMException.__init__(
+            self, f"Nothing to review, there are no new changes since the last review ({reviewed_sha})."
+        )
+
+
+class PRHeadChangedError(NothingToReviewError):
+    def __init__(self, requested_sha: str, head_sha: str | None) -> None:
+        LGTMException.__init__(
+            self, f"Nothing to review at {requested_sha}, the head of the PR has changed since ({head_sha})."
+        )
@@ -46,3 +46,33 @@ class OutputFormat(StrEnum):
     pretty = "pretty"
     json = "json"
     markdown = "markdown"
+
+
+class ContextMode(StrEnum):
+    """How much of every changed file is sent to the LLM as code context."""
+
+    file = "file"
+    hunks = "hunks"
+    symbols = "symbols"
+
+
+class DiffFormat(StrEnum):
+    """How the PR diff is serialized in the prompts sent to the LLM."""
+
+    json = "json"
+    compact = "compact"
+
+
+class SummarizingDiff(StrEnum):
+    """How much of the PR diff is sent to the summarizing agent along with the initial review."""
+
+    full = "full"
+    excerpts = "excerpts"
+
+
+class SummarizingMode(StrEnum):
+    """When the summarizing agent is run to refine the initial review."""
+
+    always = "always"
+    auto = "auto"
+    never = "never"
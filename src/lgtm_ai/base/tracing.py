@@ -0,0 +1,116 @@
+import datetime
+import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from importlib.metadata import version
+from typing import Protocol
+
+from opentelemetry import trace
+from pydantic import BaseModel
+
+logger = logging.getLogger("lgtm")
+
+type SpanAttribute = str | int | float | bool
+
+
+class StageSpan(BaseModel):
+    """Timing of one stage of an lgtm run (fetching the diff, running an agent, publishing...)."""
+
+    name: str
+    started_at: datetime.datetime
+    duration_ms: float
+    attributes: dict[str, SpanAttribute] = {}
+
+
+class SpanExporter(Protocol):
+    """Hook receiving every span as soon as it ends, e.g., to send it to a tracing backend."""
+
+    def export(self, span: StageSpan) -> None: ...
+
+
+_current_spans: ContextVar[list[StageSpan] | None] = ContextVar("lgtm_current_spans", default=None)
+_exporters: list[SpanExporter] = []
+
+
+def add_span_exporter(exporter: SpanExporter) -> None:
+    """Register an exporter that receives all the spans recorded from now on."""
+    _exporters.append(exporter)
+
+
+def remove_span_exporter(exporter: SpanExporter) -> None:
+    _exporters.remove(exporter)
+
+
+def enable_opentelemetry_export() -> None:
+    """Export all the spans recorded from now on through OpenTelemetry. Calling it more than once has no effect."""
+    if not any(isinstance(exporter, OpenTelemetrySpanExporter) for exporter in _exporters):
+        add_span_exporter(OpenTelemetrySpanExporter())
+
+
+@contextmanager
+def collect_spans() -> Iterator[list[StageSpan]]:
+    """Collect the spans recorded within this context (including tasks and threads started with `asyncio`)."""
+    spans: list[StageSpan] = []
+    token = _current_spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_spans.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes: SpanAttribute) -> Iterator[dict[str, SpanAttribute]]:
+    """Record the duration of a stage.
+
+    The yielded dictionary can be used to add attributes (bytes, file counts, token usage...) that are only known
+    once the stage is done. If the stage fails, the type of the exception is recorded in the `error` attribute.
+    """
+    started_at = datetime.datetime.now(datetime.UTC)
+    start = time.perf_counter()
+    span_attributes = dict(attributes)
+    try:
+        yield span_attributes
+    except BaseException as err:
+        span_attributes["error"] = type(err).__name__
+        raise
+    finally:
+        stage_span = StageSpan(
+            name=name,
+            started_at=started_at,
+            duration_ms=round((time.perf_counter() - start) * 1000, 3),
+            attributes=span_attributes,
+        )
+        logger.debug("Stage %s took %.1f ms %s", name, stage_span.duration_ms, span_attributes)
+        if (spans := _current_spans.get()) is not None:
+            spans.append(stage_span)
+        _export(stage_span)
+
+
+def _export(stage_span: StageSpan) -> None:
+    for exporter in _exporters:
+        try:
+            exporter.export(stage_span)
+        except Exception as err:
+            logger.warning("Failed to export span %s: %s", stage_span.name, err)
+
+
+class OpenTelemetrySpanExporter:
+    """Export lgtm spans as OpenTelemetry spans named `lgtm.<stage>`.
+
+    Only the OpenTelemetry API is used, so spans are sent wherever the OpenTelemetry SDK of the process
+    is configured to send them (e.g., with `opentelemetry-instrument`), and are discarded otherwise.
+    """
+
+    def __init__(self) -> None:
+        self._tracer = trace.get_tracer("lgtm_ai", version("lgtm-ai"))
+
+    def export(self, span: StageSpan) -> None:
+        start_time = int(span.started_at.timestamp() * 1e9)
+        otel_span = self._tracer.start_span(
+            f"lgtm.{span.name}",
+            start_time=start_time,
+            attributes={f"lgtm.{key}": value for key, value in span.attributes.items()},
+        )
+        otel_span.end(end_time=start_time + int(span.duration_ms * 1e6))
@@ -1,16 +1,39 @@
 import fnmatch
+import functools
+import math
 import pathlib
+import re
+from collections.abc import Callable
 
+from lgtm_ai.base.constants import CHARS_PER_TOKEN
 from lgtm_ai.base.schemas import PRSource
 
+type FileMatcher = Callable[[str], bool]
+
 
 def file_matches_any_pattern(file_name: str, patterns: tuple[str, ...]) -> bool:
-    for pattern in patterns:
-        full_match = fnmatch.fnmatch(file_name, pattern)
-        only_filename_match = fnmatch.fnmatch(pathlib.Path(file_name).name, pattern)
-        matches = full_match or only_filename_match
-        if matches:
-            return True
+    return compile_file_patterns(patterns)(file_name)
+
+
+@functools.lru_cache(maxsize=32)
+def compile_file_patterns(patterns: tuple[str, ...]) -> FileMatcher:
+    """Compile UNIX-style wildcard patterns into a single matcher of file paths.
+
+    A path matches if any of the patterns matches either the whole path or only its file name.
+    All the patterns are combined into one regular expression, so matching does not loop over them.
+    """
+    if not patterns:
+        return _match_nothing
+
+    regex = re.compile("|".join(f"(?:{fnmatch.translate(pattern)})" for pattern in patterns))
+
+    def _matches(file_name: str) -> bool:
+        return bool(regex.match(file_name) or regex.match(pathlib.PurePath(file_name).name))
+
+    return _matches
+
+
+def _match_nothing(file_name: str) -> bool:
     return False
 
 
@@ -21,3 +44,11 @@ def git_source_supports_multiline_suggestions(source: PRSource) -> bool:
     GitHub requires the comment to be multi-line, and the suggestion does not need special markup with ranges.
     """
     return source == PRSource.gitlab
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens of the given text.
+
+    It is a rough, provider-agnostic approximation, good enough to decide how to split or trim prompts.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
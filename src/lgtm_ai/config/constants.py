@@ -2,4 +2,18 @@ from lgtm_ai.ai.schemas import SupportedAIModels
 
 DEFAULT_AI_MODEL: SupportedAIModels = "gemini-2.5-flash"
 DEFAULT_INPUT_TOKEN_LIMIT = 500000
+DEFAULT_CONTEXT_WORKERS = 8
+DEFAULT_CONTEXT_WORKERS_PER_HOST = 8
+DEFAULT_CONTEXT_WINDOW_LINES = 20
+DEFAULT_DIFF_MAX_LINES_PER_FILE = 20_000
+DEFAULT_DIFF_MAX_BYTES_PER_FILE = 1024 * 1024
+DEFAULT_REVIEW_SHARD_CONCURRENCY = 4
+DEFAULT_SUMMARIZING_SKIP_MAX_COMMENTS = 2
+DEFAULT_SUMMARIZING_SKIP_MAX_TOKENS = 8_000
+DEFAULT_BATCH_CONCURRENCY = 4
+DEFAULT_SERVER_WORKERS = 4
+DEFAULT_CACHE_MAX_SIZE = 256 * 1024 * 1024
+DEFAULT_CACHE_TTL = 7 * 24 * 60 * 60
+DEFAULT_HTTP_CACHE_MAX_SIZE = 256 * 1024 * 1024
+DEFAULT_GIT_MAX_RETRIES = 3
 DEFAULT_ISSUE_REGEX = r"(?:refs?|closes?|resolves?)[:\s]*((?:#\d+)|(?:#?[A-Z]+-\d+))|(?:fix|feat|docs|style|refactor|perf|test|build|ci)\((?:#(\d+)|#?([A-Z]+-\d+))\)!?:"
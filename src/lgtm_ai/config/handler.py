@@ -6,8 +6,36 @@ from pathlib import Path
 from typing import Annotated, Any, Self, get_args, override
 
 from lgtm_ai.ai.schemas import AdditionalContext, CommentCategory, SupportedAIModels
-from lgtm_ai.base.schemas import IntOrNoLimit, IssuesPlatform, LocalRepository, OutputFormat, PRUrl
-from lgtm_ai.config.constants import DEFAULT_AI_MODEL, DEFAULT_INPUT_TOKEN_LIMIT, DEFAULT_ISSUE_REGEX
+from lgtm_ai.base.schemas import (
+    ContextMode,
+    DiffFormat,
+    IntOrNoLimit,
+    IssuesPlatform,
+    LocalRepository,
+    OutputFormat,
+    PRUrl,
+    SummarizingDiff,
+    SummarizingMode,
+)
+from lgtm_ai.config.constants import (
+    DEFAULT_AI_MODEL,
+    DEFAULT_BATCH_CONCURRENCY,
+    DEFAULT_CACHE_MAX_SIZE,
+    DEFAULT_CACHE_TTL,
+    DEFAULT_CONTEXT_WINDOW_LINES,
+    DEFAULT_CONTEXT_WORKERS,
+    DEFAULT_CONTEXT_WORKERS_PER_HOST,
+    DEFAULT_DIFF_MAX_BYTES_PER_FILE,
+    DEFAULT_DIFF_MAX_LINES_PER_FILE,
+    DEFAULT_GIT_MAX_RETRIES,
+    DEFAULT_HTTP_CACHE_MAX_SIZE,
+    DEFAULT_INPUT_TOKEN_LIMIT,
+    DEFAULT_ISSUE_REGEX,
+    DEFAULT_REVIEW_SHARD_CONCURRENCY,
+    DEFAULT_SERVER_WORKERS,
+    DEFAULT_SUMMARIZING_SKIP_MAX_COMMENTS,
+    DEFAULT_SUMMARIZING_SKIP_MAX_TOKENS,
+)
 from lgtm_ai.config.exceptions import (
     ConfigFileNotFoundError,
     InvalidConfigFileError,
@@ -15,6 +43,8 @@ from lgtm_ai.config.exceptions import (
 )
 from lgtm_ai.config.utils import TupleOrNone, Unique
 from lgtm_ai.config.validators import validate_regex
+from lgtm_ai.git.parser import DiffLimits
+from lgtm_ai.git_client.rate_limit import RateLimits
 from pydantic import (
     AfterValidator,
     BaseModel,
@@ -58,12 +88,17 @@ class CliOptions(BaseModel):
     issues_regex: str | None = None
     issues_platform: IssuesPlatform | None = None
     compare: str | None = None
+    incremental: bool | None = None
+    stream: bool | None = None
+    batch_concurrency: int | None = None
+    server_workers: int | None = None
 
     # Secrets
     git_api_key: str | None = None
     ai_api_key: str | None = None
     issues_api_key: str | None = None
     issues_user: str | None = None
+    webhook_secret: str | None = None
 
 
 class ResolvedConfig(
@@ -117,6 +152,57 @@ class ResolvedConfig(
     )
     """Maximum number of input tokens allowed to send to all AI models in total."""
 
+    prompt_token_budget: Annotated[int | None, Field(ge=1)] = None
+    """Maximum (estimated) number of tokens of a single review prompt. Defaults to `ai_input_tokens_limit`."""
+
+    context_workers: Annotated[int, Field(ge=1)] = DEFAULT_CONTEXT_WORKERS
+    """Maximum number of files whose contents are fetched concurrently to build the code context."""
+
+    context_workers_per_host: Annotated[int, Field(ge=1)] = DEFAULT_CONTEXT_WORKERS_PER_HOST
+    """Maximum number of concurrent file content requests to the same git service host."""
+
+    context_mode: ContextMode = ContextMode.file
+    """Whether to send the whole changed files as context, only the lines around their hunks, or the symbols enclosing them."""
+
+    context_window_lines: Annotated[int, Field(ge=0)] = DEFAULT_CONTEXT_WINDOW_LINES
+    """Lines of context kept before and after every hunk with the `hunks` context mode (and `symbols`, outside any symbol)."""
+
+    context_archive: bool = False
+    """Download the changed files of a PR in a single archive of the repository, instead of one request per file."""
+
+    diff_format: DiffFormat = DiffFormat.json
+    """Format of the diff in the prompts: JSON, or a compact annotated diff that needs far fewer tokens."""
+
+    summarizing_diff: SummarizingDiff = SummarizingDiff.full
+    """Whether to send the whole diff to the summarizing agent, or only the modified lines around every review comment."""
+
+    summarizing_mode: SummarizingMode = SummarizingMode.always
+    """Whether to always run the summarizing agent, never, or only when the initial review is likely to need it."""
+
+    summarizing_skip_max_comments: Annotated[int, Field(ge=0)] = DEFAULT_SUMMARIZING_SKIP_MAX_COMMENTS
+    """With the `auto` summarizing mode, initial reviews with more comments than this are always summarized."""
+
+    summarizing_skip_max_tokens: Annotated[int, Field(ge=0)] = DEFAULT_SUMMARIZING_SKIP_MAX_TOKENS
+    """With the `auto` summarizing mode, PRs whose diff exceeds this (estimated) number of tokens are always summarized."""
+
+    diff_max_lines_per_file: Annotated[int | None, Field(ge=1)] = DEFAULT_DIFF_MAX_LINES_PER_FILE
+    """Maximum number of modified lines of a single file that are read from the diff; the rest are dropped."""
+
+    diff_max_bytes_per_file: Annotated[int | None, Field(ge=1)] = DEFAULT_DIFF_MAX_BYTES_PER_FILE
+    """Maximum size in bytes of the modified lines of a single file that are read from the diff; the rest are dropped."""
+
+    review_shard_tokens: Annotated[int | None, Field(ge=1)] = None
+    """If set, PRs whose diff and context exceed this (estimated) number of tokens are reviewed in shards of this size."""
+
+    review_shard_concurrency: Annotated[int, Field(ge=1)] = DEFAULT_REVIEW_SHARD_CONCURRENCY
+    """Maximum number of review shards sent to the AI model concurrently."""
+
+    batch_concurrency: Annotated[int, Field(ge=1)] = DEFAULT_BATCH_CONCURRENCY
+    """Maximum number of PRs reviewed concurrently by `lgtm review-batch`."""
+
+    server_workers: Annotated[int, Field(ge=1)] = DEFAULT_SERVER_WORKERS
+    """Number of workers reviewing PRs concurrently in `lgtm serve`."""
+
     issues_url: HttpUrl | None = None
     """The URL of the issues page to retrieve additional context from."""
 
@@ -129,6 +215,39 @@ class ResolvedConfig(
     compare: str = "HEAD"
     """If reviewing a local repository, what to compare against (branch, commit, or HEAD for working dir)."""
 
+    incremental: bool = False
+    """Only review the changes pushed to the PR since the last review published by lgtm."""
+
+    stream: bool = False
+    """Print the review comments as soon as they are generated, before the final review is ready."""
+
+    cache_dir: Path | None = None
+    """Directory where LLM responses are cached. The cache is disabled if not set."""
+
+    cache_max_size: Annotated[int, Field(ge=1)] = DEFAULT_CACHE_MAX_SIZE
+    """Maximum size in bytes of the LLM response cache. Least recently used responses are evicted first."""
+
+    cache_ttl: Annotated[int, Field(ge=0)] = DEFAULT_CACHE_TTL
+    """Time in seconds after which a cached LLM response expires."""
+
+    http_cache_dir: Path | None = None
+    """Directory where the responses of the git service APIs are cached and revalidated. Disabled if not set."""
+
+    http_cache_max_size: Annotated[int, Field(ge=1)] = DEFAULT_HTTP_CACHE_MAX_SIZE
+    """Maximum size in bytes of the HTTP cache. Least recently used responses are evicted first."""
+
+    git_requests_per_second: Annotated[float, Field(gt=0)] | None = None
+    """Maximum number of requests per second sent to the API of a git service. Not limited if not set."""
+
+    git_max_retries: Annotated[int, Field(ge=0)] = DEFAULT_GIT_MAX_RETRIES
+    """Number of times a request rejected by the rate limit of the git service is retried."""
+
+    prompt_caching: bool = True
+    """Enable the prompt caching of the AI model provider, for the providers that need to opt in to it."""
+
+    opentelemetry: bool = False
+    """Export the timing spans of every stage of lgtm through OpenTelemetry."""
+
     # Secrets - these will be loaded from environment variables with LGTM_ prefix
     # They are not displayed on logs or reprs.
     git_api_key: str = Field(repr=False, exclude=True)
@@ -143,6 +262,9 @@ class ResolvedConfig(
     issues_user: str | None = Field(default=None, repr=False, exclude=True)
     """Username to interact with the issues platform (only needed for Jira)."""
 
+    webhook_secret: str | None = Field(default=None, repr=False, exclude=True)
+    """Secret that webhooks received by `lgtm serve` must be signed with (GitHub) or include as token (GitLab)."""
+
     @classmethod
     def settings_customise_sources(
         cls,
@@ -227,6 +349,14 @@ class ResolvedConfig(
 
         return v
 
+    @property
+    def diff_limits(self) -> DiffLimits:
+        return DiffLimits(max_lines=self.diff_max_lines_per_file, max_bytes=self.diff_max_bytes_per_file)
+
+    @property
+    def git_rate_limits(self) -> RateLimits:
+        return RateLimits(requests_per_second=self.git_requests_per_second, max_retries=self.git_max_retries)
+
 
 class ConfigHandler:
     """Handler for the configuration of lgtm.
@@ -243,8 +373,11 @@ class ConfigHandler:
         self.cli_args = cli_args
         self.config_file = config_file
 
-    def resolve_config(self, target: PRUrl | LocalRepository) -> ResolvedConfig:
-        """Get fully resolved configuration for running lgtm."""
+    def resolve_config(self, target: PRUrl | LocalRepository | None = None) -> ResolvedConfig:
+        """Get fully resolved configuration for running lgtm.
+
+        `target` can be omitted when lgtm runs for many PRs not known in advance (e.g., `lgtm serve`).
+        """
         try:
             cli_args = self.cli_args.model_copy()
             if isinstance(target, LocalRepository):
@@ -5,10 +5,14 @@ from lgtm_ai.formatters.base import Formatter
 
 
 class JsonFormatter(Formatter[str]):
+    def __init__(self, indent: int | None = 2) -> None:
+        """Format reviews as JSON documents, or as JSON Lines if `indent` is None."""
+        self.indent = indent
+
     def format_review_summary_section(self, review: Review, comments: list[ReviewComment] | None = None) -> str:
         """Format the **whole** review as JSON."""
         return review.model_dump_json(
-            indent=2,
+            indent=self.indent,
             exclude={
                 "pr_diff",
             },
@@ -23,14 +27,14 @@ class JsonFormatter(Formatter[str]):
 
     def format_review_comment(self, comment: ReviewComment, *, with_footer: bool = True) -> str:
         """Format a single comment as JSON."""
-        return comment.model_dump_json(indent=2)
+        return comment.model_dump_json(indent=self.indent)
 
     def format_guide(self, guide: ReviewGuide) -> str:
         """Format the review guide as JSON."""
-        return guide.model_dump_json(indent=2, exclude={"pr_diff"})
+        return guide.model_dump_json(indent=self.indent, exclude={"pr_diff"})
 
     def empty_review_message(self) -> str:
-        return json.dumps({"review_response": None, "metadata": None}, indent=2)
+        return json.dumps({"review_response": None, "metadata": None}, indent=self.indent)
 
     def empty_guide_message(self) -> str:
-        return json.dumps({"guide_response": None, "metadata": None}, indent=2)
+        return json.dumps({"guide_response": None, "metadata": None}, indent=self.indent)
@@ -93,4 +93,9 @@ class MarkDownFormatter(Formatter[str]):
             created_at=metadata.created_at,
             usage=metadata.usage,
             config=metadata.config,
+            trimmed_sections=metadata.trimmed_sections,
+            head_sha=metadata.head_sha,
+            reviewed_since_sha=metadata.reviewed_since_sha,
+            cache=metadata.cache,
+            git_rate_limit=metadata.git_rate_limit,
         )
@@ -1,8 +1,19 @@
+import ast
+import logging
 import re
-from typing import Literal
+from array import array
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from typing import Literal, Self, TypedDict, overload
 
 from lgtm_ai.git.exceptions import GitDiffParseError
-from pydantic import BaseModel
+from pydantic import BaseModel, GetCoreSchemaHandler
+from pydantic_core import core_schema
+
+logger = logging.getLogger("lgtm.git")
+
+type ModificationType = Literal["added", "removed"]
 
 
 class ModifiedLine(BaseModel):
@@ -14,6 +25,153 @@ class ModifiedLine(BaseModel):
     hunk_start_old: int | None = None
 
 
+class _ModifiedLineDict(TypedDict):
+    line: str
+    line_number: int
+    relative_line_number: int
+    modification_type: ModificationType
+    hunk_start_new: int | None
+    hunk_start_old: int | None
+
+
+class ModifiedLines(Sequence[ModifiedLine]):
+    """Compact, read-only sequence of the modified lines of a diff.
+
+    Diffs of generated or vendored code can have hundreds of thousands of modified lines, so instead of keeping one
+    `ModifiedLine` model per line, their fields are stored in flat arrays, and `ModifiedLine` models are only created
+    when the lines are accessed (or serialized). It is validated from, compared with and serialized as a list of
+    `ModifiedLine`.
+    """
+
+    __slots__ = ("_hunk_indexes", "_hunks", "_is_added", "_line_numbers", "_lines", "_relative_line_numbers")
+
+    def __init__(self, lines: Iterable[ModifiedLine] = ()) -> None:
+        self._lines: list[str] = []
+        self._line_numbers = array("q")
+        self._relative_line_numbers = array("q")
+        self._is_added = bytearray()
+        # Lines share the (new, old) hunk starts of their hunk, so they are stored once per hunk
+        self._hunks: list[tuple[int | None, int | None]] = []
+        self._hunk_indexes = array("q")
+        for line in lines:
+            self.append(
+                line.line,
+                line_number=line.line_number,
+                relative_line_number=line.relative_line_number,
+                modification_type=line.modification_type,
+                hunk_start_new=line.hunk_start_new,
+                hunk_start_old=line.hunk_start_old,
+            )
+
+    def append(
+        self,
+        line: str,
+        *,
+        line_number: int,
+        relative_line_number: int,
+        modification_type: ModificationType,
+        hunk_start_new: int | None,
+        hunk_start_old: int | None,
+    ) -> None:
+        hunk = (hunk_start_new, hunk_start_old)
+        if not self._hunks or self._hunks[-1] != hunk:
+            self._hunks.append(hunk)
+        self._lines.append(line)
+        self._line_numbers.append(line_number)
+        self._relative_line_numbers.append(relative_line_number)
+        self._is_added.append(modification_type == "added")
+        self._hunk_indexes.append(len(self._hunks) - 1)
+
+    def text_length(self) -> int:
+        """Total length of the contents of the lines, without creating their models."""
+        return sum(map(len, self._lines))
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    @overload
+    def __getitem__(self, index: int) -> ModifiedLine: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[ModifiedLine]: ...
+
+    def __getitem__(self, index: int | slice) -> ModifiedLine | list[ModifiedLine]:
+        if isinstance(index, slice):
+            return [self._get_line(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("modified line index out of range")
+        return self._get_line(index)
+
+    def __iter__(self) -> Iterator[ModifiedLine]:
+        return map(self._get_line, range(len(self)))
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ModifiedLines):
+            return (
+                self._lines == other._lines
+                and self._line_numbers == other._line_numbers
+                and self._relative_line_numbers == other._relative_line_numbers
+                and self._is_added == other._is_added
+                and [self._hunks[i] for i in self._hunk_indexes] == [other._hunks[i] for i in other._hunk_indexes]
+            )
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"ModifiedLines({list(self)!r})"
+
+    def _get_line(self, index: int) -> ModifiedLine:
+        hunk_start_new, hunk_start_old = self._hunks[self._hunk_indexes[index]]
+        # The values were validated (or parsed) when stored, there is no need to validate them again
+        return ModifiedLine.model_construct(
+            line=self._lines[index],
+            line_number=self._line_numbers[index],
+            relative_line_number=self._relative_line_numbers[index],
+            modification_type="added" if self._is_added[index] else "removed",
+            hunk_start_new=hunk_start_new,
+            hunk_start_old=hunk_start_old,
+        )
+
+    def _to_dicts(self) -> list[_ModifiedLineDict]:
+        # Serializing plain dicts is much faster than creating (and serializing) a model per line
+        hunks = self._hunks
+        return [
+            {
+                "line": line,
+                "line_number": line_number,
+                "relative_line_number": relative_line_number,
+                "modification_type": "added" if is_added else "removed",
+                "hunk_start_new": hunks[hunk_index][0],
+                "hunk_start_old": hunks[hunk_index][1],
+            }
+            for line, line_number, relative_line_number, is_added, hunk_index in zip(
+                self._lines,
+                self._line_numbers,
+                self._relative_line_numbers,
+                self._is_added,
+                self._hunk_indexes,
+                strict=True,
+            )
+        ]
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source_type: object, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        list_schema = handler.generate_schema(list[ModifiedLine])
+        from_list_schema = core_schema.chain_schema([list_schema, core_schema.no_info_plain_validator_function(cls)])
+        return core_schema.json_or_python_schema(
+            json_schema=from_list_schema,
+            python_schema=core_schema.union_schema([core_schema.is_instance_schema(cls), from_list_schema]),
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                cls._to_dicts, return_schema=handler.generate_schema(list[_ModifiedLineDict])
+            ),
+        )
+
+
 class DiffFileMetadata(BaseModel):
     new_file: bool
     deleted_file: bool
@@ -26,20 +184,41 @@ class DiffFileMetadata(BaseModel):
 
 class DiffResult(BaseModel):
     metadata: DiffFileMetadata
-    modified_lines: list[ModifiedLine]
+    modified_lines: ModifiedLines
+
+
+@dataclass(frozen=True, slots=True)
+class DiffLimits:
+    """Maximum size of the diff of a single file. Modified lines over any of the limits are dropped."""
+
+    max_lines: int | None = None
+    max_bytes: int | None = None
 
 
 _HUNK_REGEX = re.compile(r"^@@ -(\d+),?\d* \+(\d+),?\d* @@")
+_GIT_DIFF_HEADER = "diff --git "
 
 
-def parse_diff_patch(metadata: DiffFileMetadata, diff_text: object) -> DiffResult:
+def parse_diff_patch(metadata: DiffFileMetadata, diff_text: object, *, limits: DiffLimits | None = None) -> DiffResult:
     """Parse a unified diff patch and return the modified lines with their metadata."""
     if not isinstance(diff_text, str):
         raise GitDiffParseError("Diff text is not a string")
+    return parse_diff_lines(metadata, diff_text.strip().splitlines(), limits=limits)
 
-    lines = diff_text.strip().splitlines()
 
-    modified_lines = []
+def parse_diff_lines(
+    metadata: DiffFileMetadata, lines: Iterable[str], *, limits: DiffLimits | None = None
+) -> DiffResult:
+    """Parse the lines (without line endings) of the unified diff patch of a file in a single pass.
+
+    The lines are consumed one by one, and the modified lines are stored in a compact `ModifiedLines`.
+    If `limits` are given, the modified lines over them are dropped (but all the lines are consumed anyway).
+    """
+    modified_lines = ModifiedLines()
+    max_lines = limits.max_lines if limits else None
+    max_bytes = limits.max_bytes if limits else None
+    total_bytes = 0
+    truncated = False
 
     old_line_num = 0
     new_line_num = 0
@@ -49,45 +228,162 @@ def parse_diff_patch(metadata: DiffFileMetadata, diff_text: object) -> DiffResul
 
     try:
         for line in lines:
-            hunk_match = _HUNK_REGEX.match(line)
+            if truncated:
+                continue
             rel_position += 1
-            if hunk_match:
+            first_char = line[:1]
+            if first_char == "@" and (hunk_match := _HUNK_REGEX.match(line)):
                 old_line_num = int(hunk_match.group(1))
                 new_line_num = int(hunk_match.group(2))
                 hunk_start_new = new_line_num
                 hunk_start_old = old_line_num
                 continue
 
-            if line.startswith("+") and not line.startswith("+++"):
-                modified_lines.append(
-                    ModifiedLine(
-                        line=line[1:],
-                        line_number=new_line_num,
-                        relative_line_number=rel_position,
-                        modification_type="added",
-                        hunk_start_new=hunk_start_new,
-                        hunk_start_old=hunk_start_old,
-                    )
-                )
+            is_added = first_char == "+" and not line.startswith("+++")
+            if not is_added and not (first_char == "-" and not line.startswith("---")):
+                old_line_num += 1
                 new_line_num += 1
+                continue
 
-            elif line.startswith("-") and not line.startswith("---"):
-                modified_lines.append(
-                    ModifiedLine(
-                        line=line[1:],
-                        line_number=old_line_num,
-                        relative_line_number=rel_position,
-                        modification_type="removed",
-                        hunk_start_new=hunk_start_new,
-                        hunk_start_old=hunk_start_old,
-                    )
+            if max_bytes is not None:
+                total_bytes += len(line.encode()) - 1
+            if (max_lines is not None and len(modified_lines) >= max_lines) or (
+                max_bytes is not None and total_bytes > max_bytes
+            ):
+                logger.warning(
+                    "The diff of %s is too large, only its first %d modified lines are kept",
+                    metadata.new_path,
+                    len(modified_lines),
                 )
-                old_line_num += 1
+                truncated = True
+                continue
 
+            modified_lines.append(
+                line[1:],
+                line_number=new_line_num if is_added else old_line_num,
+                relative_line_number=rel_position,
+                modification_type="added" if is_added else "removed",
+                hunk_start_new=hunk_start_new,
+                hunk_start_old=hunk_start_old,
+            )
+            if is_added:
+                new_line_num += 1
             else:
                 old_line_num += 1
-                new_line_num += 1
-    except (ValueError, TypeError, KeyError) as err:
+    except (ValueError, TypeError, KeyError, OverflowError) as err:
         raise GitDiffParseError("Failed to parse diff patch") from err
 
-    return DiffResult(metadata=metadata, modified_lines=modified_lines)
+    return DiffResult.model_construct(metadata=metadata, modified_lines=modified_lines)
+
+
+def iter_unified_diff(
+    lines: Iterable[str | bytes],
+    *,
+    limits: DiffLimits | None = None,
+    exclude: Callable[[str], bool] | None = None,
+) -> Iterator[DiffResult]:
+    """Parse a multi-file unified diff, as printed by `git diff`, yielding the diff of every file as soon as it is read.
+
+    The lines are consumed incrementally (e.g., from the output of a process or an HTTP response), so only
+    the diff of the file being parsed is kept in memory (and it is capped by `limits`, if given).
+    The patches of the files whose path matches `exclude` are skipped without parsing them.
+    """
+    reader = _LineReader(lines)
+    for line in reader:
+        if line.startswith(_GIT_DIFF_HEADER):
+            metadata = _read_file_header(line, reader)
+            if exclude and exclude(metadata.new_path):
+                logger.debug("Excluding file %s from diff", metadata.new_path)
+                deque(_read_file_patch(reader), maxlen=0)
+                continue
+            yield parse_diff_lines(metadata, _read_file_patch(reader), limits=limits)
+
+
+class _LineReader:
+    """Iterator over lines without line endings, which allows putting back the last line read."""
+
+    def __init__(self, lines: Iterable[str | bytes]) -> None:
+        self._lines = iter(lines)
+        self._pushed_back: str | None = None
+
+    def __iter__(self) -> Self:
+        return self
+
+    def __next__(self) -> str:
+        if self._pushed_back is not None:
+            line, self._pushed_back = self._pushed_back, None
+            return line
+        raw_line = next(self._lines)
+        line = raw_line.decode(errors="replace") if isinstance(raw_line, bytes) else raw_line
+        return line.removesuffix("\n").removesuffix("\r")
+
+    def push_back(self, line: str) -> None:
+        self._pushed_back = line
+
+
+def _read_file_header(first_line: str, reader: _LineReader) -> DiffFileMetadata:
+    """Read the extended header of the diff of a file, up to its first hunk."""
+    old_path, new_path = _split_header_paths(first_line.removeprefix(_GIT_DIFF_HEADER))
+    new_file = deleted_file = renamed_file = False
+    for line in reader:
+        if line.startswith(("@@", _GIT_DIFF_HEADER)):
+            reader.push_back(line)
+            break
+        if line.startswith("new file mode"):
+            new_file = True
+        elif line.startswith("deleted file mode"):
+            deleted_file = True
+        elif line.startswith("rename from "):
+            renamed_file = True
+            old_path = _unquote_path(line.removeprefix("rename from "))
+        elif line.startswith("rename to "):
+            new_path = _unquote_path(line.removeprefix("rename to "))
+        elif line.startswith("--- a/") or line.startswith('--- "a/'):
+            old_path = _unquote_path(line.removeprefix("--- ").rstrip("\t")).removeprefix("a/")
+        elif line.startswith("+++ b/") or line.startswith('+++ "b/'):
+            new_path = _unquote_path(line.removeprefix("+++ ").rstrip("\t")).removeprefix("b/")
+
+    return DiffFileMetadata(
+        new_file=new_file,
+        deleted_file=deleted_file,
+        renamed_file=renamed_file,
+        new_path=new_path,
+        old_path=old_path if old_path != new_path else None,
+    )
+
+
+def _read_file_patch(reader: _LineReader) -> Iterator[str]:
+    """Yield the lines of the hunks of a file, up to the header of the next file."""
+    for line in reader:
+        if line.startswith(_GIT_DIFF_HEADER):
+            reader.push_back(line)
+            return
+        yield line
+
+
+def _split_header_paths(paths: str) -> tuple[str, str]:
+    """Split the `a/<old path> b/<new path>` part of a `diff --git` header line."""
+    if paths.startswith('"'):
+        end = paths.index('"', 1)
+        while paths[end - 1] == "\\":
+            end = paths.index('"', end + 1)
+        old_path, new_path = paths[: end + 1], paths[end + 2 :]
+    elif (
+        len(paths) % 2 and paths[len(paths) // 2] == " " and paths[2 : len(paths) // 2] == paths[len(paths) // 2 + 3 :]
+    ):
+        # Same path on both sides (the usual case), even if it has spaces
+        old_path, new_path = paths[: len(paths) // 2], paths[len(paths) // 2 + 1 :]
+    else:
+        old_path, _, new_path = paths.partition(" b/")
+        new_path = f"b/{new_path}"
+    return _unquote_path(old_path).removeprefix("a/"), _unquote_path(new_path).removeprefix("b/")
+
+
+def _unquote_path(path: str) -> str:
+    """Unquote a path that git quoted because of unusual characters (which are escaped as octal bytes)."""
+    if len(path) < 2 or not (path.startswith('"') and path.endswith('"')):
+        return path
+    try:
+        return bytes(ast.literal_eval(f"b{path}")).decode(errors="replace")
+    except (ValueError, SyntaxError):
+        return path[1:-1]
@@ -1,23 +1,36 @@
 import logging
 import pathlib
-import typing
 
+from lgtm_ai.base.utils import compile_file_patterns
 from lgtm_ai.git.exceptions import GitDiffParseError, GitNotFoundError
-from lgtm_ai.git.parser import DiffFileMetadata, DiffResult, parse_diff_patch
+from lgtm_ai.git.parser import DiffLimits, iter_unified_diff
 from lgtm_ai.git_client.schemas import PRDiff
 
-if typing.TYPE_CHECKING:
-    from git.diff import Diff
-
 logger = logging.getLogger("lgtm")
 
+# Make the output independent of the git configuration of the user (colors, external diff tools, path prefixes...)
+_GIT_DIFF_OPTIONS = (
+    "--no-color",
+    "--no-ext-diff",
+    "--no-textconv",
+    "--find-renames",
+    "--src-prefix=a/",
+    "--dst-prefix=b/",
+)
+
 
-def get_diff_from_local_repo(git_dir: pathlib.Path, *, compare: str = "HEAD") -> PRDiff:
+def get_diff_from_local_repo(
+    git_dir: pathlib.Path, *, compare: str = "HEAD", limits: DiffLimits | None = None, exclude: tuple[str, ...] = ()
+) -> PRDiff:
     """Get git diff from a local repository and parse it into PRDiff format.
 
+    The output of `git diff` is parsed as it is read, one file at a time, so the whole diff is never in memory at once.
+
     Args:
         git_dir: Path to the git repository
         compare: What to compare against (branch name, commit hash, or "HEAD" for working dir changes)
+        limits: Maximum size of the diff read for every file
+        exclude: Patterns of the files whose diff is skipped without parsing it
     """
     try:
         import git
@@ -35,36 +48,30 @@ def get_diff_from_local_repo(git_dir: pathlib.Path, *, compare: str = "HEAD") ->
 
     # Get diff based on compare parameter
     if compare == "HEAD":
-        # Working directory changes (git diff)
+        # Working directory changes (git diff HEAD)
         logger.info("Comparing working directory changes against HEAD")
-        diff_index = repo.head.commit.diff(None, create_patch=True)
+        revisions = ["HEAD"]
         target_branch = "HEAD"
     else:
-        # Compare current branch against specified compare (git diff compare..HEAD)
+        # Compare current branch against specified compare (git diff compare HEAD)
         logger.info("Comparing HEAD of %s against %s", current_branch, compare)
         try:
-            compare_commit = repo.commit(compare)
-            diff_index = compare_commit.diff(repo.head.commit, create_patch=True)
+            revisions = [repo.commit(compare).hexsha, "HEAD"]
             target_branch = compare
         except git.BadName as e:
             raise GitDiffParseError(f"Invalid branch/commit: {compare}") from e
 
-    # Parse each diff item
-    diff_results: list[DiffResult] = []
-    changed_files: list[str] = []
-
-    for diff_item in diff_index:
-        metadata = _extract_file_metadata(diff_item)
-        changed_files.append(metadata.new_path)
-
-        diff_text = _get_diff_text(diff_item)
-        diff_result = parse_diff_patch(metadata, diff_text)
-        diff_results.append(diff_result)
+    process = repo.git.diff(*_GIT_DIFF_OPTIONS, *revisions, as_process=True)
+    try:
+        diff_results = list(iter_unified_diff(process.stdout, limits=limits, exclude=compile_file_patterns(exclude)))
+        process.wait()
+    except git.GitCommandError as e:
+        raise GitDiffParseError("Failed to get the diff of the local git repository") from e
 
     return PRDiff(
         id=1,
         diff=diff_results,
-        changed_files=changed_files,
+        changed_files=[diff_result.metadata.new_path for diff_result in diff_results],
         target_branch=target_branch,
         source_branch=current_branch,
     )
@@ -81,24 +88,3 @@ def get_file_contents_from_local_repo(git_dir: pathlib.Path, file_name: pathlib.
     except UnicodeDecodeError:
         logger.warning("File %s is not a utf-8 encoded text file", file_name)
         return ""
-
-
-def _get_diff_text(diff_item: "Diff") -> str:
-    """Extract diff text from a diff item."""
-    if diff_item.diff:
-        return diff_item.diff.decode("utf-8") if isinstance(diff_item.diff, bytes) else diff_item.diff
-    return ""
-
-
-def _extract_file_metadata(diff_item: "Diff") -> DiffFileMetadata:
-    """Extract file metadata from GitPython diff item."""
-    new_path = diff_item.b_path or diff_item.a_path or "unknown"
-    old_path = diff_item.a_path if diff_item.a_path != diff_item.b_path else None
-
-    return DiffFileMetadata(
-        new_file=diff_item.new_file,
-        deleted_file=diff_item.deleted_file,
-        renamed_file=diff_item.renamed_file,
-        new_path=new_path,
-        old_path=old_path,
-    )
@@ -0,0 +1,74 @@
+"""Extraction of files from the (streamed) repository archives of git services, see `extract_files_from_archive`."""
+
+import io
+import logging
+import posixpath
+import tarfile
+from collections.abc import Buffer, Collection, Iterable, Iterator
+
+logger = logging.getLogger("lgtm.git")
+
+ARCHIVE_CHUNK_SIZE = 64 * 1024
+"""Size of the chunks in which archives are downloaded."""
+
+ARCHIVE_DOWNLOAD_TIMEOUT = 60
+"""Seconds to wait for every chunk of an archive. Git services may take a while to start streaming big archives."""
+
+
+def extract_files_from_archive(chunks: Iterable[bytes], file_paths: Collection[str]) -> dict[str, str | None]:
+    """Extract the given files from a gzipped tarball of a repository, reading it as it is downloaded.
+
+    Archives of git services contain a single root directory (e.g., `<repo>-<sha>/`), which is stripped from the
+    paths of their members. Only the requested files are kept in memory, and the download stops as soon as all of
+    them are found. Files missing from the archive, and files that are not valid UTF-8 (e.g., binary files), are
+    mapped to None.
+
+    Raises `tarfile.TarError` if the archive is not a valid gzipped tarball.
+    """
+    pending = set(file_paths)
+    contents: dict[str, str | None] = dict.fromkeys(file_paths)
+    with tarfile.open(fileobj=_ChunksReader(chunks), mode="r|gz") as archive:
+        for member in archive:
+            _, _, path = member.name.partition("/")
+            if not member.isfile() or path not in pending:
+                continue
+            pending.discard(path)
+            if (file := archive.extractfile(member)) is None:
+                continue
+            try:
+                contents[path] = file.read().decode("utf-8")
+            except UnicodeDecodeError:
+                logger.warning("File %s of the archive is not valid UTF-8, skipping it for context", path)
+            if not pending:
+                break
+    return contents
+
+
+def get_common_directory(file_paths: Iterable[str]) -> str | None:
+    """Get the deepest directory that contains all the given files, or None if it is the root of the repository."""
+    directories = [posixpath.dirname(file_path) for file_path in file_paths]
+    if not directories:
+        return None
+    return posixpath.commonpath(directories) or None
+
+
+class _ChunksReader(io.RawIOBase):
+    """Read-only file object over an iterable of chunks of bytes, so that it can be read as a stream."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks: Iterator[bytes] = iter(chunks)
+        self._buffer = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Buffer) -> int:
+        while not self._buffer:
+            if (chunk := next(self._chunks, None)) is None:
+                return 0
+            self._buffer = memoryview(chunk)
+        target = memoryview(buffer).cast("B")
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
@@ -1,10 +1,15 @@
-from typing import Protocol
+import re
+from collections.abc import Iterable, Sequence
+from typing import Final, Protocol
 
 from lgtm_ai.ai.schemas import Review, ReviewGuide
 from lgtm_ai.base.schemas import PRUrl
-from lgtm_ai.git_client.schemas import ContextBranch, IssueContent, PRDiff, PRMetadata
+from lgtm_ai.git_client.schemas import ContextBranch, IssueContent, PRDiff, PRMetadata, RateLimitBudget
 from pydantic import HttpUrl
 
+REVIEWED_SHA_MARKER_PATTERN: Final[re.Pattern[str]] = re.compile(r"<!-- lgtm-reviewed-sha: ([0-9a-fA-F]+) -->")
+"""Hidden marker that lgtm adds to published reviews, recording the head commit that was reviewed."""
+
 
 class GitClient(Protocol):
     """Interface for any Git service client."""
@@ -29,3 +34,49 @@ class GitClient(Protocol):
 
         It should never raise, and instead return None if the file cannot be downloaded.
         """
+
+    def get_files_contents(
+        self, pr_url: PRUrl, file_paths: Sequence[str], branch_name: ContextBranch
+    ) -> dict[str, str | None] | None:
+        """Get the contents of several files from the given branch at once, mapping every path to its contents.
+
+        Files that cannot be downloaded are mapped to None. Git services that cannot fetch files in bulk return None
+        (the default), and the files are then fetched one by one with `get_file_contents`. It should never raise.
+        """
+        return None
+
+    def get_last_reviewed_sha(self, pr_url: PRUrl) -> str | None:
+        """Get the head commit SHA of the last review published by lgtm on the PR, if any.
+
+        Git services that do not support incremental reviews return None (the default), and the whole PR is reviewed.
+        It should never raise, and instead return None if it cannot be determined.
+        """
+        return None
+
+    def get_diff_since(self, pr_url: PRUrl, base_sha: str) -> PRDiff | None:
+        """Get the diff of the changes pushed to the PR after the commit `base_sha`.
+
+        It should never raise, and instead return None if the diff cannot be computed
+        (e.g., `base_sha` is no longer part of the PR history after a force-push), which is also the default.
+        """
+        return None
+
+    def clear_pr_cache(self, pr_url: PRUrl) -> None:
+        """Forget the cached objects of the PR, so that they are fetched again (e.g., after new commits were pushed).
+
+        Git clients reused between reviews must call it before every review of the PR. Does nothing by default.
+        """
+        return None
+
+    def get_rate_limit_budget(self) -> RateLimitBudget | None:
+        """Get the current rate limit budget of the git service API, or None if it is not tracked (the default)."""
+        return None
+
+
+def find_reviewed_sha(bodies: Iterable[str]) -> str | None:
+    """Return the reviewed SHA recorded in the last of the given comment bodies that has one."""
+    reviewed_sha = None
+    for body in bodies:
+        if match := REVIEWED_SHA_MARKER_PATTERN.search(body or ""):
+            reviewed_sha = match.group(1)
+    return reviewed_sha
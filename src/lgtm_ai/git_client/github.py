@@ -1,110 +1,172 @@
 import binascii
 import logging
-from functools import lru_cache
+import tarfile
+from collections import Counter
+from collections.abc import Iterable, Sequence
+from functools import lru_cache, partial
 from typing import Any, Literal, cast
 from urllib.parse import urlparse
 
 import github
+import httpx
+import requests
 from lgtm_ai.ai.schemas import CodeSuggestionOffset, Review, ReviewComment, ReviewGuide
 from lgtm_ai.base.schemas import PRUrl
+from lgtm_ai.base.tracing import span
 from lgtm_ai.formatters.base import Formatter
 from lgtm_ai.git.exceptions import GitDiffParseError
-from lgtm_ai.git.parser import DiffFileMetadata, DiffResult, parse_diff_patch
-from lgtm_ai.git_client.base import GitClient
+from lgtm_ai.git.parser import DiffFileMetadata, DiffLimits, DiffResult, parse_diff_patch
+from lgtm_ai.git_client.archive import ARCHIVE_CHUNK_SIZE, ARCHIVE_DOWNLOAD_TIMEOUT, extract_files_from_archive
+from lgtm_ai.git_client.base import GitClient, find_reviewed_sha
 from lgtm_ai.git_client.exceptions import (
     PublishGuideError,
     PublishReviewError,
     PullRequestDiffError,
     PullRequestMetadataError,
 )
-from lgtm_ai.git_client.schemas import ContextBranch, IssueContent, PRDiff, PRMetadata
+from lgtm_ai.git_client.http_cache import HttpCache, get_http_adapter
+from lgtm_ai.git_client.positions import DiffPositionIndex
+from lgtm_ai.git_client.rate_limit import RateLimitScheduler
+from lgtm_ai.git_client.schemas import ContextBranch, IssueContent, PRDiff, PRMetadata, RateLimitBudget
 from pydantic import HttpUrl
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger("lgtm.git")
 
+GITHUB_MAX_PER_PAGE = 100
+"""Page size of paginated REST requests (e.g., the changed files of a pull request). 100 is the maximum GitHub allows."""
+
+GRAPHQL_BLOBS_PER_QUERY = 50
+"""Maximum number of files fetched in a single GraphQL query. GitHub limits the cost and size of every query."""
+
+_BLOB_FIELDS = "... on Blob { text isBinary isTruncated }"
+
+# PyGithub does not allow setting the HTTP session of a single client, only its connection class (name-mangled)
+_REQUESTER_CONNECTION_CLASS_ATTRIBUTE = "_Requester__connectionClass"
+
+# Statuses of the requests rejected by the rate limit of GitHub, retried by the rate limit scheduler
+_RATE_LIMIT_STATUS_CODES = frozenset({requests.codes.forbidden, requests.codes.too_many_requests})
+
 
 class GitHubClient(GitClient):
-    def __init__(self, client: github.Github, formatter: Formatter[str]) -> None:
+    def __init__(
+        self,
+        client: github.Github,
+        formatter: Formatter[str],
+        *,
+        diff_limits: DiffLimits | None = None,
+        context_archive: bool = False,
+        scheduler: RateLimitScheduler | None = None,
+    ) -> None:
         self.client = client
         self.formatter = formatter
+        self.diff_limits = diff_limits
+        self.context_archive = context_archive
+        self.scheduler = scheduler
+        self._pr_cache_versions: Counter[PRUrl] = Counter()
 
     def get_diff_from_url(self, pr_url: PRUrl) -> PRDiff:
         """Return a PRDiff object containing an identifier to the diff and a stringified representation of the diff from the latest version of the given pull request URL."""
         logger.info("Fetching diff from GitHub")
 
         try:
-            pr = _get_pr(self.client, pr_url)
+            pr = self._get_pr(pr_url)
             files = pr.get_files()
         except github.GithubException as err:
             logger.error("Failed to retrieve the diff of the pull request")
             raise PullRequestDiffError from err
 
-        parsed: list[DiffResult] = []
-        for file in files:
-            metadata = DiffFileMetadata(
-                new_file=(file.status == "added"),
-                deleted_file=(file.status == "removed"),
-                renamed_file=(file.status == "renamed"),
-                new_path=file.filename,
-                old_path=getattr(file, "previous_filename", None),
-            )
-            try:
-                parsed_diff = parse_diff_patch(metadata=metadata, diff_text=file.patch or "")
-            except GitDiffParseError:
-                logger.exception(
-                    "Failed to parse diff patch for file %s, will skip it",
-                    file.filename,
-                )
-                continue
-            parsed.append(parsed_diff)
+        return PRDiff(
+            id=pr.number,
+            diff=_parse_files(files, limits=self.diff_limits),
+            changed_files=[file.filename for file in files],
+            target_branch=pr.base.ref,
+            source_branch=pr.head.ref,
+            head_sha=pr.head.sha,
+        )
+
+    def get_rate_limit_budget(self) -> RateLimitBudget | None:
+        return self.scheduler.budget if self.scheduler else None
 
+    def clear_pr_cache(self, pr_url: PRUrl) -> None:
+        self._pr_cache_versions[pr_url] += 1
+
+    def get_last_reviewed_sha(self, pr_url: PRUrl) -> str | None:
+        """Return the head SHA recorded in the last review published by lgtm in the given pull request."""
+        try:
+            pr = self._get_pr(pr_url)
+            return find_reviewed_sha(review.body for review in pr.get_reviews())
+        except github.GithubException as err:
+            logger.warning("Failed to retrieve the previous reviews of the pull request: %s", err)
+            return None
+
+    def get_diff_since(self, pr_url: PRUrl, base_sha: str) -> PRDiff | None:
+        """Return a PRDiff with the changes between `base_sha` and the current head of the given pull request."""
+        try:
+            pr = self._get_pr(pr_url)
+            comparison = pr.base.repo.compare(base_sha, pr.head.sha)
+        except github.GithubException as err:
+            logger.warning("Failed to compare %s with the head of the pull request: %s", base_sha, err)
+            return None
+
+        if comparison.status != "ahead":
+            # The previously reviewed commit is not an ancestor of the head anymore (e.g., after a rebase)
+            logger.info("Commit %s is not an ancestor of the pull request head (%s)", base_sha, comparison.status)
+            return None
+
+        files = comparison.files
         return PRDiff(
             id=pr.number,
-            diff=parsed,
+            diff=_parse_files(files, limits=self.diff_limits),
             changed_files=[file.filename for file in files],
             target_branch=pr.base.ref,
             source_branch=pr.head.ref,
+            head_sha=pr.head.sha,
         )
 
     def publish_review(self, pr_url: PRUrl, review: Review) -> None:
         """Publish the review to the given pull request URL.
 
-        Publish a main summary comment and then specific line comments.
+        Publish a main summary comment and then specific line comments. The positions of the comments are validated
+        against the diff beforehand (see `DiffPositionIndex`): comments that cannot be placed on a line of the diff are
+        appended to the summary, and multi-line comments are only created for ranges within a single hunk.
         """
-        pr = _get_pr(self.client, pr_url)
-        comment_builder = CommentBuilder(self.formatter)
-        comments = [comment_builder.generate_comment_payload(c) for c in review.review_response.comments]
-        try:
-            commit = pr.base.repo.get_commit(pr.head.sha)
-            pr.create_review(
-                body=self.formatter.format_review_summary_section(review),
-                event="COMMENT",
-                comments=comments,
-                commit=commit,
-            )
-        except github.GithubException:
+        with span("publish_review", source="github", comments=len(review.review_response.comments)):
+            pr = self._get_pr(pr_url)
+            positions = DiffPositionIndex(review.pr_diff.diff)
+            line_comments: list[ReviewComment] = []
+            summary_comments: list[ReviewComment] = []
+            for review_comment in review.review_response.comments:
+                location = positions.locate_comment(review_comment)
+                if location and location.position:
+                    line_comments.append(location.comment)
+                else:
+                    # GitHub reviews do not support file-level comments
+                    summary_comments.append(review_comment)
+
+            comment_builder = CommentBuilder(self.formatter, positions)
+            body = self.formatter.format_review_summary_section(review, summary_comments)
+            comments = [comment_builder.generate_comment_payload(c) for c in line_comments]
             try:
-                # Fallback to single-line comments if multi-line comments fail
-                logger.warning(
-                    "Failed to publish review with multi-line comments, falling back to single-line comments"
-                )
-                comments = [
-                    comment_builder.generate_comment_payload(c, force_single_line=True)
-                    for c in review.review_response.comments
-                ]
-                pr.create_review(
-                    body=self.formatter.format_review_summary_section(review),
-                    event="COMMENT",
-                    comments=comments,
-                    commit=commit,
-                )
-            except github.GithubException as err:
-                raise PublishReviewError from err
+                commit = pr.base.repo.get_commit(pr.head.sha)
+                pr.create_review(body=body, event="COMMENT", comments=comments, commit=commit)
+            except github.GithubException:
+                try:
+                    # Fallback to single-line comments if multi-line comments fail
+                    logger.warning(
+                        "Failed to publish review with multi-line comments, falling back to single-line comments"
+                    )
+                    comments = [
+                        comment_builder.generate_comment_payload(c, force_single_line=True) for c in line_comments
+                    ]
+                    pr.create_review(body=body, event="COMMENT", comments=comments, commit=commit)
+                except github.GithubException as err:
+                    raise PublishReviewError from err
 
     def get_pr_metadata(self, pr_url: PRUrl) -> PRMetadata:
         """Return a PRMetadata object containing the metadata of the given pull request URL."""
         try:
-            pr = _get_pr(self.client, pr_url)
+            pr = self._get_pr(pr_url)
         except github.GithubException as err:
             logger.error("Failed to retrieve the metadata of the pull request")
             raise PullRequestMetadataError from err
@@ -129,23 +191,25 @@ class GitHubClient(GitClient):
         )
 
     def publish_guide(self, pr_url: PRUrl, guide: ReviewGuide) -> None:
-        pr = _get_pr(self.client, pr_url)
-        try:
-            commit = pr.base.repo.get_commit(pr.head.sha)
-            pr.create_review(
-                body=self.formatter.format_guide(guide),
-                event="COMMENT",
-                comments=[],
-                commit=commit,
-            )
-        except github.GithubException as err:
-            raise PublishGuideError from err
+        with span("publish_guide", source="github"):
+            pr = self._get_pr(pr_url)
+            try:
+                commit = pr.base.repo.get_commit(pr.head.sha)
+                pr.create_review(
+                    body=self.formatter.format_guide(guide),
+                    event="COMMENT",
+                    comments=[],
+                    commit=commit,
+                )
+            except github.GithubException as err:
+                raise PublishGuideError from err
 
     def get_file_contents(self, pr_url: PRUrl, file_path: str, branch_name: ContextBranch) -> str | None:
         repo = _get_repo(self.client, pr_url.repo_path)
-        pr = _get_pr(self.client, pr_url)
+        pr = self._get_pr(pr_url)
         try:
-            file_contents = repo.get_contents(file_path, ref=pr.head.ref if branch_name == "source" else pr.base.ref)
+            # The head commit is pinned by SHA, so its files can be cached forever (see `use_http_transport`)
+            file_contents = repo.get_contents(file_path, ref=pr.head.sha if branch_name == "source" else pr.base.ref)
         except github.GithubException as err:
             logger.warning(
                 "Failed to retrieve file %s from GitHub branch %s, error: %s",
@@ -179,6 +243,185 @@ class GitHubClient(GitClient):
             decoded_content.append(decoded_chunk_content)
         return "".join(decoded_content)
 
+    def get_files_contents(
+        self, pr_url: PRUrl, file_paths: Sequence[str], branch_name: ContextBranch
+    ) -> dict[str, str | None] | None:
+        """Get the contents of several files of the given branch in a few requests.
+
+        Files are read at the head (or base) commit of the pull request. By default, they are fetched through GraphQL,
+        `GRAPHQL_BLOBS_PER_QUERY` files per query, instead of making one REST request per file. With `context_archive`,
+        they are extracted from a tarball of the whole repository instead, which is streamed in a single request.
+        Files that do not exist in the branch, binary files and files too large to be returned whole are mapped to None.
+        """
+        try:
+            pr = self._get_pr(pr_url)
+            sha = pr.head.sha if branch_name == "source" else pr.base.sha
+        except (github.GithubException, PullRequestDiffError) as err:
+            logger.warning("Failed to retrieve the pull request to fetch its files: %s", err)
+            return None
+
+        if self.context_archive:
+            return self._get_files_contents_from_archive(pr_url, file_paths, sha=sha, branch_name=branch_name)
+        return self._get_files_contents_from_graphql(pr_url, file_paths, sha=sha, branch_name=branch_name)
+
+    def _get_files_contents_from_graphql(
+        self, pr_url: PRUrl, file_paths: Sequence[str], *, sha: str, branch_name: ContextBranch
+    ) -> dict[str, str | None] | None:
+        owner, _, name = pr_url.repo_path.partition("/")
+        contents: dict[str, str | None] = {}
+        with span("get_files_contents", source="github", branch=branch_name, files=len(file_paths)) as attributes:
+            for queries, start in enumerate(range(0, len(file_paths), GRAPHQL_BLOBS_PER_QUERY), start=1):
+                batch = file_paths[start : start + GRAPHQL_BLOBS_PER_QUERY]
+                try:
+                    blobs = _query_blobs(
+                        self.client, owner=owner, name=name, expressions=[f"{sha}:{path}" for path in batch]
+                    )
+                except github.GithubException as err:
+                    logger.warning("Failed to retrieve files from GitHub branch %s in bulk: %s", branch_name, err)
+                    return None
+                for path, blob in zip(batch, blobs, strict=True):
+                    contents[path] = _get_blob_text(blob, path, branch_name)
+                attributes.update(queries=queries)
+        return contents
+
+    def _get_files_contents_from_archive(
+        self, pr_url: PRUrl, file_paths: Sequence[str], *, sha: str, branch_name: ContextBranch
+    ) -> dict[str, str | None] | None:
+        with span("download_archive", source="github", branch=branch_name, files=len(file_paths)):
+            try:
+                archive_url = _get_repo(self.client, pr_url.repo_path).get_archive_link("tarball", sha)
+                with httpx.stream(
+                    "GET", archive_url, follow_redirects=True, timeout=ARCHIVE_DOWNLOAD_TIMEOUT
+                ) as response:
+                    response.raise_for_status()
+                    return extract_files_from_archive(response.iter_bytes(ARCHIVE_CHUNK_SIZE), file_paths)
+            except (github.GithubException, PullRequestDiffError, httpx.HTTPError, tarfile.TarError) as err:
+                logger.warning("Failed to retrieve the archive of GitHub branch %s: %s", branch_name, err)
+                return None
+
+    def _get_pr(self, pr_url: PRUrl) -> github.PullRequest.PullRequest:
+        return _get_pr(self.client, pr_url, self._pr_cache_versions[pr_url])
+
+
+def _query_blobs(
+    client: github.Github, *, owner: str, name: str, expressions: Sequence[str]
+) -> list[dict[str, Any] | None]:
+    """Fetch the blobs of the given `<rev>:<path>` expressions from a repository in a single GraphQL query."""
+    variables = ", ".join(f"$e{index}: String!" for index in range(len(expressions)))
+    objects = " ".join(
+        f"f{index}: object(expression: $e{index}) {{ {_BLOB_FIELDS} }}" for index in range(len(expressions))
+    )
+    query = f"query($owner: String!, $name: String!, {variables}) {{ repository(owner: $owner, name: $name) {{ {objects} }} }}"
+    _, data = client.requester.graphql_query(
+        query,
+        {"owner": owner, "name": name, **{f"e{index}": expression for index, expression in enumerate(expressions)}},
+    )
+    repository = data["data"]["repository"] or {}
+    return [repository.get(f"f{index}") for index in range(len(expressions))]
+
+
+def _get_blob_text(blob: dict[str, Any] | None, file_path: str, branch_name: ContextBranch) -> str | None:
+    if not blob or blob.get("text") is None:
+        # The file does not exist in the branch, or it is not a blob (e.g., a submodule)
+        return None
+    if blob.get("isBinary") or blob.get("isTruncated"):
+        logger.warning("File %s on branch %s is binary or too large, skipping it for context", file_path, branch_name)
+        return None
+    return cast(str, blob["text"])
+
+
+def _parse_files(files: Iterable[github.File.File], *, limits: DiffLimits | None) -> list[DiffResult]:
+    parsed: list[DiffResult] = []
+    for file in files:
+        metadata = DiffFileMetadata(
+            new_file=(file.status == "added"),
+            deleted_file=(file.status == "removed"),
+            renamed_file=(file.status == "renamed"),
+            new_path=file.filename,
+            old_path=getattr(file, "previous_filename", None),
+        )
+        try:
+            parsed_diff = parse_diff_patch(metadata=metadata, diff_text=file.patch or "", limits=limits)
+        except GitDiffParseError:
+            logger.exception(
+                "Failed to parse diff patch for file %s, will skip it",
+                file.filename,
+            )
+            continue
+        parsed.append(parsed_diff)
+    return parsed
+
+
+def use_http_transport(
+    client: github.Github, *, http_cache: HttpCache | None, scheduler: RateLimitScheduler | None
+) -> None:
+    """Make the REST requests of the given client go through the HTTP cache and the rate limit scheduler.
+
+    PyGithub only allows replacing its connection classes for all the clients of the process at once, which also
+    disables its persistent connections. Instead, the connection class is replaced in the requester of this client.
+    """
+    requester = client.requester
+    if requester.scheme != "https" or not hasattr(requester, _REQUESTER_CONNECTION_CLASS_ATTRIBUTE):
+        logger.warning("The HTTP cache and rate limits are not supported for this GitHub client, ignoring them")
+        return
+    setattr(
+        requester,
+        _REQUESTER_CONNECTION_CLASS_ATTRIBUTE,
+        partial(_HTTPSConnection, http_cache=http_cache, scheduler=scheduler),
+    )
+
+
+class _HTTPSConnection(github.Requester.HTTPSRequestsConnectionClass):
+    """PyGithub HTTPS connection whose requests go through an HTTP cache and a rate limit scheduler."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int | None = None,
+        *,
+        http_cache: HttpCache | None,
+        scheduler: RateLimitScheduler | None,
+        timeout: int | None = None,
+        retry: int | Retry | None = None,
+        pool_size: int | None = None,
+        verify: bool | str = True,
+    ) -> None:
+        super().__init__(host, port, timeout=timeout, retry=retry, pool_size=pool_size, verify=verify)
+        self.adapter = get_http_adapter(
+            http_cache=http_cache,
+            scheduler=scheduler,
+            max_retries=_get_retry_without_rate_limits(self.retry) if scheduler else self.retry,
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+        )
+        self.session.mount("https://", self.adapter)
+
+
+def _get_retry_without_rate_limits(retry: int | Retry | None) -> int | Retry | None:
+    """Get the given retry configuration without the retries of the requests rejected by the rate limit.
+
+    PyGithub's `GithubRetry` waits for the rate limit on its own, which would retry the rejected requests again on top
+    of the retries of the rate limit scheduler, and without holding back the other requests in the meantime.
+    """
+    if not isinstance(retry, Retry):
+        return retry
+    # `GithubRetry` always retries 403 responses, so its settings are copied to a plain `Retry`
+    return Retry(
+        total=retry.total,
+        connect=retry.connect,
+        read=retry.read,
+        redirect=retry.redirect,
+        status=retry.status,
+        other=retry.other,
+        allowed_methods=retry.allowed_methods,
+        status_forcelist={code for code in retry.status_forcelist or () if code not in _RATE_LIMIT_STATUS_CODES},
+        backoff_factor=retry.backoff_factor,
+        backoff_max=retry.backoff_max,
+        raise_on_redirect=retry.raise_on_redirect,
+        raise_on_status=retry.raise_on_status,
+        respect_retry_after_header=False,
+    )
+
 
 @lru_cache(maxsize=64)
 def _get_repo(client: github.Github, repo_path: str) -> github.Repository.Repository:
@@ -192,8 +435,11 @@ def _get_repo(client: github.Github, repo_path: str) -> github.Repository.Reposi
 
 
 @lru_cache(maxsize=64)
-def _get_pr(client: github.Github, pr_url: PRUrl) -> github.PullRequest.PullRequest:
-    """Return the pull request object for the given pull request URL."""
+def _get_pr(client: github.Github, pr_url: PRUrl, cache_version: int) -> github.PullRequest.PullRequest:
+    """Return the pull request object for the given pull request URL.
+
+    `cache_version` is only part of the cache key: bumping it (see `GitHubClient.clear_pr_cache`) fetches the PR again.
+    """
     try:
         repo = _get_repo(client, pr_url.repo_path)
         pr = repo.get_pull(pr_url.pr_number)
@@ -214,8 +460,9 @@ def _get_repo_from_issues_url(client: github.Github, issues_url: HttpUrl) -> git
 
 
 class CommentBuilder:
-    def __init__(self, formatter: Formatter[str]) -> None:
+    def __init__(self, formatter: Formatter[str], positions: DiffPositionIndex | None = None) -> None:
         self.formatter = formatter
+        self.positions = positions
 
     def generate_comment_payload(
         self, comment: ReviewComment, *, force_single_line: bool = False
@@ -226,9 +473,14 @@ class CommentBuilder:
             "body": self.formatter.format_review_comment(comment),
         }
 
-        if not force_single_line and comment.suggestion and self._should_create_multiline_comment(comment):
+        start_line, end_line = self._calculate_multiline_range(comment)
+        if (
+            not force_single_line
+            and comment.suggestion
+            and self._should_create_multiline_comment(comment)
+            and self._is_range_in_diff(comment, start_line, end_line)
+        ):
             # Use the new GitHub API parameters for multi-line comments
-            start_line, end_line = self._calculate_multiline_range(comment)
             side = self._determine_comment_side(comment)
             comment_data.update(
                 {
@@ -258,6 +510,18 @@ class CommentBuilder:
 
         return start_line_offset != end_line_offset
 
+    def _is_range_in_diff(self, comment: ReviewComment, start_line: int, end_line: int) -> bool:
+        """Whether the given range of lines is within a single hunk of the diff, which GitHub requires.
+
+        Without positions to validate it against, the range is assumed to be valid.
+        """
+        if self.positions is None:
+            return True
+        new_side = comment.is_comment_on_new_path
+        start = self.positions.get_position(comment.new_path, start_line, new_side=new_side)
+        end = self.positions.get_position(comment.new_path, end_line, new_side=new_side)
+        return start is not None and end is not None and start.hunk == end.hunk
+
     def _calculate_multiline_range(self, comment: ReviewComment) -> tuple[int, int]:
         """Calculate the start and end line numbers for a multi-line comment."""
         if not comment.suggestion:
@@ -1,7 +1,11 @@
 import base64
 import binascii
+import contextlib
 import functools
 import logging
+import tarfile
+from collections import Counter
+from collections.abc import Sequence
 from typing import Any, cast
 from urllib.parse import urlparse
 
@@ -9,12 +13,15 @@ import gitlab
 import gitlab.exceptions
 import gitlab.v4
 import gitlab.v4.objects
+import requests
 from lgtm_ai.ai.schemas import Review, ReviewComment, ReviewGuide
 from lgtm_ai.base.schemas import PRUrl
+from lgtm_ai.base.tracing import span
 from lgtm_ai.formatters.base import Formatter
 from lgtm_ai.git.exceptions import GitDiffParseError
-from lgtm_ai.git.parser import DiffFileMetadata, DiffResult, parse_diff_patch
-from lgtm_ai.git_client.base import GitClient
+from lgtm_ai.git.parser import DiffFileMetadata, DiffLimits, DiffResult, parse_diff_patch
+from lgtm_ai.git_client.archive import ARCHIVE_CHUNK_SIZE, extract_files_from_archive, get_common_directory
+from lgtm_ai.git_client.base import GitClient, find_reviewed_sha
 from lgtm_ai.git_client.exceptions import (
     InvalidGitAuthError,
     PublishGuideError,
@@ -23,17 +30,31 @@ from lgtm_ai.git_client.exceptions import (
     PullRequestDiffNotFoundError,
     PullRequestMetadataError,
 )
-from lgtm_ai.git_client.schemas import ContextBranch, IssueContent, PRDiff, PRMetadata
+from lgtm_ai.git_client.positions import CommentLocation, DiffPositionIndex
+from lgtm_ai.git_client.rate_limit import RateLimitScheduler
+from lgtm_ai.git_client.schemas import ContextBranch, IssueContent, PRDiff, PRMetadata, RateLimitBudget
 from pydantic import HttpUrl
 
 logger = logging.getLogger("lgtm.git")
 
 
 class GitlabClient(GitClient):
-    def __init__(self, client: gitlab.Gitlab, formatter: Formatter[str]) -> None:
+    def __init__(
+        self,
+        client: gitlab.Gitlab,
+        formatter: Formatter[str],
+        *,
+        diff_limits: DiffLimits | None = None,
+        context_archive: bool = False,
+        scheduler: RateLimitScheduler | None = None,
+    ) -> None:
         self.client = client
         self.formatter = formatter
+        self.diff_limits = diff_limits
+        self.context_archive = context_archive
+        self.scheduler = scheduler
         self._pr: gitlab.v4.objects.ProjectMergeRequest | None = None
+        self._pr_cache_versions: Counter[PRUrl] = Counter()
 
     def get_diff_from_url(self, pr_url: PRUrl) -> PRDiff:
         """Return a PRDiff object containing an identifier to the diff and a stringified representation of the diff from latest version of the given pull request URL."""
@@ -46,7 +67,7 @@ class GitlabClient(GitClient):
 
         logger.info("Fetching diff from GitLab")
         try:
-            pr = _get_pr_from_url(self.client, pr_url)
+            pr = self._get_pr(pr_url)
             diff = self._get_diff_from_pr(pr)
         except gitlab.exceptions.GitlabError as err:
             logger.error("Failed to retrieve the diff of the pull request")
@@ -58,11 +79,58 @@ class GitlabClient(GitClient):
             changed_files=[change["new_path"] for change in diff.diffs],
             target_branch=pr.target_branch,
             source_branch=pr.source_branch,
+            head_sha=diff.head_commit_sha,
+        )
+
+    def get_rate_limit_budget(self) -> RateLimitBudget | None:
+        return self.scheduler.budget if self.scheduler else None
+
+    def clear_pr_cache(self, pr_url: PRUrl) -> None:
+        self._pr_cache_versions[pr_url] += 1
+
+    def get_last_reviewed_sha(self, pr_url: PRUrl) -> str | None:
+        """Return the head SHA recorded in the last review published by lgtm in the given merge request."""
+        try:
+            pr = self._get_pr(pr_url)
+            notes = pr.notes.list(iterator=True, order_by="created_at", sort="asc")
+            return find_reviewed_sha(note.body for note in notes)
+        except gitlab.exceptions.GitlabError as err:
+            logger.warning("Failed to retrieve the previous reviews of the merge request: %s", err)
+            return None
+
+    def get_diff_since(self, pr_url: PRUrl, base_sha: str) -> PRDiff | None:
+        """Return a PRDiff with the changes between `base_sha` and the current head of the given merge request.
+
+        The id of the returned diff is the one of the latest MR diff version, so that comments can still be positioned on the MR.
+        """
+        try:
+            pr = self._get_pr(pr_url)
+            if base_sha not in {commit.id for commit in pr.commits()}:
+                # The previously reviewed commit is not part of the MR anymore (e.g., after a rebase)
+                logger.info("Commit %s is not part of the merge request anymore", base_sha)
+                return None
+            latest_diff = self._get_diff_from_pr(pr)
+            project = _get_project_from_url(self.client, pr_url.repo_path)
+            comparison = cast(
+                dict[str, Any], project.repository_compare(base_sha, latest_diff.head_commit_sha, straight=True)
+            )
+        except (gitlab.exceptions.GitlabError, PullRequestDiffNotFoundError) as err:
+            logger.warning("Failed to compare %s with the head of the merge request: %s", base_sha, err)
+            return None
+
+        diffs = comparison.get("diffs", [])
+        return PRDiff(
+            id=latest_diff.id,
+            diff=self._parse_gitlab_git_diff(diffs),
+            changed_files=[change["new_path"] for change in diffs],
+            target_branch=pr.target_branch,
+            source_branch=pr.source_branch,
+            head_sha=latest_diff.head_commit_sha,
         )
 
     def get_pr_metadata(self, pr_url: PRUrl) -> PRMetadata:
         try:
-            pr = _get_pr_from_url(self.client, pr_url)
+            pr = self._get_pr(pr_url)
         except gitlab.exceptions.GitlabError as err:
             logger.error("Failed to retrieve the metadata of the pull request")
             raise PullRequestMetadataError from err
@@ -86,29 +154,30 @@ class GitlabClient(GitClient):
 
     def publish_review(self, pr_url: PRUrl, review: Review) -> None:
         logger.info("Publishing review to GitLab")
-        try:
-            pr = _get_pr_from_url(self.client, pr_url)
-            self._post_review_summary(pr, review)
-            failed_comments = self._post_review_comments(pr, review)
-            logger.warning(
-                "Some comments could not be posted to GitLab; total: %d, failed: %d",
-                len(review.review_response.comments),
-                len(failed_comments),
-            )
-        except gitlab.exceptions.GitlabError as err:
-            raise PublishReviewError from err
+        with (
+            span("publish_review", source="gitlab", comments=len(review.review_response.comments)) as attributes,
+        ):
+            locations, unplaced_comments = self._locate_review_comments(review)
+            try:
+                pr = self._get_pr(pr_url)
+                self._post_review_summary(pr, review, unplaced_comments)
+                failed_comments = self._post_review_comments(pr, review, locations)
+                attributes["failed_comments"] = len(failed_comments)
+            except gitlab.exceptions.GitlabError as err:
+                raise PublishReviewError from err
 
     def publish_guide(self, pr_url: PRUrl, guide: ReviewGuide) -> None:
-        try:
-            pr = _get_pr_from_url(self.client, pr_url)
-            pr.notes.create({"body": self.formatter.format_guide(guide)})
-        except gitlab.exceptions.GitlabError as err:
-            raise PublishGuideError from err
+        with span("publish_guide", source="gitlab"):
+            try:
+                pr = self._get_pr(pr_url)
+                pr.notes.create({"body": self.formatter.format_guide(guide)})
+            except gitlab.exceptions.GitlabError as err:
+                raise PublishGuideError from err
 
     def get_file_contents(self, pr_url: PRUrl, file_path: str, branch_name: ContextBranch) -> str | None:
         project = _get_project_from_url(self.client, pr_url.repo_path)
         try:
-            pr = _get_pr_from_url(self.client, pr_url)
+            pr = self._get_pr(pr_url)
             file = project.files.get(
                 file_path=file_path,
                 ref=pr.sha if branch_name == "source" else pr.target_branch,
@@ -124,6 +193,41 @@ class GitlabClient(GitClient):
             return None
         return content
 
+    def get_files_contents(
+        self, pr_url: PRUrl, file_paths: Sequence[str], branch_name: ContextBranch
+    ) -> dict[str, str | None] | None:
+        """Get the contents of several files of the given branch from a single archive of the repository.
+
+        Only with `context_archive`: otherwise, files are fetched one by one. The archive only contains the deepest
+        directory that has all the files, and it is streamed, keeping only the requested files in memory.
+        """
+        if not self.context_archive:
+            return None
+
+        with span("download_archive", source="gitlab", branch=branch_name, files=len(file_paths)):
+            try:
+                project = _get_project_from_url(self.client, pr_url.repo_path)
+                pr = self._get_pr(pr_url)
+                query_data = {"sha": pr.sha if branch_name == "source" else pr.target_branch}
+                if path := get_common_directory(file_paths):
+                    query_data["path"] = path
+                # Not `project.repository_archive`, which does not give access to the response to close it
+                response = cast(
+                    requests.Response,
+                    self.client.http_get(
+                        f"/projects/{project.encoded_id}/repository/archive.tar.gz",
+                        query_data=query_data,
+                        raw=True,
+                        streamed=True,
+                    ),
+                )
+                # Closing the response stops the download if all the files were found before the end of the archive
+                with contextlib.closing(response):
+                    return extract_files_from_archive(response.iter_content(ARCHIVE_CHUNK_SIZE), file_paths)
+            except (gitlab.exceptions.GitlabError, requests.RequestException, tarfile.TarError) as err:
+                logger.warning("Failed to retrieve the archive of GitLab branch %s: %s", branch_name, err)
+                return None
+
     def _parse_gitlab_git_diff(self, diffs: list[dict[str, object]]) -> list[DiffResult]:
         parsed_diffs: list[DiffResult] = []
         for diff in diffs:
@@ -135,6 +239,7 @@ class GitlabClient(GitClient):
                 parsed = parse_diff_patch(
                     metadata=DiffFileMetadata.model_validate(diff),
                     diff_text=cast(str, diff_text),
+                    limits=self.diff_limits,
                 )
             except GitDiffParseError:
                 logger.exception(
@@ -145,25 +250,45 @@ class GitlabClient(GitClient):
 
         return parsed_diffs
 
-    def _post_review_summary(self, pr: gitlab.v4.objects.ProjectMergeRequest, review: Review) -> None:
-        pr.notes.create({"body": self.formatter.format_review_summary_section(review)})
+    def _locate_review_comments(self, review: Review) -> tuple[list[CommentLocation], list[ReviewComment]]:
+        """Find where every comment of the review can be posted, from the diff the review was made on.
 
-    def _post_review_comments(self, pr: gitlab.v4.objects.ProjectMergeRequest, review: Review) -> list[ReviewComment]:
-        """Post comments on the file & filenumber they refer to.
+        Returns the locations of the comments that can be posted on the merge request, and the comments on files that
+        are not part of the diff, which should be appended to the review summary instead.
+        """
+        positions = DiffPositionIndex(review.pr_diff.diff)
+        locations: list[CommentLocation] = []
+        unplaced_comments: list[ReviewComment] = []
+        for review_comment in review.review_response.comments:
+            if location := positions.locate_comment(review_comment):
+                locations.append(location)
+            else:
+                unplaced_comments.append(review_comment)
+        return locations, unplaced_comments
+
+    def _post_review_summary(
+        self, pr: gitlab.v4.objects.ProjectMergeRequest, review: Review, comments: list[ReviewComment]
+    ) -> None:
+        pr.notes.create({"body": self.formatter.format_review_summary_section(review, comments)})
 
-        The AI currently makes mistakes which make gitlab fail to accurately post a comment.
-        For example with the line number a comment refers to (whether it's a line on the 'old' file vs the 'new file).
-        To avoid blocking the review, we try once with `new_line`, retry with `old_line`, then try to post the comment on the file level and finally return the comments to be posted with the main summary.
+    def _post_review_comments(
+        self, pr: gitlab.v4.objects.ProjectMergeRequest, review: Review, locations: list[CommentLocation]
+    ) -> list[ReviewComment]:
+        """Post comments on the file & line number they refer to.
+
+        The positions of the comments are validated against the diff beforehand (see `DiffPositionIndex`), so every
+        comment takes a single request. If GitLab still rejects a line comment, it is posted once more at file level.
 
         Returns:
-            list[ReviewComment]: list of comments that could not be created, and therefore should be appended to the review summary
+            list[ReviewComment]: list of comments that could not be created at all
         """
         logger.info("Posting comments to GitLab")
         failed_comments: list[ReviewComment] = []
 
         diff = pr.diffs.get(review.pr_diff.id)
-        for review_comment in review.review_response.comments:
-            position = {
+        for location in locations:
+            review_comment = location.comment
+            position: dict[str, Any] = {
                 "base_sha": diff.base_commit_sha,
                 "head_sha": diff.head_commit_sha,
                 "start_sha": diff.start_commit_sha,
@@ -171,20 +296,20 @@ class GitlabClient(GitClient):
                 "old_path": review_comment.old_path,
                 "position_type": "text",
             }
-            if review_comment.is_comment_on_new_path:
-                position["new_line"] = review_comment.line_number
+            if location.position is None:
+                position["position_type"] = "file"
             else:
-                position["old_line"] = review_comment.line_number
+                # Context lines must be addressed by both their old and new line numbers
+                if location.position.new_line is not None:
+                    position["new_line"] = location.position.new_line
+                if location.position.old_line is not None:
+                    position["old_line"] = location.position.old_line
 
             gitlab_comment = {
                 "body": self.formatter.format_review_comment(review_comment),
                 "position": position,
             }
-
-            comment_create_success = self._attempt_comment_at_positions(pr, gitlab_comment)
-
-            if not comment_create_success:
-                # Add it to the list of failed comments to be published in the summary comment
+            if not self._create_discussion(pr, gitlab_comment):
                 failed_comments.append(review_comment)
 
         if failed_comments:
@@ -195,53 +320,34 @@ class GitlabClient(GitClient):
             )
         return failed_comments
 
-    def _attempt_comment_at_positions(
-        self, pr: gitlab.v4.objects.ProjectMergeRequest, gitlab_comment: dict[str, Any]
-    ) -> bool:
-        """Try to post comments at decreasingly specific positions.
-
-        By default we want to just try original target, then swap lines, then post to file, then give up.
+    def _create_discussion(self, pr: gitlab.v4.objects.ProjectMergeRequest, gitlab_comment: dict[str, Any]) -> bool:
+        """Create a discussion with the given comment, falling back to a file-level one if its line is rejected.
 
-        Returns whether any of the attempts were successful.
+        Returns whether the discussion was created.
         """
-        comment_create_success: bool = True
+        position = gitlab_comment["position"]
         try:
             pr.discussions.create(gitlab_comment)
         except gitlab.exceptions.GitlabError:
-            comment_create_success = False
-
-        position = gitlab_comment["position"]
-        if not comment_create_success:
-            # Switch new_line <-> old_line in case the AI made a mistake with `is_comment_on_new_path`
-            logger.debug("Failed to post comment, retrying with new_line <-> old_line")
-            if "old_line" in position:
-                position["new_line"] = position.pop("old_line")
-            else:
-                position["old_line"] = position.pop("new_line")
-
-            comment_create_success = True
-            try:
-                pr.discussions.create(gitlab_comment)
-            except gitlab.exceptions.GitlabError:
-                comment_create_success = False
-
-        if not comment_create_success:
-            # Failed to attach to a line, so let's try at file level
-            logger.debug("Failed to post for neither line, retrying with a file-level comment")
-            _ = position.pop("new_line", None)
-            _ = position.pop("old_line", None)
-            position["position_type"] = "file"
-
-            comment_create_success = True
-            try:
-                pr.discussions.create(gitlab_comment)
-            except gitlab.exceptions.GitlabError:
-                comment_create_success = False
-                logger.debug(
-                    "Failed to post the comment anywhere specific, it will go to general description (hopefully)"
-                )
+            if position["position_type"] == "file":
+                logger.debug("Failed to post a file-level comment")
+                return False
+        else:
+            return True
+
+        logger.debug("Failed to post comment on its line, retrying with a file-level comment")
+        position.pop("new_line", None)
+        position.pop("old_line", None)
+        position["position_type"] = "file"
+        try:
+            pr.discussions.create(gitlab_comment)
+        except gitlab.exceptions.GitlabError:
+            logger.debug("Failed to post a file-level comment")
+            return False
+        return True
 
-        return comment_create_success
+    def _get_pr(self, pr_url: PRUrl) -> gitlab.v4.objects.ProjectMergeRequest:
+        return _get_pr_from_url(self.client, pr_url, self._pr_cache_versions[pr_url])
 
     def _get_diff_from_pr(self, pr: gitlab.v4.objects.ProjectMergeRequest) -> gitlab.v4.objects.ProjectMergeRequestDiff:
         """Gitlab returns multiple "diff" objects for a single MR, which correspond to each pushed "version" of the MR.
@@ -257,7 +363,11 @@ class GitlabClient(GitClient):
 
 
 @functools.lru_cache(maxsize=32)
-def _get_pr_from_url(client: gitlab.Gitlab, pr_url: PRUrl) -> gitlab.v4.objects.ProjectMergeRequest:
+def _get_pr_from_url(client: gitlab.Gitlab, pr_url: PRUrl, cache_version: int) -> gitlab.v4.objects.ProjectMergeRequest:
+    """Get the merge request of the given URL.
+
+    `cache_version` is only part of the cache key: bumping it (see `GitlabClient.clear_pr_cache`) fetches the MR again.
+    """
     logger.debug("Fetching mr from GitLab (cache miss)")
     project = _get_project_from_url(client, pr_url.repo_path)
     return project.mergerequests.get(pr_url.pr_number)
@@ -0,0 +1,251 @@
+"""Persistent HTTP cache of the requests made to the APIs of git services, revalidated with conditional requests.
+
+Responses with an `ETag` or `Last-Modified` header are stored on disk, and requesting them again sends
+`If-None-Match`/`If-Modified-Since` so that the git service answers with an empty `304 Not Modified` if they did not
+change (which, on GitHub, does not count against the rate limit). Responses of resources that can never change (blobs,
+or file contents at a commit SHA) are served from the cache without any request at all.
+"""
+
+import contextlib
+import hashlib
+import io
+import logging
+import os
+import pathlib
+import re
+import tempfile
+from collections.abc import Mapping
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from lgtm_ai.git_client.rate_limit import RateLimitedHTTPAdapter, RateLimitScheduler
+from pydantic import BaseModel, ConfigDict, ValidationError
+from requests.adapters import DEFAULT_POOLSIZE
+from requests.structures import CaseInsensitiveDict
+from urllib3 import HTTPResponse
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger("lgtm.git")
+
+_SHA_PATTERN = re.compile(r"[0-9a-f]{40}|[0-9a-f]{64}")
+_BLOB_PATH_PATTERN = re.compile(r"/(?:git|repository)/blobs/(?:[0-9a-f]{40}|[0-9a-f]{64})(?:/|$)")
+_CONTENTS_PATH_PATTERN = re.compile(r"/contents(?:/|$)|/repository/files/|/repository/archive")
+_KEY_HEADERS = ("Authorization", "PRIVATE-TOKEN", "JOB-TOKEN", "Accept")
+# Headers describing the body as sent over the wire, which does not match the (decoded) body stored in the cache
+_WIRE_HEADERS = frozenset({"content-encoding", "content-length", "transfer-encoding"})
+
+
+class _HttpCacheEntry(BaseModel):
+    model_config = ConfigDict(ser_json_bytes="base64", val_json_bytes="base64")
+
+    status: int
+    headers: dict[str, str]
+    body: bytes
+    immutable: bool
+
+
+class HttpCache:
+    """On-disk cache of HTTP responses of git service APIs.
+
+    Every entry is stored in its own JSON file named after its key. When the cache grows over `max_size` bytes, the
+    least recently used entries are evicted. Entries never expire: they are revalidated with the git service instead.
+
+    The cache never raises on I/O errors: a broken cache behaves like an empty one.
+    """
+
+    def __init__(self, directory: pathlib.Path, *, max_size: int) -> None:
+        self.directory = directory
+        self.max_size = max_size
+
+    @staticmethod
+    def make_key(request: requests.PreparedRequest) -> str:
+        """Build the cache key of a request.
+
+        Credentials are part of the key, so that responses are never shared between users with different access.
+        """
+        headers = [f"{name}: {request.headers.get(name, '')}" for name in _KEY_HEADERS]
+        payload = "\n".join([request.method or "", request.url or "", *headers])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> _HttpCacheEntry | None:
+        """Return the cached response for the given key, or None if there is no valid entry for it."""
+        path = self._get_path(key)
+        try:
+            entry = _HttpCacheEntry.model_validate_json(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValidationError):
+            logger.warning("Ignoring unreadable HTTP cache entry %s", path)
+            self._remove(path)
+            return None
+
+        with contextlib.suppress(OSError):
+            # Access times are not reliable (noatime mounts), so the modification time tracks recency for LRU
+            os.utime(path)
+        return entry
+
+    def set(self, key: str, entry: _HttpCacheEntry) -> None:
+        """Store a response in the cache, evicting old entries if the cache is over its maximum size."""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Write atomically so that concurrent lgtm runs never read half-written entries
+            with tempfile.NamedTemporaryFile("wb", dir=self.directory, suffix=".tmp", delete=False) as tmp_file:
+                tmp_file.write(entry.model_dump_json().encode())
+            os.replace(tmp_file.name, self._get_path(key))
+        except OSError as err:
+            logger.warning("Failed to write to the HTTP cache in %s: %s", self.directory, err)
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        try:
+            entries = [(path, path.stat()) for path in self.directory.glob("*.json")]
+        except OSError:
+            return
+
+        total_size = sum(stat.st_size for _, stat in entries)
+        for path, stat in sorted(entries, key=lambda entry: entry[1].st_mtime):
+            if total_size <= self.max_size:
+                break
+            logger.debug("Evicting HTTP cache entry %s", path)
+            self._remove(path)
+            total_size -= stat.st_size
+
+    def _get_path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}.json"
+
+    def _remove(self, path: pathlib.Path) -> None:
+        try:
+            path.unlink(missing_ok=True)
+        except OSError:
+            logger.warning("Failed to remove HTTP cache entry %s", path)
+
+
+class CachingHTTPAdapter(RateLimitedHTTPAdapter):
+    """Transport adapter of `requests` that caches GET responses in an `HttpCache`.
+
+    Streamed responses (e.g., repository archives) are never cached, so that they are not read into memory. Responses
+    served from the cache without any request do not go through the rate limit scheduler.
+    """
+
+    def __init__(
+        self,
+        cache: HttpCache,
+        *,
+        scheduler: RateLimitScheduler | None = None,
+        max_retries: Retry | int | None = 0,
+        pool_connections: int = DEFAULT_POOLSIZE,
+        pool_maxsize: int = DEFAULT_POOLSIZE,
+    ) -> None:
+        super().__init__(
+            scheduler, max_retries=max_retries, pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.cache = cache
+
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: float | tuple[float, float] | tuple[float, None] | None = None,
+        verify: bool | str = True,
+        cert: bytes | str | tuple[bytes | str, bytes | str] | None = None,
+        proxies: Mapping[str, str] | None = None,
+    ) -> requests.Response:
+        if request.method != "GET" or "Range" in request.headers:
+            return super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+        key = self.cache.make_key(request)
+        entry = self.cache.get(key)
+        if entry and entry.immutable:
+            logger.debug("HTTP cache hit for %s", request.url)
+            return self._build_cached_response(request, entry)
+        cached_headers = CaseInsensitiveDict(entry.headers if entry else {})
+        if etag := cached_headers.get("ETag"):
+            request.headers["If-None-Match"] = etag
+        if last_modified := cached_headers.get("Last-Modified"):
+            request.headers["If-Modified-Since"] = last_modified
+
+        response = super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        if entry and response.status_code == requests.codes.not_modified:
+            logger.debug("HTTP cache entry of %s revalidated", request.url)
+            response.close()
+            # The 304 response carries up-to-date headers (e.g., the remaining rate limit)
+            cached_headers.update(_get_cacheable_headers(response))
+            return self._build_cached_response(request, entry.model_copy(update={"headers": dict(cached_headers)}))
+
+        if not stream and _is_cacheable(response):
+            self.cache.set(
+                key,
+                _HttpCacheEntry(
+                    status=response.status_code,
+                    headers=_get_cacheable_headers(response),
+                    body=response.content,
+                    immutable=is_immutable_url(request.url or ""),
+                ),
+            )
+        return response
+
+    def _build_cached_response(self, request: requests.PreparedRequest, entry: _HttpCacheEntry) -> requests.Response:
+        raw_response = HTTPResponse(
+            body=io.BytesIO(entry.body),
+            headers={**entry.headers, "Content-Length": str(len(entry.body))},
+            status=entry.status,
+            preload_content=False,
+        )
+        return self.build_response(request, raw_response)
+
+
+def get_http_adapter(
+    *,
+    http_cache: HttpCache | None,
+    scheduler: RateLimitScheduler | None,
+    max_retries: Retry | int | None = 0,
+    pool_connections: int = DEFAULT_POOLSIZE,
+    pool_maxsize: int = DEFAULT_POOLSIZE,
+) -> RateLimitedHTTPAdapter:
+    """Get the transport adapter of the requests sent to a git service, with the given HTTP cache and scheduler."""
+    if http_cache:
+        return CachingHTTPAdapter(
+            http_cache,
+            scheduler=scheduler,
+            max_retries=max_retries,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+        )
+    return RateLimitedHTTPAdapter(
+        scheduler, max_retries=max_retries, pool_connections=pool_connections, pool_maxsize=pool_maxsize
+    )
+
+
+def get_session(*, http_cache: HttpCache | None, scheduler: RateLimitScheduler | None) -> requests.Session:
+    """Get a `requests` session whose requests go through the given HTTP cache and rate limit scheduler."""
+    session = requests.Session()
+    adapter = get_http_adapter(http_cache=http_cache, scheduler=scheduler)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def is_immutable_url(url: str) -> bool:
+    """Whether the resource at the given URL can never change: a git blob, or files at a given commit SHA."""
+    parsed_url = urlsplit(url)
+    if _BLOB_PATH_PATTERN.search(parsed_url.path):
+        return True
+    if not _CONTENTS_PATH_PATTERN.search(parsed_url.path):
+        return False
+    query = parse_qs(parsed_url.query)
+    return any(_SHA_PATTERN.fullmatch(value) for value in [*query.get("ref", []), *query.get("sha", [])])
+
+
+def _is_cacheable(response: requests.Response) -> bool:
+    if response.status_code != requests.codes.ok or "no-store" in response.headers.get("Cache-Control", ""):
+        return False
+    return (
+        "ETag" in response.headers
+        or "Last-Modified" in response.headers
+        or is_immutable_url(response.request.url or "")
+    )
+
+
+def _get_cacheable_headers(response: requests.Response) -> dict[str, str]:
+    return {name: value for name, value in response.headers.items() if name.lower() not in _WIRE_HEADERS}
@@ -0,0 +1,169 @@
+"""Index of the lines of a diff on which review comments can be placed, see `DiffPositionIndex`.
+
+Git services only accept comments on the lines of the hunks of a diff: GitHub addresses them by their position in the
+patch of the file (or by their line number and side, for multi-line comments), and GitLab by their line number in the
+old and/or new version of the file. Comments the AI placed on a line that is not part of the diff are rejected by the
+API, so they are corrected (or downgraded to file-level comments) locally before publishing them.
+"""
+
+import itertools
+import logging
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from lgtm_ai.ai.schemas import ReviewComment
+from lgtm_ai.git.parser import DiffResult, ModifiedLine
+
+logger = logging.getLogger("lgtm.git")
+
+
+@dataclass(frozen=True, slots=True)
+class DiffPosition:
+    """Position of a line in the diff of a file.
+
+    Context lines have both an old and a new line number, removed lines only the old one, and added lines only the
+    new one. `hunk` is the index of the hunk of the line in the diff of the file.
+    """
+
+    relative_line_number: int
+    old_line: int | None
+    new_line: int | None
+    hunk: int
+
+    def get_line(self, *, new_side: bool) -> int | None:
+        """Get the line number on the given side of the diff, or None if the line is not on that side."""
+        return self.new_line if new_side else self.old_line
+
+
+@dataclass(frozen=True, slots=True)
+class CommentLocation:
+    """Where a review comment can be published: on a line of the diff or, if `position` is None, on its file."""
+
+    comment: ReviewComment
+    position: DiffPosition | None
+
+
+@dataclass(slots=True)
+class _FilePositions:
+    new_path: str
+    old_path: str
+    by_new_line: dict[int, DiffPosition] = field(default_factory=dict)
+    by_old_line: dict[int, DiffPosition] = field(default_factory=dict)
+    by_relative_line: dict[int, DiffPosition] = field(default_factory=dict)
+
+    def add(self, position: DiffPosition) -> None:
+        self.by_relative_line[position.relative_line_number] = position
+        if position.new_line is not None:
+            self.by_new_line[position.new_line] = position
+        if position.old_line is not None:
+            self.by_old_line[position.old_line] = position
+
+    def get(self, line: int, *, new_side: bool) -> DiffPosition | None:
+        return (self.by_new_line if new_side else self.by_old_line).get(line)
+
+
+class DiffPositionIndex:
+    """Positions of the lines of the diffs of a PR where comments can be placed, by file, line number and side.
+
+    Diffs only keep their modified lines, so the context lines between the modified lines of a hunk are reconstructed
+    from the line numbers around them. The context lines after the last modified line of a hunk are unknown, and
+    therefore not indexed.
+    """
+
+    def __init__(self, diffs: Iterable[DiffResult]) -> None:
+        self._files: dict[str, _FilePositions] = {}
+        for diff in diffs:
+            positions = _index_file(diff)
+            self._files.setdefault(positions.new_path, positions)
+            self._files.setdefault(positions.old_path, positions)
+
+    def get_position(self, path: str, line: int, *, new_side: bool) -> DiffPosition | None:
+        """Get the position of the given line of a file, on the new or old side of its diff."""
+        if (positions := self._files.get(path)) is None:
+            return None
+        return positions.get(line, new_side=new_side)
+
+    def locate_comment(self, comment: ReviewComment) -> CommentLocation | None:
+        """Find the line of the diff where the given comment can be placed, correcting its position if needed.
+
+        The line is looked up by the line number of the comment on its side of the diff, then by its relative line
+        number and finally by its line number on the other side, in case the AI mixed up the side. Comments that
+        match no line of the diff of their file are downgraded to file-level comments.
+
+        Returns None if the file of the comment is not part of the diff.
+        """
+        positions = self._files.get(comment.new_path) or self._files.get(comment.old_path)
+        if positions is None:
+            logger.debug("File %s of comment is not part of the diff", comment.new_path)
+            return None
+
+        paths = {"new_path": positions.new_path, "old_path": positions.old_path}
+        position, new_side = _find_position(positions, comment)
+        if position is None:
+            logger.debug("Line %d of %s is not part of the diff", comment.line_number, comment.new_path)
+            return CommentLocation(comment=comment.model_copy(update=paths), position=None)
+
+        return CommentLocation(
+            comment=comment.model_copy(
+                update={
+                    **paths,
+                    "line_number": position.get_line(new_side=new_side),
+                    "relative_line_number": position.relative_line_number,
+                    "is_comment_on_new_path": new_side,
+                }
+            ),
+            position=position,
+        )
+
+
+def _find_position(positions: _FilePositions, comment: ReviewComment) -> tuple[DiffPosition | None, bool]:
+    new_side = comment.is_comment_on_new_path
+    if position := positions.get(comment.line_number, new_side=new_side):
+        return position, new_side
+    if position := positions.by_relative_line.get(comment.relative_line_number):
+        if position.get_line(new_side=new_side) is None:
+            new_side = not new_side
+        return position, new_side
+    if position := positions.get(comment.line_number, new_side=not new_side):
+        return position, not new_side
+    return None, new_side
+
+
+def _index_file(diff: DiffResult) -> _FilePositions:
+    metadata = diff.metadata
+    positions = _FilePositions(new_path=metadata.new_path, old_path=metadata.old_path or metadata.new_path)
+    hunks = itertools.groupby(diff.modified_lines, key=lambda line: (line.hunk_start_new, line.hunk_start_old))
+    for hunk, (_, lines) in enumerate(hunks):
+        _index_hunk(positions, hunk, list(lines))
+    return positions
+
+
+def _index_hunk(positions: _FilePositions, hunk: int, lines: list[ModifiedLine]) -> None:
+    first_line = lines[0]
+    old_line, new_line = first_line.hunk_start_old, first_line.hunk_start_new
+    if old_line is None or new_line is None:
+        # Without the start of the hunk, its context lines cannot be reconstructed
+        for line in lines:
+            positions.add(_get_modified_line_position(line, hunk))
+        return
+
+    # Walk the hunk from its first line, filling the gaps between its modified lines with context lines
+    hunk_start = new_line if first_line.modification_type == "added" else old_line
+    cursor = first_line.relative_line_number - max(first_line.line_number - hunk_start, 0)
+    for line in lines:
+        for relative_line_number in range(cursor, line.relative_line_number):
+            positions.add(DiffPosition(relative_line_number, old_line, new_line, hunk))
+            old_line += 1
+            new_line += 1
+        positions.add(_get_modified_line_position(line, hunk))
+        if line.modification_type == "added":
+            new_line = line.line_number + 1
+        else:
+            old_line = line.line_number + 1
+        cursor = line.relative_line_number + 1
+
+
+def _get_modified_line_position(line: ModifiedLine, hunk: int) -> DiffPosition:
+    if line.modification_type == "added":
+        return DiffPosition(line.relative_line_number, old_line=None, new_line=line.line_number, hunk=hunk)
+    return DiffPosition(line.relative_line_number, old_line=line.line_number, new_line=None, hunk=hunk)
@@ -0,0 +1,221 @@
+"""Pacing of the requests made to the APIs of git services, so that they stay within their rate limits.
+
+Git services report the budget left for the current window in the headers of every response:
+`X-RateLimit-Limit`/`X-RateLimit-Remaining`/`X-RateLimit-Reset` (GitHub) or `RateLimit-Limit`/`RateLimit-Remaining`/
+`RateLimit-Reset` (GitLab), and they reject requests over the limit with a 429 (or a 403, on GitHub) response, usually
+with a `Retry-After` header. `RateLimitScheduler` keeps track of that budget for a git service host, shared by all the
+clients of the process.
+"""
+
+import datetime
+import email.utils
+import functools
+import logging
+import random
+import threading
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+
+import requests
+from lgtm_ai.git_client.schemas import RateLimitBudget
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger("lgtm.git")
+
+RATE_LIMIT_RESERVE_FRACTION = 0.1
+"""Fraction of the rate limit under which the remaining requests are spread evenly until the limit is reset."""
+
+RETRY_BACKOFF_BASE = 1.0
+"""Seconds to wait before the first retry of a rejected request, when the git service does not say how long to wait."""
+
+RETRY_MAX_DELAY = 60.0
+"""Maximum seconds to wait before retrying a rejected request. Rejected requests that need longer are not retried."""
+
+_LIMIT_HEADERS = ("X-RateLimit-Limit", "RateLimit-Limit")
+_REMAINING_HEADERS = ("X-RateLimit-Remaining", "RateLimit-Remaining")
+_RESET_HEADERS = ("X-RateLimit-Reset", "RateLimit-Reset")
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimits:
+    """Limits on the pace of the requests sent to the API of a git service."""
+
+    requests_per_second: float | None = None
+    max_retries: int = 0
+
+
+class RateLimitScheduler:
+    """Paces the requests sent to a git service with a token bucket, and decides when to retry rejected requests.
+
+    The bucket is refilled at `requests_per_second`, if set, and also at the pace that spreads the remaining budget
+    until the rate limit is reset when it falls under `RATE_LIMIT_RESERVE_FRACTION`. Requests rejected by the rate
+    limit are retried up to `max_retries` times, after the delay asked by the git service or a jittered exponential
+    backoff, and all the requests to the git service wait for that delay too.
+
+    It is thread-safe: the same scheduler is meant to be shared by all the clients of a git service host.
+    """
+
+    def __init__(self, limits: RateLimits | None = None) -> None:
+        self.limits = limits or RateLimits()
+        self._lock = threading.Lock()
+        self._tokens = 1.0
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._budget = RateLimitBudget()
+
+    @property
+    def budget(self) -> RateLimitBudget:
+        """The current budget of the git service, and how much requests have been throttled so far."""
+        with self._lock:
+            return self._budget.model_copy()
+
+    def acquire(self) -> None:
+        """Wait until a request can be sent to the git service."""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(self._blocked_until - now, 0.0)
+            if (rate := self._get_rate()) is not None:
+                # Every request takes its token right away, so that concurrent requests queue up instead of bursting
+                self._tokens = min(self._tokens + (now - self._refilled_at) * rate, max(rate, 1.0)) - 1
+                delay = max(delay, -self._tokens / rate)
+            self._refilled_at = now
+            self._budget.requests += 1
+            self._budget.waited_seconds += delay
+        if delay:
+            logger.debug("Waiting %.2f seconds before sending a request to stay within the rate limit", delay)
+            time.sleep(delay)
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        """Record the rate limit budget reported in the headers of a response."""
+        limit = _get_int_header(headers, _LIMIT_HEADERS)
+        remaining = _get_int_header(headers, _REMAINING_HEADERS)
+        reset = _get_int_header(headers, _RESET_HEADERS)
+        with self._lock:
+            if limit is not None:
+                self._budget.limit = limit
+            if remaining is not None:
+                self._budget.remaining = remaining
+            if reset is not None:
+                self._budget.reset_at = datetime.datetime.fromtimestamp(reset, tz=datetime.UTC)
+
+    def get_retry_delay(self, status_code: int, headers: Mapping[str, str], *, attempt: int) -> float | None:
+        """Get the seconds to wait before retrying a request that got the given response, or None not to retry it.
+
+        Only requests rejected by the rate limit are retried. The returned delay is also applied to any other request
+        sent to the git service in the meantime.
+        """
+        retry_after = _get_retry_after(headers)
+        remaining = _get_int_header(headers, _REMAINING_HEADERS)
+        if status_code != requests.codes.too_many_requests and not (
+            status_code == requests.codes.forbidden and (retry_after is not None or remaining == 0)
+        ):
+            return None
+
+        with self._lock:
+            self._budget.throttled += 1
+            if attempt >= self.limits.max_retries:
+                return None
+            if retry_after is None and remaining == 0 and self._budget.reset_at:
+                retry_after = (self._budget.reset_at - datetime.datetime.now(datetime.UTC)).total_seconds()
+            if retry_after is None:
+                delay = random.uniform(0, RETRY_BACKOFF_BASE * 2**attempt)  # noqa: S311
+            else:
+                # Jitter spreads the retries of concurrent requests, that all got rejected at the same time
+                delay = max(retry_after, 0.0) + random.uniform(0, RETRY_BACKOFF_BASE)  # noqa: S311
+            if delay > RETRY_MAX_DELAY:
+                logger.warning("The rate limit of the git service resets in %d seconds, not retrying", delay)
+                return None
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        return delay
+
+    def _get_rate(self) -> float | None:
+        rate = self.limits.requests_per_second
+        budget = self._budget
+        if (
+            budget.limit
+            and budget.remaining is not None
+            and budget.reset_at
+            and budget.remaining < budget.limit * RATE_LIMIT_RESERVE_FRACTION
+        ):
+            seconds_to_reset = (budget.reset_at - datetime.datetime.now(datetime.UTC)).total_seconds()
+            # Never stop completely: the budget may have been reset already, which the next response will tell
+            spread_rate = max(budget.remaining, 1) / max(seconds_to_reset, 1.0)
+            rate = min(rate, spread_rate) if rate else spread_rate
+        return rate
+
+
+class RateLimitedHTTPAdapter(HTTPAdapter):
+    """Transport adapter of `requests` that paces the requests with a `RateLimitScheduler`, if given."""
+
+    def __init__(
+        self,
+        scheduler: RateLimitScheduler | None = None,
+        *,
+        max_retries: Retry | int | None = 0,
+        pool_connections: int = DEFAULT_POOLSIZE,
+        pool_maxsize: int = DEFAULT_POOLSIZE,
+    ) -> None:
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=max_retries)
+        self.scheduler = scheduler
+
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: float | tuple[float, float] | tuple[float, None] | None = None,
+        verify: bool | str = True,
+        cert: bytes | str | tuple[bytes | str, bytes | str] | None = None,
+        proxies: Mapping[str, str] | None = None,
+    ) -> requests.Response:
+        if self.scheduler is None:
+            return super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+        attempt = 0
+        while True:
+            self.scheduler.acquire()
+            response = super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+            self.scheduler.update(response.headers)
+            delay = self.scheduler.get_retry_delay(response.status_code, response.headers, attempt=attempt)
+            if delay is None:
+                return response
+            logger.warning(
+                "Request to %s rejected by the rate limit of the git service, retrying in %.1f seconds",
+                request.url,
+                delay,
+            )
+            response.close()
+            attempt += 1
+
+
+@functools.cache
+def get_rate_limit_scheduler(host: str, limits: RateLimits) -> RateLimitScheduler:
+    """Get the scheduler of the requests sent to the given git service host, shared by all the clients of the process."""
+    return RateLimitScheduler(limits)
+
+
+def _get_int_header(headers: Mapping[str, str], names: tuple[str, ...]) -> int | None:
+    for name in names:
+        try:
+            return int(headers[name])
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+def _get_retry_after(headers: Mapping[str, str]) -> float | None:
+    """Get the seconds to wait from a `Retry-After` header, which can be a number of seconds or an HTTP date."""
+    if (value := headers.get("Retry-After")) is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.UTC)
+    return (retry_at - datetime.datetime.now(datetime.UTC)).total_seconds()
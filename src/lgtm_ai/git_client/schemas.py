@@ -1,5 +1,7 @@
-from typing import Literal
+import datetime
+from typing import Literal, Self
 
+from lgtm_ai.base.utils import compile_file_patterns
 from lgtm_ai.git.parser import DiffResult
 from pydantic import BaseModel
 
@@ -12,6 +14,24 @@ class PRDiff(BaseModel):
     changed_files: list[str]
     target_branch: str
     source_branch: str
+    head_sha: str | None = None
+
+    @property
+    def size(self) -> int:
+        """Total length of the modified lines of the diff."""
+        return sum(file.modified_lines.text_length() for file in self.diff)
+
+    def exclude_files(self, patterns: tuple[str, ...]) -> Self:
+        """Return a copy of the diff without the files matching any of the given `exclude` patterns."""
+        if not patterns:
+            return self
+        matches = compile_file_patterns(patterns)
+        return self.model_copy(
+            update={
+                "diff": [file for file in self.diff if not matches(file.metadata.new_path)],
+                "changed_files": [file_path for file_path in self.changed_files if not matches(file_path)],
+            }
+        )
 
 
 class PRMetadata(BaseModel):
@@ -22,3 +42,14 @@ class PRMetadata(BaseModel):
 class IssueContent(BaseModel):
     title: str
     description: str
+
+
+class RateLimitBudget(BaseModel):
+    """Rate limit budget of a git service API, as last reported by it, and how lgtm was throttled by it."""
+
+    limit: int | None = None
+    remaining: int | None = None
+    reset_at: datetime.datetime | None = None
+    requests: int = 0
+    throttled: int = 0
+    waited_seconds: float = 0.0
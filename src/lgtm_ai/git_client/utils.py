@@ -1,26 +1,68 @@
+from urllib.parse import urlparse
+
 import github
 import gitlab
 from lgtm_ai.base.schemas import IssuesPlatform, PRSource
 from lgtm_ai.formatters.base import Formatter
+from lgtm_ai.git.parser import DiffLimits
 from lgtm_ai.git_client.base import GitClient
-from lgtm_ai.git_client.github import GitHubClient
+from lgtm_ai.git_client.github import GITHUB_MAX_PER_PAGE, GitHubClient, use_http_transport
 from lgtm_ai.git_client.gitlab import GitlabClient
+from lgtm_ai.git_client.http_cache import HttpCache, get_session
+from lgtm_ai.git_client.rate_limit import RateLimits, RateLimitScheduler, get_rate_limit_scheduler
 
 
 def get_git_client(
-    source: PRSource | IssuesPlatform, token: str, formatter: Formatter[str], url: str | None = None
+    source: PRSource | IssuesPlatform,
+    token: str,
+    formatter: Formatter[str],
+    url: str | None = None,
+    *,
+    diff_limits: DiffLimits | None = None,
+    context_archive: bool = False,
+    http_cache: HttpCache | None = None,
+    rate_limits: RateLimits | None = None,
 ) -> GitClient | None:
-    """Return a GitClient instance based on the provided PR URL."""
+    """Return a GitClient instance based on the provided PR URL.
+
+    If given, `diff_limits` caps the size of the diff read for every file of the PRs. With `context_archive`, the
+    contents of the changed files are downloaded in a single archive of the repository. If given, the requests made
+    to the API of the git service go through `http_cache`. With `rate_limits`, they are paced by the rate limit
+    scheduler shared by all the clients of the git service host.
+    """
     git_client: GitClient
 
     if source == "gitlab":
-        git_client = GitlabClient(gitlab.Gitlab(url=url, private_token=token), formatter=formatter)
+        scheduler = _get_scheduler(urlparse(url or gitlab.const.DEFAULT_URL).netloc, rate_limits)
+        git_client = GitlabClient(
+            gitlab.Gitlab(
+                url=url, private_token=token, session=get_session(http_cache=http_cache, scheduler=scheduler)
+            ),
+            formatter=formatter,
+            diff_limits=diff_limits,
+            context_archive=context_archive,
+            scheduler=scheduler,
+        )
     elif source == "github":
         # TODO: Handle GitHub Enterprise with a custom URL
-        git_client = GitHubClient(github.Github(login_or_token=token), formatter=formatter)
+        client = github.Github(login_or_token=token, per_page=GITHUB_MAX_PER_PAGE)
+        scheduler = _get_scheduler(urlparse(client.requester.base_url).netloc, rate_limits)
+        if http_cache or scheduler:
+            use_http_transport(client, http_cache=http_cache, scheduler=scheduler)
+        git_client = GitHubClient(
+            client,
+            formatter=formatter,
+            diff_limits=diff_limits,
+            context_archive=context_archive,
+            scheduler=scheduler,
+        )
     elif source == "local":
         return None
     else:
         raise ValueError(f"Unsupported source: {source}")
 
     return git_client
+
+
+def _get_scheduler(host: str, rate_limits: RateLimits | None) -> RateLimitScheduler | None:
+    return get_rate_limit_scheduler(host, rate_limits) if rate_limits else None
@@ -38,7 +38,7 @@ class ReviewOutput(Review):
         "openWorldHint": True,
     },
 )
-def get_lgtm_review(
+async def get_lgtm_review(
     repo_path: Annotated[str, Field("Path to the local git repository")],
     compare: Annotated[
         str,
@@ -68,8 +68,12 @@ def get_lgtm_review(
 
     agent_extra_settings = AgentSettings(retries=resolved_config.ai_retries)
     code_reviewer = CodeReviewer(
-        reviewer_agent=get_reviewer_agent_with_settings(agent_extra_settings),
-        summarizing_agent=get_summarizing_agent_with_settings(agent_extra_settings),
+        reviewer_agent=get_reviewer_agent_with_settings(agent_extra_settings, diff_format=resolved_config.diff_format),
+        summarizing_agent=get_summarizing_agent_with_settings(
+            agent_extra_settings,
+            diff_format=resolved_config.diff_format,
+            summarizing_diff=resolved_config.summarizing_diff,
+        ),
         model=get_ai_model(
             model_name=resolved_config.model,
             api_key=resolved_config.ai_api_key,
@@ -79,11 +83,13 @@ def get_lgtm_review(
             git_client=None,
             issues_client=None,
             httpx_client=httpx_client,
+            max_workers=resolved_config.context_workers,
+            max_workers_per_host=resolved_config.context_workers_per_host,
         ),
         git_client=None,
         config=resolved_config,
     )
-    review = code_reviewer.review(target=target)
+    review = await code_reviewer.areview(target=target)
 
     return ReviewOutput.model_validate(review)
 
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from collections.abc import Callable, Sequence
+
+from lgtm_ai.ai.schemas import Review
+from lgtm_ai.base.exceptions import NothingToReviewError
+from lgtm_ai.base.schemas import PRUrl
+from lgtm_ai.review.reviewer import CodeReviewer
+from pydantic import BaseModel
+
+logger = logging.getLogger("lgtm.ai")
+
+
+class BatchReviewResult(BaseModel):
+    """Outcome of reviewing one of the PRs of a batch.
+
+    `review` is None if there was nothing to review or if the review failed, in which case `error` is set.
+    """
+
+    url: str
+    review: Review | None = None
+    error: str | None = None
+
+
+class BatchReviewer:
+    """Review many PRs concurrently, sharing the code reviewers (and thus their clients and agents) between them.
+
+    `get_code_reviewer` is called for every PR, and it is expected to return the same `CodeReviewer` for PRs
+    that can share one (e.g., PRs hosted in the same git service).
+    """
+
+    def __init__(
+        self,
+        get_code_reviewer: Callable[[PRUrl], CodeReviewer],
+        *,
+        concurrency: int,
+        publish: bool = False,
+    ) -> None:
+        self.get_code_reviewer = get_code_reviewer
+        self.concurrency = concurrency
+        self.publish = publish
+
+    def review(
+        self, targets: Sequence[PRUrl], *, on_result: Callable[[BatchReviewResult], None] | None = None
+    ) -> list[BatchReviewResult]:
+        """Review all the given PRs and return their results in the same order.
+
+        Synchronous wrapper around `areview`; it cannot be called from within a running event loop.
+        """
+        return asyncio.run(self.areview(targets, on_result=on_result))
+
+    async def areview(
+        self, targets: Sequence[PRUrl], *, on_result: Callable[[BatchReviewResult], None] | None = None
+    ) -> list[BatchReviewResult]:
+        """Review all the given PRs, at most `concurrency` at a time, and return their results in the same order.
+
+        A failed review does not stop the batch: its error is recorded in its result instead.
+        If `on_result` is given, it is called with every result as soon as it is ready.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def _review_target(target: PRUrl) -> BatchReviewResult:
+            async with semaphore:
+                result = await self.review_target(target)
+            if on_result:
+                on_result(result)
+            return result
+
+        return await asyncio.gather(*(_review_target(target) for target in targets))
+
+    async def review_target(self, target: PRUrl, *, head_sha: str | None = None) -> BatchReviewResult:
+        """Review (and publish, if configured) a single PR, recording any error in the result instead of raising it.
+
+        If `head_sha` is given, the PR is only reviewed if it is still its head commit (see `CodeReviewer.areview`).
+        """
+        logger.info("Starting review of %s", target.full_url)
+        try:
+            code_reviewer = self.get_code_reviewer(target)
+            review = await code_reviewer.areview(target, head_sha=head_sha)
+            if self.publish and code_reviewer.git_client:
+                await asyncio.to_thread(code_reviewer.git_client.publish_review, pr_url=target, review=review)
+                logger.info("Review of %s published successfully", target.full_url)
+        except NothingToReviewError as err:
+            logger.info("Nothing to review in %s: %s", target.full_url, err.format_message())
+            return BatchReviewResult(url=target.full_url)
+        except Exception as err:
+            logger.error("Review of %s failed: %s", target.full_url, err)
+            return BatchReviewResult(url=target.full_url, error=str(err) or type(err).__name__)
+
+        logger.info("Review of %s completed, total comments: %d", target.full_url, len(review.review_response.comments))
+        return BatchReviewResult(url=target.full_url, review=review)
@@ -0,0 +1,144 @@
+import logging
+from dataclasses import dataclass
+from typing import Self
+
+from lgtm_ai.ai.schemas import AdditionalContext, TrimmedSection
+from lgtm_ai.base.constants import CHARS_PER_TOKEN
+from lgtm_ai.base.utils import estimate_tokens
+from lgtm_ai.review.schemas import PRCodeContext, PRContextFileContents
+
+logger = logging.getLogger("lgtm.ai")
+
+TRUNCATION_MARKER = "\n[... truncated by lgtm to fit the prompt token budget ...]"
+
+
+@dataclass(frozen=True, slots=True)
+class PromptBudgetPlan:
+    """Sections of a review prompt that fit in the token budget, and what had to be trimmed to get there."""
+
+    context: PRCodeContext
+    additional_context: list[AdditionalContext] | None
+    trimmed: list[TrimmedSection]
+    estimated_tokens: int
+
+
+@dataclass(slots=True)
+class _Section:
+    kind: str
+    name: str
+    content: str
+    tokens: int
+    original_tokens: int
+    dropped: bool = False
+
+    @classmethod
+    def build(cls, *, kind: str, name: str, content: str) -> Self:
+        tokens = estimate_tokens(content)
+        return cls(kind=kind, name=name, content=content, tokens=tokens, original_tokens=tokens)
+
+
+class PromptBudgetPlanner:
+    """Keeps the sections of a review prompt under a token budget before the prompt is rendered.
+
+    When the prompt is over budget, sections are trimmed in priority order:
+    1. Context files from the target branch are dropped (largest first).
+    2. The largest context files are truncated (or dropped if nothing useful would be left).
+    3. Additional context is truncated or dropped, starting from the last one.
+
+    The diff, PR metadata and issue context are never trimmed: if they alone exceed the budget,
+    the resulting plan will still be over budget.
+    """
+
+    def __init__(self, max_tokens: int) -> None:
+        self.max_tokens = max_tokens
+
+    def plan(
+        self,
+        *,
+        fixed_tokens: int,
+        context: PRCodeContext,
+        additional_context: list[AdditionalContext] | None,
+    ) -> PromptBudgetPlan:
+        """Trim the given context so that it fits in the budget together with `fixed_tokens` tokens."""
+        files = [_Section.build(kind=fc.branch, name=fc.file_path, content=fc.content) for fc in context.file_contents]
+        extra = [
+            _Section.build(kind="additional_context", name=ac.file_url or ac.prompt, content=ac.context or "")
+            for ac in additional_context or []
+        ]
+        excess = fixed_tokens + sum(s.tokens for s in files + extra) - self.max_tokens
+
+        if excess > 0:
+            target_files = sorted((s for s in files if s.kind == "target"), key=lambda s: s.tokens, reverse=True)
+            excess = self._drop(target_files, excess)
+        if excess > 0:
+            remaining_files = sorted((s for s in files if not s.dropped), key=lambda s: s.tokens, reverse=True)
+            excess = self._truncate(remaining_files, excess)
+        if excess > 0:
+            excess = self._truncate(list(reversed(extra)), excess)
+        if excess > 0:
+            logger.warning(
+                "The review prompt is still ~%d tokens over the budget of %d tokens after trimming all context",
+                excess,
+                self.max_tokens,
+            )
+
+        return PromptBudgetPlan(
+            context=PRCodeContext(
+                file_contents=[
+                    PRContextFileContents(file_path=fc.file_path, content=section.content, branch=fc.branch)
+                    for fc, section in zip(context.file_contents, files, strict=True)
+                    if not section.dropped
+                ]
+            ),
+            additional_context=[
+                ac.model_copy(update={"context": section.content}) if ac.context is not None else ac
+                for ac, section in zip(additional_context or [], extra, strict=True)
+                if not section.dropped
+            ]
+            or None,
+            trimmed=[
+                TrimmedSection(
+                    section="additional_context" if section.kind == "additional_context" else "context",
+                    name=section.name,
+                    action="dropped" if section.dropped else "truncated",
+                    original_tokens=section.original_tokens,
+                    final_tokens=0 if section.dropped else section.tokens,
+                )
+                for section in files + extra
+                if section.dropped or section.tokens != section.original_tokens
+            ],
+            estimated_tokens=self.max_tokens + excess,
+        )
+
+    def _drop(self, sections: list[_Section], excess: int) -> int:
+        for section in sections:
+            if excess <= 0:
+                break
+            logger.info("Dropping %s from the prompt to fit in the token budget", section.name)
+            excess -= section.tokens
+            section.dropped = True
+            section.tokens = 0
+        return excess
+
+    def _truncate(self, sections: list[_Section], excess: int) -> int:
+        marker_tokens = estimate_tokens(TRUNCATION_MARKER)
+        for section in sections:
+            if excess <= 0:
+                break
+            keep_tokens = section.tokens - excess - marker_tokens
+            if keep_tokens <= 0:
+                excess = self._drop([section], excess)
+                continue
+            logger.info("Truncating %s to ~%d tokens to fit in the token budget", section.name, keep_tokens)
+            section.content = _truncate_at_line(section.content, keep_tokens * CHARS_PER_TOKEN) + TRUNCATION_MARKER
+            new_tokens = estimate_tokens(section.content)
+            excess -= section.tokens - new_tokens
+            section.tokens = new_tokens
+        return excess
+
+
+def _truncate_at_line(text: str, max_chars: int) -> str:
+    """Truncate the text to at most `max_chars` characters, without cutting lines in half if possible."""
+    truncated = text[:max_chars]
+    last_newline = truncated.rfind("\n")
+    return truncated[:last_newline] if last_newline > 0 else truncated
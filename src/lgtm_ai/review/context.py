@@ -1,6 +1,9 @@
 import logging
 import pathlib
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Protocol
 from urllib.parse import ParseResult, urlparse
 
@@ -9,10 +12,17 @@ from lgtm_ai.ai.schemas import (
     AdditionalContext,
 )
 from lgtm_ai.base.exceptions import LGTMException
-from lgtm_ai.base.schemas import LocalRepository, PRUrl
+from lgtm_ai.base.schemas import ContextMode, LocalRepository, PRUrl
+from lgtm_ai.config.constants import (
+    DEFAULT_CONTEXT_WINDOW_LINES,
+    DEFAULT_CONTEXT_WORKERS,
+    DEFAULT_CONTEXT_WORKERS_PER_HOST,
+)
+from lgtm_ai.git.parser import DiffResult
 from lgtm_ai.git.repository import get_file_contents_from_local_repo
 from lgtm_ai.git_client.base import GitClient
 from lgtm_ai.git_client.schemas import ContextBranch, IssueContent, PRDiff, PRMetadata
+from lgtm_ai.review.excerpts import extract_hunk_windows, extract_symbols
 from lgtm_ai.review.schemas import PRCodeContext
 from pydantic import HttpUrl
 
@@ -31,48 +41,146 @@ class ContextRetriever:
     """
 
     def __init__(
-        self, git_client: GitClient | None, issues_client: IssuesClient | None, httpx_client: httpx.Client
+        self,
+        git_client: GitClient | None,
+        issues_client: IssuesClient | None,
+        httpx_client: httpx.Client,
+        *,
+        max_workers: int = DEFAULT_CONTEXT_WORKERS,
+        max_workers_per_host: int = DEFAULT_CONTEXT_WORKERS_PER_HOST,
+        context_mode: ContextMode = ContextMode.file,
+        context_window_lines: int = DEFAULT_CONTEXT_WINDOW_LINES,
     ) -> None:
         self._git_client = git_client
         self._issues_client = issues_client
         self._httpx_client = httpx_client
+        self._max_workers = max_workers
+        self._max_workers_per_host = max_workers_per_host
+        self._context_mode = context_mode
+        self._context_window_lines = context_window_lines
+        # Host limits are shared by every review that uses this retriever, not only by a single call.
+        self._host_semaphores: dict[str, threading.BoundedSemaphore] = {}
+        self._host_semaphores_lock = threading.Lock()
 
     def get_code_context(self, target: PRUrl | LocalRepository, pr_diff: PRDiff) -> PRCodeContext:
         """Get the code context from the repository.
 
         It mimics the information a human reviewer might have access to, which usually implies
         only looking at the PR in question.
+
+        Files are fetched in bulk if the git client supports it (see `GitClient.get_files_contents`), and otherwise
+        concurrently (bounded by `max_workers`, and by `max_workers_per_host` for each git service), but the resulting
+        context always follows the order of `pr_diff.changed_files`.
+
+        With the `hunks` context mode, only the lines around the hunks of every file are kept (see `extract_hunk_windows`),
+        and with the `symbols` mode, only the functions or classes enclosing them (see `extract_symbols`).
         """
         logger.info("Fetching code context from repository")
+        if not isinstance(target, LocalRepository) and not (self._git_client and isinstance(target, PRUrl)):
+            # This should never happen, but it is technically a possible code path.
+            # If there is a PRUrl, then the git client will always be set.
+            raise LGTMException("Invalid pr_url type or git_client not configured")
+
         context = PRCodeContext(file_contents=[])
-        branch: ContextBranch = "source"
-        for file_path in pr_diff.changed_files:
-            logger.debug("Fetching content for file %s", file_path)
-            if self._git_client and isinstance(target, PRUrl):
-                branch = "source"
-                content = self._git_client.get_file_contents(file_path=file_path, pr_url=target, branch_name=branch)
-                if content is None:
-                    logger.warning(
-                        "Failed to retrieve file %s from source branch, attempting to retrieve from target branch...",
-                        file_path,
-                    )
-                    branch = "target"
-                    content = self._git_client.get_file_contents(
-                        file_path=file_path, pr_url=target, branch_name="target"
-                    )
-                    if content is None:
-                        logger.warning("Failed to retrieve file %s from target branch, skipping...", file_path)
-                        continue
-            elif isinstance(target, LocalRepository):
-                content = get_file_contents_from_local_repo(target.repo_path, pathlib.Path(file_path))
-                branch = "source"
-            else:
-                # This should never happen, but it is technically a possible code path.
-                # If there is a PRUrl, then the git client will always be set.
-                raise LGTMException("Invalid pr_url type or git_client not configured")
+        if not pr_diff.changed_files:
+            return context
+
+        diffs_by_path = {diff.metadata.new_path: diff for diff in pr_diff.diff}
+        results = self._get_files_context_in_bulk(target, pr_diff.changed_files) if isinstance(target, PRUrl) else None
+        if results is None:
+            results = self._get_files_context_concurrently(target, pr_diff.changed_files)
+        for file_path, result in zip(pr_diff.changed_files, results, strict=True):
+            if result is None:
+                continue
+            content, branch = result
+            if (diff := diffs_by_path.get(file_path)) is not None:
+                content = self._extract_relevant_content(file_path, content, diff, branch)
             context.add_file(file_path, content, branch)
         return context
 
+    def _get_files_context_in_bulk(
+        self, pr_url: PRUrl, file_paths: list[str]
+    ) -> list[tuple[str, ContextBranch] | None] | None:
+        """Get the contents of all the changed files with the bulk API of the git client, if it has one.
+
+        Files missing from the source branch are fetched from the target branch, as in `_get_file_context`.
+        Returns None if the git client cannot fetch files in bulk.
+        """
+        if not self._git_client:
+            raise LGTMException("Invalid pr_url type or git_client not configured")
+        with self._get_host_semaphore(pr_url.base_url):
+            source_contents = self._git_client.get_files_contents(pr_url, file_paths, "source")
+        if source_contents is None:
+            return None
+
+        target_contents: dict[str, str | None] = {}
+        if missing := [file_path for file_path in file_paths if source_contents.get(file_path) is None]:
+            logger.warning(
+                "Failed to retrieve %d files from source branch, attempting to retrieve them from target branch...",
+                len(missing),
+            )
+            with self._get_host_semaphore(pr_url.base_url):
+                target_contents = self._git_client.get_files_contents(pr_url, missing, "target") or {}
+
+        results: list[tuple[str, ContextBranch] | None] = []
+        for file_path in file_paths:
+            if (content := source_contents.get(file_path)) is not None:
+                results.append((content, "source"))
+            elif (content := target_contents.get(file_path)) is not None:
+                results.append((content, "target"))
+            else:
+                logger.warning("Failed to retrieve file %s from target branch, skipping...", file_path)
+                results.append(None)
+        return results
+
+    def _get_files_context_concurrently(
+        self, target: PRUrl | LocalRepository, file_paths: list[str]
+    ) -> list[tuple[str, ContextBranch] | None]:
+        workers = min(self._max_workers, len(file_paths))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lgtm-context") as executor:
+            return list(executor.map(partial(self._get_file_context, target), file_paths))
+
+    def _extract_relevant_content(self, file_path: str, content: str, diff: DiffResult, branch: ContextBranch) -> str:
+        """Keep the parts of a changed file required by the context mode."""
+        if self._context_mode == ContextMode.hunks:
+            return extract_hunk_windows(content, diff, branch, window_lines=self._context_window_lines)
+        if self._context_mode == ContextMode.symbols:
+            return extract_symbols(content, diff, branch, file_path=file_path, window_lines=self._context_window_lines)
+        return content
+
+    def _get_file_context(self, target: PRUrl | LocalRepository, file_path: str) -> tuple[str, ContextBranch] | None:
+        """Get the contents of a single changed file, falling back to the target branch if needed."""
+        logger.debug("Fetching content for file %s", file_path)
+        if isinstance(target, LocalRepository):
+            return get_file_contents_from_local_repo(target.repo_path, pathlib.Path(file_path)), "source"
+
+        content = self._get_file_contents_from_git(target, file_path, "source")
+        if content is not None:
+            return content, "source"
+
+        logger.warning(
+            "Failed to retrieve file %s from source branch, attempting to retrieve from target branch...",
+            file_path,
+        )
+        content = self._get_file_contents_from_git(target, file_path, "target")
+        if content is None:
+            logger.warning("Failed to retrieve file %s from target branch, skipping...", file_path)
+            return None
+        return content, "target"
+
+    def _get_file_contents_from_git(self, pr_url: PRUrl, file_path: str, branch: ContextBranch) -> str | None:
+        if not self._git_client:
+            raise LGTMException("Invalid pr_url type or git_client not configured")
+        with self._get_host_semaphore(pr_url.base_url):
+            return self._git_client.get_file_contents(file_path=file_path, pr_url=pr_url, branch_name=branch)
+
+    def _get_host_semaphore(self, base_url: str) -> threading.BoundedSemaphore:
+        host = urlparse(base_url).netloc or base_url
+        with self._host_semaphores_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self._max_workers_per_host)
+            return self._host_semaphores[host]
+
     def get_additional_context(
         self, pr_url: PRUrl | LocalRepository, additional_context: tuple[AdditionalContext, ...]
     ) -> list[AdditionalContext] | None:
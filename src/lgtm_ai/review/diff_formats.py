@@ -0,0 +1,49 @@
+"""Serialization of PR diffs into the formats the AI models receive them in (see `DiffFormat`)."""
+
+import json
+from collections.abc import Iterable
+
+from lgtm_ai.base.schemas import DiffFormat
+from lgtm_ai.git.parser import DiffResult
+
+
+def serialize_diff(diffs: Iterable[DiffResult], diff_format: DiffFormat) -> str:
+    if diff_format == DiffFormat.compact:
+        return "\n".join(_serialize_file_compact(diff) for diff in diffs)
+    return json.dumps([diff.model_dump() for diff in diffs])
+
+
+def _serialize_file_compact(diff: DiffResult) -> str:
+    """Serialize the diff of a file as a header line followed by its hunks.
+
+    Every hunk starts with a `@@ -<hunk_start_old> +<hunk_start_new> @@` line, followed by one line for
+    every modified line: `<+ or -> <line_number> <relative_line_number> | <contents of the line>`.
+    """
+    metadata = diff.metadata
+    header = [f"FILE {metadata.new_path}"]
+    if metadata.old_path and metadata.old_path != metadata.new_path:
+        header.append(f"old_path={metadata.old_path}")
+    header.extend(
+        flag
+        for flag, is_set in (
+            ("new_file", metadata.new_file),
+            ("deleted_file", metadata.deleted_file),
+            ("renamed_file", metadata.renamed_file),
+        )
+        if is_set
+    )
+
+    lines = [" ".join(header)]
+    current_hunk: tuple[int | None, int | None] | None = None
+    for line in diff.modified_lines:
+        hunk = (line.hunk_start_old, line.hunk_start_new)
+        if hunk != current_hunk:
+            current_hunk = hunk
+            lines.append(f"@@ -{_format_hunk_start(hunk[0])} +{_format_hunk_start(hunk[1])} @@")
+        sign = "+" if line.modification_type == "added" else "-"
+        lines.append(f"{sign} {line.line_number} {line.relative_line_number} | {line.line}")
+    return "\n".join(lines)
+
+
+def _format_hunk_start(start: int | None) -> str:
+    return "?" if start is None else str(start)
@@ -0,0 +1,277 @@
+"""Extraction of the relevant parts of the changed files, so that not all of their contents need to be sent as context."""
+
+import ast
+import re
+from collections.abc import Iterable, Sequence
+from typing import Protocol
+
+from lgtm_ai.ai.schemas import ReviewComment
+from lgtm_ai.git.parser import DiffResult, ModifiedLine
+from lgtm_ai.git_client.schemas import ContextBranch
+
+type LineRange = tuple[int, int]
+"""Inclusive range of 1-based line numbers."""
+
+MAX_SYMBOL_LINES = 300
+"""Symbols longer than this (e.g., a big class whose body changed between two methods) are not sent whole."""
+
+COMMENT_EXCERPT_LINES = 10
+"""Modified lines of the diff kept before and after every review comment when summarizing with diff excerpts."""
+
+_IMPORT_LINE = re.compile(r"^(import|from|use|using|require|include|package|#include|#import)\b")
+_BLOCK_CLOSING_LINE = re.compile(r"^\s*([}\])]|end\b|fi\b|done\b|esac\b)")
+_SYMBOL_PREFIX_LINE = re.compile(r"^\s*(@|#|//|/\*|\*|--)")
+
+
+def get_hunk_line_ranges(diff: DiffResult, branch: ContextBranch) -> list[LineRange]:
+    """Get the range of lines spanned by every hunk of the diff, numbered as in the file of the given branch.
+
+    Lines that only exist in the other branch (e.g., removed lines when looking at the source branch) are
+    mapped to the place they would occupy, using the start of their hunk in both versions of the file.
+    """
+    ranges: dict[tuple[int | None, int | None], LineRange] = {}
+    for line in diff.modified_lines:
+        line_number = _get_line_number_in_branch(
+            line.line_number, line.modification_type, line.hunk_start_new, line.hunk_start_old, branch
+        )
+        # Without hunk information (diffs parsed by older versions), every line is its own hunk.
+        key = (line.hunk_start_new, line.hunk_start_old) if line.hunk_start_new is not None else (line_number, None)
+        start, end = ranges.get(key, (line_number, line_number))
+        ranges[key] = (min(start, line_number), max(end, line_number))
+    return sorted(ranges.values())
+
+
+def extract_hunk_windows(content: str, diff: DiffResult, branch: ContextBranch, *, window_lines: int) -> str:
+    """Keep only the lines of `content` within `window_lines` lines of any hunk of the diff.
+
+    Overlapping or adjacent windows are merged, and every omitted run of lines is replaced by a marker with
+    the line numbers it spans, so that the LLM can still relate the remaining lines to the diff. Files without
+    modified lines (e.g., pure renames) are replaced by a single marker.
+    """
+    lines = content.splitlines()
+    hunks = get_hunk_line_ranges(diff, branch)
+    return _render_excerpt(content, lines, [_get_window(hunk, window_lines, len(lines)) for hunk in hunks])
+
+
+def extract_symbols(content: str, diff: DiffResult, branch: ContextBranch, *, file_path: str, window_lines: int) -> str:
+    """Keep only the module-level imports of `content` and the smallest function or class enclosing every hunk.
+
+    Python files are parsed with `ast`. Other files (and Python files that cannot be parsed) use a heuristic
+    based on indentation: the enclosing block of a hunk starts at the closest previous line that is less
+    indented than the hunk, and ends right before the next line that is not more indented than that one
+    (or at that line, if it closes the block, e.g., with a brace).
+
+    Hunks outside any function or class (e.g., module-level changes), or whose enclosing symbol is longer
+    than `MAX_SYMBOL_LINES`, fall back to a window of `window_lines` lines around them. Omitted lines are
+    replaced by markers, as in `extract_hunk_windows`, and files without modified lines by a single marker.
+    """
+    lines = content.splitlines()
+    hunks = get_hunk_line_ranges(diff, branch)
+    if not hunks:
+        return _render_excerpt(content, lines, [])
+    symbols: _SymbolFinder
+    try:
+        symbols = _PythonSymbolFinder(content) if file_path.endswith((".py", ".pyi")) else _IndentSymbolFinder(lines)
+    except (SyntaxError, ValueError):
+        symbols = _IndentSymbolFinder(lines)
+
+    ranges = list(symbols.imports())
+    for hunk in hunks:
+        symbol = symbols.enclosing(hunk)
+        if symbol is None or symbol[1] - symbol[0] >= MAX_SYMBOL_LINES:
+            symbol = _get_window(hunk, window_lines, len(lines))
+        ranges.append(symbol)
+    return _render_excerpt(content, lines, ranges)
+
+
+def extract_commented_diff(
+    diffs: Iterable[DiffResult], comments: Iterable[ReviewComment], *, window_lines: int = COMMENT_EXCERPT_LINES
+) -> list[DiffResult]:
+    """Keep only the modified lines of the diff that are in the same hunk as a review comment, and close to it.
+
+    A modified line is kept if it is within `window_lines` lines of the diff (by `relative_line_number`) of a
+    comment on its file. Comments are anchored to the modified line they were placed on; if there is none
+    (e.g., the comment is on an unmodified line), any hunk around their relative line number is used. Files
+    without comments are dropped altogether.
+    """
+    diffs = list(diffs)
+    diffs_by_path: dict[str, DiffResult] = {}
+    for diff in diffs:
+        diffs_by_path.setdefault(diff.metadata.new_path, diff)
+        if diff.metadata.old_path:
+            diffs_by_path.setdefault(diff.metadata.old_path, diff)
+
+    kept: dict[str, set[int]] = {}
+    for comment in comments:
+        commented_diff = diffs_by_path.get(comment.new_path if comment.is_comment_on_new_path else comment.old_path)
+        if commented_diff is None:
+            continue
+        kept.setdefault(commented_diff.metadata.new_path, set()).update(
+            _get_lines_around_comment(commented_diff.modified_lines, comment, window_lines)
+        )
+
+    return [
+        DiffResult(
+            metadata=diff.metadata,
+            modified_lines=[
+                line for index, line in enumerate(diff.modified_lines) if index in kept[diff.metadata.new_path]
+            ],
+        )
+        for diff in diffs
+        if kept.get(diff.metadata.new_path)
+    ]
+
+
+def _get_lines_around_comment(
+    lines: Sequence[ModifiedLine], comment: ReviewComment, window_lines: int
+) -> Iterable[int]:
+    """Indexes of the modified lines within `window_lines` lines of the diff of the given comment, in its hunk."""
+    modification_type = "added" if comment.is_comment_on_new_path else "removed"
+    anchor = next(
+        (
+            line
+            for line in lines
+            if line.line_number == comment.line_number and line.modification_type == modification_type
+        ),
+        None,
+    )
+    relative_line_number = anchor.relative_line_number if anchor else comment.relative_line_number
+    for index, line in enumerate(lines):
+        if abs(line.relative_line_number - relative_line_number) > window_lines:
+            continue
+        if anchor is None or (line.hunk_start_new, line.hunk_start_old) == (
+            anchor.hunk_start_new,
+            anchor.hunk_start_old,
+        ):
+            yield index
+
+
+class _SymbolFinder(Protocol):
+    def imports(self) -> Iterable[LineRange]: ...
+
+    def enclosing(self, hunk: LineRange) -> LineRange | None: ...
+
+
+class _PythonSymbolFinder:
+    def __init__(self, content: str) -> None:
+        self._tree = ast.parse(content)
+        self._symbols = [
+            (
+                min([node.lineno, *(decorator.lineno for decorator in node.decorator_list)]),
+                node.end_lineno or node.lineno,
+            )
+            for node in ast.walk(self._tree)
+            if isinstance(node, ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef)
+        ]
+
+    def imports(self) -> Iterable[LineRange]:
+        for node in self._tree.body:
+            if isinstance(node, ast.Import | ast.ImportFrom):
+                yield node.lineno, node.end_lineno or node.lineno
+
+    def enclosing(self, hunk: LineRange) -> LineRange | None:
+        candidates = [(start, end) for start, end in self._symbols if start <= hunk[0] and hunk[1] <= end]
+        return min(candidates, key=lambda symbol: symbol[1] - symbol[0], default=None)
+
+
+class _IndentSymbolFinder:
+    def __init__(self, lines: list[str]) -> None:
+        self._lines = lines
+
+    def imports(self) -> Iterable[LineRange]:
+        for line_number, line in enumerate(self._lines, start=1):
+            if _IMPORT_LINE.match(line):
+                yield line_number, line_number
+
+    def enclosing(self, hunk: LineRange) -> LineRange | None:
+        start, end = hunk[0], min(hunk[1], len(self._lines))
+        indents = [self._indent(line_number) for line_number in range(start, end + 1)]
+        hunk_indent = min((indent for indent in indents if indent is not None), default=None)
+        if not hunk_indent:
+            return None
+
+        header = next(
+            (n for n in range(start - 1, 0, -1) if (indent := self._indent(n)) is not None and indent < hunk_indent),
+            None,
+        )
+        if header is None:
+            return None
+        header_indent = self._indent(header) or 0
+
+        block_end = end
+        for line_number in range(end + 1, len(self._lines) + 1):
+            indent = self._indent(line_number)
+            if indent is not None and indent <= header_indent:
+                if _BLOCK_CLOSING_LINE.match(self._lines[line_number - 1]):
+                    block_end = line_number
+                break
+            block_end = line_number
+
+        # Decorators, annotations and comments right above the header belong to the symbol too
+        while header > 1 and _SYMBOL_PREFIX_LINE.match(self._lines[header - 2]):
+            header -= 1
+        return header, block_end
+
+    def _indent(self, line_number: int) -> int | None:
+        """Indentation of the given line, or None if it is blank."""
+        if line_number > len(self._lines):
+            return None
+        line = self._lines[line_number - 1]
+        stripped = line.lstrip()
+        return len(line) - len(stripped) if stripped else None
+
+
+def _get_window(hunk: LineRange, window_lines: int, total_lines: int) -> LineRange:
+    return max(1, hunk[0] - window_lines), min(total_lines, hunk[1] + window_lines)
+
+
+def _render_excerpt(content: str, lines: list[str], ranges: Iterable[LineRange]) -> str:
+    """Render the given ranges of lines, replacing every omitted run of lines with a marker."""
+    if not lines:
+        return content
+    if not (merged := _merge_ranges(ranges)):
+        # No line of the file is relevant to the diff (e.g., the file was renamed without changing its contents)
+        return f"[... no textual changes, lines 1-{len(lines)} omitted ...]"
+
+    excerpt: list[str] = []
+    next_line = 1
+    for start, end in merged:
+        if start > next_line:
+            excerpt.append(_omitted_marker(next_line, start - 1))
+        excerpt.extend(lines[start - 1 : end])
+        next_line = end + 1
+    if next_line <= len(lines):
+        excerpt.append(_omitted_marker(next_line, len(lines)))
+    return "\n".join(excerpt)
+
+
+def _get_line_number_in_branch(
+    line_number: int,
+    modification_type: str,
+    hunk_start_new: int | None,
+    hunk_start_old: int | None,
+    branch: ContextBranch,
+) -> int:
+    # Added lines are numbered as in the source branch, and removed lines as in the target branch.
+    own_branch = "source" if modification_type == "added" else "target"
+    if branch == own_branch or hunk_start_new is None or hunk_start_old is None:
+        return line_number
+    offset = hunk_start_old - hunk_start_new if branch == "target" else hunk_start_new - hunk_start_old
+    return max(1, line_number + offset)
+
+
+def _merge_ranges(ranges: Iterable[LineRange]) -> list[LineRange]:
+    merged: list[LineRange] = []
+    for start, end in sorted(ranges):
+        if start > end:
+            # The hunk is past the end of the file (e.g., the file changed after the diff was computed).
+            continue
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _omitted_marker(start: int, end: int) -> str:
+    return f"[... lines {start}-{end} omitted ...]"
@@ -1,9 +1,14 @@
 import logging
 
 import httpx
-from lgtm_ai.ai.schemas import GuideResponse, PublishMetadata, ReviewGuide
+from lgtm_ai.ai.agent import get_prompt_caching_settings
+from lgtm_ai.ai.cache import ResponseCache
+from lgtm_ai.ai.schemas import CacheStats, GuideResponse, PublishMetadata, ReviewGuide
 from lgtm_ai.base.constants import DEFAULT_HTTPX_TIMEOUT
+from lgtm_ai.base.exceptions import NothingToReviewError
 from lgtm_ai.base.schemas import PRUrl
+from lgtm_ai.base.tracing import collect_spans, span
+from lgtm_ai.base.utils import estimate_tokens
 from lgtm_ai.config.handler import ResolvedConfig
 from lgtm_ai.git_client.base import GitClient
 from lgtm_ai.review.context import ContextRetriever
@@ -11,7 +16,7 @@ from lgtm_ai.review.exceptions import handle_ai_exceptions
 from lgtm_ai.review.prompt_generators import PromptGenerator
 from pydantic_ai import Agent
 from pydantic_ai.models import Model
-from pydantic_ai.usage import UsageLimits
+from pydantic_ai.usage import RunUsage, UsageLimits
 
 logger = logging.getLogger("lgtm")
 
@@ -30,33 +35,104 @@ class ReviewGuideGenerator:
         self.git_client = git_client
         self.config = config
         self.context_retriever = ContextRetriever(
-            git_client=git_client, issues_client=git_client, httpx_client=httpx.Client(timeout=DEFAULT_HTTPX_TIMEOUT)
+            git_client=git_client,
+            issues_client=git_client,
+            httpx_client=httpx.Client(timeout=DEFAULT_HTTPX_TIMEOUT),
+            max_workers=config.context_workers,
+            max_workers_per_host=config.context_workers_per_host,
+            context_mode=config.context_mode,
+            context_window_lines=config.context_window_lines,
+        )
+        self.response_cache = (
+            ResponseCache(config.cache_dir, max_size=config.cache_max_size, ttl=config.cache_ttl)
+            if config.cache_dir
+            else None
         )
 
     def generate_review_guide(self, pr_url: PRUrl) -> ReviewGuide:
+        """Generate a review guide for the given PR.
+
+        The duration of every stage is recorded in the `spans` of the guide metadata.
+        """
+        with collect_spans() as spans, span("guide", source=pr_url.source) as attributes:
+            guide = self._generate_review_guide(pr_url)
+            attributes.update(
+                requests=guide.metadata.usage.requests,
+                input_tokens=guide.metadata.usage.input_tokens,
+                output_tokens=guide.metadata.usage.output_tokens,
+                cache_read_tokens=guide.metadata.usage.cache_read_tokens,
+            )
+        guide.metadata.spans = spans
+        return guide
+
+    def _generate_review_guide(self, pr_url: PRUrl) -> ReviewGuide:
         if not self.git_client:
             raise ValueError("Git client is not configured, cannot generate review guide")
-        pr_diff = self.git_client.get_diff_from_url(pr_url)
-        context = self.context_retriever.get_code_context(pr_url, pr_diff)
-        metadata = self.git_client.get_pr_metadata(pr_url)
+        with span("get_diff") as attributes:
+            pr_diff = self.git_client.get_diff_from_url(pr_url).exclude_files(self.config.exclude)
+            attributes.update(files=len(pr_diff.diff), bytes=pr_diff.size)
+        if not pr_diff.diff:
+            raise NothingToReviewError(exclude=self.config.exclude)
+        with span("get_code_context") as attributes:
+            context = self.context_retriever.get_code_context(pr_url, pr_diff)
+            attributes.update(
+                files=len(context.file_contents), bytes=sum(len(file.content) for file in context.file_contents)
+            )
+        with span("get_pr_metadata"):
+            metadata = self.git_client.get_pr_metadata(pr_url)
         usage_limits = UsageLimits(input_tokens_limit=self.config.ai_input_tokens_limit)
 
         prompt_generator = PromptGenerator(self.config, metadata)
 
-        guide_prompt = prompt_generator.generate_guide_prompt(pr_diff=pr_diff, context=context)
-        logger.info("Running AI model on the PR diff")
-        with handle_ai_exceptions():
-            raw_res = self.guide_agent.run_sync(
-                model=self.model,
-                user_prompt=guide_prompt,
-                usage_limits=usage_limits,
-            )
+        with span("render_guide_prompt") as attributes:
+            guide_prompt = prompt_generator.generate_guide_prompt(pr_diff=pr_diff, context=context)
+            attributes.update(bytes=len(guide_prompt), estimated_tokens=estimate_tokens(guide_prompt))
+        with span("guide_agent") as attributes:
+            guide_response, usage, cache_stats = self._run_guide_agent(guide_prompt, usage_limits=usage_limits)
+            attributes["cached"] = bool(cache_stats and cache_stats.hits)
         logger.info("Guide generation completed")
 
         return ReviewGuide(
             pr_diff=pr_diff,
-            guide_response=raw_res.output,
+            guide_response=guide_response,
             metadata=PublishMetadata(
-                model_name=self.model.model_name, usage=raw_res.usage(), config=self.config.model_dump()
+                model_name=self.model.model_name,
+                usage=usage,
+                config=self.config.model_dump(),
+                cache=cache_stats,
+                git_rate_limit=self.git_client.get_rate_limit_budget() if self.git_client else None,
             ),
         )
+
+    def _run_guide_agent(
+        self, guide_prompt: str, *, usage_limits: UsageLimits
+    ) -> tuple[GuideResponse, RunUsage, CacheStats | None]:
+        cache_key = None
+        if self.response_cache:
+            cache_key = ResponseCache.make_key(
+                agent_name="guide",
+                model_name=self.model.model_name,
+                system_prompt_deps=None,
+                user_prompt=guide_prompt,
+                settings={"model_url": self.config.model_url, "retries": self.config.ai_retries},
+            )
+            if cached_response := self.response_cache.get(cache_key, GuideResponse):
+                logger.info("Guide found in the LLM response cache")
+                return cached_response, RunUsage(), CacheStats(hits=1)
+
+        logger.info("Running AI model on the PR diff")
+        with handle_ai_exceptions():
+            raw_res = self.guide_agent.run_sync(
+                model=self.model,
+                user_prompt=guide_prompt,
+                usage_limits=usage_limits,
+                model_settings=(
+                    get_prompt_caching_settings(self.model, cache_key="lgtm-guide")
+                    if self.config.prompt_caching
+                    else None
+                ),
+            )
+        if self.response_cache and cache_key:
+            self.response_cache.set(cache_key, raw_res.output)
+            return raw_res.output, raw_res.usage(), CacheStats(misses=1)
+        return raw_res.output, raw_res.usage(), None
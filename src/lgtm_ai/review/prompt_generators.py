@@ -1,17 +1,16 @@
-import json
-import logging
 import pathlib
 from typing import ClassVar
 
 from jinja2 import Environment, FileSystemLoader
 from lgtm_ai.ai.schemas import AdditionalContext, ReviewResponse
-from lgtm_ai.base.exceptions import NothingToReviewError
-from lgtm_ai.base.utils import file_matches_any_pattern
+from lgtm_ai.base.schemas import SummarizingDiff
+from lgtm_ai.base.utils import estimate_tokens
 from lgtm_ai.config.handler import ResolvedConfig
 from lgtm_ai.git_client.schemas import IssueContent, PRDiff, PRMetadata
-from lgtm_ai.review.schemas import PRCodeContext, PRContextFileContents
-
-logger = logging.getLogger("lgtm.ai")
+from lgtm_ai.review.budget import PromptBudgetPlan, PromptBudgetPlanner
+from lgtm_ai.review.diff_formats import serialize_diff
+from lgtm_ai.review.excerpts import extract_commented_diff
+from lgtm_ai.review.schemas import PRCodeContext
 
 
 class PromptGenerator:
@@ -37,26 +36,59 @@ class PromptGenerator:
     ) -> str:
         """Generate the initial prompt for the AI model to review the PR.
 
-        It includes the diff and the context of the PR, formatted for the AI to receive.
+        It includes the diff and the context of the PR, formatted for the AI to receive. Files matching the `exclude`
+        patterns of the config must already be removed from both (see `PRDiff.exclude_files`).
         """
         template = self._template_env.get_template(self.REVIEW_TEMPLATE)
         return template.render(
             metadata=self.pr_metadata,
             diff=self._serialize_pr_diff(pr_diff),
-            context=self._filter_context_based_on_exclusions(context.file_contents),
+            context=context.file_contents,
             issue_context=issue_context,
             additional_context=additional_context,
         )
 
+    def plan_review_prompt(
+        self,
+        *,
+        pr_diff: PRDiff,
+        context: PRCodeContext,
+        additional_context: list[AdditionalContext] | None = None,
+        issue_context: IssueContent | None = None,
+        max_tokens: int,
+    ) -> PromptBudgetPlan:
+        """Trim the context of a review prompt so that the rendered prompt fits in `max_tokens` (estimated) tokens.
+
+        The diff, PR metadata and issue context are always kept; only the code context and the additional context are trimmed.
+        """
+        fixed_tokens = estimate_tokens(
+            self.generate_review_prompt(
+                pr_diff=pr_diff,
+                context=PRCodeContext(file_contents=[]),
+                issue_context=issue_context,
+            )
+        )
+        return PromptBudgetPlanner(max_tokens).plan(
+            fixed_tokens=fixed_tokens,
+            context=context,
+            additional_context=additional_context,
+        )
+
     def generate_summarizing_prompt(self, *, pr_diff: PRDiff, raw_review: ReviewResponse) -> str:
         """Generate a prompt for the AI model to summarize the review.
 
-        It includes the diff and the review, formatted for the AI to receive.
+        It includes the diff and the review, formatted for the AI to receive. With the `excerpts` summarizing diff,
+        only the modified lines around every comment of the review are included instead of the whole diff.
         """
         template = self._template_env.get_template(self.SUMMARIZING_TEMPLATE)
+        if self.config.summarizing_diff == SummarizingDiff.excerpts:
+            diff = serialize_diff(extract_commented_diff(pr_diff.diff, raw_review.comments), self.config.diff_format)
+        else:
+            diff = self._serialize_pr_diff(pr_diff)
         return template.render(
             metadata=self.pr_metadata,
-            diff=self._serialize_pr_diff(pr_diff),
+            diff=diff,
+            diff_excerpts=self.config.summarizing_diff == SummarizingDiff.excerpts,
             review=raw_review.model_dump(),
         )
 
@@ -67,26 +99,10 @@ class PromptGenerator:
             pr_diff=pr_diff, context=context, additional_context=additional_context
         )  # FIXME: They are the same for now?
 
-    def _filter_context_based_on_exclusions(
-        self, file_context: list[PRContextFileContents]
-    ) -> list[PRContextFileContents]:
-        return [fc for fc in file_context if not file_matches_any_pattern(fc.file_path, self.config.exclude)]
-
     def _serialize_pr_diff(self, pr_diff: PRDiff) -> str:
-        """Serialize the PR diff to a JSON string for the AI model.
+        """Serialize the PR diff for the AI model, in the `diff_format` of the config (JSON by default).
 
         The PR diff is parsed by the Git client, and contains all the necessary information the AI needs
-        to review it. We convert it here to a JSON string so that the AI can process it easily.
-
-        It excludes files according to the `exclude` patterns in the config.
+        to review it. We convert it here to a string (see `serialize_diff`) so that the AI can process it easily.
         """
-        keep = []
-        for diff in pr_diff.diff:
-            if not file_matches_any_pattern(diff.metadata.new_path, self.config.exclude):
-                keep.append(diff.model_dump())
-            else:
-                logger.debug("Excluding file %s from diff", diff.metadata.new_path)
-
-        if not keep:
-            raise NothingToReviewError(exclude=self.config.exclude)
-        return json.dumps(keep)
+        return serialize_diff(pr_diff.diff, self.config.diff_format)
@@ -1,24 +1,40 @@
+import asyncio
 import logging
 
+from lgtm_ai.ai.agent import get_prompt_caching_settings
+from lgtm_ai.ai.cache import ResponseCache
 from lgtm_ai.ai.schemas import (
+    AdditionalContext,
+    CacheStats,
     PublishMetadata,
     Review,
+    ReviewComment,
     ReviewerDeps,
     ReviewResponse,
     SummarizingDeps,
+    TrimmedSection,
 )
+from lgtm_ai.base.exceptions import NoChangesSinceLastReviewError, NothingToReviewError, PRHeadChangedError
 from lgtm_ai.base.schemas import LocalRepository, PRUrl
+from lgtm_ai.base.tracing import collect_spans, span
+from lgtm_ai.base.utils import estimate_tokens
 from lgtm_ai.config.handler import ResolvedConfig
 from lgtm_ai.git.repository import get_diff_from_local_repo
 from lgtm_ai.git_client.base import GitClient
-from lgtm_ai.git_client.schemas import PRDiff, PRMetadata
+from lgtm_ai.git_client.positions import DiffPositionIndex
+from lgtm_ai.git_client.schemas import IssueContent, PRDiff, PRMetadata
 from lgtm_ai.review.context import ContextRetriever
 from lgtm_ai.review.exceptions import (
     handle_ai_exceptions,
 )
 from lgtm_ai.review.prompt_generators import PromptGenerator
+from lgtm_ai.review.schemas import PRCodeContext
+from lgtm_ai.review.sharding import ReviewShard, merge_review_responses, shard_pr
+from lgtm_ai.review.streaming import CommentCallback, CommentStreamer
+from lgtm_ai.review.summarizing import SummarizingPolicy
 from pydantic_ai import Agent
 from pydantic_ai.models import Model
+from pydantic_ai.settings import ModelSettings
 from pydantic_ai.usage import RunUsage, UsageLimits
 
 logger = logging.getLogger("lgtm.ai")
@@ -37,14 +53,14 @@ class CodeReviewer:
     - Gather code context, additional context, and related issue context for the PR using a ContextRetriever.
     - Generate prompts for the AI agents using a PromptGenerator, tailored to the PR and its context.
     - Run the reviewer agent to produce an initial review, including inline comments and a summary.
+      Large PRs can be split into shards that are reviewed concurrently and merged.
     - Optionally fetch and incorporate related issue context if configured.
     - Run the summarizing agent to produce a final, polished review response.
     - Track and aggregate usage statistics for AI model calls.
     - Return a Review object containing the PR diff, final review response, and metadata about the review process.
 
     Main workflow:
-        - Fetch PR metadata and diff.
-        - Gather code and additional context, and optionally issue context.
+        - Fetch PR metadata and diff, together with code, additional and issue context (concurrently).
         - Generate a review prompt and run the reviewer agent for the initial review.
         - Summarize the initial review using the summarizing agent.
         - Return a Review object with all results and metadata.
@@ -84,38 +100,97 @@ class CodeReviewer:
         self.git_client = git_client
         self.config = config
         self.context_retriever = context_retriever
+        self.response_cache = (
+            ResponseCache(config.cache_dir, max_size=config.cache_max_size, ttl=config.cache_ttl)
+            if config.cache_dir
+            else None
+        )
+
+    def review(self, target: PRUrl | LocalRepository, *, on_comment: CommentCallback | None = None) -> Review:
+        """Perform a full review of the given pull request URL or local git repository and return it.
+
+        Synchronous wrapper around `areview`; it cannot be called from within a running event loop.
+        """
+        return asyncio.run(self.areview(target, on_comment=on_comment))
+
+    async def areview(
+        self,
+        target: PRUrl | LocalRepository,
+        *,
+        on_comment: CommentCallback | None = None,
+        head_sha: str | None = None,
+    ) -> Review:
+        """Perform a full review of the given pull request URL or local git repository and return it.
 
-    def review(self, target: PRUrl | LocalRepository) -> Review:
-        """Perform a full review of the given pull request URL or local git repository and return it."""
+        All independent I/O (PR metadata, diff, code context, additional context and issue context)
+        is performed concurrently, and the AI agents are run asynchronously. The PR is always fetched again,
+        even if the git client already fetched it for a previous review.
+
+        If `head_sha` is given, the review is only performed if it is still the head commit of the PR, otherwise
+        `PRHeadChangedError` is raised.
+
+        If `on_comment` is given, the comments of the initial review are streamed to it as they are generated,
+        before the final (summarized) review is ready.
+
+        The duration of every stage of the review is recorded in the `spans` of the review metadata.
+        """
+        with collect_spans() as spans, span("review", source=target.source) as attributes:
+            review = await self._review(target, on_comment=on_comment, head_sha=head_sha)
+            attributes.update(comments=len(review.review_response.comments), **_usage_attributes(review.metadata.usage))
+        review.metadata.spans = spans
+        return review
+
+    async def _review(
+        self, target: PRUrl | LocalRepository, *, on_comment: CommentCallback | None, head_sha: str | None
+    ) -> Review:
+        if self.git_client and isinstance(target, PRUrl):
+            # Git clients may be shared by many reviews, and the PR may have changed since the last one
+            self.git_client.clear_pr_cache(target)
         total_usage = RunUsage()
         usage_limits = UsageLimits(input_tokens_limit=self.config.ai_input_tokens_limit)
+        trimmed_sections: list[TrimmedSection] = []
+        cache_stats = CacheStats()
 
-        if self.git_client and isinstance(target, PRUrl):
-            metadata = self.git_client.get_pr_metadata(target)
-            pr_diff = self.git_client.get_diff_from_url(target)
-        elif isinstance(target, LocalRepository):
-            metadata = PRMetadata(title="Local changes with no PR", description="")
-            pr_diff = get_diff_from_local_repo(target.repo_path, compare=self.config.compare)
-        else:
-            raise ValueError("Invalid pr_url type or git_client not configured")
+        (
+            (metadata, issue_context),
+            (pr_diff, review_diff, context, reviewed_since_sha),
+            additional_context,
+        ) = await asyncio.gather(
+            self._get_metadata_and_issue_context(target),
+            self._get_diff_and_code_context(target, head_sha=head_sha),
+            self._get_additional_context(target),
+        )
 
         prompt_generator = PromptGenerator(self.config, metadata)
+        shards = self._get_review_shards(review_diff, context)
 
-        initial_review_response = self._perform_initial_review(
-            target,
-            pr_diff=pr_diff,
-            pr_metadata=metadata,
+        initial_review_response = await self._perform_initial_review(
+            pr_diff=review_diff,
+            context=context,
+            shards=shards,
+            additional_context=additional_context,
+            issue_context=issue_context,
             prompt_generator=prompt_generator,
             total_usage=total_usage,
             usage_limits=usage_limits,
+            trimmed_sections=trimmed_sections,
+            cache_stats=cache_stats,
+            on_comment=on_comment,
         )
-        final_review, final_usage = self._summarize_initial_review(
-            pr_diff,
+        # The input tokens limit applies to each shard of a sharded review, and then to its summary on its own
+        sharded = len(shards) > 1
+        final_review, final_usage = await self._summarize_initial_review(
+            review_diff,
             initial_review_response=initial_review_response,
             prompt_generator=prompt_generator,
-            total_usage=total_usage,
+            total_usage=RunUsage() if sharded else total_usage,
             usage_limits=usage_limits,
+            cache_stats=cache_stats,
         )
+        if sharded:
+            final_usage = total_usage + final_usage
+        if reviewed_since_sha:
+            final_review = _relocate_incremental_comments(final_review, interdiff=review_diff, pr_diff=pr_diff)
         logger.info("Final review completed")
         logger.debug(
             "Final review score: %d; Number of comments: %d", final_review.raw_score, len(final_review.comments)
@@ -125,64 +200,273 @@ class CodeReviewer:
             pr_diff=pr_diff,
             review_response=final_review,
             metadata=PublishMetadata(
-                model_name=self.model.model_name, usage=final_usage, config=self.config.model_dump()
+                model_name=self.model.model_name,
+                usage=final_usage,
+                config=self.config.model_dump(),
+                trimmed_sections=trimmed_sections,
+                head_sha=pr_diff.head_sha,
+                reviewed_since_sha=reviewed_since_sha,
+                cache=cache_stats if self.response_cache else None,
+                git_rate_limit=self.git_client.get_rate_limit_budget() if self.git_client else None,
             ),
         )
 
-    def _perform_initial_review(
+    async def _get_metadata_and_issue_context(
+        self, target: PRUrl | LocalRepository
+    ) -> tuple[PRMetadata, IssueContent | None]:
+        """Fetch the PR metadata and, if configured, the content of the issue it refers to."""
+        if self.git_client and isinstance(target, PRUrl):
+            with span("get_pr_metadata"):
+                metadata = await asyncio.to_thread(self.git_client.get_pr_metadata, target)
+        elif isinstance(target, LocalRepository):
+            metadata = PRMetadata(title="Local changes with no PR", description="")
+        else:
+            raise ValueError("Invalid pr_url type or git_client not configured")
+
+        if not (self.config.issues_platform and self.config.issues_url and self.config.issues_regex):
+            return metadata, None
+
+        logger.info("Fetching issue context related if possible")
+        with span("get_issue_context") as attributes:
+            issue_context = await asyncio.to_thread(
+                self.context_retriever.get_issues_context,
+                issues_url=self.config.issues_url,
+                issues_regex=self.config.issues_regex,
+                pr_metadata=metadata,
+            )
+            attributes["found"] = issue_context is not None
+        return metadata, issue_context
+
+    async def _get_additional_context(self, target: PRUrl | LocalRepository) -> list[AdditionalContext] | None:
+        with span("get_additional_context") as attributes:
+            additional_context = await asyncio.to_thread(
+                self.context_retriever.get_additional_context,
+                pr_url=target,
+                additional_context=self.config.additional_context,
+            )
+            attributes["items"] = len(additional_context or [])
+        return additional_context
+
+    async def _get_diff_and_code_context(
+        self, target: PRUrl | LocalRepository, *, head_sha: str | None
+    ) -> tuple[PRDiff, PRDiff, PRCodeContext, str | None]:
+        """Fetch the PR diff and the diff to review (without excluded files), and the contents of the files it changes.
+
+        The diff to review is the PR diff itself, except in incremental mode, where it only contains the changes since
+        the last review published by lgtm, whose head SHA is returned too (None if the whole PR is reviewed).
+        """
+        reviewed_since_sha = None
+        with span("get_diff") as attributes:
+            if self.git_client and isinstance(target, PRUrl):
+                pr_diff = await asyncio.to_thread(self.git_client.get_diff_from_url, target)
+                if head_sha and pr_diff.head_sha != head_sha:
+                    raise PRHeadChangedError(head_sha, pr_diff.head_sha)
+                review_diff = pr_diff
+                if self.config.incremental:
+                    review_diff, reviewed_since_sha = await self._get_incremental_diff(self.git_client, target, pr_diff)
+            elif isinstance(target, LocalRepository):
+                pr_diff = await asyncio.to_thread(
+                    get_diff_from_local_repo,
+                    target.repo_path,
+                    compare=self.config.compare,
+                    limits=self.config.diff_limits,
+                    exclude=self.config.exclude,
+                )
+            else:
+                raise ValueError("Invalid pr_url type or git_client not configured")
+            # Excluded files are dropped before fetching any context, so that their contents are never downloaded
+            pr_diff = pr_diff.exclude_files(self.config.exclude)
+            review_diff = review_diff.exclude_files(self.config.exclude) if reviewed_since_sha else pr_diff
+            attributes.update(files=len(review_diff.diff), bytes=review_diff.size)
+        if not review_diff.diff:
+            raise NothingToReviewError(exclude=self.config.exclude)
+
+        with span("get_code_context") as attributes:
+            context = await asyncio.to_thread(
+                self.context_retriever.get_code_context, target=target, pr_diff=review_diff
+            )
+            attributes.update(
+                files=len(context.file_contents), bytes=sum(len(file.content) for file in context.file_contents)
+            )
+        return pr_diff, review_diff, context, reviewed_since_sha
+
+    async def _get_incremental_diff(
+        self, git_client: GitClient, pr_url: PRUrl, pr_diff: PRDiff
+    ) -> tuple[PRDiff, str | None]:
+        """Return the diff of the changes pushed since the last lgtm review, or the full diff if there is no usable previous review."""
+        last_reviewed_sha = await asyncio.to_thread(git_client.get_last_reviewed_sha, pr_url)
+        if not last_reviewed_sha:
+            logger.info("No previous review found, reviewing the whole PR")
+            return pr_diff, None
+        if last_reviewed_sha == pr_diff.head_sha:
+            raise NoChangesSinceLastReviewError(last_reviewed_sha)
+
+        interdiff = await asyncio.to_thread(git_client.get_diff_since, pr_url, last_reviewed_sha)
+        if interdiff is None:
+            logger.info("Cannot compute the changes since %s, reviewing the whole PR", last_reviewed_sha)
+            return pr_diff, None
+        if not interdiff.diff:
+            raise NoChangesSinceLastReviewError(last_reviewed_sha)
+
+        logger.info("Reviewing only the changes since %s (%d files)", last_reviewed_sha, len(interdiff.changed_files))
+        return interdiff, last_reviewed_sha
+
+    async def _perform_initial_review(
         self,
-        pr_url: PRUrl | LocalRepository,
         *,
         pr_diff: PRDiff,
-        pr_metadata: PRMetadata,
+        context: PRCodeContext,
+        shards: list[ReviewShard],
+        additional_context: list[AdditionalContext] | None,
+        issue_context: IssueContent | None,
         prompt_generator: PromptGenerator,
         total_usage: RunUsage,
         usage_limits: UsageLimits,
+        trimmed_sections: list[TrimmedSection],
+        cache_stats: CacheStats,
+        on_comment: CommentCallback | None,
     ) -> ReviewResponse:
-        """Perform an initial review of the PR with the reviewer agent."""
-        context = self.context_retriever.get_code_context(target=pr_url, pr_diff=pr_diff)
-        additional_context = self.context_retriever.get_additional_context(
-            pr_url=pr_url,
-            additional_context=self.config.additional_context,
-        )
-        if self.config.issues_platform and self.config.issues_url and self.config.issues_regex:
-            logger.info("Fetching issue context related if possible")
-            issue_context = self.context_retriever.get_issues_context(
-                issues_url=self.config.issues_url,
-                issues_regex=self.config.issues_regex,
-                pr_metadata=pr_metadata,
-            )
-        else:
-            issue_context = None
+        """Perform an initial review of the PR with the reviewer agent.
 
-        review_prompt = prompt_generator.generate_review_prompt(
-            pr_diff=pr_diff,
-            context=context,
-            additional_context=additional_context,
-            issue_context=issue_context,
-        )
-        logger.info("Reviewer Agent is performing the initial review")
-        with handle_ai_exceptions():
-            raw_res = self.reviewer_agent.run_sync(
-                model=self.model,
-                user_prompt=review_prompt,
-                deps=ReviewerDeps(
-                    configured_technologies=self.config.technologies, configured_categories=self.config.categories
-                ),
-                usage=total_usage,
+        If the PR is too large (see `review_shard_tokens`), it is split into `shards` that are reviewed concurrently
+        and whose partial reviews are merged into one. The input tokens limit applies to each shard separately, and
+        their usage is added to `total_usage` once all of them are reviewed.
+
+        Any context trimmed to fit the prompt token budget is appended to `trimmed_sections`.
+        If `on_comment` is given, the reviewer agent output is streamed and every comment is passed to it when complete.
+        """
+        if len(shards) <= 1:
+            review_prompt = self._generate_review_prompt(
+                prompt_generator,
+                pr_diff=pr_diff,
+                context=context,
+                additional_context=additional_context,
+                issue_context=issue_context,
+                trimmed_sections=trimmed_sections,
+            )
+            logger.info("Reviewer Agent is performing the initial review")
+            return await self._run_reviewer_agent(
+                review_prompt,
+                total_usage=total_usage,
                 usage_limits=usage_limits,
+                cache_stats=cache_stats,
+                on_comment=on_comment,
             )
-        logger.info("Initial review completed")
-        logger.debug(
-            "Initial review score: %d; Number of comments: %d", raw_res.output.raw_score, len(raw_res.output.comments)
+
+        logger.info("Reviewer Agent is performing the initial review in %d shards", len(shards))
+        semaphore = asyncio.Semaphore(self.config.review_shard_concurrency)
+
+        async def _review_shard(shard: ReviewShard, shard_usage: RunUsage) -> ReviewResponse:
+            shard_prompt = self._generate_review_prompt(
+                prompt_generator,
+                pr_diff=shard.pr_diff,
+                context=shard.context,
+                additional_context=additional_context,
+                issue_context=issue_context,
+                trimmed_sections=trimmed_sections,
+            )
+            async with semaphore:
+                return await self._run_reviewer_agent(
+                    shard_prompt,
+                    total_usage=shard_usage,
+                    usage_limits=usage_limits,
+                    cache_stats=cache_stats,
+                    on_comment=on_comment,
+                )
+
+        shard_usages = [RunUsage() for _ in shards]
+        responses = await asyncio.gather(*map(_review_shard, shards, shard_usages))
+        for shard_usage in shard_usages:
+            total_usage.incr(shard_usage)
+        return merge_review_responses(list(responses))
+
+    def _generate_review_prompt(
+        self,
+        prompt_generator: PromptGenerator,
+        *,
+        pr_diff: PRDiff,
+        context: PRCodeContext,
+        additional_context: list[AdditionalContext] | None,
+        issue_context: IssueContent | None,
+        trimmed_sections: list[TrimmedSection],
+    ) -> str:
+        """Generate a review prompt, trimming its context beforehand if it would not fit in the prompt token budget."""
+        with span("render_review_prompt") as attributes:
+            max_tokens = self.config.prompt_token_budget or self.config.ai_input_tokens_limit
+            if max_tokens:
+                plan = prompt_generator.plan_review_prompt(
+                    pr_diff=pr_diff,
+                    context=context,
+                    additional_context=additional_context,
+                    issue_context=issue_context,
+                    max_tokens=max_tokens,
+                )
+                context, additional_context = plan.context, plan.additional_context
+                trimmed_sections.extend(plan.trimmed)
+                attributes["trimmed_sections"] = len(plan.trimmed)
+            review_prompt = prompt_generator.generate_review_prompt(
+                pr_diff=pr_diff,
+                context=context,
+                additional_context=additional_context,
+                issue_context=issue_context,
+            )
+            attributes.update(bytes=len(review_prompt), estimated_tokens=estimate_tokens(review_prompt))
+        return review_prompt
+
+    def _get_review_shards(self, pr_diff: PRDiff, context: PRCodeContext) -> list[ReviewShard]:
+        if not self.config.review_shard_tokens:
+            return []
+        return shard_pr(
+            pr_diff, context, max_tokens=self.config.review_shard_tokens, diff_format=self.config.diff_format
+        )
+
+    async def _run_reviewer_agent(
+        self,
+        review_prompt: str,
+        *,
+        total_usage: RunUsage,
+        usage_limits: UsageLimits,
+        cache_stats: CacheStats,
+        on_comment: CommentCallback | None,
+    ) -> ReviewResponse:
+        deps = ReviewerDeps(
+            configured_technologies=self.config.technologies, configured_categories=self.config.categories
         )
-        initial_usage = raw_res.usage()
+        cache_key = self._get_cache_key("reviewer", deps=deps, user_prompt=review_prompt)
+        with span("reviewer_agent") as attributes:
+            if cached_response := self._get_cached_response(cache_key, cache_stats):
+                logger.info("Initial review found in the LLM response cache")
+                if on_comment:
+                    for comment in cached_response.comments:
+                        on_comment(comment)
+                attributes.update(cached=True, comments=len(cached_response.comments))
+                return cached_response
+
+            streamer = CommentStreamer(on_comment) if on_comment else None
+            with handle_ai_exceptions():
+                raw_res = await self.reviewer_agent.run(
+                    model=self.model,
+                    user_prompt=review_prompt,
+                    deps=deps,
+                    usage=total_usage,
+                    usage_limits=usage_limits,
+                    model_settings=self._get_model_settings("reviewer"),
+                    event_stream_handler=streamer,
+                )
+            output, initial_usage = raw_res.output, raw_res.usage()
+            # Token usage is accumulated for the whole review (or shard), so only the output is recorded here
+            attributes.update(cached=False, comments=len(output.comments))
+        if streamer:
+            streamer.emit_remaining(output.comments)
+        self._cache_response(cache_key, output)
+        logger.info("Initial review completed")
+        logger.debug("Initial review score: %d; Number of comments: %d", output.raw_score, len(output.comments))
         logger.debug(
             f"Initial review usage summary: {initial_usage.requests=} {initial_usage.input_tokens=} {initial_usage.output_tokens=} {initial_usage.total_tokens=}"
         )
-        return raw_res.output
+        return output
 
-    def _summarize_initial_review(
+    async def _summarize_initial_review(
         self,
         pr_diff: PRDiff,
         *,
@@ -190,19 +474,116 @@ class CodeReviewer:
         prompt_generator: PromptGenerator,
         total_usage: RunUsage,
         usage_limits: UsageLimits,
+        cache_stats: CacheStats,
     ) -> tuple[ReviewResponse, RunUsage]:
-        """Summarize the initial review with the summarizing agent."""
+        """Summarize the initial review with the summarizing agent, unless the summarizing policy skips it."""
+        policy = SummarizingPolicy.from_config(self.config)
+        decision = policy.decide(initial_review_response, pr_diff=pr_diff)
+        if not decision.summarize:
+            logger.info("Skipping the summarizing agent: %s", decision.reason)
+            with span("summarizing_agent", skipped=True, reason=decision.reason) as attributes:
+                final_review = policy.finalize(initial_review_response)
+                attributes.update(comments=len(final_review.comments))
+            return final_review, total_usage
+
         logger.info("Summarizing Agent is refining the initial review")
-        summary_prompt = prompt_generator.generate_summarizing_prompt(
-            pr_diff=pr_diff, raw_review=initial_review_response
-        )
-        with handle_ai_exceptions():
-            final_res = self.summarizing_agent.run_sync(
-                model=self.model,
-                user_prompt=summary_prompt,
-                deps=SummarizingDeps(configured_categories=self.config.categories),
-                usage=total_usage,
-                usage_limits=usage_limits,
+        with span("render_summarizing_prompt") as attributes:
+            summary_prompt = prompt_generator.generate_summarizing_prompt(
+                pr_diff=pr_diff, raw_review=initial_review_response
+            )
+            attributes.update(bytes=len(summary_prompt), estimated_tokens=estimate_tokens(summary_prompt))
+        deps = SummarizingDeps(configured_categories=self.config.categories)
+        cache_key = self._get_cache_key("summarizer", deps=deps, user_prompt=summary_prompt)
+        with span("summarizing_agent") as attributes:
+            if cached_response := self._get_cached_response(cache_key, cache_stats):
+                logger.info("Final review found in the LLM response cache")
+                attributes.update(cached=True, comments=len(cached_response.comments))
+                return cached_response, total_usage
+
+            usage_before = _usage_attributes(total_usage)
+            with handle_ai_exceptions():
+                final_res = await self.summarizing_agent.run(
+                    model=self.model,
+                    user_prompt=summary_prompt,
+                    deps=deps,
+                    usage=total_usage,
+                    usage_limits=usage_limits,
+                    model_settings=self._get_model_settings("summarizer"),
+                )
+            usage = final_res.usage()
+            attributes.update(
+                cached=False,
+                comments=len(final_res.output.comments),
+                **{key: value - usage_before[key] for key, value in _usage_attributes(usage).items()},
             )
-        usage = final_res.usage()
+        self._cache_response(cache_key, final_res.output)
         return final_res.output, usage
+
+    def _get_model_settings(self, agent_name: str) -> ModelSettings | None:
+        if not self.config.prompt_caching:
+            return None
+        return get_prompt_caching_settings(self.model, cache_key=f"lgtm-{agent_name}")
+
+    def _get_cache_key(self, agent_name: str, *, deps: object, user_prompt: str) -> str | None:
+        if not self.response_cache:
+            return None
+        return ResponseCache.make_key(
+            agent_name=agent_name,
+            model_name=self.model.model_name,
+            system_prompt_deps=deps,
+            user_prompt=user_prompt,
+            settings={"model_url": self.config.model_url, "retries": self.config.ai_retries},
+        )
+
+    def _get_cached_response(self, cache_key: str | None, cache_stats: CacheStats) -> ReviewResponse | None:
+        if not self.response_cache or not cache_key:
+            return None
+        cached_response = self.response_cache.get(cache_key, ReviewResponse)
+        if cached_response:
+            cache_stats.hits += 1
+        else:
+            cache_stats.misses += 1
+        return cached_response
+
+    def _cache_response(self, cache_key: str | None, response: ReviewResponse) -> None:
+        if self.response_cache and cache_key:
+            self.response_cache.set(cache_key, response)
+
+
+def _relocate_incremental_comments(
+    review_response: ReviewResponse, *, interdiff: PRDiff, pr_diff: PRDiff
+) -> ReviewResponse:
+    """Move the comments of an incremental review from the interdiff they were made on to the full diff of the PR.
+
+    Both diffs end at the head of the PR, so comments on its lines keep their line number, with the relative line
+    number of the full diff. Comments on lines that are not part of the full diff (e.g., lines removed since the last
+    review) are moved to line 0, which matches no line of the diff, so that they are published on their file instead.
+    """
+    interdiff_positions = DiffPositionIndex(interdiff.diff)
+    pr_positions = DiffPositionIndex(pr_diff.diff)
+    comments: list[ReviewComment] = []
+    for comment in review_response.comments:
+        position = None
+        if location := interdiff_positions.locate_comment(comment):
+            comment = location.comment
+            if location.position and location.position.new_line is not None:
+                position = pr_positions.get_position(comment.new_path, location.position.new_line, new_side=True)
+        comments.append(
+            comment.model_copy(
+                update={
+                    "line_number": position.new_line if position else 0,
+                    "relative_line_number": position.relative_line_number if position else 0,
+                    "is_comment_on_new_path": True,
+                }
+            )
+        )
+    return review_response.model_copy(update={"comments": comments})
+
+
+def _usage_attributes(usage: RunUsage) -> dict[str, int]:
+    return {
+        "requests": usage.requests,
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "cache_read_tokens": usage.cache_read_tokens,
+    }
@@ -0,0 +1,105 @@
+import logging
+import pathlib
+from dataclasses import dataclass
+
+from lgtm_ai.ai.schemas import ReviewResponse
+from lgtm_ai.base.schemas import DiffFormat
+from lgtm_ai.base.utils import estimate_tokens
+from lgtm_ai.git.parser import DiffResult
+from lgtm_ai.git_client.schemas import PRDiff
+from lgtm_ai.review.diff_formats import serialize_diff
+from lgtm_ai.review.schemas import PRCodeContext, PRContextFileContents
+
+logger = logging.getLogger("lgtm.ai")
+
+
+@dataclass(frozen=True, slots=True)
+class ReviewShard:
+    """A subset of the files of a PR that can be reviewed independently of the rest."""
+
+    pr_diff: PRDiff
+    context: PRCodeContext
+
+
+@dataclass(slots=True)
+class _FileEntry:
+    diff: DiffResult
+    context: list[PRContextFileContents]
+    tokens: int
+
+
+def shard_pr(
+    pr_diff: PRDiff,
+    context: PRCodeContext,
+    *,
+    max_tokens: int,
+    diff_format: DiffFormat = DiffFormat.json,
+) -> list[ReviewShard]:
+    """Split a PR into shards whose diff and code context fit (approximately) in `max_tokens` tokens.
+
+    Files in the same directory are kept in the same shard whenever possible, so that the reviewer
+    sees related changes together. Files that do not fit in a shard on their own get a shard for themselves.
+    The tokens of the diffs are estimated in the given `diff_format`.
+    """
+    context_by_file: dict[str, list[PRContextFileContents]] = {}
+    for file_context in context.file_contents:
+        context_by_file.setdefault(file_context.file_path, []).append(file_context)
+
+    groups: dict[str, list[_FileEntry]] = {}
+    for diff in pr_diff.diff:
+        path = diff.metadata.new_path
+        diff_context = context_by_file.get(path, [])
+        tokens = estimate_tokens(serialize_diff([diff], diff_format)) + sum(
+            estimate_tokens(c.content) for c in diff_context
+        )
+        groups.setdefault(str(pathlib.PurePosixPath(path).parent), []).append(
+            _FileEntry(diff=diff, context=diff_context, tokens=tokens)
+        )
+
+    shards: list[list[_FileEntry]] = []
+    current: list[_FileEntry] = []
+    current_tokens = 0
+    for directory in sorted(groups):
+        for entry in groups[directory]:
+            if current and current_tokens + entry.tokens > max_tokens:
+                shards.append(current)
+                current, current_tokens = [], 0
+            if entry.tokens > max_tokens:
+                logger.warning(
+                    "File %s (~%d tokens) does not fit in a single review shard of %d tokens",
+                    entry.diff.metadata.new_path,
+                    entry.tokens,
+                    max_tokens,
+                )
+            current.append(entry)
+            current_tokens += entry.tokens
+    if current:
+        shards.append(current)
+
+    return [_build_shard(pr_diff, entries) for entries in shards]
+
+
+def merge_review_responses(responses: list[ReviewResponse]) -> ReviewResponse:
+    """Merge the partial reviews of several shards into a single review.
+
+    Comments are concatenated, summaries are joined and the score is the worst score of all shards.
+    """
+    if len(responses) == 1:
+        return responses[0]
+    return ReviewResponse(
+        summary="\n\n".join(response.summary for response in responses),
+        comments=[comment for response in responses for comment in response.comments],
+        raw_score=min((response.raw_score for response in responses), key=int),
+    )
+
+
+def _build_shard(pr_diff: PRDiff, entries: list[_FileEntry]) -> ReviewShard:
+    return ReviewShard(
+        pr_diff=pr_diff.model_copy(
+            update={
+                "diff": [entry.diff for entry in entries],
+                "changed_files": [entry.diff.metadata.new_path for entry in entries],
+            }
+        ),
+        context=PRCodeContext(file_contents=[c for entry in entries for c in entry.context]),
+    )
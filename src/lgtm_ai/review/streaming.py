@@ -0,0 +1,98 @@
+import json
+import logging
+from collections.abc import AsyncIterable, Callable
+
+from lgtm_ai.ai.schemas import ReviewComment, ReviewerDeps
+from pydantic import ValidationError
+from pydantic_ai import RunContext
+from pydantic_ai.messages import (
+    AgentStreamEvent,
+    ModelResponsePart,
+    ModelResponsePartDelta,
+    PartDeltaEvent,
+    PartStartEvent,
+    TextPart,
+    TextPartDelta,
+    ToolCallPart,
+    ToolCallPartDelta,
+)
+from pydantic_core import from_json
+
+logger = logging.getLogger("lgtm.ai")
+
+type CommentCallback = Callable[[ReviewComment], None]
+"""Callback receiving the comments of the initial review as soon as they are generated."""
+
+
+class CommentStreamer:
+    """Event stream handler for the reviewer agent that passes every review comment to a callback as soon as it is complete.
+
+    The output of the agent is parsed as partial JSON while it is being streamed. The last comment of a partial output
+    may still be incomplete, so comments are only emitted once the next one has started. The comments that are only
+    complete when the output is final must be emitted with `emit_remaining`.
+    """
+
+    def __init__(self, on_comment: CommentCallback) -> None:
+        self.on_comment = on_comment
+        self.emitted: list[ReviewComment] = []
+
+    async def __call__(self, ctx: RunContext[ReviewerDeps], events: AsyncIterable[AgentStreamEvent]) -> None:
+        raw_parts: dict[int, str] = {}
+        async for event in events:
+            if isinstance(event, PartStartEvent):
+                raw_parts[event.index] = _get_raw_part(event.part)
+            elif isinstance(event, PartDeltaEvent):
+                raw_parts[event.index] = raw_parts.get(event.index, "") + _get_raw_delta(event.delta)
+            else:
+                continue
+            self._emit_complete_comments(raw_parts[event.index])
+
+    def emit_remaining(self, comments: list[ReviewComment]) -> None:
+        """Emit the comments of the final output that have not been emitted while streaming."""
+        self._emit_new(comments)
+
+    def _emit_complete_comments(self, raw_output: str) -> None:
+        try:
+            output = from_json(raw_output, allow_partial=True)
+        except ValueError:
+            return
+        if not isinstance(output, dict) or not isinstance(raw_comments := output.get("comments"), list):
+            return
+
+        complete_comments = []
+        for raw_comment in raw_comments[:-1]:
+            try:
+                complete_comments.append(ReviewComment.model_validate(raw_comment))
+            except ValidationError:
+                logger.debug("Ignoring invalid streamed comment, it will be emitted if the final output is valid")
+
+        self._emit_new(complete_comments)
+
+    def _emit_new(self, comments: list[ReviewComment]) -> None:
+        # Partial outputs are parsed again on every delta, and the model may retry its output,
+        # so comments that have already been emitted are skipped
+        already_emitted = list(self.emitted)
+        for comment in comments:
+            if comment in already_emitted:
+                already_emitted.remove(comment)
+            else:
+                self.emitted.append(comment)
+                self.on_comment(comment)
+
+
+def _get_raw_part(part: ModelResponsePart) -> str:
+    if isinstance(part, ToolCallPart):
+        return part.args_as_json_str() if part.args else ""
+    if isinstance(part, TextPart):
+        return part.content
+    return ""
+
+
+def _get_raw_delta(delta: ModelResponsePartDelta) -> str:
+    if isinstance(delta, ToolCallPartDelta):
+        if isinstance(delta.args_delta, dict):
+            return json.dumps(delta.args_delta)
+        return delta.args_delta or ""
+    if isinstance(delta, TextPartDelta):
+        return delta.content_delta
+    return ""
@@ -0,0 +1,76 @@
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Self
+
+from lgtm_ai.ai.schemas import CommentCategory, ReviewResponse
+from lgtm_ai.base.schemas import DiffFormat, SummarizingMode
+from lgtm_ai.base.utils import estimate_tokens
+from lgtm_ai.config.handler import ResolvedConfig
+from lgtm_ai.git_client.schemas import PRDiff
+from lgtm_ai.review.diff_formats import serialize_diff
+
+
+@dataclass(frozen=True, slots=True)
+class SummarizingDecision:
+    """Whether the summarizing agent must refine the initial review, and why."""
+
+    summarize: bool
+    reason: str
+
+
+@dataclass(frozen=True, slots=True)
+class SummarizingPolicy:
+    """Decides whether the initial review is worth a second round trip to the summarizing agent.
+
+    With the `auto` mode, the summarizing agent is skipped when the initial review has no comments, or when it has
+    few comments (at most `max_comments`), all of them in the configured categories, on a small PR (a diff of at
+    most `max_tokens` estimated tokens). Noisy reviews (with comments in categories that were not asked for) and
+    reviews of large PRs are always summarized.
+    """
+
+    mode: SummarizingMode
+    categories: Sequence[CommentCategory]
+    max_comments: int
+    max_tokens: int
+    diff_format: DiffFormat = DiffFormat.json
+
+    @classmethod
+    def from_config(cls, config: ResolvedConfig) -> Self:
+        return cls(
+            mode=config.summarizing_mode,
+            categories=config.categories,
+            max_comments=config.summarizing_skip_max_comments,
+            max_tokens=config.summarizing_skip_max_tokens,
+            diff_format=config.diff_format,
+        )
+
+    def decide(self, initial_review: ReviewResponse, *, pr_diff: PRDiff) -> SummarizingDecision:
+        """Decide whether to summarize the initial review of the given PR diff."""
+        if self.mode == SummarizingMode.always:
+            return SummarizingDecision(summarize=True, reason="summarizing mode is always")
+        if self.mode == SummarizingMode.never:
+            return SummarizingDecision(summarize=False, reason="summarizing mode is never")
+
+        comments = initial_review.comments
+        if not comments:
+            return SummarizingDecision(summarize=False, reason="the initial review has no comments")
+        if any(comment.category not in self.categories for comment in comments):
+            return SummarizingDecision(summarize=True, reason="some comments are not in the configured categories")
+        if len(comments) > self.max_comments:
+            return SummarizingDecision(summarize=True, reason=f"the initial review has {len(comments)} comments")
+        # Serializing the diff is the most expensive check, so it is done last
+        diff_tokens = estimate_tokens(serialize_diff(pr_diff.diff, self.diff_format))
+        if diff_tokens > self.max_tokens:
+            return SummarizingDecision(summarize=True, reason=f"the diff has ~{diff_tokens} tokens")
+        return SummarizingDecision(summarize=False, reason=f"the initial review has only {len(comments)} comments")
+
+    def finalize(self, initial_review: ReviewResponse) -> ReviewResponse:
+        """Turn the initial review into the final one without the summarizing agent.
+
+        Comments outside the configured categories are dropped, and the rest are sorted by severity.
+        """
+        return ReviewResponse(
+            summary=initial_review.summary,
+            comments=[comment for comment in initial_review.comments if comment.category in self.categories],
+            raw_score=initial_review.raw_score,
+        )
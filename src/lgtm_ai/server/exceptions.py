@@ -0,0 +1,21 @@
+from http import HTTPStatus
+
+
+class WebhookError(Exception):
+    """Error handling a webhook request. It is answered with `status`."""
+
+    status: HTTPStatus = HTTPStatus.BAD_REQUEST
+
+    def __init__(self, message: str = "Invalid webhook request.") -> None:
+        super().__init__(message)
+
+
+class InvalidWebhookError(WebhookError):
+    status = HTTPStatus.BAD_REQUEST
+
+
+class UnauthorizedWebhookError(WebhookError):
+    status = HTTPStatus.UNAUTHORIZED
+
+    def __init__(self, message: str = "The webhook secret is missing or invalid.") -> None:
+        super().__init__(message)
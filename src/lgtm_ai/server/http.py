@@ -0,0 +1,91 @@
+import asyncio
+import json
+import logging
+from http import HTTPStatus
+from typing import Final
+
+from lgtm_ai.server.exceptions import WebhookError
+from lgtm_ai.server.scheduler import ReviewScheduler
+from lgtm_ai.server.webhooks import parse_webhook
+
+logger = logging.getLogger("lgtm.server")
+
+MAX_BODY_SIZE: Final[int] = 25 * 1024 * 1024
+"""Maximum size of webhook payloads (GitHub caps them at 25 MiB)."""
+
+MAX_HEADER_LINES: Final[int] = 100
+REQUEST_TIMEOUT: Final[float] = 30
+
+
+class WebhookServer:
+    """Minimal HTTP server that receives PR webhooks and submits review jobs to a `ReviewScheduler`.
+
+    It answers `POST` requests to any path as webhooks and `GET /health` as a health check. Every connection
+    serves a single request. Webhooks are answered as soon as the job is queued, without waiting for the review.
+    """
+
+    def __init__(self, scheduler: ReviewScheduler, *, secret: str | None = None) -> None:
+        self.scheduler = scheduler
+        self.secret = secret
+
+    async def start(self, host: str, port: int) -> asyncio.Server:
+        """Start listening on the given host and port (0 for a random free port)."""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        for socket in server.sockets:
+            logger.info("Listening for webhooks on %s", socket.getsockname())
+        return server
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            status, response = await asyncio.wait_for(self._handle_request(reader), REQUEST_TIMEOUT)
+        except (TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            status, response = HTTPStatus.BAD_REQUEST, {"error": "Malformed HTTP request."}
+
+        body = json.dumps(response).encode()
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode()
+            + body
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader: asyncio.StreamReader) -> tuple[HTTPStatus, dict[str, str]]:
+        method, path, _ = (await reader.readuntil(b"\r\n")).decode("latin-1").split(" ", 2)
+        headers = await _read_headers(reader)
+
+        if method == "GET" and path == "/health":
+            return HTTPStatus.OK, {"status": "ok"}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"Method {method} not allowed."}
+
+        content_length = int(headers.get("content-length", "0"))
+        if content_length > MAX_BODY_SIZE:
+            return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Payload too large."}
+        body = await reader.readexactly(content_length)
+
+        try:
+            job = parse_webhook(headers, body, secret=self.secret)
+        except WebhookError as err:
+            logger.warning("Rejecting webhook request: %s", err)
+            return err.status, {"error": str(err)}
+
+        if not job:
+            return HTTPStatus.OK, {"status": "ignored"}
+        self.scheduler.submit(job)
+        return HTTPStatus.ACCEPTED, {"status": "queued"}
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> dict[str, str]:
+    headers: dict[str, str] = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = (await reader.readuntil(b"\r\n")).decode("latin-1").strip()
+        if not line:
+            return headers
+        name, value = line.split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+    raise ValueError("Too many headers")
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from collections.abc import Callable, Coroutine
+from types import TracebackType
+from typing import Any, Self
+
+from lgtm_ai.server.webhooks import ReviewJob
+
+logger = logging.getLogger("lgtm.server")
+
+type ReviewFunction = Callable[[ReviewJob], Coroutine[Any, Any, object]]
+
+
+class ReviewScheduler:
+    """Queue of review jobs processed by a pool of async workers.
+
+    Jobs are keyed by PR. Submitting a job for a PR that is already waiting in the queue replaces the queued job
+    (so many pushes to the same PR result in a single review of its latest head), and submitting a job for a PR
+    whose review of another head commit is in progress cancels that review, as it is outdated.
+
+    Use it as an async context manager: workers are started on enter, and stopped (cancelling the reviews
+    in progress) on exit.
+    """
+
+    def __init__(self, review: ReviewFunction, *, workers: int) -> None:
+        self.review = review
+        self.workers = workers
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._pending: dict[str, ReviewJob] = {}
+        self._running: dict[str, tuple[ReviewJob, asyncio.Task[object]]] = {}
+        self._worker_tasks: list[asyncio.Task[None]] = []
+
+    async def __aenter__(self) -> Self:
+        self._worker_tasks = [asyncio.create_task(self._work(), name=f"lgtm-worker-{i}") for i in range(self.workers)]
+        return self
+
+    async def __aexit__(
+        self, exc_type: type[BaseException] | None, exc: BaseException | None, traceback: TracebackType | None
+    ) -> None:
+        tasks = [*self._worker_tasks, *(task for _, task in self._running.values())]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def submit(self, job: ReviewJob) -> None:
+        """Queue a review job, coalescing it with the queued job of the same PR and cancelling outdated reviews."""
+        key = job.target.full_url
+        running = self._running.get(key)
+        if running and running[0].head_sha != job.head_sha:
+            logger.info("Cancelling review of %s at %s, new commits were pushed", key, running[0].head_sha)
+            running[1].cancel()
+        elif running and key not in self._pending:
+            logger.info("Ignoring review job of %s at %s, it is already being reviewed", key, job.head_sha)
+            return
+
+        if key in self._pending:
+            logger.info("Coalescing review jobs of %s, only %s will be reviewed", key, job.head_sha)
+            self._pending[key] = job
+            return
+
+        logger.info("Queueing review of %s at %s", key, job.head_sha)
+        self._pending[key] = job
+        self._queue.put_nowait(key)
+
+    async def join(self) -> None:
+        """Wait until all the submitted jobs have been processed."""
+        await self._queue.join()
+
+    async def _work(self) -> None:
+        while True:
+            key = await self._queue.get()
+            try:
+                await self._process(key)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, key: str) -> None:
+        if previous := self._running.get(key):
+            # A cancelled review of this PR may still be winding down
+            await asyncio.wait({previous[1]})
+
+        job = self._pending.pop(key)
+        task = asyncio.create_task(self.review(job))
+        self._running[key] = (job, task)
+        try:
+            await asyncio.wait({task})
+        finally:
+            # Another worker may already be reviewing a newer head of this PR
+            if (running := self._running.get(key)) and running[1] is task:
+                del self._running[key]
+
+        if task.cancelled():
+            logger.info("Review of %s at %s was cancelled", key, job.head_sha)
+        elif err := task.exception():
+            logger.error("Review of %s at %s failed: %s", key, job.head_sha, err)
+        else:
+            logger.info("Review of %s at %s completed", key, job.head_sha)
@@ -0,0 +1,124 @@
+import hashlib
+import hmac
+import json
+import logging
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Final
+from urllib.parse import urlparse
+
+from lgtm_ai.base.schemas import PRSource, PRUrl
+from lgtm_ai.server.exceptions import InvalidWebhookError, UnauthorizedWebhookError
+
+logger = logging.getLogger("lgtm.server")
+
+GITHUB_REVIEWABLE_ACTIONS: Final[frozenset[str]] = frozenset({"opened", "reopened", "synchronize", "ready_for_review"})
+GITLAB_REVIEWABLE_ACTIONS: Final[frozenset[str]] = frozenset({"open", "reopen", "update"})
+
+
+@dataclass(frozen=True, slots=True)
+class ReviewJob:
+    """Request to review a PR at a given head commit."""
+
+    target: PRUrl
+    head_sha: str
+
+
+def parse_webhook(headers: Mapping[str, str], body: bytes, *, secret: str | None) -> ReviewJob | None:
+    """Parse a GitHub or GitLab webhook request into a review job.
+
+    `headers` must have lowercase names. Returns None for events that do not require a review
+    (other event types, closed or draft PRs, updates without new commits...).
+
+    If `secret` is given, requests must be signed with it (GitHub) or include it as token (GitLab).
+    """
+    if "x-github-event" in headers:
+        _verify_github_signature(headers, body, secret)
+        return _parse_github_event(headers["x-github-event"], _load_payload(body))
+    if "x-gitlab-event" in headers:
+        _verify_gitlab_token(headers, secret)
+        return _parse_gitlab_event(headers["x-gitlab-event"], _load_payload(body))
+    raise InvalidWebhookError("Unsupported webhook, only GitHub and GitLab webhooks are supported.")
+
+
+def _verify_github_signature(headers: Mapping[str, str], body: bytes, secret: str | None) -> None:
+    if not secret:
+        return
+    expected = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(headers.get("x-hub-signature-256", ""), expected):
+        raise UnauthorizedWebhookError
+
+
+def _verify_gitlab_token(headers: Mapping[str, str], secret: str | None) -> None:
+    if secret and not hmac.compare_digest(headers.get("x-gitlab-token", ""), secret):
+        raise UnauthorizedWebhookError
+
+
+def _load_payload(body: bytes) -> dict[str, Any]:
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise InvalidWebhookError("The webhook payload is not valid JSON.") from None
+    if not isinstance(payload, dict):
+        raise InvalidWebhookError("The webhook payload must be a JSON object.")
+    return payload
+
+
+def _parse_github_event(event: str, payload: dict[str, Any]) -> ReviewJob | None:
+    if event != "pull_request" or payload.get("action") not in GITHUB_REVIEWABLE_ACTIONS:
+        logger.debug("Ignoring GitHub %s event with action %s", event, payload.get("action"))
+        return None
+
+    try:
+        pull_request = payload["pull_request"]
+        if pull_request.get("draft"):
+            logger.debug("Ignoring GitHub event of draft PR %s", pull_request["html_url"])
+            return None
+        url = pull_request["html_url"]
+        return ReviewJob(
+            target=PRUrl(
+                full_url=url,
+                base_url=_get_base_url(url),
+                repo_path=payload["repository"]["full_name"],
+                pr_number=int(pull_request["number"]),
+                source=PRSource.github,
+            ),
+            head_sha=pull_request["head"]["sha"],
+        )
+    except (KeyError, TypeError, ValueError) as err:
+        raise InvalidWebhookError(f"Invalid GitHub pull_request payload: {err!r}") from None
+
+
+def _parse_gitlab_event(event: str, payload: dict[str, Any]) -> ReviewJob | None:
+    attributes = payload.get("object_attributes") or {}
+    action = attributes.get("action")
+    if event != "Merge Request Hook" or action not in GITLAB_REVIEWABLE_ACTIONS:
+        logger.debug("Ignoring GitLab %s event with action %s", event, action)
+        return None
+    if action == "update" and "oldrev" not in attributes:
+        # Updates of the title, labels, etc. do not push new commits
+        logger.debug("Ignoring GitLab update event without new commits")
+        return None
+
+    try:
+        if attributes.get("draft") or attributes.get("work_in_progress"):
+            logger.debug("Ignoring GitLab event of draft MR %s", attributes["url"])
+            return None
+        url = attributes["url"]
+        return ReviewJob(
+            target=PRUrl(
+                full_url=url,
+                base_url=_get_base_url(url),
+                repo_path=payload["project"]["path_with_namespace"],
+                pr_number=int(attributes["iid"]),
+                source=PRSource.gitlab,
+            ),
+            head_sha=attributes["last_commit"]["id"],
+        )
+    except (KeyError, TypeError, ValueError) as err:
+        raise InvalidWebhookError(f"Invalid GitLab Merge Request Hook payload: {err!r}") from None
+
+
+def _get_base_url(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
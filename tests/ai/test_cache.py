@@ -0,0 +1,83 @@
+import os
+import pathlib
+import time
+from unittest import mock
+
+from lgtm_ai.ai.cache import ResponseCache
+from lgtm_ai.ai.schemas import GuideResponse, ReviewResponse
+
+
+def _get_key(user_prompt: str = "prompt", **kwargs: object) -> str:
+    params: dict[str, object] = {
+        "agent_name": "reviewer",
+        "model_name": "gpt-4.1",
+        "system_prompt_deps": None,
+        "user_prompt": user_prompt,
+        "settings": {},
+    } | kwargs
+    return ResponseCache.make_key(**params)  # type: ignore[arg-type]
+
+
+def test_cache_key_depends_on_all_inputs() -> None:
+    keys = {
+        _get_key(),
+        _get_key(user_prompt="another prompt"),
+        _get_key(agent_name="summarizer"),
+        _get_key(model_name="gpt-4o"),
+        _get_key(system_prompt_deps=("python",)),
+        _get_key(settings={"retries": 3}),
+    }
+
+    assert len(keys) == 6
+    assert _get_key() == _get_key()
+    with mock.patch("lgtm_ai.ai.cache.LGTM_VERSION", "0.0.0"):
+        assert _get_key() not in keys
+
+
+def test_get_and_set(tmp_path: pathlib.Path) -> None:
+    cache = ResponseCache(tmp_path / "cache", max_size=1024 * 1024, ttl=60)
+    response = ReviewResponse(summary="summary", raw_score=4)
+
+    assert cache.get(_get_key(), ReviewResponse) is None
+    cache.set(_get_key(), response)
+
+    assert cache.get(_get_key(), ReviewResponse) == response
+    assert cache.get(_get_key(user_prompt="another prompt"), ReviewResponse) is None
+
+
+def test_expired_entries_are_ignored(tmp_path: pathlib.Path) -> None:
+    cache = ResponseCache(tmp_path, max_size=1024 * 1024, ttl=60)
+    cache.set(_get_key(), ReviewResponse(summary="summary", raw_score=4))
+
+    with mock.patch("lgtm_ai.ai.cache.time.time", return_value=time.time() + 61):
+        assert cache.get(_get_key(), ReviewResponse) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_invalid_entries_are_ignored(tmp_path: pathlib.Path) -> None:
+    cache = ResponseCache(tmp_path, max_size=1024 * 1024, ttl=60)
+    (tmp_path / f"{_get_key('corrupt')}.json").write_text("{not json")
+    cache.set(_get_key("review"), ReviewResponse(summary="summary", raw_score=4))
+
+    assert cache.get(_get_key("corrupt"), ReviewResponse) is None
+    assert cache.get(_get_key("review"), GuideResponse) is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path: pathlib.Path) -> None:
+    response = ReviewResponse(summary="summary", raw_score=4)
+    cache = ResponseCache(tmp_path, max_size=1024 * 1024, ttl=60)
+    cache.set(_get_key("first"), response)
+    entry_size = (tmp_path / f"{_get_key('first')}.json").stat().st_size
+    cache.max_size = 2 * entry_size + entry_size // 2  # Room for two entries
+
+    cache.set(_get_key("second"), response)
+    now = time.time()
+    os.utime(tmp_path / f"{_get_key('first')}.json", (now - 20, now - 20))
+    os.utime(tmp_path / f"{_get_key('second')}.json", (now - 10, now - 10))
+    # Reading the first entry makes it the most recently used one
+    assert cache.get(_get_key("first"), ReviewResponse) == response
+    cache.set(_get_key("third"), response)
+
+    assert cache.get(_get_key("first"), ReviewResponse) == response
+    assert cache.get(_get_key("second"), ReviewResponse) is None
+    assert cache.get(_get_key("third"), ReviewResponse) == response
@@ -2,7 +2,7 @@ from contextlib import nullcontext as does_not_raise
 from typing import Any
 
 import pytest
-from lgtm_ai.ai.agent import get_ai_model
+from lgtm_ai.ai.agent import get_ai_model, get_prompt_caching_settings
 from lgtm_ai.ai.exceptions import (
     InvalidGeminiWildcard,
     InvalidModelWildCard,
@@ -39,6 +39,24 @@ def test_get_ai_model(model: str, model_url: str | None, ai_api_key: str, expect
         assert ai_model.model_name == model
 
 
+@pytest.mark.parametrize(
+    ("model", "model_url", "expected"),
+    [
+        ("claude-sonnet-4-0", None, {"anthropic_cache_instructions": True, "anthropic_cache_messages": True}),
+        ("gpt-4.1", None, {"openai_prompt_cache_key": "lgtm-reviewer"}),
+        # Custom OpenAI-compatible endpoints may not support the cache key
+        ("gpt-4.1", "http://localhost:1234", {}),
+        # These providers cache prompts automatically
+        ("gemini-2.5-flash", None, {}),
+        ("deepseek-chat", None, {}),
+    ],
+)
+def test_get_prompt_caching_settings(model: str, model_url: str | None, expected: dict[str, object]) -> None:
+    ai_model = get_ai_model(model, "fake_api_key", model_url=model_url)
+
+    assert get_prompt_caching_settings(ai_model, cache_key="lgtm-reviewer") == expected
+
+
 @pytest.mark.parametrize(
     ("model", "expected_model_name", "expectation"),
     [
@@ -0,0 +1,68 @@
+import asyncio
+import datetime
+from unittest import mock
+
+import pytest
+from lgtm_ai.base.tracing import (
+    OpenTelemetrySpanExporter,
+    StageSpan,
+    add_span_exporter,
+    collect_spans,
+    remove_span_exporter,
+    span,
+)
+
+
+def test_spans_are_collected() -> None:
+    async def stage(name: str) -> None:
+        with span(name):
+            await asyncio.to_thread(lambda: None)
+
+    async def run() -> None:
+        await asyncio.gather(stage("first"), stage("second"))
+
+    with collect_spans() as spans, span("outer", files=2) as attributes:
+        asyncio.run(run())
+        attributes["bytes"] = 10
+    with span("not-collected"):
+        pass
+
+    assert [s.name for s in spans] == ["first", "second", "outer"]
+    assert spans[-1].attributes == {"files": 2, "bytes": 10}
+    assert all(s.duration_ms >= 0 for s in spans)
+
+
+def test_errors_are_recorded() -> None:
+    with collect_spans() as spans, pytest.raises(ValueError, match="boom"), span("failing"):
+        raise ValueError("boom")
+
+    assert spans[0].attributes == {"error": "ValueError"}
+
+
+def test_spans_are_exported() -> None:
+    exporter = mock.Mock()
+    failing_exporter = mock.Mock(export=mock.Mock(side_effect=RuntimeError))
+    add_span_exporter(failing_exporter)
+    add_span_exporter(exporter)
+    try:
+        with span("stage", comments=1):
+            pass
+    finally:
+        remove_span_exporter(failing_exporter)
+        remove_span_exporter(exporter)
+
+    exported = exporter.export.call_args.args[0]
+    assert (exported.name, exported.attributes) == ("stage", {"comments": 1})
+
+
+def test_opentelemetry_exporter() -> None:
+    started_at = datetime.datetime(2025, 1, 1, tzinfo=datetime.UTC)
+    with mock.patch("lgtm_ai.base.tracing.trace.get_tracer") as m_get_tracer:
+        OpenTelemetrySpanExporter().export(
+            StageSpan(name="review", started_at=started_at, duration_ms=1.5, attributes={"files": 3})
+        )
+
+    start_time = int(started_at.timestamp() * 1e9)
+    m_tracer = m_get_tracer.return_value
+    m_tracer.start_span.assert_called_once_with("lgtm.review", start_time=start_time, attributes={"lgtm.files": 3})
+    m_tracer.start_span.return_value.end.assert_called_once_with(end_time=start_time + 1_500_000)
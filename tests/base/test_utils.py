@@ -1,5 +1,5 @@
 import pytest
-from lgtm_ai.base.utils import file_matches_any_pattern
+from lgtm_ai.base.utils import compile_file_patterns, file_matches_any_pattern
 
 
 @pytest.mark.parametrize(
@@ -21,3 +21,15 @@ from lgtm_ai.base.utils import file_matches_any_pattern
 )
 def test_file_matches_any_pattern(file_name: str, patterns: tuple[str, ...], expected_match: bool) -> None:
     assert file_matches_any_pattern(file_name, patterns) == expected_match
+
+
+def test_compile_file_patterns_is_cached() -> None:
+    matches = compile_file_patterns(("*.lock", "vendor/*"))
+
+    assert compile_file_patterns(("*.lock", "vendor/*")) is matches
+    assert [matches(path) for path in ("poetry.lock", "a/b/uv.lock", "vendor/x/y.js", "src/vendor.py")] == [
+        True,
+        True,
+        True,
+        False,
+    ]
@@ -8,6 +8,7 @@ from lgtm_ai.ai.schemas import (
     GuideResponse,
     PublishMetadata,
     Review,
+    ReviewComment,
     ReviewGuide,
     ReviewResponse,
 )
@@ -44,8 +45,8 @@ class TestJsonFormatter:
                 "model_name": "whatever",
                 "usage": {
                     "input_tokens": 200,
-                    "cache_write_tokens": 1,
-                    "cache_read_tokens": 1,
+                    "cache_write_tokens": 0,
+                    "cache_read_tokens": 0,
                     "output_tokens": 100,
                     "input_audio_tokens": 1,
                     "cache_audio_read_tokens": 1,
@@ -57,6 +58,24 @@ class TestJsonFormatter:
             },
         }
 
+    def test_format_comment_as_json_lines(self) -> None:
+        comment = ReviewComment(
+            old_path="file1",
+            new_path="file1",
+            comment="comment",
+            category="Correctness",
+            severity="HIGH",
+            line_number=1,
+            relative_line_number=1,
+            is_comment_on_new_path=True,
+            programming_language="python",
+        )
+
+        output = JsonFormatter(indent=None).format_review_comment(comment)
+
+        assert "\n" not in output
+        assert ReviewComment.model_validate_json(output) == comment
+
     def test_format_guide(self) -> None:
         guide = ReviewGuide(
             pr_diff=PRDiff(
@@ -104,8 +123,8 @@ class TestJsonFormatter:
                 "model_name": "whatever",
                 "usage": {
                     "input_tokens": 200,
-                    "cache_write_tokens": 1,
-                    "cache_read_tokens": 1,
+                    "cache_write_tokens": 0,
+                    "cache_read_tokens": 0,
                     "output_tokens": 100,
                     "input_audio_tokens": 1,
                     "cache_audio_read_tokens": 1,
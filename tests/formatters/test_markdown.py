@@ -14,9 +14,11 @@ from lgtm_ai.ai.schemas import (
     ReviewComment,
     ReviewGuide,
     ReviewResponse,
+    TrimmedSection,
 )
 from lgtm_ai.config.handler import ResolvedConfig
 from lgtm_ai.formatters.markdown import MarkDownFormatter
+from lgtm_ai.git_client.base import find_reviewed_sha
 from lgtm_ai.git_client.schemas import PRDiff
 from tests.review.utils import MOCK_USAGE
 
@@ -32,6 +34,11 @@ class TestMarkdownFormatter:
                 created_at="2025-05-15T09:43:01.654374+00:00",
                 usage=MOCK_USAGE,
                 config=None,
+                trimmed_sections=[],
+                head_sha=None,
+                reviewed_since_sha=None,
+                cache=None,
+                git_rate_limit=None,
                 spec=PublishMetadata,
             ),
             review_response=ReviewResponse(
@@ -76,6 +83,69 @@ class TestMarkdownFormatter:
             "",
         ]
 
+    def test_format_summary_section_with_trimmed_context(self) -> None:
+        review = Review(
+            metadata=mock.Mock(
+                uuid="fb64cb958fcf49219545912156e0a4a0",
+                model_name="whatever",
+                created_at="2025-05-15T09:43:01.654374+00:00",
+                usage=MOCK_USAGE,
+                config=None,
+                trimmed_sections=[
+                    TrimmedSection(
+                        section="context", name="foo.py", action="truncated", original_tokens=12000, final_tokens=3000
+                    ),
+                    TrimmedSection(
+                        section="additional_context",
+                        name="guidelines",
+                        action="dropped",
+                        original_tokens=500,
+                        final_tokens=0,
+                    ),
+                ],
+                head_sha=None,
+                reviewed_since_sha=None,
+                cache=None,
+                git_rate_limit=None,
+                spec=PublishMetadata,
+            ),
+            review_response=ReviewResponse(raw_score=5, summary="summary"),
+            pr_diff=mock.Mock(spec=PRDiff),
+        )
+        lines = self.formatter.format_review_summary_section(review).split("\n")
+
+        assert "<details><summary>Trimmed context</summary>" in lines
+        assert "- **foo.py** (context): truncated, `12,000` → `3,000` tokens" in lines
+        assert "- **guidelines** (additional_context): dropped, `500` → `0` tokens" in lines
+
+    def test_format_summary_section_records_reviewed_commit(self) -> None:
+        review = Review(
+            metadata=mock.Mock(
+                uuid="fb64cb958fcf49219545912156e0a4a0",
+                model_name="whatever",
+                created_at="2025-05-15T09:43:01.654374+00:00",
+                usage=MOCK_USAGE,
+                config=None,
+                trimmed_sections=[],
+                head_sha="abc123",
+                reviewed_since_sha="def456",
+                cache=None,
+                git_rate_limit=None,
+                spec=PublishMetadata,
+            ),
+            review_response=ReviewResponse(raw_score=5, summary="summary"),
+            pr_diff=mock.Mock(spec=PRDiff),
+        )
+        summary = self.formatter.format_review_summary_section(review)
+
+        lines = summary.split("\n")
+        created_at = lines.index("- **Created at**: `2025-05-15T09:43:01.654374+00:00`")
+        assert lines[created_at + 1 : created_at + 3] == [
+            "- **Reviewed commit**: `abc123` (changes since `def456`)",
+            "<!-- lgtm-reviewed-sha: abc123 -->",
+        ]
+        assert find_reviewed_sha([summary]) == "abc123"
+
     def test_format_comments_section_empty_comments(self) -> None:
         review = Review(
             review_response=ReviewResponse(
@@ -372,6 +442,11 @@ class TestMarkdownFormatter:
                 created_at="2025-05-15T09:43:01.654374+00:00",
                 usage=MOCK_USAGE,
                 config=None,
+                trimmed_sections=[],
+                head_sha=None,
+                reviewed_since_sha=None,
+                cache=None,
+                git_rate_limit=None,
                 spec=PublishMetadata,
             ),
         )
@@ -449,6 +524,11 @@ class TestMarkdownFormatter:
                 created_at="2025-05-15T09:43:01.654374+00:00",
                 usage=MOCK_USAGE,
                 config=config.model_dump(),
+                trimmed_sections=[],
+                head_sha=None,
+                reviewed_since_sha=None,
+                cache=None,
+                git_rate_limit=None,
                 spec=PublishMetadata,
             ),
             review_response=ReviewResponse(
@@ -491,6 +571,40 @@ class TestMarkdownFormatter:
             "",
             "- **ai_input_tokens_limit**: `500000`",
             "",
+            "- **prompt_token_budget**: `None`",
+            "",
+            "- **context_workers**: `8`",
+            "",
+            "- **context_workers_per_host**: `8`",
+            "",
+            "- **context_mode**: `file`",
+            "",
+            "- **context_window_lines**: `20`",
+            "",
+            "- **context_archive**: `False`",
+            "",
+            "- **diff_format**: `json`",
+            "",
+            "- **summarizing_diff**: `full`",
+            "",
+            "- **summarizing_mode**: `always`",
+            "",
+            "- **summarizing_skip_max_comments**: `2`",
+            "",
+            "- **summarizing_skip_max_tokens**: `8000`",
+            "",
+            "- **diff_max_lines_per_file**: `20000`",
+            "",
+            "- **diff_max_bytes_per_file**: `1048576`",
+            "",
+            "- **review_shard_tokens**: `None`",
+            "",
+            "- **review_shard_concurrency**: `4`",
+            "",
+            "- **batch_concurrency**: `4`",
+            "",
+            "- **server_workers**: `4`",
+            "",
             "- **issues_url**: `https://your-repo.com/issues`",
             "",
             "- **issues_regex**: `ISSUE-\\d+`",
@@ -499,6 +613,28 @@ class TestMarkdownFormatter:
             "",
             "- **compare**: `HEAD`",
             "",
+            "- **incremental**: `False`",
+            "",
+            "- **stream**: `False`",
+            "",
+            "- **cache_dir**: `None`",
+            "",
+            "- **cache_max_size**: `268435456`",
+            "",
+            "- **cache_ttl**: `604800`",
+            "",
+            "- **http_cache_dir**: `None`",
+            "",
+            "- **http_cache_max_size**: `268435456`",
+            "",
+            "- **git_requests_per_second**: `None`",
+            "",
+            "- **git_max_retries**: `3`",
+            "",
+            "- **prompt_caching**: `True`",
+            "",
+            "- **opentelemetry**: `False`",
+            "",
             "",
             "</details>",
             "",
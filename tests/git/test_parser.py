@@ -1,6 +1,14 @@
 import pytest
 from lgtm_ai.git.exceptions import GitDiffParseError
-from lgtm_ai.git.parser import DiffResult, parse_diff_patch
+from lgtm_ai.git.parser import (
+    DiffFileMetadata,
+    DiffLimits,
+    DiffResult,
+    ModifiedLine,
+    ModifiedLines,
+    iter_unified_diff,
+    parse_diff_patch,
+)
 from tests.git.fixtures import (
     COMPLEX_DIFF_TEXT,
     DUMMY_METADATA,
@@ -88,3 +96,145 @@ def test_parse_diff_hunk_starts_set_correctly() -> None:
         assert line.hunk_start_new == expected_new, (
             f"Expected hunk_start_new {expected_new}, got {line.hunk_start_new} for line: {content}"
         )
+
+
+@pytest.mark.parametrize(
+    "parsed",
+    [
+        pytest.param(PARSED_SIMPLE_DIFF, id="simple"),
+        pytest.param(PARSED_REFACTOR_DIFF, id="refactor"),
+        pytest.param(PARSED_GIT_SHOW, id="git-show"),
+    ],
+)
+def test_modified_lines_are_serialized_as_list_of_models(parsed: DiffResult) -> None:
+    models = list(parsed.modified_lines)
+    assert all(isinstance(line, ModifiedLine) for line in models)
+
+    dumped = parsed.model_dump()
+    assert dumped["modified_lines"] == [line.model_dump() for line in models]
+    assert parsed.model_dump(exclude_none=True)["modified_lines"] == [
+        line.model_dump(exclude_none=True) for line in models
+    ]
+    assert DiffResult.model_validate(dumped) == parsed
+    assert DiffResult.model_validate_json(parsed.model_dump_json()) == parsed
+
+
+def test_modified_lines_sequence() -> None:
+    lines = [
+        ModifiedLine(line="a", line_number=1, relative_line_number=1, modification_type="removed"),
+        ModifiedLine(
+            line="b",
+            line_number=1,
+            relative_line_number=2,
+            modification_type="added",
+            hunk_start_new=1,
+            hunk_start_old=1,
+        ),
+        ModifiedLine(
+            line="c",
+            line_number=8,
+            relative_line_number=5,
+            modification_type="added",
+            hunk_start_new=7,
+            hunk_start_old=6,
+        ),
+    ]
+    modified_lines = ModifiedLines(lines)
+
+    assert len(modified_lines) == 3
+    assert modified_lines[-1] == lines[-1]
+    assert modified_lines[1:] == lines[1:]
+    assert modified_lines == lines
+    assert modified_lines != ModifiedLines(lines[:2])
+    assert modified_lines.text_length() == 3
+    with pytest.raises(IndexError):
+        modified_lines[3]
+
+
+@pytest.mark.parametrize(
+    ("limits", "expected_lines"),
+    [
+        pytest.param(DiffLimits(), 6, id="no-limits"),
+        pytest.param(DiffLimits(max_lines=4), 4, id="max-lines"),
+        pytest.param(DiffLimits(max_bytes=len("line 0line 1line 2")), 3, id="max-bytes"),
+    ],
+)
+def test_parse_diff_patch_limits(limits: DiffLimits, expected_lines: int) -> None:
+    diff_text = "@@ -1,3 +1,3 @@\n" + "\n".join(f"-line {i}\n+line {i}" for i in range(3))
+
+    parsed = parse_diff_patch(DUMMY_METADATA, diff_text, limits=limits)
+
+    assert [line.line for line in parsed.modified_lines] == [f"line {i}" for i in range(3) for _ in "-+"][
+        :expected_lines
+    ]
+
+
+def test_iter_unified_diff() -> None:
+    git_diff_output = [
+        b"diff --git a/example.txt b/example.txt\n",
+        b"index 1234567..7654321 100644\n",
+        b"--- a/example.txt\n",
+        b"+++ b/example.txt\n",
+        *(f"{line}\n".encode() for line in SIMPLE_DIFF.strip().splitlines()),
+        b"diff --git a/image.png b/image.png\n",
+        b"new file mode 100644\n",
+        b"index 0000000..bdc955b\n",
+        b"Binary files /dev/null and b/image.png differ\n",
+        b'diff --git "a/old \\303\\244.py" "b/new \\303\\266.py"\n',
+        b"similarity index 90%\n",
+        b'rename from "old \\303\\244.py"\n',
+        b'rename to "new \\303\\266.py"\n',
+        b'--- "a/old \\303\\244.py"\n',
+        b'+++ "b/new \\303\\266.py"\n',
+        b"@@ -1 +1 @@\n",
+        b"-a = 1\r\n",
+        b"+a = 2\r\n",
+        b"diff --git a/with space.txt b/with space.txt\n",
+        b"deleted file mode 100644\n",
+        b"--- a/with space.txt\t\n",
+        b"+++ /dev/null\n",
+        b"@@ -1 +0,0 @@\n",
+        b"-bye\n",
+    ]
+
+    parsed = list(iter_unified_diff(iter(git_diff_output)))
+
+    assert parsed[0].metadata == DiffFileMetadata(
+        new_file=False, deleted_file=False, renamed_file=False, new_path="example.txt"
+    )
+    assert parsed[0].modified_lines == PARSED_SIMPLE_DIFF.modified_lines
+    assert parsed[1] == DiffResult(
+        metadata=DiffFileMetadata(new_file=True, deleted_file=False, renamed_file=False, new_path="image.png"),
+        modified_lines=[],
+    )
+    assert parsed[2].metadata == DiffFileMetadata(
+        new_file=False, deleted_file=False, renamed_file=True, new_path="new ö.py", old_path="old ä.py"
+    )
+    assert [(line.line, line.modification_type) for line in parsed[2].modified_lines] == [
+        ("a = 1", "removed"),
+        ("a = 2", "added"),
+    ]
+    assert parsed[3].metadata == DiffFileMetadata(
+        new_file=False, deleted_file=True, renamed_file=False, new_path="with space.txt"
+    )
+    assert [line.line for line in parsed[3].modified_lines] == ["bye"]
+
+
+def test_iter_unified_diff_skips_excluded_files() -> None:
+    git_diff_output = [
+        "diff --git a/poetry.lock b/poetry.lock\n",
+        "--- a/poetry.lock\n",
+        "+++ b/poetry.lock\n",
+        "@@ -1 +1 @@\n",
+        "-version = 1\n",
+        "+version = 2\n",
+        "diff --git a/example.txt b/example.txt\n",
+        "--- a/example.txt\n",
+        "+++ b/example.txt\n",
+        *(f"{line}\n" for line in SIMPLE_DIFF.strip().splitlines()),
+    ]
+
+    parsed = list(iter_unified_diff(git_diff_output, exclude=lambda path: path.endswith(".lock")))
+
+    assert [diff.metadata.new_path for diff in parsed] == ["example.txt"]
+    assert parsed[0].modified_lines == PARSED_SIMPLE_DIFF.modified_lines
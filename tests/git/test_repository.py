@@ -5,13 +5,8 @@ from unittest import mock
 
 import pytest
 from lgtm_ai.git.exceptions import GitDiffParseError
-from lgtm_ai.git.parser import DiffFileMetadata, DiffResult
-from lgtm_ai.git.repository import (
-    _extract_file_metadata,
-    _get_diff_text,
-    get_diff_from_local_repo,
-    get_file_contents_from_local_repo,
-)
+from lgtm_ai.git.parser import DiffFileMetadata, DiffLimits, DiffResult, ModifiedLine
+from lgtm_ai.git.repository import get_diff_from_local_repo, get_file_contents_from_local_repo
 
 import git
 
@@ -25,19 +20,6 @@ def mock_repo() -> mock.Mock:
     return repo
 
 
-@pytest.fixture
-def mock_diff_item() -> mock.Mock:
-    """Mock git diff item with sample data."""
-    diff_item = mock.Mock(spec=git.diff.Diff)
-    diff_item.a_path = "old_file.py"
-    diff_item.b_path = "new_file.py"
-    diff_item.new_file = False
-    diff_item.deleted_file = False
-    diff_item.renamed_file = True
-    diff_item.diff = b"@@ -1,3 +1,3 @@\n-old line\n+new line\n"
-    return diff_item
-
-
 @pytest.fixture
 def temp_git_repo() -> Generator[pathlib.Path, None, None]:
     """Create a temporary git repository for integration tests."""
@@ -68,38 +50,83 @@ class TestGetDiffFromLocalRepo:
         with pytest.raises(GitDiffParseError, match="Cannot read local git repository"):
             get_diff_from_local_repo(invalid_path)
 
-    @mock.patch("git.Repo")
-    def test_working_directory_changes_default(self, mock_repo_class: mock.Mock) -> None:
+    def test_working_directory_changes_default(self, temp_git_repo: pathlib.Path) -> None:
         """Test default behavior - working directory changes vs HEAD."""
-        mock_repo = mock.Mock()
-        mock_repo.active_branch.name = "main"
-        mock_repo.head.commit.diff.return_value = []
-        mock_repo_class.return_value = mock_repo
+        (temp_git_repo / "test.py").write_text("def hello():\n    return 'lgtm'\n")
+        branch = git.Repo(temp_git_repo).active_branch.name
 
-        result = get_diff_from_local_repo(pathlib.Path("/fake/path"))
+        result = get_diff_from_local_repo(temp_git_repo)
 
-        # Verify diff was called with None (working directory)
-        mock_repo.head.commit.diff.assert_called_once_with(None, create_patch=True)
         assert result.target_branch == "HEAD"
-        assert result.source_branch == "main"
-
-    @mock.patch("git.Repo")
-    def test_compare_against_branch(self, mock_repo_class: mock.Mock) -> None:
-        """Test comparing against a specific branch."""
-        mock_repo = mock.Mock()
-        mock_repo.active_branch.name = "feature"
-        mock_compare_commit = mock.Mock()
-        mock_repo.commit.return_value = mock_compare_commit
-        mock_compare_commit.diff.return_value = []
-        mock_repo_class.return_value = mock_repo
-
-        result = get_diff_from_local_repo(pathlib.Path("/fake/path"), compare="main")
-
-        # Verify correct commit was retrieved and diff called
-        mock_repo.commit.assert_called_once_with("main")
-        mock_compare_commit.diff.assert_called_once_with(mock_repo.head.commit, create_patch=True)
-        assert result.target_branch == "main"
+        assert result.source_branch == branch
+        assert result.changed_files == ["test.py"]
+        assert result.diff == [
+            DiffResult(
+                metadata=DiffFileMetadata(
+                    new_file=False, deleted_file=False, renamed_file=False, new_path="test.py", old_path=None
+                ),
+                modified_lines=[
+                    ModifiedLine(
+                        line="    return 'world'",
+                        line_number=2,
+                        relative_line_number=2,
+                        modification_type="removed",
+                        hunk_start_new=1,
+                        hunk_start_old=1,
+                    ),
+                    ModifiedLine(
+                        line="    return 'lgtm'",
+                        line_number=2,
+                        relative_line_number=3,
+                        modification_type="added",
+                        hunk_start_new=1,
+                        hunk_start_old=1,
+                    ),
+                ],
+            )
+        ]
+
+    def test_compare_against_branch(self, temp_git_repo: pathlib.Path) -> None:
+        """Test comparing against a specific branch, with new, deleted and renamed files."""
+        repo = git.Repo(temp_git_repo)
+        (temp_git_repo / "to_delete.txt").write_text("bye\n")
+        (temp_git_repo / "to rename.txt").write_text("".join(f"line {i}\n" for i in range(10)))
+        repo.index.add(["to_delete.txt", "to rename.txt"])
+        repo.index.commit("Add files")
+        repo.create_head("main-branch")
+
+        repo.create_head("feature").checkout()
+        (temp_git_repo / "new_file.py").write_text("print('new')\n")
+        repo.index.add(["new_file.py"])
+        repo.index.remove(["to_delete.txt"], working_tree=True)
+        repo.git.mv("to rename.txt", "renamed ä.txt")
+        repo.index.commit("Change files")
+
+        result = get_diff_from_local_repo(temp_git_repo, compare="main-branch")
+
+        assert result.target_branch == "main-branch"
         assert result.source_branch == "feature"
+        assert sorted(result.changed_files) == ["new_file.py", "renamed ä.txt", "to_delete.txt"]
+        metadata = {diff.metadata.new_path: diff.metadata for diff in result.diff}
+        assert metadata["new_file.py"].new_file
+        assert metadata["to_delete.txt"].deleted_file
+        assert metadata["renamed ä.txt"].renamed_file
+        assert metadata["renamed ä.txt"].old_path == "to rename.txt"
+        lines = {diff.metadata.new_path: [line.line for line in diff.modified_lines] for diff in result.diff}
+        assert lines == {"new_file.py": ["print('new')"], "to_delete.txt": ["bye"], "renamed ä.txt": []}
+
+    def test_diff_limits(self, temp_git_repo: pathlib.Path) -> None:
+        """Test that the modified lines of every file over the limits are dropped."""
+        (temp_git_repo / "test.py").write_text("".join(f"line {i}\n" for i in range(100)))
+        (temp_git_repo / "other.py").write_text("other\n")
+        git.Repo(temp_git_repo).index.add(["other.py"])
+
+        result = get_diff_from_local_repo(temp_git_repo, limits=DiffLimits(max_lines=10))
+
+        assert {diff.metadata.new_path: len(diff.modified_lines) for diff in result.diff} == {
+            "other.py": 1,
+            "test.py": 10,
+        }
 
     @mock.patch("git.Repo")
     def test_invalid_compare_reference(self, mock_repo_class: mock.Mock) -> None:
@@ -111,73 +138,18 @@ class TestGetDiffFromLocalRepo:
         with pytest.raises(GitDiffParseError, match="Invalid branch/commit: invalid-ref"):
             get_diff_from_local_repo(pathlib.Path("/fake/path"), compare="invalid-ref")
 
-    @mock.patch("git.Repo")
-    @mock.patch("lgtm_ai.git.repository.parse_diff_patch")
-    @mock.patch("lgtm_ai.git.repository._extract_file_metadata")
-    @mock.patch("lgtm_ai.git.repository._get_diff_text")
-    def test_diff_processing(
-        self,
-        mock_get_diff_text: mock.Mock,
-        mock_extract_metadata: mock.Mock,
-        mock_parse_diff: mock.Mock,
-        mock_repo_class: mock.Mock,
-    ) -> None:
-        """Test processing of diff items."""
-        # Setup mocks
-        mock_repo = mock.Mock()
-        mock_repo.active_branch.name = "test-branch"
-        mock_diff_item = mock.Mock()
-        mock_repo.head.commit.diff.return_value = [mock_diff_item]
-        mock_repo_class.return_value = mock_repo
-
-        # Mock the helper functions
-        mock_metadata = DiffFileMetadata(
-            new_file=False, deleted_file=False, renamed_file=False, new_path="test.py", old_path=None
-        )
-        mock_extract_metadata.return_value = mock_metadata
-        mock_get_diff_text.return_value = "diff text"
-        mock_diff_result = DiffResult(metadata=mock_metadata, modified_lines=[])
-        mock_parse_diff.return_value = mock_diff_result
-
-        result = get_diff_from_local_repo(pathlib.Path("/fake/path"))
+    def test_compare_with_range(self, temp_git_repo: pathlib.Path) -> None:
+        """Test comparing against a relative reference."""
+        (temp_git_repo / "test.py").write_text("changed\n")
+        repo = git.Repo(temp_git_repo)
+        repo.index.add(["test.py"])
+        repo.index.commit("Change test.py")
 
-        # Verify all processing steps were called
-        mock_extract_metadata.assert_called_once_with(mock_diff_item)
-        mock_get_diff_text.assert_called_once_with(mock_diff_item)
-        mock_parse_diff.assert_called_once_with(mock_metadata, "diff text")
+        result = get_diff_from_local_repo(temp_git_repo, compare="HEAD~1")
 
-        assert len(result.diff) == 1
+        assert result.target_branch == "HEAD~1"
         assert result.changed_files == ["test.py"]
-
-    @pytest.mark.parametrize(
-        ("compare", "expected_target"),
-        [
-            ("HEAD", "HEAD"),
-            ("main", "main"),
-            ("develop", "develop"),
-            ("HEAD~1", "HEAD~1"),
-            ("abc123", "abc123"),
-        ],
-    )
-    @mock.patch("git.Repo")
-    def test_compare_parameter_values(self, mock_repo_class: mock.Mock, compare: str, expected_target: str) -> None:
-        """Test various values for the compare parameter."""
-        mock_repo = mock.Mock()
-        mock_repo.active_branch.name = "current"
-
-        if compare == "HEAD":
-            mock_repo.head.commit.diff.return_value = []
-        else:
-            mock_compare_commit = mock.Mock()
-            mock_repo.commit.return_value = mock_compare_commit
-            mock_compare_commit.diff.return_value = []
-
-        mock_repo_class.return_value = mock_repo
-
-        result = get_diff_from_local_repo(pathlib.Path("/fake/path"), compare=compare)
-
-        assert result.target_branch == expected_target
-        assert result.source_branch == "current"
+        assert [line.modification_type for line in result.diff[0].modified_lines] == ["removed", "removed", "added"]
 
 
 class TestGetFileContentsFromLocalRepo:
@@ -205,107 +177,3 @@ class TestGetFileContentsFromLocalRepo:
         result = get_file_contents_from_local_repo(temp_git_repo, pathlib.Path("binary.bin"))
 
         assert result == ""
-
-
-class TestGetDiffText:
-    """Test the _get_diff_text helper function."""
-
-    def test_diff_as_bytes(self) -> None:
-        """Test extracting diff text when it's bytes."""
-        mock_diff = mock.Mock()
-        mock_diff.diff = b"@@ -1,1 +1,1 @@\n-old\n+new"
-
-        result = _get_diff_text(mock_diff)
-
-        assert result == "@@ -1,1 +1,1 @@\n-old\n+new"
-
-    def test_diff_as_string(self) -> None:
-        """Test extracting diff text when it's already a string."""
-        mock_diff = mock.Mock()
-        mock_diff.diff = "@@ -1,1 +1,1 @@\n-old\n+new"
-
-        result = _get_diff_text(mock_diff)
-
-        assert result == "@@ -1,1 +1,1 @@\n-old\n+new"
-
-    def test_no_diff(self) -> None:
-        """Test extracting diff text when there's no diff."""
-        mock_diff = mock.Mock()
-        mock_diff.diff = None
-
-        result = _get_diff_text(mock_diff)
-
-        assert result == ""
-
-
-class TestExtractFileMetadata:
-    """Test the _extract_file_metadata helper function."""
-
-    def test_renamed_file(self, mock_diff_item: mock.Mock) -> None:
-        """Test extracting metadata for renamed file."""
-        result = _extract_file_metadata(mock_diff_item)
-
-        assert result.new_path == "new_file.py"
-        assert result.old_path == "old_file.py"
-        assert result.renamed_file is True
-        assert result.new_file is False
-        assert result.deleted_file is False
-
-    def test_new_file(self) -> None:
-        """Test extracting metadata for new file."""
-        mock_diff = mock.Mock()
-        mock_diff.a_path = None
-        mock_diff.b_path = "new_file.py"
-        mock_diff.new_file = True
-        mock_diff.deleted_file = False
-        mock_diff.renamed_file = False
-
-        result = _extract_file_metadata(mock_diff)
-
-        assert result.new_path == "new_file.py"
-        assert result.old_path is None
-        assert result.new_file is True
-
-    def test_deleted_file(self) -> None:
-        """Test extracting metadata for deleted file."""
-        mock_diff = mock.Mock()
-        mock_diff.a_path = "deleted_file.py"
-        mock_diff.b_path = None
-        mock_diff.new_file = False
-        mock_diff.deleted_file = True
-        mock_diff.renamed_file = False
-
-        result = _extract_file_metadata(mock_diff)
-
-        assert result.new_path == "deleted_file.py"
-        assert result.old_path == "deleted_file.py"  # For deleted files, old_path should be set
-        assert result.deleted_file is True
-
-    def test_same_path_no_rename(self) -> None:
-        """Test extracting metadata when file has same path (not renamed)."""
-        mock_diff = mock.Mock()
-        mock_diff.a_path = "same_file.py"
-        mock_diff.b_path = "same_file.py"
-        mock_diff.new_file = False
-        mock_diff.deleted_file = False
-        mock_diff.renamed_file = False
-
-        result = _extract_file_metadata(mock_diff)
-
-        assert result.new_path == "same_file.py"
-        assert result.old_path is None  # Same path, so no old_path
-        assert result.renamed_file is False
-
-    def test_unknown_path_fallback(self) -> None:
-        """Test fallback to 'unknown' when both paths are None."""
-        mock_diff = mock.Mock()
-        mock_diff.a_path = None
-        mock_diff.b_path = None
-        mock_diff.new_file = False
-        mock_diff.deleted_file = False
-        mock_diff.renamed_file = False
-
-        result = _extract_file_metadata(mock_diff)
-
-        assert result.new_path == "unknown"
-        assert result.old_path is None
@@ -1,3 +1,5 @@
+import io
+import tarfile
 from unittest import mock
 
 from lgtm_ai.ai.schemas import (
@@ -78,3 +80,17 @@ FAKE_GUIDE = ReviewGuide(
     ),
     metadata=PublishMetadata(model_name="whatever", usage=MOCK_USAGE),
 )
+
+
+def make_tarball(files: dict[str, bytes], *, root: str = "repo-sha") -> bytes:
+    """Return a gzipped tarball with the given files under a single root directory, like the archives of git services."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        directory = tarfile.TarInfo(root)
+        directory.type = tarfile.DIRTYPE
+        archive.addfile(directory)
+        for path, content in files.items():
+            member = tarfile.TarInfo(f"{root}/{path}")
+            member.size = len(content)
+            archive.addfile(member, io.BytesIO(content))
+    return buffer.getvalue()
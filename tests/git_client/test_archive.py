@@ -0,0 +1,51 @@
+import tarfile
+from collections.abc import Iterator
+
+import pytest
+from lgtm_ai.git_client.archive import extract_files_from_archive, get_common_directory
+from tests.git_client.fixtures import make_tarball
+
+
+def _chunks(data: bytes, size: int = 7) -> Iterator[bytes]:
+    return (data[i : i + size] for i in range(0, len(data), size))
+
+
+def test_extract_files_from_archive() -> None:
+    tarball = make_tarball(
+        {
+            "a.py": b"print('a')",
+            "src/b.py": b"b" * 100_000,
+            "src/image.png": b"\x89PNG\xff\xfe",
+            "not_requested.py": b"ignored",
+        }
+    )
+
+    contents = extract_files_from_archive(_chunks(tarball), ["a.py", "src/b.py", "src/image.png", "missing.py"])
+
+    assert contents == {"a.py": "print('a')", "src/b.py": "b" * 100_000, "src/image.png": None, "missing.py": None}
+
+
+def test_extract_files_from_archive_stops_reading_when_all_files_are_found() -> None:
+    tarball = make_tarball({"a.py": b"a", **{f"file_{i}.bin": bytes(range(256)) * 1000 for i in range(20)}})
+    chunks = _chunks(tarball, size=1024)
+
+    assert extract_files_from_archive(chunks, ["a.py"]) == {"a.py": "a"}
+    assert next(chunks, None) is not None
+
+
+def test_extract_files_from_invalid_archive() -> None:
+    with pytest.raises(tarfile.TarError):
+        extract_files_from_archive([b"<html>not an archive</html>"], ["a.py"])
+
+
+@pytest.mark.parametrize(
+    ("file_paths", "expected"),
+    [
+        (["src/lgtm/a.py", "src/lgtm/sub/b.py"], "src/lgtm"),
+        (["src/a.py", "tests/b.py"], None),
+        (["README.md"], None),
+        ([], None),
+    ],
+)
+def test_get_common_directory(file_paths: list[str], expected: str | None) -> None:
+    assert get_common_directory(file_paths) == expected
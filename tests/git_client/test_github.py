@@ -16,15 +16,27 @@ from lgtm_ai.ai.schemas import (
 )
 from lgtm_ai.base.schemas import PRSource, PRUrl
 from lgtm_ai.formatters.base import Formatter
-from lgtm_ai.git.parser import DiffFileMetadata, DiffResult, ModifiedLine
+from lgtm_ai.git.parser import DiffFileMetadata, DiffLimits, DiffResult, ModifiedLine, parse_diff_patch
 from lgtm_ai.git_client.exceptions import PullRequestDiffError
 from lgtm_ai.git_client.github import CommentBuilder, GitHubClient
 from lgtm_ai.git_client.schemas import IssueContent, PRDiff
 from pydantic import HttpUrl
 from tests.conftest import CopyingMock
-from tests.git_client.fixtures import FAKE_GUIDE
+from tests.git_client.fixtures import FAKE_GUIDE, make_tarball
 from tests.review.utils import MOCK_USAGE
 
+# foo.py: lines 8-13 of a hunk with modified lines 10, 11 and 13; bar.py: removed line 20
+PUBLISHED_DIFF = [
+    parse_diff_patch(
+        DiffFileMetadata(new_file=False, deleted_file=False, renamed_file=False, new_path="foo.py"),
+        "@@ -8,4 +8,6 @@\n a\n b\n-c\n+C\n+D\n e\n+f",
+    ),
+    parse_diff_patch(
+        DiffFileMetadata(new_file=False, deleted_file=False, renamed_file=False, new_path="bar.py"),
+        "@@ -20,1 +19,0 @@\n-x",
+    ),
+]
+
 MockGithubUrl = PRUrl(
     full_url="https://github.com/foo/bar/pull/1",
     repo_path="foo/bar",
@@ -39,7 +51,7 @@ def mock_pr(diff: dict[str, Any] | None = None) -> CopyingMock:
 
     You can pass a dictionary with the diff to be returned by the mock.
     """
-    m_pr = CopyingMock(base=mock.Mock(ref="main"), head=mock.Mock(ref="feature"), number=1)
+    m_pr = CopyingMock(base=mock.Mock(ref="main"), head=mock.Mock(ref="feature", sha="head-sha"), number=1)
     files = diff["files"] if diff else []
     m_pr.get_files.return_value = [
         mock.Mock(
@@ -80,7 +92,8 @@ def mock_github_client(repo: mock.Mock | None = None) -> GitHubClient:
 
 class MockFormatter(Formatter[str]):
     def format_review_summary_section(self, review: Review, comments: list[ReviewComment] | None = None) -> str:
-        return f"summary section {review.review_response.summary}"
+        comments_section = self.format_review_comments_section(comments) if comments else ""
+        return f"summary section {review.review_response.summary}{comments_section}"
 
     def format_review_comments_section(self, comments: list[ReviewComment]) -> str:
         return "comments section" + "".join(self.format_review_comment(comment) for comment in comments)
@@ -190,9 +203,25 @@ def test_get_diff_from_url_successful() -> None:
         changed_files=["justfile", "pyproject.toml"],
         target_branch="main",
         source_branch="feature",
+        head_sha="head-sha",
     )
 
 
+def test_get_diff_from_url_with_diff_limits() -> None:
+    patch = "@@ -1,3 +1,3 @@\n" + "\n".join(f"-old {i}\n+new {i}" for i in range(3))
+    m_repo = mock_repo(mock_pr({"files": [{"filename": "file.py", "patch": patch}]}))
+    client = GitHubClient(
+        client=mock.Mock(get_repo=mock.Mock(return_value=m_repo)),
+        formatter=MockFormatter(),
+        diff_limits=DiffLimits(max_lines=2),
+    )
+
+    pr_diff = client.get_diff_from_url(MockGithubUrl)
+
+    assert [line.line for line in pr_diff.diff[0].modified_lines] == ["old 0", "new 0"]
+    assert pr_diff.changed_files == ["file.py"]
+
+
 def test_get_diff_from_url_with_renamed_files() -> None:
     """Ensures that renamed files (which have a None patch) are handled correctly."""
     diffs_response = {
@@ -221,6 +250,7 @@ def test_get_diff_from_url_with_renamed_files() -> None:
         changed_files=["justfile"],
         target_branch="main",
         source_branch="feature",
+        head_sha="head-sha",
     )
 
 
@@ -324,22 +354,77 @@ def test_get_file_contents_one_file_missing() -> None:
     assert content_2 is None
 
 
+def test_get_files_contents_in_batches(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("lgtm_ai.git_client.github.GRAPHQL_BLOBS_PER_QUERY", 2)
+    m_pr = mock_pr()
+    m_pr.base.sha = "base-sha"
+    client = mock_github_client(mock_repo(m_pr))
+    blobs = {
+        "a.py": {"text": "a", "isBinary": False, "isTruncated": False},
+        "image.png": {"text": None, "isBinary": True, "isTruncated": False},
+        "huge.json": {"text": "{", "isBinary": False, "isTruncated": True},
+        "missing.py": None,
+    }
+
+    def _graphql_query(query: str, variables: dict[str, str]) -> tuple[dict[str, Any], dict[str, Any]]:
+        expressions = {key: value for key, value in variables.items() if key.startswith("e")}
+        return {}, {
+            "data": {"repository": {f"f{key[1:]}": blobs[value.split(":")[1]] for key, value in expressions.items()}}
+        }
+
+    with mock.patch.object(client.client.requester, "graphql_query", side_effect=_graphql_query) as m_graphql_query:
+        contents = client.get_files_contents(MockGithubUrl, ["a.py", "image.png", "huge.json", "missing.py"], "target")
+
+    assert contents == {"a.py": "a", "image.png": None, "huge.json": None, "missing.py": None}
+    assert [call.args[1] for call in m_graphql_query.call_args_list] == [
+        {"owner": "foo", "name": "bar", "e0": "base-sha:a.py", "e1": "base-sha:image.png"},
+        {"owner": "foo", "name": "bar", "e0": "base-sha:huge.json", "e1": "base-sha:missing.py"},
+    ]
+
+
+def test_get_files_contents_failure() -> None:
+    client = mock_github_client(mock_repo(mock_pr()))
+    with mock.patch.object(
+        client.client.requester, "graphql_query", side_effect=MockGithubException(502, "Bad gateway")
+    ):
+        assert client.get_files_contents(MockGithubUrl, ["a.py"], "source") is None
+
+
+def test_get_files_contents_from_archive(monkeypatch: pytest.MonkeyPatch) -> None:
+    m_pr = mock_pr()
+    m_repo = mock_repo(m_pr)
+    m_repo.get_archive_link.return_value = "https://codeload.github.com/foo/bar/tar.gz/head-sha"
+    client = mock_github_client(m_repo)
+    client.context_archive = True
+    tarball = make_tarball({"a.py": b"a", "b.py": b"b"}, root="foo-bar-head-sha")
+    m_stream = mock.MagicMock()
+    m_stream.return_value.__enter__.return_value.iter_bytes.return_value = iter([tarball])
+    monkeypatch.setattr("lgtm_ai.git_client.github.httpx.stream", m_stream)
+
+    with mock.patch.object(client.client.requester, "graphql_query") as m_graphql_query:
+        contents = client.get_files_contents(MockGithubUrl, ["a.py", "missing.py"], "source")
+
+    assert contents == {"a.py": "a", "missing.py": None}
+    m_repo.get_archive_link.assert_called_once_with("tarball", "head-sha")
+    m_graphql_query.assert_not_called()
+
+
 def test_post_review_successful() -> None:
     m_pr = mock_pr()
     m_repo = mock_repo(m_pr)
     client = mock_github_client(m_repo)
 
     fake_review = Review(
-        pr_diff=PRDiff(id=1, diff=[], changed_files=[], target_branch="main", source_branch="feature"),
+        pr_diff=PRDiff(id=1, diff=PUBLISHED_DIFF, changed_files=[], target_branch="main", source_branch="feature"),
         review_response=ReviewResponse(
             summary="a",
             raw_score=5,
             comments=[
                 ReviewComment(
-                    new_path="foo",
-                    old_path="foo",
-                    line_number=1,
-                    relative_line_number=288,
+                    new_path="foo.py",
+                    old_path="foo.py",
+                    line_number=10,
+                    relative_line_number=4,
                     comment="b",
                     is_comment_on_new_path=True,
                     category="Correctness",
@@ -347,10 +432,10 @@ def test_post_review_successful() -> None:
                     programming_language="python",
                 ),
                 ReviewComment(
-                    new_path="bar",
-                    old_path="bar",
-                    line_number=2,
-                    relative_line_number=299,
+                    new_path="bar.py",
+                    old_path="bar.py",
+                    line_number=20,
+                    relative_line_number=1,
                     comment="c",
                     is_comment_on_new_path=False,
                     category="Correctness",
@@ -373,8 +458,8 @@ def test_post_review_successful() -> None:
             event="COMMENT",
             comments=[
                 # Notice that the position is the relative line number
-                {"path": "foo", "position": 288, "body": "comment b"},
-                {"path": "bar", "position": 299, "body": "comment c"},
+                {"path": "foo.py", "position": 4, "body": "comment b"},
+                {"path": "bar.py", "position": 1, "body": "comment c"},
             ],
             commit=mock.ANY,
         )
@@ -397,7 +482,7 @@ def test_post_review_fallback_to_single_line() -> None:
     )
 
     fake_review = Review(
-        pr_diff=PRDiff(id=1, diff=[], changed_files=[], target_branch="main", source_branch="feature"),
+        pr_diff=PRDiff(id=1, diff=PUBLISHED_DIFF, changed_files=[], target_branch="main", source_branch="feature"),
         review_response=ReviewResponse(
             summary="review summary",
             raw_score=5,
@@ -406,7 +491,7 @@ def test_post_review_fallback_to_single_line() -> None:
                     new_path="foo.py",
                     old_path="foo.py",
                     line_number=10,
-                    relative_line_number=288,
+                    relative_line_number=4,
                     comment="This should be a multi-line comment",
                     is_comment_on_new_path=True,
                     category="Correctness",
@@ -418,7 +503,7 @@ def test_post_review_fallback_to_single_line() -> None:
                     new_path="bar.py",
                     old_path="bar.py",
                     line_number=20,
-                    relative_line_number=299,
+                    relative_line_number=1,
                     comment="Another comment without suggestion",
                     is_comment_on_new_path=False,
                     category="Correctness",
@@ -461,7 +546,7 @@ def test_post_review_fallback_to_single_line() -> None:
             {
                 "path": "bar.py",
                 "body": "comment Another comment without suggestion",
-                "position": 299,  # Single-line comment (no suggestion)
+                "position": 1,  # Single-line comment (no suggestion)
             },
         ],
         commit=mock.ANY,
@@ -476,18 +561,84 @@ def test_post_review_fallback_to_single_line() -> None:
             {
                 "path": "foo.py",
                 "body": "comment This should be a multi-line comment",
-                "position": 288,  # Forced to single-line
+                "position": 4,  # Forced to single-line
             },
             {
                 "path": "bar.py",
                 "body": "comment Another comment without suggestion",
-                "position": 299,  # Already single-line
+                "position": 1,  # Already single-line
             },
         ],
         commit=mock.ANY,
     )
 
 
+def test_post_review_validates_comment_positions_locally() -> None:
+    m_pr = mock_pr()
+    m_repo = mock_repo(m_pr)
+    client = mock_github_client(m_repo)
+    comment_kwargs: dict[str, Any] = {
+        "category": "Correctness",
+        "severity": "LOW",
+        "programming_language": "python",
+    }
+    # The suggestion spans lines 12 to 14 of foo.py, but line 14 is not part of the diff
+    suggestion = CodeSuggestion(
+        start_offset=CodeSuggestionOffset(offset=0, direction="+"),
+        end_offset=CodeSuggestionOffset(offset=2, direction="+"),
+        snippet="new code",
+        programming_language="python",
+        ready_for_replacement=True,
+    )
+    comments = [
+        # Wrong relative line number and side
+        ReviewComment(
+            new_path="foo.py",
+            old_path="foo.py",
+            line_number=12,
+            relative_line_number=99,
+            comment="b",
+            is_comment_on_new_path=False,
+            suggestion=suggestion,
+            **comment_kwargs,
+        ),
+        # Line outside of the diff
+        ReviewComment(
+            new_path="bar.py",
+            old_path="bar.py",
+            line_number=50,
+            relative_line_number=50,
+            comment="c",
+            is_comment_on_new_path=False,
+            **comment_kwargs,
+        ),
+        # File outside of the diff
+        ReviewComment(
+            new_path="baz.py",
+            old_path="baz.py",
+            line_number=1,
+            relative_line_number=1,
+            comment="d",
+            is_comment_on_new_path=True,
+            **comment_kwargs,
+        ),
+    ]
+    fake_review = Review(
+        pr_diff=PRDiff(id=1, diff=PUBLISHED_DIFF, changed_files=[], target_branch="main", source_branch="feature"),
+        review_response=ReviewResponse(summary="a", raw_score=5, comments=comments),
+        metadata=PublishMetadata(model_name="whatever", usage=MOCK_USAGE),
+    )
+
+    client.publish_review(MockGithubUrl, fake_review)
+
+    m_pr.create_review.assert_called_once_with(
+        body="summary section acomments sectioncomment ccomment d",
+        event="COMMENT",
+        comments=[{"path": "foo.py", "body": "comment b", "position": 6}],
+        commit=mock.ANY,
+    )
+
+
 def test_publish_guide_successful() -> None:
     m_pr = mock_pr()
     m_repo = mock_repo(m_pr)
@@ -546,6 +697,60 @@ def test_get_issue_content_not_found() -> None:
 # CommentBuilder tests
 
 
+def test_get_last_reviewed_sha() -> None:
+    m_pr = mock_pr()
+    m_pr.get_reviews.return_value = [
+        mock.Mock(body="summary\n<!-- lgtm-reviewed-sha: abc123 -->"),
+        mock.Mock(body="a human review"),
+        mock.Mock(body="summary\n<!-- lgtm-reviewed-sha: def456 -->"),
+        mock.Mock(body=None),
+    ]
+    client = mock_github_client(mock_repo(m_pr))
+
+    assert client.get_last_reviewed_sha(MockGithubUrl) == "def456"
+
+
+def test_get_last_reviewed_sha_without_previous_reviews() -> None:
+    m_pr = mock_pr()
+    m_pr.get_reviews.return_value = [mock.Mock(body="a human review")]
+    client = mock_github_client(mock_repo(m_pr))
+
+    assert client.get_last_reviewed_sha(MockGithubUrl) is None
+
+
+def test_get_diff_since() -> None:
+    m_pr = mock_pr()
+    m_pr.base.repo.compare.return_value = mock.Mock(
+        status="ahead",
+        files=[
+            mock.Mock(
+                filename="justfile",
+                patch="@@ -1,1 +1,1 @@\n-old\n+new",
+                status="modified",
+                previous_filename="justfile",
+            )
+        ],
+    )
+    client = mock_github_client(mock_repo(m_pr))
+
+    pr_diff = client.get_diff_since(MockGithubUrl, "abc123")
+
+    m_pr.base.repo.compare.assert_called_once_with("abc123", "head-sha")
+    assert pr_diff is not None
+    assert pr_diff.changed_files == ["justfile"]
+    assert [line.line for line in pr_diff.diff[0].modified_lines] == ["old", "new"]
+    assert pr_diff.head_sha == "head-sha"
+
+
+@pytest.mark.parametrize("status", ["diverged", "behind", "identical"])
+def test_get_diff_since_not_an_ancestor(status: str) -> None:
+    m_pr = mock_pr()
+    m_pr.base.repo.compare.return_value = mock.Mock(status=status, files=[])
+    client = mock_github_client(mock_repo(m_pr))
+
+    assert client.get_diff_since(MockGithubUrl, "abc123") is None
+
+
 def test_comment_builder_generate_comment_payload_single_line() -> None:
     """Test generating a single-line comment payload."""
     builder = CommentBuilder(MockFormatter())
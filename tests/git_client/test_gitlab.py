@@ -5,6 +5,7 @@ import click
 import gitlab
 import gitlab.exceptions
 import pytest
+import requests
 from lgtm_ai.ai.schemas import (
     PublishMetadata,
     Review,
@@ -14,14 +15,26 @@ from lgtm_ai.ai.schemas import (
 )
 from lgtm_ai.base.schemas import PRSource, PRUrl
 from lgtm_ai.formatters.base import Formatter
+from lgtm_ai.git.parser import DiffFileMetadata, parse_diff_patch
 from lgtm_ai.git_client.exceptions import PullRequestDiffError
 from lgtm_ai.git_client.gitlab import GitlabClient
 from lgtm_ai.git_client.schemas import IssueContent, PRDiff
 from pydantic import HttpUrl
 from tests.conftest import CopyingMock
-from tests.git_client.fixtures import FAKE_GUIDE, PARSED_GIT_DIFF
+from tests.git_client.fixtures import FAKE_GUIDE, PARSED_GIT_DIFF, make_tarball
 from tests.review.utils import MOCK_USAGE
 
+# Added line 1 of foo, and line 2 of bar removed after an unchanged line
+PUBLISHED_DIFF = [
+    parse_diff_patch(
+        DiffFileMetadata(new_file=True, deleted_file=False, renamed_file=False, new_path="foo"), "@@ -0,0 +1,1 @@\n+a"
+    ),
+    parse_diff_patch(
+        DiffFileMetadata(new_file=False, deleted_file=False, renamed_file=False, new_path="bar"),
+        "@@ -1,2 +1,1 @@\n x\n-y",
+    ),
+]
+
 MockGitlabUrl = PRUrl(
     full_url="https://gitlab.com/foo/-/merge_requests/1",
     base_url="https://gitlab.com",
@@ -79,7 +92,8 @@ def mock_gitlab_client(project: mock.Mock | None = None) -> GitlabClient:
 
 class MockFormatter(Formatter[str]):
     def format_review_summary_section(self, review: Review, comments: list[ReviewComment] | None = None) -> str:
-        return f"summary section {review.review_response.summary}"
+        comments_section = self.format_review_comments_section(comments) if comments else ""
+        return f"summary section {review.review_response.summary}{comments_section}"
 
     def format_review_comments_section(self, comments: list[ReviewComment]) -> str:
         return "comments section" + "".join(self.format_review_comment(comment) for comment in comments)
@@ -126,6 +140,7 @@ def test_get_diff_from_url_successful(diffs_response: dict[str, object]) -> None
         changed_files=["justfile", "pyproject.toml"],
         target_branch="main",
         source_branch="feature",
+        head_sha="head",
     )
 
 
@@ -136,7 +151,7 @@ def test_post_review_successful() -> None:
     client = mock_gitlab_client(m_project)
 
     fake_review = Review(
-        pr_diff=PRDiff(id=1, diff=[], changed_files=[], target_branch="main", source_branch="feature"),
+        pr_diff=PRDiff(id=1, diff=PUBLISHED_DIFF, changed_files=[], target_branch="main", source_branch="feature"),
         review_response=ReviewResponse(
             summary="a",
             raw_score=5,
@@ -211,7 +226,6 @@ def test_post_review_with_a_successful_and_an_unsuccessful_comments() -> None:
         mock.Mock(),
         gitlab.exceptions.GitlabError(),
         gitlab.exceptions.GitlabError(),
-        gitlab.exceptions.GitlabError(),
     ]
     m_project = mock_project(m_mr)
     m_project.diffs.list.return_value = [mock.Mock()]
@@ -220,7 +234,7 @@ def test_post_review_with_a_successful_and_an_unsuccessful_comments() -> None:
     fake_review = Review(
         pr_diff=PRDiff(
             id=1,
-            diff=[],
+            diff=PUBLISHED_DIFF,
             changed_files=[],
             target_branch="main",
             source_branch="feature",
@@ -258,11 +272,7 @@ def test_post_review_with_a_successful_and_an_unsuccessful_comments() -> None:
 
     client.publish_review(MockGitlabUrl, fake_review)
 
-    m_mr.notes.create.assert_called_with(
-        {
-            "body": f"{client.formatter.format_review_summary_section(fake_review, [fake_review.review_response.comments[1]])}"
-        }
-    )
+    m_mr.notes.create.assert_called_with({"body": client.formatter.format_review_summary_section(fake_review)})
     m_mr.discussions.create.assert_has_calls(
         [
             mock.call(
@@ -293,20 +303,6 @@ def test_post_review_with_a_successful_and_an_unsuccessful_comments() -> None:
                     },
                 }
             ),
-            mock.call(
-                {
-                    "body": mock.ANY,
-                    "position": {
-                        "base_sha": "base",
-                        "head_sha": "head",
-                        "start_sha": "start",
-                        "new_path": "bar",
-                        "old_path": "bar",
-                        "position_type": "text",
-                        "new_line": 2,
-                    },
-                }
-            ),
             mock.call(
                 {
                     "body": mock.ANY,
@@ -323,6 +319,104 @@ def test_post_review_with_a_successful_and_an_unsuccessful_comments() -> None:
         ]
     )
 
+    assert m_mr.discussions.create.call_count == 3
+
+
+def test_post_review_corrects_comment_positions_locally() -> None:
+    m_mr = mock_mr()
+    m_project = mock_project(m_mr)
+    client = mock_gitlab_client(m_project)
+    comment_kwargs: dict[str, Any] = {
+        "category": "Correctness",
+        "severity": "LOW",
+        "programming_language": "python",
+    }
+    comments = [
+        # Wrong side: line 1 of foo was added
+        ReviewComment(
+            new_path="foo",
+            old_path="foo",
+            line_number=1,
+            relative_line_number=1,
+            comment="b",
+            is_comment_on_new_path=False,
+            **comment_kwargs,
+        ),
+        # Unchanged line of bar, found by its relative line number
+        ReviewComment(
+            new_path="bar",
+            old_path="bar",
+            line_number=30,
+            relative_line_number=1,
+            comment="c",
+            is_comment_on_new_path=True,
+            **comment_kwargs,
+        ),
+        # Line outside of the diff
+        ReviewComment(
+            new_path="bar",
+            old_path="bar",
+            line_number=30,
+            relative_line_number=30,
+            comment="d",
+            is_comment_on_new_path=True,
+            **comment_kwargs,
+        ),
+        # File outside of the diff
+        ReviewComment(
+            new_path="baz",
+            old_path="baz",
+            line_number=1,
+            relative_line_number=1,
+            comment="e",
+            is_comment_on_new_path=True,
+            **comment_kwargs,
+        ),
+    ]
+    fake_review = Review(
+        pr_diff=PRDiff(id=1, diff=PUBLISHED_DIFF, changed_files=[], target_branch="main", source_branch="feature"),
+        review_response=ReviewResponse(summary="a", raw_score=5, comments=comments),
+        metadata=PublishMetadata(model_name="whatever", usage=MOCK_USAGE),
+    )
+
+    client.publish_review(MockGitlabUrl, fake_review)
+
+    m_mr.notes.create.assert_called_once_with({"body": "summary section acomments sectioncomment e"})
+    base_position = {"base_sha": "base", "head_sha": "head", "start_sha": "start"}
+    assert m_mr.discussions.create.call_args_list == [
+        mock.call(
+            {
+                "body": "comment b",
+                "position": {
+                    **base_position,
+                    "new_path": "foo",
+                    "old_path": "foo",
+                    "position_type": "text",
+                    "new_line": 1,
+                },
+            }
+        ),
+        mock.call(
+            {
+                "body": "comment c",
+                "position": {
+                    **base_position,
+                    "new_path": "bar",
+                    "old_path": "bar",
+                    "position_type": "text",
+                    "new_line": 1,
+                    "old_line": 1,
+                },
+            }
+        ),
+        mock.call(
+            {
+                "body": "comment d",
+                "position": {**base_position, "new_path": "bar", "old_path": "bar", "position_type": "file"},
+            }
+        ),
+    ]
+
 
 def test_get_file_contents_multiple_files() -> None:
     m_mr = mock_mr()
@@ -383,6 +477,62 @@ def test_get_file_contents_one_file_missing() -> None:
     assert contents == "surprise"
 
 
+def test_get_files_contents_is_not_supported_without_context_archive() -> None:
+    client = mock_gitlab_client(mock_project(mock_mr()))
+
+    assert client.get_files_contents(MockGitlabUrl, ["a.py"], "source") is None
+
+
+def _mock_archive_response(chunks: list[bytes] | Exception) -> mock.Mock:
+    m_response = mock.Mock(spec=requests.Response)
+    if isinstance(chunks, Exception):
+        m_response.iter_content.side_effect = chunks
+    else:
+        m_response.iter_content.return_value = iter(chunks)
+    return m_response
+
+
+def test_get_files_contents_from_archive() -> None:
+    m_mr = mock_mr()
+    m_mr.sha = "head-sha"
+    m_project = mock_project(m_mr)
+    m_project.encoded_id = 1
+    tarball = make_tarball({"src/a.py": b"a", "src/sub/b.py": b"b"}, root="foo-head-sha-src")
+    m_response = _mock_archive_response([tarball[:10], tarball[10:]])
+    client = mock_gitlab_client(m_project)
+    client.client.http_get.return_value = m_response  # type: ignore[attr-defined]
+    client.context_archive = True
+
+    contents = client.get_files_contents(MockGitlabUrl, ["src/a.py", "src/sub/b.py", "src/missing.py"], "source")
+
+    assert contents == {"src/a.py": "a", "src/sub/b.py": "b", "src/missing.py": None}
+    client.client.http_get.assert_called_once_with(  # type: ignore[attr-defined]
+        "/projects/1/repository/archive.tar.gz",
+        query_data={"sha": "head-sha", "path": "src"},
+        raw=True,
+        streamed=True,
+    )
+    m_response.close.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        gitlab.exceptions.GitlabGetError("Archive not available"),
+        requests.exceptions.ChunkedEncodingError("Connection broken"),
+    ],
+)
+def test_get_files_contents_from_archive_failure(error: Exception) -> None:
+    m_project = mock_project(mock_mr())
+    m_response = _mock_archive_response(error)
+    client = mock_gitlab_client(m_project)
+    client.client.http_get.return_value = m_response  # type: ignore[attr-defined]
+    client.context_archive = True
+
+    assert client.get_files_contents(MockGitlabUrl, ["a.py"], "target") is None
+    m_response.close.assert_called_once()
+
+
 def test_publish_guide_successful() -> None:
     m_mr = mock_mr()
     m_project = mock_project(m_mr)
@@ -426,3 +576,39 @@ def test_get_issue_content_not_found() -> None:
     issues_url = HttpUrl("https://gitlab.com/foo/-/issues/1")
     result = client.get_issue_content(issues_url, "1")
     assert result is None
+
+
+def test_get_last_reviewed_sha() -> None:
+    m_mr = mock_mr()
+    m_mr.notes.list.return_value = [
+        mock.Mock(body="summary\n<!-- lgtm-reviewed-sha: abc123 -->"),
+        mock.Mock(body="summary\n<!-- lgtm-reviewed-sha: def456 -->"),
+        mock.Mock(body="a human comment"),
+    ]
+    client = mock_gitlab_client(mock_project(m_mr))
+
+    assert client.get_last_reviewed_sha(MockGitlabUrl) == "def456"
+    m_mr.notes.list.assert_called_once_with(iterator=True, order_by="created_at", sort="asc")
+
+
+def test_get_diff_since(diffs_response: dict[str, object]) -> None:
+    m_mr = mock_mr(diffs_response)
+    m_mr.commits.return_value = [mock.Mock(id="head"), mock.Mock(id="abc123")]
+    m_project = mock_project(m_mr)
+    m_project.repository_compare.return_value = {"diffs": diffs_response["diffs"]}
+    client = mock_gitlab_client(m_project)
+
+    pr_diff = client.get_diff_since(MockGitlabUrl, "abc123")
+
+    m_project.repository_compare.assert_called_once_with("abc123", "head", straight=True)
+    assert pr_diff == client.get_diff_from_url(MockGitlabUrl)
+
+
+def test_get_diff_since_commit_not_in_merge_request() -> None:
+    m_mr = mock_mr()
+    m_mr.commits.return_value = [mock.Mock(id="head")]
+    m_project = mock_project(m_mr)
+    client = mock_gitlab_client(m_project)
+
+    assert client.get_diff_since(MockGitlabUrl, "abc123") is None
+    m_project.repository_compare.assert_not_called()
@@ -0,0 +1,193 @@
+import io
+import os
+import pathlib
+from collections.abc import Iterator
+from unittest import mock
+
+import github
+import pytest
+import requests
+from lgtm_ai.base.schemas import PRSource
+from lgtm_ai.formatters.markdown import MarkDownFormatter
+from lgtm_ai.git_client.github import GitHubClient, use_http_transport
+from lgtm_ai.git_client.gitlab import GitlabClient
+from lgtm_ai.git_client.http_cache import CachingHTTPAdapter, HttpCache, get_session, is_immutable_url
+from lgtm_ai.git_client.utils import get_git_client
+from requests.adapters import HTTPAdapter
+
+SHA = "0123456789abcdef0123456789abcdef01234567"
+
+
+def _make_response(
+    request: requests.PreparedRequest, status: int, body: bytes = b"", headers: dict[str, str] | None = None
+) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.headers = requests.structures.CaseInsensitiveDict(headers or {})
+    response._content = body
+    response.raw = io.BytesIO(body)
+    response.request = request
+    response.url = request.url or ""
+    return response
+
+
+@pytest.fixture
+def http_cache(tmp_path: pathlib.Path) -> HttpCache:
+    return HttpCache(tmp_path, max_size=1024 * 1024)
+
+
+@pytest.fixture
+def m_send() -> Iterator[mock.MagicMock]:
+    """Mock the requests sent through the network by the caching adapter."""
+    with mock.patch.object(HTTPAdapter, "send", autospec=True) as m_send:
+        yield m_send
+
+
+@pytest.mark.parametrize(
+    ("url", "expected"),
+    [
+        (f"https://api.github.com/repos/foo/bar/git/blobs/{SHA}", True),
+        (f"https://api.github.com/repos/foo/bar/contents/src/a.py?ref={SHA}", True),
+        (f"https://gitlab.com/api/v4/projects/1/repository/files/src%2Fa.py?ref={SHA}", True),
+        (f"https://gitlab.com/api/v4/projects/1/repository/archive.tar.gz?sha={SHA}", True),
+        ("https://api.github.com/repos/foo/bar/contents/src/a.py?ref=main", False),
+        (f"https://api.github.com/repos/foo/bar/commits/{SHA}/statuses", False),
+        ("https://api.github.com/repos/foo/bar/pulls/1", False),
+    ],
+)
+def test_is_immutable_url(url: str, expected: bool) -> None:
+    assert is_immutable_url(url) is expected
+
+
+def test_revalidates_cached_responses_with_etag(http_cache: HttpCache, m_send: mock.MagicMock) -> None:
+    url = "https://api.github.com/repos/foo/bar/pulls/1"
+    m_send.side_effect = [
+        _make_response(requests.Request("GET", url).prepare(), 200, b'{"number": 1}', {"ETag": '"abc"'}),
+        _make_response(
+            requests.Request("GET", url).prepare(), 304, headers={"ETag": '"abc"', "X-RateLimit-Remaining": "42"}
+        ),
+    ]
+    session = get_session(http_cache=http_cache, scheduler=None)
+
+    first_response = session.get(url)
+    second_response = session.get(url)
+
+    assert first_response.json() == second_response.json() == {"number": 1}
+    assert second_response.status_code == 200
+    assert second_response.headers["X-RateLimit-Remaining"] == "42"
+    first_request, second_request = (call.args[1] for call in m_send.call_args_list)
+    assert "If-None-Match" not in first_request.headers
+    assert second_request.headers["If-None-Match"] == '"abc"'
+
+
+def test_refreshes_cached_responses_that_changed(http_cache: HttpCache, m_send: mock.MagicMock) -> None:
+    url = "https://api.github.com/repos/foo/bar/pulls/1"
+    request = requests.Request("GET", url).prepare()
+    m_send.side_effect = [
+        _make_response(request, 200, b"old", {"Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}),
+        _make_response(request, 200, b"new", {"Last-Modified": "Tue, 02 Jan 2024 00:00:00 GMT"}),
+        _make_response(request, 304),
+    ]
+    session = get_session(http_cache=http_cache, scheduler=None)
+
+    assert [session.get(url).content for _ in range(3)] == [b"old", b"new", b"new"]
+    assert m_send.call_args_list[2].args[1].headers["If-Modified-Since"] == "Tue, 02 Jan 2024 00:00:00 GMT"
+
+
+def test_serves_immutable_responses_without_requests(http_cache: HttpCache, m_send: mock.MagicMock) -> None:
+    url = f"https://api.github.com/repos/foo/bar/contents/a.py?ref={SHA}"
+    m_send.return_value = _make_response(requests.Request("GET", url).prepare(), 200, b"print('a')")
+    session = get_session(http_cache=http_cache, scheduler=None)
+
+    assert session.get(url).content == b"print('a')"
+    assert session.get(url).content == b"print('a')"
+    m_send.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    ("method", "status", "headers", "stream"),
+    [
+        ("POST", 200, {"ETag": '"abc"'}, False),
+        ("GET", 404, {"ETag": '"abc"'}, False),
+        ("GET", 200, {}, False),
+        ("GET", 200, {"ETag": '"abc"', "Cache-Control": "no-store"}, False),
+        ("GET", 200, {"ETag": '"abc"'}, True),
+    ],
+)
+def test_does_not_cache_some_responses(
+    http_cache: HttpCache,
+    m_send: mock.MagicMock,
+    tmp_path: pathlib.Path,
+    method: str,
+    status: int,
+    headers: dict[str, str],
+    stream: bool,
+) -> None:
+    url = "https://api.github.com/repos/foo/bar/pulls/1"
+    m_send.return_value = _make_response(requests.Request(method, url).prepare(), status, b"body", headers)
+
+    get_session(http_cache=http_cache, scheduler=None).request(method, url, stream=stream)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cache_key_depends_on_credentials() -> None:
+    url = "https://gitlab.com/api/v4/projects/1"
+
+    keys = {
+        HttpCache.make_key(requests.Request("GET", url, headers={"PRIVATE-TOKEN": token}).prepare())
+        for token in ("token-a", "token-b")
+    }
+
+    assert len(keys) == 2
+
+
+def test_http_cache_evicts_least_recently_used_entries(tmp_path: pathlib.Path, m_send: mock.MagicMock) -> None:
+    http_cache = HttpCache(tmp_path, max_size=2000)
+    session = get_session(http_cache=http_cache, scheduler=None)
+    urls = [f"https://api.github.com/repos/foo/bar/git/blobs/{str(i) * 40}" for i in range(3)]
+    m_send.side_effect = [_make_response(requests.Request("GET", url).prepare(), 200, b"x" * 1000) for url in urls]
+
+    for url in urls:
+        session.get(url)
+        for path in tmp_path.iterdir():
+            # Make older entries strictly older, regardless of the resolution of modification times
+            os.utime(path, (path.stat().st_mtime - 10, path.stat().st_mtime - 10))
+
+    assert len(list(tmp_path.iterdir())) == 1
+    assert http_cache.get(HttpCache.make_key(session.prepare_request(requests.Request("GET", urls[-1])))) is not None
+
+
+def test_http_cache_ignores_unreadable_entries(http_cache: HttpCache, tmp_path: pathlib.Path) -> None:
+    (tmp_path / "key.json").write_text("not json")
+
+    assert http_cache.get("key") is None
+    assert not (tmp_path / "key.json").exists()
+
+
+def test_get_git_client_with_http_cache(http_cache: HttpCache) -> None:
+    gitlab_client = get_git_client(
+        source=PRSource.gitlab,
+        token="token",
+        formatter=MarkDownFormatter(),
+        url="https://gitlab.com",
+        http_cache=http_cache,
+    )
+    github_client = get_git_client(
+        source=PRSource.github, token="token", formatter=MarkDownFormatter(), http_cache=http_cache
+    )
+
+    assert isinstance(gitlab_client, GitlabClient)
+    assert isinstance(gitlab_client.client.session.get_adapter("https://gitlab.com/api/v4"), CachingHTTPAdapter)
+    assert isinstance(github_client, GitHubClient)
+    connection = github_client.client.requester._Requester__connectionClass("api.github.com", 443)  # type: ignore[attr-defined]
+    assert isinstance(connection.session.get_adapter("https://api.github.com/repos"), CachingHTTPAdapter)
+
+
+def test_use_http_cache_ignores_http_github_clients(http_cache: HttpCache) -> None:
+    client = github.Github(base_url="http://github.example.com/api/v3")
+
+    use_http_transport(client, http_cache=http_cache, scheduler=None)
+
+    connection = client.requester._Requester__connectionClass("github.example.com", 80)  # type: ignore[attr-defined]
+    assert not isinstance(connection, github.Requester.HTTPSRequestsConnectionClass)
@@ -0,0 +1,126 @@
+from typing import Any
+
+import pytest
+from lgtm_ai.ai.schemas import ReviewComment
+from lgtm_ai.git.parser import DiffFileMetadata, parse_diff_patch
+from lgtm_ai.git_client.positions import CommentLocation, DiffPosition, DiffPositionIndex
+
+PATCH = """@@ -1,5 +1,5 @@
+ import os
+-import sys
++import re
+
+
+ def foo():
+@@ -20,3 +20,4 @@ def foo():
+     a = 1
++    b = 2
+     return a
+-    c = 3
+"""
+
+
+@pytest.fixture
+def positions() -> DiffPositionIndex:
+    metadata = DiffFileMetadata(
+        new_file=False, deleted_file=False, renamed_file=True, new_path="new.py", old_path="old.py"
+    )
+    return DiffPositionIndex([parse_diff_patch(metadata, PATCH)])
+
+
+def _make_comment(**kwargs: Any) -> ReviewComment:
+    return ReviewComment(
+        **{
+            "new_path": "new.py",
+            "old_path": "old.py",
+            "comment": "comment",
+            "category": "Correctness",
+            "severity": "LOW",
+            "programming_language": "python",
+            **kwargs,
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    ("line", "new_side", "expected"),
+    [
+        (1, True, DiffPosition(relative_line_number=1, old_line=1, new_line=1, hunk=0)),
+        (1, False, DiffPosition(relative_line_number=1, old_line=1, new_line=1, hunk=0)),
+        (2, False, DiffPosition(relative_line_number=2, old_line=2, new_line=None, hunk=0)),
+        (2, True, DiffPosition(relative_line_number=3, old_line=None, new_line=2, hunk=0)),
+        (20, True, DiffPosition(relative_line_number=8, old_line=20, new_line=20, hunk=1)),
+        (21, True, DiffPosition(relative_line_number=9, old_line=None, new_line=21, hunk=1)),
+        (22, True, DiffPosition(relative_line_number=10, old_line=21, new_line=22, hunk=1)),
+        (22, False, DiffPosition(relative_line_number=11, old_line=22, new_line=None, hunk=1)),
+    ],
+)
+def test_get_position(positions: DiffPositionIndex, line: int, new_side: bool, expected: DiffPosition) -> None:
+    assert positions.get_position("new.py", line, new_side=new_side) == expected
+
+
+@pytest.mark.parametrize(
+    ("path", "line", "new_side"),
+    [
+        # Context lines after the last modified line of a hunk are unknown
+        ("new.py", 3, True),
+        ("new.py", 10, True),
+        ("other.py", 1, True),
+    ],
+)
+def test_get_position_outside_of_the_diff(positions: DiffPositionIndex, path: str, line: int, new_side: bool) -> None:
+    assert positions.get_position(path, line, new_side=new_side) is None
+
+
+@pytest.mark.parametrize(
+    ("comment", "expected_line", "expected_relative_line", "expected_new_side"),
+    [
+        # Valid position
+        (_make_comment(line_number=21, relative_line_number=9, is_comment_on_new_path=True), 21, 9, True),
+        # Wrong relative line number
+        (_make_comment(line_number=21, relative_line_number=1, is_comment_on_new_path=True), 21, 9, True),
+        # Wrong line number and side
+        (_make_comment(line_number=50, relative_line_number=9, is_comment_on_new_path=False), 21, 9, True),
+        # Paths mixed up
+        (
+            _make_comment(line_number=2, relative_line_number=2, is_comment_on_new_path=False, new_path="old.py"),
+            2,
+            2,
+            False,
+        ),
+    ],
+)
+def test_locate_comment(
+    positions: DiffPositionIndex,
+    comment: ReviewComment,
+    expected_line: int,
+    expected_relative_line: int,
+    expected_new_side: bool,
+) -> None:
+    location = positions.locate_comment(comment)
+
+    assert location is not None
+    assert location.position is not None
+    assert location.comment == comment.model_copy(
+        update={
+            "new_path": "new.py",
+            "old_path": "old.py",
+            "line_number": expected_line,
+            "relative_line_number": expected_relative_line,
+            "is_comment_on_new_path": expected_new_side,
+        }
+    )
+
+
+def test_locate_comment_outside_of_the_diff_of_its_file(positions: DiffPositionIndex) -> None:
+    comment = _make_comment(line_number=50, relative_line_number=50, is_comment_on_new_path=True)
+
+    assert positions.locate_comment(comment) == CommentLocation(comment=comment, position=None)
+
+
+def test_locate_comment_of_a_file_outside_of_the_diff(positions: DiffPositionIndex) -> None:
+    comment = _make_comment(
+        line_number=1, relative_line_number=1, is_comment_on_new_path=True, new_path="other.py", old_path="other.py"
+    )
+
+    assert positions.locate_comment(comment) is None
@@ -0,0 +1,202 @@
+import datetime
+import io
+import time
+from collections.abc import Iterator
+from unittest import mock
+
+import github
+import pytest
+import requests
+from lgtm_ai.base.schemas import PRSource
+from lgtm_ai.formatters.markdown import MarkDownFormatter
+from lgtm_ai.git_client.rate_limit import (
+    RateLimitedHTTPAdapter,
+    RateLimits,
+    RateLimitScheduler,
+)
+from lgtm_ai.git_client.schemas import RateLimitBudget
+from lgtm_ai.git_client.utils import get_git_client
+from requests.adapters import HTTPAdapter
+
+
+def _make_response(status: int, headers: dict[str, str] | None = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.headers = requests.structures.CaseInsensitiveDict(headers or {})
+    response.raw = io.BytesIO(b"")
+    return response
+
+
+def _in_seconds(seconds: int) -> str:
+    return str(int(time.time()) + seconds)
+
+
+@pytest.fixture
+def m_sleep() -> Iterator[mock.MagicMock]:
+    with mock.patch("lgtm_ai.git_client.rate_limit.time.sleep") as m_sleep:
+        yield m_sleep
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "4999", "X-RateLimit-Reset": "1760000000"},
+        {"RateLimit-Limit": "5000", "RateLimit-Remaining": "4999", "RateLimit-Reset": "1760000000"},
+    ],
+)
+def test_update_reads_the_rate_limit_headers(headers: dict[str, str]) -> None:
+    scheduler = RateLimitScheduler()
+
+    scheduler.update(headers)
+
+    assert scheduler.budget == RateLimitBudget(
+        limit=5000, remaining=4999, reset_at=datetime.datetime.fromtimestamp(1760000000, tz=datetime.UTC)
+    )
+
+
+@pytest.mark.parametrize(
+    ("status_code", "headers", "expected_min", "expected_max"),
+    [
+        (429, {"Retry-After": "5"}, 5, 6),
+        (403, {"Retry-After": "5"}, 5, 6),
+        (429, {}, 0, 1),
+    ],
+)
+def test_get_retry_delay_of_rate_limited_responses(
+    status_code: int, headers: dict[str, str], expected_min: float, expected_max: float
+) -> None:
+    scheduler = RateLimitScheduler(RateLimits(max_retries=1))
+    scheduler.update(headers)
+
+    delay = scheduler.get_retry_delay(status_code, headers, attempt=0)
+
+    assert delay is not None
+    assert expected_min <= delay <= expected_max
+    assert scheduler.budget.throttled == 1
+
+
+def test_get_retry_delay_waits_for_the_rate_limit_reset() -> None:
+    scheduler = RateLimitScheduler(RateLimits(max_retries=1))
+    headers = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": _in_seconds(10)}
+    scheduler.update(headers)
+
+    delay = scheduler.get_retry_delay(403, headers, attempt=0)
+
+    assert delay is not None
+    assert 8 <= delay <= 11
+
+
+@pytest.mark.parametrize(
+    ("status_code", "headers", "attempt"),
+    [
+        (200, {}, 0),
+        (403, {"X-RateLimit-Remaining": "10"}, 0),
+        (429, {"Retry-After": "1"}, 2),
+        (429, {"Retry-After": "3600"}, 0),
+    ],
+)
+def test_get_retry_delay_does_not_retry(status_code: int, headers: dict[str, str], attempt: int) -> None:
+    scheduler = RateLimitScheduler(RateLimits(max_retries=2))
+
+    assert scheduler.get_retry_delay(status_code, headers, attempt=attempt) is None
+
+
+def test_get_retry_delay_backs_off_exponentially() -> None:
+    scheduler = RateLimitScheduler(RateLimits(max_retries=3))
+
+    with mock.patch("lgtm_ai.git_client.rate_limit.random.uniform", side_effect=lambda _, high: high):
+        delays = [scheduler.get_retry_delay(429, {}, attempt=attempt) for attempt in range(3)]
+
+    assert delays == [1, 2, 4]
+
+
+def test_acquire_paces_requests(m_sleep: mock.MagicMock) -> None:
+    with mock.patch("lgtm_ai.git_client.rate_limit.time.monotonic", return_value=100.0):
+        scheduler = RateLimitScheduler(RateLimits(requests_per_second=2))
+        for _ in range(4):
+            scheduler.acquire()
+
+    assert [call.args[0] for call in m_sleep.call_args_list] == [0.5, 1.0, 1.5]
+    assert scheduler.budget.requests == 4
+    assert scheduler.budget.waited_seconds == 3.0
+
+
+def test_acquire_spreads_the_remaining_budget(m_sleep: mock.MagicMock) -> None:
+    with mock.patch("lgtm_ai.git_client.rate_limit.time.monotonic", return_value=100.0):
+        scheduler = RateLimitScheduler()
+        scheduler.acquire()
+        scheduler.update(
+            {"X-RateLimit-Limit": "100", "X-RateLimit-Remaining": "50", "X-RateLimit-Reset": _in_seconds(100)}
+        )
+        scheduler.acquire()
+        m_sleep.assert_not_called()
+        scheduler.update(
+            {"X-RateLimit-Limit": "100", "X-RateLimit-Remaining": "5", "X-RateLimit-Reset": _in_seconds(100)}
+        )
+        scheduler.acquire()
+        scheduler.acquire()
+
+    ((delay,),) = (call.args for call in m_sleep.call_args_list)
+    assert delay == pytest.approx(20, abs=1)
+
+
+def test_acquire_waits_for_rate_limited_requests(m_sleep: mock.MagicMock) -> None:
+    scheduler = RateLimitScheduler(RateLimits(max_retries=1))
+
+    delay = scheduler.get_retry_delay(429, {"Retry-After": "5"}, attempt=0)
+    scheduler.acquire()
+
+    assert delay is not None
+    assert m_sleep.call_args.args[0] == pytest.approx(delay, abs=0.1)
+
+
+def test_adapter_retries_rate_limited_requests(m_sleep: mock.MagicMock) -> None:
+    session = requests.Session()
+    session.mount("https://", RateLimitedHTTPAdapter(RateLimitScheduler(RateLimits(max_retries=3))))
+
+    with mock.patch.object(
+        HTTPAdapter,
+        "send",
+        autospec=True,
+        side_effect=[_make_response(429, {"Retry-After": "1"}), _make_response(200, {"X-RateLimit-Remaining": "9"})],
+    ) as m_send:
+        response = session.get("https://api.github.com/repos/foo/bar")
+
+    assert response.status_code == 200
+    assert m_send.call_count == 2
+    m_sleep.assert_called_once()
+
+
+def test_get_git_client_shares_schedulers_by_host() -> None:
+    clients = [
+        get_git_client(
+            source=PRSource.gitlab,
+            token="token",
+            formatter=MarkDownFormatter(),
+            url=url,
+            rate_limits=RateLimits(max_retries=1),
+        )
+        for url in ("https://gitlab.com", "https://gitlab.com", "https://gitlab.example.com")
+    ]
+    schedulers = [client.scheduler for client in clients]  # type: ignore[union-attr]
+
+    assert schedulers[0] is schedulers[1]
+    assert schedulers[0] is not schedulers[2]
+    assert isinstance(clients[0].client.session.get_adapter("https://gitlab.com"), RateLimitedHTTPAdapter)  # type: ignore[union-attr]
+    assert clients[0].get_rate_limit_budget() == RateLimitBudget()  # type: ignore[union-attr]
+
+
+def test_github_transport_leaves_rate_limited_requests_to_the_scheduler() -> None:
+    client = get_git_client(
+        source=PRSource.github, token="token", formatter=MarkDownFormatter(), rate_limits=RateLimits(max_retries=1)
+    )
+
+    connection_class = client.client.requester._Requester__connectionClass  # type: ignore[union-attr]
+    connection = connection_class("api.github.com", 443, retry=github.GithubRetry(total=3))
+    retry = connection.session.get_adapter("https://api.github.com/repos").max_retries
+
+    assert not isinstance(retry, github.GithubRetry)
+    assert retry.total == 3
+    assert not retry.is_retry("GET", 403, has_retry_after=True)
+    assert not retry.is_retry("GET", 429, has_retry_after=True)
+    assert retry.is_retry("GET", 502)
@@ -49,7 +49,9 @@ async def test_lgtm_review_tool(temp_git_repo: Path) -> None:
     from lgtm_ai.mcp.__main__ import mcp
 
     async with Client(mcp) as client:
-        with mock.patch("lgtm_ai.review.CodeReviewer.review", return_value=MOCK_REVIEW) as mock_review:
+        with mock.patch(
+            "lgtm_ai.review.CodeReviewer.areview", new_callable=mock.AsyncMock, return_value=MOCK_REVIEW
+        ) as mock_review:
             result = await client.call_tool("lgtm-review", {"repo_path": str(temp_git_repo)})
 
     assert mock_review.call_count == 1
@@ -77,6 +79,12 @@ async def test_lgtm_review_tool(temp_git_repo: Path) -> None:
                 "tool_calls": 0,
             },
             "config": None,
+            "trimmed_sections": [],
+            "head_sha": None,
+            "reviewed_since_sha": None,
+            "cache": None,
+            "git_rate_limit": None,
+            "spans": [],
         },
     }
 
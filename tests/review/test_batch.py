@@ -0,0 +1,88 @@
+import asyncio
+from unittest import mock
+
+from lgtm_ai.ai.schemas import PublishMetadata, Review, ReviewResponse
+from lgtm_ai.base.exceptions import NothingToReviewError
+from lgtm_ai.base.schemas import PRSource, PRUrl
+from lgtm_ai.git_client.schemas import PRDiff
+from lgtm_ai.review.batch import BatchReviewer, BatchReviewResult
+from pydantic_ai.usage import RunUsage
+from tests.review.utils import MOCK_DIFF
+
+
+def _get_target(pr_number: int) -> PRUrl:
+    return PRUrl(
+        full_url=f"https://gitlab.com/foo/-/merge_requests/{pr_number}",
+        base_url="https://gitlab.com",
+        repo_path="foo",
+        pr_number=pr_number,
+        source=PRSource.gitlab,
+    )
+
+
+def _get_review(pr_number: int) -> Review:
+    return Review(
+        pr_diff=PRDiff(id=pr_number, diff=MOCK_DIFF, changed_files=[], target_branch="main", source_branch="feature"),
+        review_response=ReviewResponse(summary=f"review {pr_number}", raw_score=5),
+        metadata=PublishMetadata(model_name="whatever", usage=RunUsage()),
+    )
+
+
+def test_batch_results_are_returned_in_order() -> None:
+    code_reviewer = mock.Mock()
+
+    async def areview(target: PRUrl, head_sha: str | None = None) -> Review:
+        if target.pr_number == 2:
+            raise NothingToReviewError
+        if target.pr_number == 3:
+            raise ValueError("boom")
+        # Make the first review finish last
+        await asyncio.sleep(0.01 if target.pr_number == 1 else 0)
+        return _get_review(target.pr_number)
+
+    code_reviewer.areview = areview
+    streamed_results: list[BatchReviewResult] = []
+
+    results = BatchReviewer(lambda target: code_reviewer, concurrency=4).review(
+        [_get_target(pr_number) for pr_number in range(1, 5)], on_result=streamed_results.append
+    )
+
+    assert [(result.url[-1], result.review is not None, result.error) for result in results] == [
+        ("1", True, None),
+        ("2", False, None),
+        ("3", False, "boom"),
+        ("4", True, None),
+    ]
+    assert streamed_results[-1].url == results[0].url
+    code_reviewer.git_client.publish_review.assert_not_called()
+
+
+def test_batch_respects_concurrency() -> None:
+    running = 0
+    max_running = 0
+
+    async def areview(target: PRUrl, head_sha: str | None = None) -> Review:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return _get_review(target.pr_number)
+
+    code_reviewer = mock.Mock(areview=areview)
+
+    results = BatchReviewer(lambda target: code_reviewer, concurrency=2).review(
+        [_get_target(pr_number) for pr_number in range(1, 7)]
+    )
+
+    assert len(results) == 6
+    assert max_running == 2
+
+
+def test_batch_publishes_reviews() -> None:
+    code_reviewer = mock.Mock(areview=mock.AsyncMock(return_value=_get_review(1)))
+
+    BatchReviewer(lambda target: code_reviewer, concurrency=1, publish=True).review([_get_target(1)])
+
+    code_reviewer.areview.assert_called_once_with(_get_target(1), head_sha=None)
+    code_reviewer.git_client.publish_review.assert_called_once_with(pr_url=_get_target(1), review=_get_review(1))
@@ -0,0 +1,87 @@
+from lgtm_ai.ai.schemas import AdditionalContext, TrimmedSection
+from lgtm_ai.review.budget import TRUNCATION_MARKER, PromptBudgetPlanner
+from lgtm_ai.review.schemas import PRCodeContext, PRContextFileContents
+
+
+def _get_context() -> PRCodeContext:
+    return PRCodeContext(
+        file_contents=[
+            PRContextFileContents(file_path="small.py", content="s" * 400),
+            PRContextFileContents(file_path="big.py", content="line\n" * 400),
+            PRContextFileContents(file_path="old.py", content="o" * 800, branch="target"),
+        ]
+    )
+
+
+def _get_additional_context() -> list[AdditionalContext]:
+    return [
+        AdditionalContext(prompt="guidelines", context="g" * 400),
+        AdditionalContext(prompt="more guidelines", context="m" * 400),
+    ]
+
+
+def test_nothing_is_trimmed_when_under_budget() -> None:
+    context, additional_context = _get_context(), _get_additional_context()
+
+    plan = PromptBudgetPlanner(max_tokens=10_000).plan(
+        fixed_tokens=100, context=context, additional_context=additional_context
+    )
+
+    assert plan.context == context
+    assert plan.additional_context == additional_context
+    assert plan.trimmed == []
+    assert plan.estimated_tokens == 100 + 100 + 500 + 200 + 100 + 100
+
+
+def test_target_branch_context_is_dropped_first() -> None:
+    plan = PromptBudgetPlanner(max_tokens=950).plan(
+        fixed_tokens=100, context=_get_context(), additional_context=_get_additional_context()
+    )
+
+    assert [fc.file_path for fc in plan.context.file_contents] == ["small.py", "big.py"]
+    assert plan.additional_context == _get_additional_context()
+    assert plan.trimmed == [
+        TrimmedSection(section="context", name="old.py", action="dropped", original_tokens=200, final_tokens=0)
+    ]
+    assert plan.estimated_tokens <= 950
+
+
+def test_largest_files_are_truncated_by_whole_lines() -> None:
+    plan = PromptBudgetPlanner(max_tokens=700).plan(
+        fixed_tokens=100, context=_get_context(), additional_context=_get_additional_context()
+    )
+
+    big = plan.context.file_contents[1]
+    assert big.file_path == "big.py"
+    assert big.content.endswith("line" + TRUNCATION_MARKER)
+    assert [fc.file_path for fc in plan.context.file_contents] == ["small.py", "big.py"]
+    assert plan.additional_context == _get_additional_context()
+    assert [(t.name, t.action) for t in plan.trimmed] == [("big.py", "truncated"), ("old.py", "dropped")]
+    assert plan.estimated_tokens <= 700
+
+
+def test_additional_context_is_trimmed_last() -> None:
+    plan = PromptBudgetPlanner(max_tokens=200).plan(
+        fixed_tokens=100, context=_get_context(), additional_context=_get_additional_context()
+    )
+
+    assert plan.context == PRCodeContext(file_contents=[])
+    assert plan.additional_context == [AdditionalContext(prompt="guidelines", context="g" * 400)]
+    assert [(t.section, t.name, t.action) for t in plan.trimmed] == [
+        ("context", "small.py", "dropped"),
+        ("context", "big.py", "dropped"),
+        ("context", "old.py", "dropped"),
+        ("additional_context", "more guidelines", "dropped"),
+    ]
+    assert plan.estimated_tokens == 200
+
+
+def test_fixed_sections_are_never_trimmed() -> None:
+    plan = PromptBudgetPlanner(max_tokens=100).plan(
+        fixed_tokens=500, context=_get_context(), additional_context=_get_additional_context()
+    )
+
+    assert plan.context == PRCodeContext(file_contents=[])
+    assert plan.additional_context is None
+    assert len(plan.trimmed) == 5
+    assert plan.estimated_tokens == 500
@@ -1,10 +1,13 @@
+import threading
+import time
 from unittest import mock
 
 import httpx
 import pytest
 from lgtm_ai.ai.schemas import AdditionalContext
-from lgtm_ai.base.schemas import PRSource, PRUrl
+from lgtm_ai.base.schemas import ContextMode, PRSource, PRUrl
 from lgtm_ai.config.constants import DEFAULT_ISSUE_REGEX
+from lgtm_ai.git.parser import DiffFileMetadata, parse_diff_patch
 from lgtm_ai.git_client.base import GitClient
 from lgtm_ai.git_client.github import GitHubClient
 from lgtm_ai.git_client.gitlab import GitlabClient
@@ -104,10 +107,9 @@ class TestAdditionalContext:
 class TestCodeContext:
     def test_get_context_multiple_files(self, client: GitClient) -> None:
         m_client = mock.Mock(spec=client)
-        m_client.get_file_contents.side_effect = [
-            "lorem ipsum dolor sit amet",
-            "surprise",
-        ]
+        m_client.get_files_contents.return_value = None
+        contents = {"important.py": "lorem ipsum dolor sit amet", "logic.py": "surprise"}
+        m_client.get_file_contents.side_effect = lambda file_path, pr_url, branch_name: contents[file_path]
         context_retriever = ContextRetriever(
             git_client=m_client, issues_client=MockGitClient(), httpx_client=mock.Mock(spec=httpx.Client)
         )
@@ -139,11 +141,10 @@ class TestCodeContext:
 
     def test_get_context_one_file_missing(self, client: GitClient) -> None:
         m_client = mock.Mock(spec=client)
-        m_client.get_file_contents.side_effect = [
-            None,  # Missing in source branch
-            None,  # Missing in target branch
-            "surprise",
-        ]
+        m_client.get_files_contents.return_value = None
+        # important.py is missing in both source and target branches
+        contents = {"important.py": None, "logic.py": "surprise"}
+        m_client.get_file_contents.side_effect = lambda file_path, pr_url, branch_name: contents[file_path]
         context_retriever = ContextRetriever(
             git_client=m_client, issues_client=MockGitClient(), httpx_client=mock.Mock(spec=httpx.Client)
         )
@@ -175,6 +176,166 @@ class TestCodeContext:
         )
 
 
+class TestConcurrentCodeContext:
+    pr_url = PRUrl(
+        full_url="https://github.com/foo/bar/pull/1",
+        base_url="https://github.com",
+        repo_path="foo/bar",
+        pr_number=1,
+        source=PRSource.github,
+    )
+
+    def test_context_keeps_file_order_and_falls_back_to_target(self) -> None:
+        changed_files = [f"file_{i}.py" for i in range(20)]
+
+        def _get_file_contents(file_path: str, pr_url: PRUrl, branch_name: str) -> str | None:
+            index = int(file_path.removeprefix("file_").removesuffix(".py"))
+            # Files finish in reverse order, and every third file only exists in the target branch
+            time.sleep((20 - index) / 1000)
+            if index % 3 == 0 and branch_name == "source":
+                return None
+            return f"{file_path}@{branch_name}"
+
+        m_client = mock.Mock(spec=GitHubClient)
+
+        m_client.get_files_contents.return_value = None
+        m_client.get_file_contents.side_effect = _get_file_contents
+        context_retriever = ContextRetriever(
+            git_client=m_client, issues_client=None, httpx_client=mock.Mock(spec=httpx.Client), max_workers=8
+        )
+        pr_diff = PRDiff(id=1, changed_files=changed_files, target_branch="main", source_branch="feature", diff=[])
+
+        context = context_retriever.get_code_context(self.pr_url, pr_diff=pr_diff)
+
+        expected_branches = ["target" if i % 3 == 0 else "source" for i in range(20)]
+        assert context == PRCodeContext(
+            file_contents=[
+                PRContextFileContents(file_path=file_path, content=f"{file_path}@{branch}", branch=branch)
+                for file_path, branch in zip(changed_files, expected_branches, strict=True)
+            ]
+        )
+
+    @pytest.mark.parametrize(
+        ("max_workers", "max_workers_per_host", "expected_max_in_flight"),
+        [
+            (1, 8, 1),
+            (8, 2, 2),
+            (4, 8, 4),
+        ],
+    )
+    def test_context_fetching_is_bounded(
+        self, max_workers: int, max_workers_per_host: int, expected_max_in_flight: int
+    ) -> None:
+        lock = threading.Lock()
+        in_flight = 0
+        max_in_flight = 0
+
+        def _get_file_contents(file_path: str, pr_url: PRUrl, branch_name: str) -> str:
+            nonlocal in_flight, max_in_flight
+            with lock:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+            time.sleep(0.01)
+            with lock:
+                in_flight -= 1
+            return "content"
+
+        m_client = mock.Mock(spec=GitHubClient)
+
+        m_client.get_files_contents.return_value = None
+        m_client.get_file_contents.side_effect = _get_file_contents
+        context_retriever = ContextRetriever(
+            git_client=m_client,
+            issues_client=None,
+            httpx_client=mock.Mock(spec=httpx.Client),
+            max_workers=max_workers,
+            max_workers_per_host=max_workers_per_host,
+        )
+        pr_diff = PRDiff(
+            id=1,
+            changed_files=[f"file_{i}.py" for i in range(16)],
+            target_branch="main",
+            source_branch="feature",
+            diff=[],
+        )
+
+        context = context_retriever.get_code_context(self.pr_url, pr_diff=pr_diff)
+
+        assert len(context.file_contents) == 16
+        assert max_in_flight == expected_max_in_flight
+
+    def test_context_is_fetched_in_bulk_if_the_client_supports_it(self) -> None:
+        def _get_files_contents(pr_url: PRUrl, file_paths: list[str], branch_name: str) -> dict[str, str | None]:
+            missing = {"b.py", "c.py"} if branch_name == "source" else {"c.py"}
+            return {
+                file_path: None if file_path in missing else f"{file_path}@{branch_name}" for file_path in file_paths
+            }
+
+        m_client = mock.Mock(spec=GitHubClient)
+        m_client.get_files_contents.side_effect = _get_files_contents
+        context_retriever = ContextRetriever(
+            git_client=m_client, issues_client=None, httpx_client=mock.Mock(spec=httpx.Client)
+        )
+        pr_diff = PRDiff(
+            id=1, changed_files=["a.py", "b.py", "c.py"], target_branch="main", source_branch="feature", diff=[]
+        )
+
+        context = context_retriever.get_code_context(self.pr_url, pr_diff=pr_diff)
+
+        assert context == PRCodeContext(
+            file_contents=[
+                PRContextFileContents(file_path="a.py", content="a.py@source", branch="source"),
+                PRContextFileContents(file_path="b.py", content="b.py@target", branch="target"),
+            ]
+        )
+        assert m_client.get_files_contents.call_args_list == [
+            mock.call(self.pr_url, ["a.py", "b.py", "c.py"], "source"),
+            mock.call(self.pr_url, ["b.py", "c.py"], "target"),
+        ]
+        m_client.get_file_contents.assert_not_called()
+
+    def test_hunks_context_mode_keeps_only_windows_around_hunks(self) -> None:
+        contents = {"big.py": "\n".join(f"line {i}" for i in range(1, 101)), "no_diff.py": "small"}
+        m_client = mock.Mock(spec=GitHubClient)
+        m_client.get_files_contents.return_value = None
+        m_client.get_file_contents.side_effect = lambda file_path, pr_url, branch_name: contents[file_path]
+        context_retriever = ContextRetriever(
+            git_client=m_client,
+            issues_client=None,
+            httpx_client=mock.Mock(spec=httpx.Client),
+            context_mode=ContextMode.hunks,
+            context_window_lines=1,
+        )
+        diff = parse_diff_patch(
+            DiffFileMetadata(new_file=False, deleted_file=False, renamed_file=False, new_path="big.py"),
+            "@@ -50,1 +50,1 @@\n-old line 50\n+line 50\n",
+        )
+        pr_diff = PRDiff(
+            id=1, changed_files=["big.py", "no_diff.py"], target_branch="main", source_branch="feature", diff=[diff]
+        )
+
+        context = context_retriever.get_code_context(self.pr_url, pr_diff=pr_diff)
+
+        assert context == PRCodeContext(
+            file_contents=[
+                PRContextFileContents(
+                    file_path="big.py",
+                    content="\n".join(
+                        [
+                            "[... lines 1-48 omitted ...]",
+                            "line 49",
+                            "line 50",
+                            "line 51",
+                            "[... lines 52-100 omitted ...]",
+                        ]
+                    ),
+                ),
+                # Files without a diff (e.g., binary files) are kept whole
+                PRContextFileContents(file_path="no_diff.py", content="small"),
+            ]
+        )
+
+
 class TestIssueContext:
     @pytest.mark.parametrize(
         ("metadata", "expected"),
@@ -0,0 +1,43 @@
+import json
+
+from lgtm_ai.base.schemas import DiffFormat
+from lgtm_ai.git.parser import DiffFileMetadata, DiffResult, parse_diff_patch
+from lgtm_ai.review.diff_formats import serialize_diff
+
+DIFFS = [
+    parse_diff_patch(
+        DiffFileMetadata(new_file=False, deleted_file=False, renamed_file=True, new_path="new.py", old_path="old.py"),
+        "@@ -1,2 +1,2 @@\n-a = 1\n+a = 2\n b = 2\n@@ -10,1 +10,2 @@\n c = 3\n+d = 4\n",
+    ),
+    DiffResult(
+        metadata=DiffFileMetadata(new_file=True, deleted_file=False, renamed_file=False, new_path="image.png"),
+        modified_lines=[],
+    ),
+]
+
+
+def test_serialize_diff_json() -> None:
+    assert json.loads(serialize_diff(DIFFS, DiffFormat.json)) == [diff.model_dump() for diff in DIFFS]
+
+
+def test_serialize_diff_compact() -> None:
+    assert serialize_diff(DIFFS, DiffFormat.compact).splitlines() == [
+        "FILE new.py old_path=old.py renamed_file",
+        "@@ -1 +1 @@",
+        "- 1 1 | a = 1",
+        "+ 1 2 | a = 2",
+        "@@ -10 +10 @@",
+        "+ 11 6 | d = 4",
+        "FILE image.png new_file",
+    ]
+
+
+def test_serialize_diff_compact_is_smaller_than_json() -> None:
+    diff = parse_diff_patch(
+        DiffFileMetadata(new_file=False, deleted_file=False, renamed_file=False, new_path="module.py"),
+        "@@ -1,50 +1,50 @@\n" + "".join(f"-value_{i} = {i}\n+value_{i} = {i + 1}\n" for i in range(50)),
+    )
+
+    compact, json_diff = serialize_diff([diff], DiffFormat.compact), serialize_diff([diff], DiffFormat.json)
+
+    assert len(compact) < len(json_diff) / 2
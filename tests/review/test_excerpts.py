@@ -0,0 +1,268 @@
+import pytest
+from lgtm_ai.ai.schemas import ReviewComment
+from lgtm_ai.git.parser import DiffFileMetadata, DiffResult, parse_diff_patch
+from lgtm_ai.git_client.schemas import ContextBranch
+from lgtm_ai.review.excerpts import (
+    extract_commented_diff,
+    extract_hunk_windows,
+    extract_symbols,
+    get_hunk_line_ranges,
+)
+
+METADATA = DiffFileMetadata(new_file=False, deleted_file=False, renamed_file=False, new_path="module.py")
+
+# Line 10 is replaced by two lines, and line 40 (41 in the new file) is removed
+DIFF_TEXT = """@@ -9,3 +9,4 @@ def foo():
+ line 9
+-line 10
++line 10a
++line 10b
+ line 11
+@@ -39,3 +40,2 @@ def bar():
+ line 39
+-line 40
+ line 41
+"""
+
+NEW_CONTENT = "\n".join(
+    [f"line {i}" for i in range(1, 10)] + ["line 10a", "line 10b"] + [f"line {i}" for i in range(11, 61) if i != 40]
+)
+
+
+@pytest.fixture
+def diff() -> DiffResult:
+    return parse_diff_patch(METADATA, DIFF_TEXT)
+
+
+@pytest.mark.parametrize(
+    ("branch", "expected"),
+    [
+        ("source", [(10, 11), (41, 41)]),
+        ("target", [(10, 11), (40, 40)]),
+    ],
+)
+def test_get_hunk_line_ranges(diff: DiffResult, branch: ContextBranch, expected: list[tuple[int, int]]) -> None:
+    assert get_hunk_line_ranges(diff, branch) == expected
+
+
+def test_extract_hunk_windows(diff: DiffResult) -> None:
+    excerpt = extract_hunk_windows(NEW_CONTENT, diff, "source", window_lines=2)
+
+    assert excerpt.splitlines() == [
+        "[... lines 1-7 omitted ...]",
+        "line 8",
+        "line 9",
+        "line 10a",
+        "line 10b",
+        "line 11",
+        "line 12",
+        "[... lines 14-38 omitted ...]",
+        "line 38",
+        "line 39",
+        "line 41",
+        "line 42",
+        "line 43",
+        "[... lines 44-60 omitted ...]",
+    ]
+
+
+def test_extract_hunk_windows_merges_overlapping_windows(diff: DiffResult) -> None:
+    excerpt = extract_hunk_windows(NEW_CONTENT, diff, "source", window_lines=15)
+
+    lines = excerpt.splitlines()
+    assert lines[0] == "line 1"
+    assert lines[-1] == "[... lines 57-60 omitted ...]"
+    assert not any("omitted" in line for line in lines[:-1])
+
+
+def test_extract_hunk_windows_keeps_whole_file_if_windows_cover_it(diff: DiffResult) -> None:
+    assert extract_hunk_windows(NEW_CONTENT, diff, "source", window_lines=100) == NEW_CONTENT
+
+
+def test_extract_hunk_windows_ignores_hunks_past_the_end_of_the_file(diff: DiffResult) -> None:
+    content = "\n".join(f"line {i}" for i in range(1, 21))
+
+    excerpt = extract_hunk_windows(content, diff, "source", window_lines=1)
+
+    assert excerpt.splitlines() == [
+        "[... lines 1-8 omitted ...]",
+        "line 9",
+        "line 10",
+        "line 11",
+        "line 12",
+        "[... lines 13-20 omitted ...]",
+    ]
+
+
+@pytest.mark.parametrize("mode", ["hunks", "symbols"])
+def test_extract_relevant_lines_of_a_renamed_file_without_changes(mode: str) -> None:
+    metadata = DiffFileMetadata(
+        new_file=False, deleted_file=False, renamed_file=True, new_path="new.py", old_path="old.py"
+    )
+    renamed = parse_diff_patch(metadata, "")
+    content = "import os\n\n\ndef foo():\n    return os.sep\n"
+
+    if mode == "hunks":
+        excerpt = extract_hunk_windows(content, renamed, "source", window_lines=2)
+    else:
+        excerpt = extract_symbols(content, renamed, "source", file_path="new.py", window_lines=2)
+
+    assert excerpt == "[... no textual changes, lines 1-5 omitted ...]"
+
+
+PYTHON_CONTENT = """import os
+from typing import Any
+
+CONSTANT = 1
+
+
+class Foo:
+    def bar(self) -> None:
+        pass
+
+    @property
+    def baz(self) -> int:
+        value = 1
+        value += 1
+        return value
+
+
+def qux() -> None:
+    pass
+"""
+
+
+def _diff_changing_line(line_number: int, path: str = "module.py") -> DiffResult:
+    return parse_diff_patch(
+        METADATA.model_copy(update={"new_path": path}),
+        f"@@ -{line_number},1 +{line_number},1 @@\n-old\n+new\n",
+    )
+
+
+def test_extract_symbols_python() -> None:
+    excerpt = extract_symbols(PYTHON_CONTENT, _diff_changing_line(14), "source", file_path="module.py", window_lines=1)
+
+    assert excerpt.splitlines() == [
+        "import os",
+        "from typing import Any",
+        "[... lines 3-10 omitted ...]",
+        "    @property",
+        "    def baz(self) -> int:",
+        "        value = 1",
+        "        value += 1",
+        "        return value",
+        "[... lines 16-19 omitted ...]",
+    ]
+
+
+def test_extract_symbols_python_module_level_change_falls_back_to_window() -> None:
+    excerpt = extract_symbols(PYTHON_CONTENT, _diff_changing_line(4), "source", file_path="module.py", window_lines=1)
+
+    assert excerpt.splitlines() == [
+        "import os",
+        "from typing import Any",
+        "",
+        "CONSTANT = 1",
+        "",
+        "[... lines 6-19 omitted ...]",
+    ]
+
+
+def test_extract_symbols_invalid_python_uses_indentation() -> None:
+    content = PYTHON_CONTENT.replace("def qux() -> None:", "def qux( -> None:")
+
+    excerpt = extract_symbols(content, _diff_changing_line(19), "source", file_path="module.py", window_lines=1)
+
+    assert excerpt.splitlines() == [
+        "import os",
+        "from typing import Any",
+        "[... lines 3-17 omitted ...]",
+        "def qux( -> None:",
+        "    pass",
+    ]
+
+
+def test_extract_symbols_braces() -> None:
+    content = """import { x } from "y";
+
+const a = 1;
+
+// Does things
+function foo() {
+  if (a) {
+    return x;
+  }
+  return null;
+}
+
+function bar() {}
+"""
+
+    excerpt = extract_symbols(
+        content, _diff_changing_line(10, "module.ts"), "source", file_path="module.ts", window_lines=0
+    )
+
+    assert excerpt.splitlines() == [
+        'import { x } from "y";',
+        "[... lines 2-4 omitted ...]",
+        "// Does things",
+        "function foo() {",
+        "  if (a) {",
+        "    return x;",
+        "  }",
+        "  return null;",
+        "}",
+        "[... lines 12-13 omitted ...]",
+    ]
+
+
+def _comment(line_number: int, *, relative_line_number: int = 1, on_new_path: bool = True) -> ReviewComment:
+    return ReviewComment(
+        old_path="module.py",
+        new_path="module.py",
+        comment="comment",
+        category="Correctness",
+        severity="LOW",
+        line_number=line_number,
+        relative_line_number=relative_line_number,
+        is_comment_on_new_path=on_new_path,
+        programming_language="python",
+    )
+
+
+def test_extract_commented_diff_keeps_only_the_hunk_of_the_comment(diff: DiffResult) -> None:
+    other_file = parse_diff_patch(METADATA.model_copy(update={"new_path": "other.py"}), "@@ -1,1 +1,1 @@\n-a\n+b\n")
+
+    excerpts = extract_commented_diff([diff, other_file], [_comment(11)])
+
+    assert [excerpt.metadata.new_path for excerpt in excerpts] == ["module.py"]
+    assert [(line.modification_type, line.line_number) for line in excerpts[0].modified_lines] == [
+        ("removed", 10),
+        ("added", 10),
+        ("added", 11),
+    ]
+
+
+def test_extract_commented_diff_keeps_lines_close_to_the_comment() -> None:
+    diff = parse_diff_patch(METADATA, "@@ -1,30 +1,30 @@\n" + "".join(f"-old {i}\n+new {i}\n" for i in range(30)))
+
+    excerpts = extract_commented_diff([diff], [_comment(15, on_new_path=False)], window_lines=2)
+
+    assert [(line.modification_type, line.line_number) for line in excerpts[0].modified_lines] == [
+        ("removed", 14),
+        ("added", 14),
+        ("removed", 15),
+        ("added", 15),
+        ("removed", 16),
+    ]
+
+
+def test_extract_commented_diff_comment_outside_modified_lines(diff: DiffResult) -> None:
+    # The comment is on an unmodified line, so its relative line number is used
+    excerpts = extract_commented_diff([diff], [_comment(50, relative_line_number=7)], window_lines=1)
+
+    assert [(line.modification_type, line.line_number) for line in excerpts[0].modified_lines] == [("removed", 40)]
+
+
+def test_extract_commented_diff_without_comments(diff: DiffResult) -> None:
+    assert extract_commented_diff([diff], []) == []
@@ -1,9 +1,11 @@
+import pathlib
 from unittest import mock
 
 from lgtm_ai.ai.agent import (
     get_guide_agent_with_settings,
 )
 from lgtm_ai.ai.schemas import (
+    CacheStats,
     GuideChecklistItem,
     GuideKeyChange,
     GuideReference,
@@ -17,6 +19,7 @@ from lgtm_ai.git_client.schemas import PRDiff
 from lgtm_ai.review.guide import ReviewGuideGenerator
 from pydantic_ai.models.openai import OpenAIChatModel
 from pydantic_ai.models.test import TestModel
+from pydantic_ai.usage import RunUsage
 from tests.review.utils import MOCK_DIFF, MockGitClient
 
 
@@ -36,6 +39,15 @@ def test_get_guide_from_url_valid() -> None:
             pr_url=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
         )
 
+    spans, guide.metadata.spans = guide.metadata.spans, []
+    assert [span.name for span in spans] == [
+        "get_diff",
+        "get_code_context",
+        "get_pr_metadata",
+        "render_guide_prompt",
+        "guide_agent",
+        "guide",
+    ]
     assert guide == ReviewGuide(
         pr_diff=PRDiff(
             id=1,
@@ -56,3 +68,27 @@ def test_get_guide_from_url_valid() -> None:
             config=config.model_dump(),
         ),
     )
+
+
+def test_guide_is_cached(tmp_path: pathlib.Path) -> None:
+    guide_agent = mock.Mock()
+    guide_agent.run_sync.return_value = mock.Mock(
+        output=GuideResponse(summary="a", key_changes=[], checklist=[], references=[]),
+        usage=lambda: RunUsage(requests=1),
+    )
+    guide_generator = ReviewGuideGenerator(
+        guide_agent=guide_agent,
+        model=mock.Mock(spec=OpenAIChatModel, model_name="gemini-2.5-flash"),
+        git_client=MockGitClient(),
+        config=ResolvedConfig(ai_api_key="", git_api_key="", cache_dir=tmp_path),
+    )
+    pr_url = PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+
+    first_guide = guide_generator.generate_review_guide(pr_url=pr_url)
+    second_guide = guide_generator.generate_review_guide(pr_url=pr_url)
+
+    assert guide_agent.run_sync.call_count == 1
+    assert first_guide.guide_response == second_guide.guide_response
+    assert first_guide.metadata.cache == CacheStats(misses=1)
+    assert second_guide.metadata.cache == CacheStats(hits=1)
+    assert second_guide.metadata.usage == RunUsage()
@@ -1,16 +1,33 @@
 import json
+import pathlib
 import textwrap
-from typing import Literal
+import threading
+from collections.abc import AsyncIterator
+from typing import Any, Literal
 from unittest import mock
 
 import pytest
 from lgtm_ai.ai.agent import get_reviewer_agent_with_settings, get_summarizing_agent_with_settings
-from lgtm_ai.ai.schemas import AdditionalContext, PublishMetadata, Review, ReviewResponse
+from lgtm_ai.ai.prompts import (
+    REVIEWER_SYSTEM_PROMPT_COMPACT_DIFF,
+    SUMMARIZING_SYSTEM_PROMPT,
+    SUMMARIZING_SYSTEM_PROMPT_DIFF_EXCERPTS,
+)
+from lgtm_ai.ai.schemas import (
+    AdditionalContext,
+    CacheStats,
+    PublishMetadata,
+    Review,
+    ReviewComment,
+    ReviewResponse,
+    SummarizingDeps,
+)
 from lgtm_ai.base.exceptions import NothingToReviewError
-from lgtm_ai.base.schemas import PRSource, PRUrl
+from lgtm_ai.base.schemas import DiffFormat, PRSource, PRUrl, SummarizingDiff, SummarizingMode
 from lgtm_ai.config.constants import DEFAULT_AI_MODEL
 from lgtm_ai.config.handler import ResolvedConfig
-from lgtm_ai.git_client.schemas import PRDiff
+from lgtm_ai.git.parser import DiffFileMetadata, DiffResult, parse_diff_patch
+from lgtm_ai.git_client.schemas import ContextBranch, PRDiff, PRMetadata
 from lgtm_ai.review import CodeReviewer
 from lgtm_ai.review.context import ContextRetriever
 from lgtm_ai.review.exceptions import (
@@ -29,10 +46,19 @@ from pydantic_ai import (
     capture_run_messages,
     models,
 )
-from pydantic_ai.messages import ModelMessage, ModelRequest
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    ToolCallPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, DeltaToolCalls, FunctionModel
 from pydantic_ai.models.openai import OpenAIChatModel
 from pydantic_ai.models.test import TestModel
-from pydantic_ai.usage import RunUsage
+from pydantic_ai.usage import RequestUsage, RunUsage
+from tests.git_client.test_gitlab import MockGitlabUrl, mock_gitlab_client, mock_mr, mock_project
 from tests.review.utils import MOCK_DIFF, MockGitClient
 
 # This is a safety measure to make sure we don't accidentally make real requests to the LLM while testing,
@@ -114,6 +140,28 @@ def test_get_review_from_url_valid(context_retriever: ContextRetriever) -> None:
             target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
         )
 
+    # Spans are checked on their own, their durations are not deterministic
+    spans, review.metadata.spans = review.metadata.spans, []
+    assert {span.name for span in spans} == {
+        "get_pr_metadata",
+        "get_diff",
+        "get_code_context",
+        "get_additional_context",
+        "render_review_prompt",
+        "reviewer_agent",
+        "render_summarizing_prompt",
+        "summarizing_agent",
+        "review",
+    }
+    assert spans[-1].attributes == {
+        "source": "gitlab",
+        "comments": 0,
+        "requests": 2,
+        "input_tokens": review.metadata.usage.input_tokens,
+        "output_tokens": review.metadata.usage.output_tokens,
+        "cache_read_tokens": 0,
+    }
+
     # We get an actual review object
     assert review == Review(
         pr_diff=PRDiff(
@@ -132,20 +180,21 @@ def test_get_review_from_url_valid(context_retriever: ContextRetriever) -> None:
     )
 
     # There are messages with the correct prompts to the AI agent
-    expected_message = (
-        textwrap.dedent(
-            f"""
-        PR METADATA:
-        - Title: feat(#288): a title
-        - Description: bar
-
-
+    expected_message = textwrap.dedent(
+        f"""
+        ADDITIONAL CONTEXT:
 
-        PR DIFF:
+        ```file=None, prompt=These are the development guidelines for the project. Please follow them.
+        contents-of-dev-guidelines
         ```
-        {json.dumps([diff.model_dump() for diff in MOCK_DIFF])}
+
+        ```file=None, prompt=Yet another prompt
+        yet-another-context
         ```
 
+        PR METADATA:
+        - Title: feat(#288): a title
+        - Description: bar
 
         CONTEXT:
 
@@ -157,19 +206,12 @@ def test_get_review_from_url_valid(context_retriever: ContextRetriever) -> None:
         contents-of-file-2.txt-context
         ```
 
-        ADDITIONAL CONTEXT:
-
-        ```file=None, prompt=These are the development guidelines for the project. Please follow them.
-        contents-of-dev-guidelines
+        PR DIFF:
         ```
-
-        ```file=None, prompt=Yet another prompt
-        yet-another-context
+        {json.dumps([diff.model_dump() for diff in MOCK_DIFF])}
         ```
         """
-        ).strip()
-        + "\n"
-    )
+    ).strip()
     _assert_agent_message(
         messages,
         expected_message,
@@ -222,25 +264,26 @@ def test_get_review_with_issue(context_retriever: ContextRetriever) -> None:
     assert isinstance(review, Review)
 
     # There are messages with the correct prompts to the AI agent
-    expected_message = (
-        textwrap.dedent(
-            f"""
+    expected_message = textwrap.dedent(
+        f"""
+        ADDITIONAL CONTEXT:
+
+        ```file=None, prompt=These are the development guidelines for the project. Please follow them.
+        contents-of-dev-guidelines
+        ```
+
+        ```file=None, prompt=Yet another prompt
+        yet-another-context
+        ```
+
         PR METADATA:
         - Title: feat(#288): a title
         - Description: bar
 
-
         USER STORY:
         - Title: Issue title
         - Description: Issue description
 
-
-        PR DIFF:
-        ```
-        {json.dumps([diff.model_dump() for diff in MOCK_DIFF])}
-        ```
-
-
         CONTEXT:
 
         ```file=file-1.txt, branch=source
@@ -251,19 +294,12 @@ def test_get_review_with_issue(context_retriever: ContextRetriever) -> None:
         contents-of-file-2.txt-context
         ```
 
-        ADDITIONAL CONTEXT:
-
-        ```file=None, prompt=These are the development guidelines for the project. Please follow them.
-        contents-of-dev-guidelines
+        PR DIFF:
         ```
-
-        ```file=None, prompt=Yet another prompt
-        yet-another-context
+        {json.dumps([diff.model_dump() for diff in MOCK_DIFF])}
         ```
         """
-        ).strip()
-        + "\n"
-    )
+    ).strip()
     _assert_agent_message(
         messages,
         expected_message,
@@ -275,7 +311,8 @@ def test_get_review_with_issue(context_retriever: ContextRetriever) -> None:
 def test_summarizing_message_in_review(context_retriever: ContextRetriever) -> None:
     test_agent = mock.Mock()
     test_summarizing_agent = get_summarizing_agent_with_settings()
-    test_agent.run_sync.return_value = mock.Mock(
+    test_agent.run = mock.AsyncMock()
+    test_agent.run.return_value = mock.Mock(
         output=ReviewResponse(summary="a", raw_score=1),
         usage=lambda: RunUsage(requests=1, input_tokens=1041, output_tokens=6),
     )
@@ -451,6 +488,480 @@ def test_file_is_excluded_from_prompt(context_retriever: ContextRetriever) -> No
     assert not any("contents-of-file2" in str(message) for message in messages)
 
 
+def test_excluded_files_are_not_fetched_for_context() -> None:
+    fetched_files: list[str] = []
+
+    class RecordingGitClient(MockGitClient):
+        def get_file_contents(self, pr_url: PRUrl, file_path: str, branch_name: ContextBranch) -> str | None:
+            fetched_files.append(file_path)
+            return super().get_file_contents(pr_url, file_path, branch_name)
+
+    test_agent = get_reviewer_agent_with_settings()
+    test_summary_agent = get_summarizing_agent_with_settings()
+    with test_agent.override(model=TestModel()), test_summary_agent.override(model=TestModel()):
+        code_reviewer = CodeReviewer(
+            reviewer_agent=test_agent,
+            summarizing_agent=test_summary_agent,
+            model=mock.Mock(spec=OpenAIChatModel, model_name=DEFAULT_AI_MODEL),
+            git_client=MockGitClient(),
+            context_retriever=ContextRetriever(
+                git_client=RecordingGitClient(), issues_client=None, httpx_client=mock.Mock()
+            ),
+            config=ResolvedConfig(ai_api_key="", git_api_key="", exclude=("*2.txt",)),
+        )
+        review = code_reviewer.review(
+            target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+        )
+
+    assert fetched_files == ["file-1.txt"]
+    assert [diff.metadata.new_path for diff in review.pr_diff.diff] == ["file1.txt"]
+
+
+def test_review_with_compact_diff_format(context_retriever: ContextRetriever) -> None:
+    test_agent = get_reviewer_agent_with_settings(diff_format=DiffFormat.compact)
+    test_summary_agent = get_summarizing_agent_with_settings(diff_format=DiffFormat.compact)
+    with (
+        test_agent.override(model=TestModel()),
+        test_summary_agent.override(model=TestModel()),
+        capture_run_messages() as messages,
+    ):
+        code_reviewer = CodeReviewer(
+            reviewer_agent=test_agent,
+            summarizing_agent=test_summary_agent,
+            model=mock.Mock(spec=OpenAIChatModel, model_name=DEFAULT_AI_MODEL),
+            git_client=MockGitClient(),
+            context_retriever=context_retriever,
+            config=ResolvedConfig(ai_api_key="", git_api_key="", diff_format=DiffFormat.compact),
+        )
+        code_reviewer.review(
+            target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+        )
+
+    system_prompts = [
+        part.content for message in messages for part in message.parts if isinstance(part, SystemPromptPart)
+    ]
+    assert REVIEWER_SYSTEM_PROMPT_COMPACT_DIFF in system_prompts
+    assert any("FILE file1.txt new_file" in str(message) for message in messages)
+    assert not any('"modification_type"' in str(message) for message in messages)
+
+
+def test_summarizing_agent_is_told_about_diff_excerpts() -> None:
+    test_summary_agent = get_summarizing_agent_with_settings(summarizing_diff=SummarizingDiff.excerpts)
+    with capture_run_messages() as messages:
+        test_summary_agent.run_sync(
+            "review", model=TestModel(), deps=SummarizingDeps(configured_categories=("Correctness",))
+        )
+
+    system_prompts = [
+        part.content for message in messages for part in message.parts if isinstance(part, SystemPromptPart)
+    ]
+    assert SUMMARIZING_SYSTEM_PROMPT_DIFF_EXCERPTS in system_prompts
+    assert SUMMARIZING_SYSTEM_PROMPT not in system_prompts
+
+
+def test_review_summarizes_with_diff_excerpts(context_retriever: ContextRetriever) -> None:
+    test_agent = mock.Mock()
+    test_summarizing_agent = get_summarizing_agent_with_settings()
+    test_agent.run = mock.AsyncMock()
+    test_agent.run.return_value = mock.Mock(
+        output=ReviewResponse(
+            summary="a",
+            raw_score=1,
+            comments=[
+                ReviewComment(
+                    old_path="file2.txt",
+                    new_path="file2.txt",
+                    comment="comment",
+                    category="Correctness",
+                    severity="LOW",
+                    line_number=20,
+                    relative_line_number=2,
+                    is_comment_on_new_path=False,
+                    programming_language="text",
+                )
+            ],
+        ),
+        usage=lambda: RunUsage(requests=1, input_tokens=1041, output_tokens=6),
+    )
+
+    with test_summarizing_agent.override(model=TestModel()), capture_run_messages() as messages:
+        code_reviewer = CodeReviewer(
+            reviewer_agent=test_agent,
+            summarizing_agent=test_summarizing_agent,
+            model=mock.Mock(spec=OpenAIChatModel, model_name=DEFAULT_AI_MODEL),
+            git_client=MockGitClient(),
+            context_retriever=context_retriever,
+            config=ResolvedConfig(ai_api_key="", git_api_key="", summarizing_diff=SummarizingDiff.excerpts),
+        )
+        code_reviewer.review(
+            target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+        )
+
+    summarizing_prompt = next(
+        part.content for message in messages for part in message.parts if isinstance(part, UserPromptPart)
+    )
+    assert (
+        f"PR DIFF EXCERPTS (only the modified lines around the comments of the review):\n```\n{json.dumps([MOCK_DIFF[1].model_dump()])}\n```"
+        in summarizing_prompt
+    )
+
+
+def test_review_skips_summarizing_agent_for_small_reviews(context_retriever: ContextRetriever) -> None:
+    test_agent = get_reviewer_agent_with_settings()
+    test_summarizing_agent = mock.Mock()
+    with test_agent.override(model=TestModel(custom_output_args={"summary": "summary", "raw_score": 5})):
+        code_reviewer = CodeReviewer(
+            reviewer_agent=test_agent,
+            summarizing_agent=test_summarizing_agent,
+            model=mock.Mock(spec=OpenAIChatModel, model_name=DEFAULT_AI_MODEL),
+            git_client=MockGitClient(),
+            context_retriever=context_retriever,
+            config=ResolvedConfig(ai_api_key="", git_api_key="", summarizing_mode=SummarizingMode.auto),
+        )
+        review = code_reviewer.review(
+            target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+        )
+
+    test_summarizing_agent.run.assert_not_called()
+    assert review.review_response == ReviewResponse(summary="summary", raw_score=5)
+    assert review.metadata.usage.requests == 1
+    summarizing_span = next(span for span in review.metadata.spans if span.name == "summarizing_agent")
+    assert summarizing_span.attributes == {
+        "skipped": True,
+        "reason": "the initial review has no comments",
+        "comments": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_areview_fetches_metadata_and_diff_concurrently(context_retriever: ContextRetriever) -> None:
+    # Both calls wait for each other, so the review would fail if they were run sequentially
+    barrier = threading.Barrier(2, timeout=5)
+
+    class ConcurrentGitClient(MockGitClient):
+        def get_diff_from_url(self, pr_url: PRUrl) -> PRDiff:
+            barrier.wait()
+            return super().get_diff_from_url(pr_url)
+
+        def get_pr_metadata(self, pr_url: PRUrl) -> PRMetadata:
+            barrier.wait()
+            return super().get_pr_metadata(pr_url)
+
+    test_agent = get_reviewer_agent_with_settings()
+    test_summary_agent = get_summarizing_agent_with_settings()
+    with (
+        test_agent.override(model=TestModel()),
+        test_summary_agent.override(model=TestModel()),
+    ):
+        code_reviewer = CodeReviewer(
+            reviewer_agent=test_agent,
+            summarizing_agent=test_summary_agent,
+            model=mock.Mock(spec=OpenAIChatModel, model_name=DEFAULT_AI_MODEL),
+            git_client=ConcurrentGitClient(),
+            context_retriever=context_retriever,
+            config=ResolvedConfig(ai_api_key="", git_api_key=""),
+        )
+        review = await code_reviewer.areview(
+            target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+        )
+
+    assert review.review_response == ReviewResponse(summary="a", raw_score=1)
+    assert review.pr_diff.diff == MOCK_DIFF
+
+
+def test_large_pr_is_reviewed_in_shards(context_retriever: ContextRetriever) -> None:
+    reviewer_agent = mock.Mock()
+    reviewer_agent.run = mock.AsyncMock(
+        side_effect=[
+            mock.Mock(output=ReviewResponse(summary="shard 1", raw_score=4), usage=lambda: RunUsage(requests=1)),
+            mock.Mock(output=ReviewResponse(summary="shard 2", raw_score=3), usage=lambda: RunUsage(requests=1)),
+        ]
+    )
+    summarizing_agent = mock.Mock()
+    summarizing_agent.run = mock.AsyncMock(
+        return_value=mock.Mock(output=ReviewResponse(summary="final", raw_score=3), usage=lambda: RunUsage(requests=3))
+    )
+    code_reviewer = CodeReviewer(
+        reviewer_agent=reviewer_agent,
+        summarizing_agent=summarizing_agent,
+        model=mock.Mock(spec=OpenAIChatModel, model_name=DEFAULT_AI_MODEL),
+        git_client=MockGitClient(),
+        context_retriever=context_retriever,
+        # Every file is larger than a single token, so each one gets its own shard
+        config=ResolvedConfig(ai_api_key="", git_api_key="", review_shard_tokens=1),
+    )
+
+    review = code_reviewer.review(
+        target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+    )
+
+    assert review.review_response == ReviewResponse(summary="final", raw_score=3)
+    shard_prompts = [call.kwargs["user_prompt"] for call in reviewer_agent.run.call_args_list]
+    assert len(shard_prompts) == 2
+    assert "contents-of-file1" in shard_prompts[0]
+    assert "contents-of-file2" not in shard_prompts[0]
+    assert "contents-of-file2" in shard_prompts[1]
+    assert "contents-of-file1" not in shard_prompts[1]
+
+    # The summarizer receives the merged review of all shards, with the full diff
+    summary_prompt = summarizing_agent.run.call_args.kwargs["user_prompt"]
+    assert repr("shard 1\n\nshard 2") in summary_prompt
+    assert "contents-of-file1" in summary_prompt
+    assert "contents-of-file2" in summary_prompt
+
+
+def test_input_tokens_limit_applies_to_each_shard(context_retriever: ContextRetriever) -> None:
+    def review(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        return ModelResponse(
+            parts=[ToolCallPart(info.output_tools[0].name, {"summary": "summary", "raw_score": 3})],
+            usage=RequestUsage(input_tokens=60),
+        )
+
+    code_reviewer = CodeReviewer(
+        reviewer_agent=get_reviewer_agent_with_settings(),
+        summarizing_agent=get_summarizing_agent_with_settings(),
+        model=FunctionModel(review),
+        git_client=MockGitClient(),
+        context_retriever=context_retriever,
+        # Each shard (and the summary) is under the limit, but not all of them together
+        config=ResolvedConfig(ai_api_key="", git_api_key="", review_shard_tokens=1, ai_input_tokens_limit=100),
+    )
+
+    review_result = code_reviewer.review(
+        target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+    )
+
+    assert review_result.metadata.usage.requests == 3
+    assert review_result.metadata.usage.input_tokens == 180
+
+
+def test_review_context_is_trimmed_to_fit_the_prompt_token_budget(context_retriever: ContextRetriever) -> None:
+    reviewer_agent = mock.Mock()
+    reviewer_agent.run = mock.AsyncMock(
+        return_value=mock.Mock(output=ReviewResponse(summary="a", raw_score=4), usage=lambda: RunUsage(requests=1))
+    )
+    summarizing_agent = mock.Mock()
+    summarizing_agent.run = mock.AsyncMock(
+        return_value=mock.Mock(output=ReviewResponse(summary="b", raw_score=4), usage=lambda: RunUsage(requests=2))
+    )
+    code_reviewer = CodeReviewer(
+        reviewer_agent=reviewer_agent,
+        summarizing_agent=summarizing_agent,
+        model=mock.Mock(spec=OpenAIChatModel, model_name=DEFAULT_AI_MODEL),
+        git_client=MockGitClient(),
+        context_retriever=context_retriever,
+        # The diff alone is over budget, so all the context must go
+        config=ResolvedConfig(ai_api_key="", git_api_key="", prompt_token_budget=1),
+    )
+
+    review = code_reviewer.review(
+        target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+    )
+
+    review_prompt = reviewer_agent.run.call_args.kwargs["user_prompt"]
+    assert "contents-of-file-1.txt-context" not in review_prompt
+    assert "contents-of-file-2.txt-context" not in review_prompt
+    assert [(section.name, section.action) for section in review.metadata.trimmed_sections] == [
+        ("file-1.txt", "dropped"),
+        ("file-2.txt", "dropped"),
+    ]
+
+
+def test_responses_are_cached(context_retriever: ContextRetriever, tmp_path: pathlib.Path) -> None:
+    reviewer_agent = mock.Mock()
+    reviewer_agent.run = mock.AsyncMock(
+        return_value=mock.Mock(output=ReviewResponse(summary="a", raw_score=4), usage=lambda: RunUsage(requests=1))
+    )
+    summarizing_agent = mock.Mock()
+    summarizing_agent.run = mock.AsyncMock(
+        return_value=mock.Mock(output=ReviewResponse(summary="b", raw_score=3), usage=lambda: RunUsage(requests=2))
+    )
+    code_reviewer = CodeReviewer(
+        reviewer_agent=reviewer_agent,
+        summarizing_agent=summarizing_agent,
+        model=mock.Mock(spec=OpenAIChatModel, model_name=DEFAULT_AI_MODEL),
+        git_client=MockGitClient(),
+        context_retriever=context_retriever,
+        config=ResolvedConfig(ai_api_key="", git_api_key="", cache_dir=tmp_path),
+    )
+    target = PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+
+    first_review = code_reviewer.review(target=target)
+    second_review = code_reviewer.review(target=target)
+
+    assert reviewer_agent.run.call_count == 1
+    assert summarizing_agent.run.call_count == 1
+    assert first_review.review_response == second_review.review_response == ReviewResponse(summary="b", raw_score=3)
+    assert first_review.metadata.cache == CacheStats(hits=0, misses=2)
+    assert second_review.metadata.cache == CacheStats(hits=2, misses=0)
+    assert second_review.metadata.usage == RunUsage()
+
+
+class MockIncrementalGitClient(MockGitClient):
+    def __init__(
+        self, last_reviewed_sha: str | None, interdiff: PRDiff | None, diff: list[DiffResult] | None = None
+    ) -> None:
+        self.last_reviewed_sha = last_reviewed_sha
+        self.interdiff = interdiff
+        self.diff = diff
+
+    def get_diff_from_url(self, pr_url: PRUrl) -> PRDiff:
+        pr_diff = super().get_diff_from_url(pr_url).model_copy(update={"head_sha": "new-sha"})
+        return pr_diff.model_copy(update={"diff": self.diff}) if self.diff else pr_diff
+
+    def get_last_reviewed_sha(self, pr_url: PRUrl) -> str | None:
+        return self.last_reviewed_sha
+
+    def get_diff_since(self, pr_url: PRUrl, base_sha: str) -> PRDiff | None:
+        return self.interdiff
+
+
+def _get_incremental_code_reviewer(git_client: MockIncrementalGitClient, reviewer_agent: mock.Mock) -> CodeReviewer:
+    summarizing_agent = mock.Mock()
+    summarizing_agent.run = mock.AsyncMock(
+        return_value=mock.Mock(output=ReviewResponse(summary="b", raw_score=4), usage=lambda: RunUsage(requests=2))
+    )
+    return CodeReviewer(
+        reviewer_agent=reviewer_agent,
+        summarizing_agent=summarizing_agent,
+        model=mock.Mock(spec=OpenAIChatModel, model_name=DEFAULT_AI_MODEL),
+        git_client=git_client,
+        context_retriever=ContextRetriever(git_client=git_client, issues_client=git_client, httpx_client=mock.Mock()),
+        config=ResolvedConfig(ai_api_key="", git_api_key="", incremental=True),
+    )
+
+
+def test_incremental_review_only_reviews_changes_since_last_review() -> None:
+    interdiff = PRDiff(
+        id=1,
+        diff=MOCK_DIFF[1:],
+        changed_files=["file-2.txt"],
+        target_branch="main",
+        source_branch="feature",
+        head_sha="new-sha",
+    )
+    reviewer_agent = mock.Mock()
+    reviewer_agent.run = mock.AsyncMock(
+        return_value=mock.Mock(output=ReviewResponse(summary="a", raw_score=4), usage=lambda: RunUsage(requests=1))
+    )
+    code_reviewer = _get_incremental_code_reviewer(
+        MockIncrementalGitClient(last_reviewed_sha="old-sha", interdiff=interdiff), reviewer_agent
+    )
+
+    review = code_reviewer.review(
+        target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+    )
+
+    # The review is published on the full diff of the PR
+    assert review.pr_diff.diff == MOCK_DIFF
+    assert review.metadata.head_sha == "new-sha"
+    assert review.metadata.reviewed_since_sha == "old-sha"
+    review_prompt = reviewer_agent.run.call_args.kwargs["user_prompt"]
+    # Only the new changes are reviewed, but with the full contents of the changed files
+    assert "contents-of-file-2.txt-context" in review_prompt
+    assert "contents-of-file-1.txt-context" not in review_prompt
+    assert "contents-of-file1" not in review_prompt
+
+
+def test_incremental_review_comments_are_published_on_the_full_diff() -> None:
+    metadata = DiffFileMetadata(new_file=False, deleted_file=False, renamed_file=False, new_path="foo.py")
+    # The PR replaced `x` by `a`, `b` and `c`. Since the last review, `y` was replaced by `c`
+    full_diff = [parse_diff_patch(metadata, "@@ -1,2 +1,4 @@\n-x\n+a\n+b\n+c\n d")]
+    interdiff = PRDiff(
+        id=1,
+        diff=[parse_diff_patch(metadata, "@@ -2,3 +2,3 @@\n b\n-y\n+c\n d")],
+        changed_files=["foo.py"],
+        target_branch="main",
+        source_branch="feature",
+        head_sha="new-sha",
+    )
+    comment_kwargs: dict[str, Any] = {
+        "new_path": "foo.py",
+        "old_path": "foo.py",
+        "category": "Correctness",
+        "severity": "LOW",
+        "programming_language": "python",
+    }
+    comments = [
+        ReviewComment(
+            comment="on c", line_number=3, relative_line_number=3, is_comment_on_new_path=True, **comment_kwargs
+        ),
+        ReviewComment(
+            comment="on y", line_number=3, relative_line_number=2, is_comment_on_new_path=False, **comment_kwargs
+        ),
+    ]
+    reviewer_agent = mock.Mock()
+    reviewer_agent.run = mock.AsyncMock(
+        return_value=mock.Mock(output=ReviewResponse(summary="a", raw_score=4), usage=lambda: RunUsage(requests=1))
+    )
+    code_reviewer = _get_incremental_code_reviewer(
+        MockIncrementalGitClient(last_reviewed_sha="old-sha", interdiff=interdiff, diff=full_diff), reviewer_agent
+    )
+    code_reviewer.summarizing_agent.run.return_value.output = ReviewResponse(  # type: ignore[attr-defined]
+        summary="b", raw_score=4, comments=comments
+    )
+    m_mr = mock_mr()
+    gitlab_client = mock_gitlab_client(mock_project(m_mr))
+
+    review = code_reviewer.review(
+        target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+    )
+    gitlab_client.publish_review(MockGitlabUrl, review)
+
+    # `c` is the 4th line of the full diff, and `y` is not part of it anymore
+    base_position = {
+        "base_sha": "base",
+        "head_sha": "head",
+        "start_sha": "start",
+        "new_path": "foo.py",
+        "old_path": "foo.py",
+    }
+    assert m_mr.discussions.create.call_args_list == [
+        mock.call({"body": "comment on c", "position": {**base_position, "position_type": "text", "new_line": 3}}),
+        mock.call({"body": "comment on y", "position": {**base_position, "position_type": "file"}}),
+    ]
+    assert [(c.line_number, c.relative_line_number) for c in review.review_response.comments] == [(3, 4), (0, 0)]
+
+
+@pytest.mark.parametrize(
+    ("last_reviewed_sha", "interdiff"),
+    [
+        (None, None),
+        ("old-sha", None),  # The last reviewed commit is not part of the PR anymore
+    ],
+)
+def test_incremental_review_falls_back_to_full_review(last_reviewed_sha: str | None, interdiff: PRDiff | None) -> None:
+    reviewer_agent = mock.Mock()
+    reviewer_agent.run = mock.AsyncMock(
+        return_value=mock.Mock(output=ReviewResponse(summary="a", raw_score=4), usage=lambda: RunUsage(requests=1))
+    )
+    code_reviewer = _get_incremental_code_reviewer(
+        MockIncrementalGitClient(last_reviewed_sha=last_reviewed_sha, interdiff=interdiff), reviewer_agent
+    )
+
+    review = code_reviewer.review(
+        target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+    )
+
+    assert review.pr_diff.changed_files == ["file-1.txt", "file-2.txt"]
+    assert review.metadata.head_sha == "new-sha"
+    assert review.metadata.reviewed_since_sha is None
+
+
+def test_incremental_review_without_new_changes() -> None:
+    reviewer_agent = mock.Mock()
+    reviewer_agent.run = mock.AsyncMock()
+    code_reviewer = _get_incremental_code_reviewer(
+        MockIncrementalGitClient(last_reviewed_sha="new-sha", interdiff=None), reviewer_agent
+    )
+
+    with pytest.raises(NothingToReviewError):
+        code_reviewer.review(
+            target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab)
+        )
+    reviewer_agent.run.assert_not_called()
+
+
 @pytest.mark.parametrize(
     ("raised_error", "expected_error"),
     [
@@ -465,7 +976,7 @@ def test_file_is_excluded_from_prompt(context_retriever: ContextRetriever) -> No
 )
 def test_errors_are_handled_on_reviewer_agent(raised_error: Exception, expected_error: type[Exception]) -> None:
     error_agent = mock.Mock()
-    error_agent.run_sync.side_effect = raised_error
+    error_agent.run = mock.AsyncMock(side_effect=raised_error)
 
     code_reviewer = CodeReviewer(
         reviewer_agent=error_agent,
@@ -507,3 +1018,55 @@ def _assert_agent_message(
 
 def _get_requests_from_messages(messages: list[ModelMessage]) -> list[ModelRequest]:
     return [prompt for prompt in messages if isinstance(prompt, ModelRequest)]
+
+
+def _get_comment(comment: str, severity: Literal["LOW", "MEDIUM", "HIGH"]) -> dict[str, object]:
+    return {
+        "old_path": "file1",
+        "new_path": "file1",
+        "comment": comment,
+        "category": "Correctness",
+        "severity": severity,
+        "line_number": 1,
+        "relative_line_number": 1,
+        "is_comment_on_new_path": True,
+        "programming_language": "python",
+    }
+
+
+def test_review_comments_are_streamed(context_retriever: ContextRetriever) -> None:
+    output_args = json.dumps(
+        {
+            "summary": "summary",
+            "comments": [_get_comment("first", "LOW"), _get_comment("second", "HIGH"), _get_comment("third", "MEDIUM")],
+            "raw_score": 3,
+        }
+    )
+    streamed_comments: list[str] = []
+
+    async def stream_review(messages: list[ModelMessage], info: AgentInfo) -> AsyncIterator[DeltaToolCalls]:
+        tool_name = info.output_tools[0].name
+        # Stream the output in small chunks so that comments arrive while others are still being generated
+        for start in range(0, len(output_args), 10):
+            yield {0: DeltaToolCall(name=tool_name if start == 0 else None, json_args=output_args[start : start + 10])}
+        assert streamed_comments == ["first", "second"]  # The last comment is only complete with the final output
+
+    summarizing_agent = mock.Mock()
+    summarizing_agent.run = mock.AsyncMock(
+        return_value=mock.Mock(output=ReviewResponse(summary="b", raw_score=3), usage=lambda: RunUsage(requests=1))
+    )
+    code_reviewer = CodeReviewer(
+        reviewer_agent=get_reviewer_agent_with_settings(),
+        summarizing_agent=summarizing_agent,
+        model=FunctionModel(stream_function=stream_review),
+        git_client=MockGitClient(),
+        context_retriever=context_retriever,
+        config=ResolvedConfig(ai_api_key="", git_api_key=""),
+    )
+
+    code_reviewer.review(
+        target=PRUrl(full_url="foo", base_url="foo", repo_path="foo", pr_number=1, source=PRSource.gitlab),
+        on_comment=lambda comment: streamed_comments.append(comment.comment),
+    )
+
+    assert streamed_comments == ["first", "second", "third"]
@@ -0,0 +1,104 @@
+from lgtm_ai.ai.schemas import ReviewComment, ReviewResponse
+from lgtm_ai.git.parser import DiffFileMetadata, DiffResult, ModifiedLine
+from lgtm_ai.git_client.schemas import PRDiff
+from lgtm_ai.review.schemas import PRCodeContext, PRContextFileContents
+from lgtm_ai.review.sharding import merge_review_responses, shard_pr
+
+
+def _get_diff(path: str, lines: int = 1) -> DiffResult:
+    return DiffResult(
+        metadata=DiffFileMetadata(new_file=False, deleted_file=False, renamed_file=False, new_path=path),
+        modified_lines=[
+            ModifiedLine(line="x" * 40, line_number=i, relative_line_number=i, modification_type="added")
+            for i in range(lines)
+        ],
+    )
+
+
+def _get_pr_diff(*diffs: DiffResult) -> PRDiff:
+    return PRDiff(
+        id=1,
+        diff=list(diffs),
+        changed_files=[diff.metadata.new_path for diff in diffs],
+        target_branch="main",
+        source_branch="feature",
+    )
+
+
+def _get_comment(path: str, severity: str = "LOW") -> ReviewComment:
+    return ReviewComment(
+        old_path=path,
+        new_path=path,
+        comment="comment",
+        category="Quality",
+        severity=severity,
+        line_number=1,
+        relative_line_number=1,
+        is_comment_on_new_path=True,
+        programming_language="python",
+    )
+
+
+def test_small_pr_is_a_single_shard() -> None:
+    pr_diff = _get_pr_diff(_get_diff("a/one.py"), _get_diff("b/two.py"))
+    context = PRCodeContext(file_contents=[PRContextFileContents(file_path="a/one.py", content="contents")])
+
+    shards = shard_pr(pr_diff, context, max_tokens=100_000)
+
+    assert len(shards) == 1
+    assert shards[0].pr_diff == pr_diff
+    assert shards[0].context == context
+
+
+def test_shards_are_grouped_by_directory_and_bounded() -> None:
+    pr_diff = _get_pr_diff(
+        _get_diff("b/one.py", lines=10),
+        _get_diff("a/one.py", lines=10),
+        _get_diff("b/two.py", lines=10),
+        _get_diff("a/two.py", lines=10),
+    )
+    context = PRCodeContext(
+        file_contents=[
+            PRContextFileContents(file_path="a/one.py", content="a-one"),
+            PRContextFileContents(file_path="b/two.py", content="b-two", branch="target"),
+        ]
+    )
+
+    # Each file is ~400 tokens, so only two of them fit in a shard
+    shards = shard_pr(pr_diff, context, max_tokens=1000)
+
+    assert [shard.pr_diff.changed_files for shard in shards] == [["a/one.py", "a/two.py"], ["b/one.py", "b/two.py"]]
+    assert [[diff.metadata.new_path for diff in shard.pr_diff.diff] for shard in shards] == [
+        ["a/one.py", "a/two.py"],
+        ["b/one.py", "b/two.py"],
+    ]
+    assert shards[0].context == PRCodeContext(
+        file_contents=[PRContextFileContents(file_path="a/one.py", content="a-one")]
+    )
+    assert shards[1].context == PRCodeContext(
+        file_contents=[PRContextFileContents(file_path="b/two.py", content="b-two", branch="target")]
+    )
+
+
+def test_files_larger_than_a_shard_get_their_own_shard() -> None:
+    pr_diff = _get_pr_diff(_get_diff("a/small.py"), _get_diff("a/huge.py", lines=100), _get_diff("a/other.py"))
+
+    shards = shard_pr(pr_diff, PRCodeContext(file_contents=[]), max_tokens=500)
+
+    assert [shard.pr_diff.changed_files for shard in shards] == [["a/small.py"], ["a/huge.py"], ["a/other.py"]]
+
+
+def test_merge_review_responses() -> None:
+    merged = merge_review_responses(
+        [
+            ReviewResponse(summary="First shard", comments=[_get_comment("a.py")], raw_score=4),
+            ReviewResponse(summary="Second shard", comments=[_get_comment("b.py", severity="HIGH")], raw_score=2),
+            ReviewResponse(summary="Third shard", comments=[], raw_score=5),
+        ]
+    )
+
+    assert merged == ReviewResponse(
+        summary="First shard\n\nSecond shard\n\nThird shard",
+        comments=[_get_comment("b.py", severity="HIGH"), _get_comment("a.py")],
+        raw_score=2,
+    )
@@ -0,0 +1,81 @@
+import pytest
+from lgtm_ai.ai.schemas import CommentCategory, CommentSeverity, ReviewComment, ReviewResponse
+from lgtm_ai.base.schemas import SummarizingMode
+from lgtm_ai.config.handler import ResolvedConfig
+from lgtm_ai.git_client.schemas import PRDiff
+from lgtm_ai.review.summarizing import SummarizingPolicy
+from tests.review.utils import MOCK_DIFF
+
+PR_DIFF = PRDiff(
+    id=1, diff=MOCK_DIFF, changed_files=["file1.txt", "file2.txt"], target_branch="main", source_branch="f"
+)
+
+
+def _comment(category: CommentCategory = "Correctness", severity: CommentSeverity = "LOW") -> ReviewComment:
+    return ReviewComment(
+        old_path="file1.txt",
+        new_path="file1.txt",
+        comment="comment",
+        category=category,
+        severity=severity,
+        line_number=2,
+        relative_line_number=1,
+        is_comment_on_new_path=False,
+        programming_language="text",
+    )
+
+
+def _policy(mode: SummarizingMode, *, max_comments: int = 2, max_tokens: int = 1000) -> SummarizingPolicy:
+    return SummarizingPolicy(
+        mode=mode, categories=["Correctness", "Quality"], max_comments=max_comments, max_tokens=max_tokens
+    )
+
+
+@pytest.mark.parametrize(
+    ("policy", "comments", "expected"),
+    [
+        (_policy(SummarizingMode.always), [], True),
+        (_policy(SummarizingMode.never), [_comment()] * 5, False),
+        (_policy(SummarizingMode.auto), [], False),
+        (_policy(SummarizingMode.auto), [_comment()], False),
+        (_policy(SummarizingMode.auto), [_comment(), _comment("Security")], True),
+        (_policy(SummarizingMode.auto), [_comment()] * 3, True),
+        (_policy(SummarizingMode.auto, max_comments=3), [_comment()] * 3, False),
+        (_policy(SummarizingMode.auto, max_tokens=10), [_comment()], True),
+    ],
+)
+def test_decide(policy: SummarizingPolicy, comments: list[ReviewComment], expected: bool) -> None:
+    decision = policy.decide(ReviewResponse(summary="summary", raw_score=4, comments=comments), pr_diff=PR_DIFF)
+
+    assert decision.summarize is expected
+    assert decision.reason
+
+
+def test_finalize_filters_categories_and_sorts_comments() -> None:
+    initial_review = ReviewResponse(
+        summary="summary",
+        raw_score=4,
+        comments=[_comment("Quality", "LOW"), _comment("Security", "HIGH"), _comment("Correctness", "HIGH")],
+    )
+
+    final_review = _policy(SummarizingMode.never).finalize(initial_review)
+
+    assert [(comment.category, comment.severity) for comment in final_review.comments] == [
+        ("Correctness", "HIGH"),
+        ("Quality", "LOW"),
+    ]
+    assert (final_review.summary, final_review.raw_score) == ("summary", 4)
+
+
+def test_from_config() -> None:
+    config = ResolvedConfig(
+        ai_api_key="",
+        git_api_key="",
+        summarizing_mode=SummarizingMode.auto,
+        summarizing_skip_max_comments=5,
+        categories=("Testing",),
+    )
+
+    assert SummarizingPolicy.from_config(config) == SummarizingPolicy(
+        mode=SummarizingMode.auto, categories=("Testing",), max_comments=5, max_tokens=8000
+    )
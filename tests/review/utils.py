@@ -9,7 +9,14 @@ from pydantic import HttpUrl
 from pydantic_ai.usage import RunUsage
 
 MOCK_USAGE = mock.MagicMock(
-    requests=1, input_tokens=200, output_tokens=100, total_tokens=300, details={}, spec=RunUsage
+    requests=1,
+    input_tokens=200,
+    output_tokens=100,
+    total_tokens=300,
+    cache_read_tokens=0,
+    cache_write_tokens=0,
+    details={},
+    spec=RunUsage,
 )
 
 MOCK_DIFF = [
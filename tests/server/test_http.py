@@ -0,0 +1,59 @@
+import json
+from unittest import mock
+
+import httpx
+import pytest
+from lgtm_ai.server.http import WebhookServer
+from lgtm_ai.server.webhooks import ReviewJob
+
+GITHUB_PAYLOAD = {
+    "action": "opened",
+    "pull_request": {"html_url": "https://github.com/foo/bar/pull/1", "number": 1, "head": {"sha": "abc"}},
+    "repository": {"full_name": "foo/bar"},
+}
+
+
+@pytest.mark.asyncio
+async def test_webhook_server() -> None:
+    scheduler = mock.Mock()
+    server = await WebhookServer(scheduler, secret="secret").start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    async with server, httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        health = await client.get("/health")
+        queued = await client.post(
+            "/", json=GITHUB_PAYLOAD, headers={"X-GitHub-Event": "pull_request", "X-Gitlab-Token": "secret"}
+        )
+        ignored = await client.post(
+            "/",
+            json={"object_attributes": {"action": "close"}},
+            headers={"X-Gitlab-Event": "Merge Request Hook", "X-Gitlab-Token": "secret"},
+        )
+        unauthorized = await client.post(
+            "/", json={}, headers={"X-Gitlab-Event": "Merge Request Hook", "X-Gitlab-Token": "wrong"}
+        )
+        not_allowed = await client.put("/", content=b"")
+
+    assert (health.status_code, health.json()) == (200, {"status": "ok"})
+    assert (queued.status_code, queued.json()) == (401, {"error": "The webhook secret is missing or invalid."})
+    assert (ignored.status_code, ignored.json()) == (200, {"status": "ignored"})
+    assert unauthorized.status_code == 401
+    assert not_allowed.status_code == 405
+    scheduler.submit.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_webhook_server_queues_reviews() -> None:
+    scheduler = mock.Mock()
+    server = await WebhookServer(scheduler).start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    async with server, httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        response = await client.post(
+            "/webhook", content=json.dumps(GITHUB_PAYLOAD), headers={"X-GitHub-Event": "pull_request"}
+        )
+
+    assert (response.status_code, response.json()) == (202, {"status": "queued"})
+    job = scheduler.submit.call_args.args[0]
+    assert isinstance(job, ReviewJob)
+    assert (job.target.full_url, job.head_sha) == ("https://github.com/foo/bar/pull/1", "abc")
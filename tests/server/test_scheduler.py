@@ -0,0 +1,162 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from lgtm_ai.ai.schemas import ReviewResponse
+from lgtm_ai.base.schemas import PRSource, PRUrl
+from lgtm_ai.config.constants import DEFAULT_AI_MODEL
+from lgtm_ai.config.handler import ResolvedConfig
+from lgtm_ai.formatters.markdown import MarkDownFormatter
+from lgtm_ai.git_client.gitlab import GitlabClient
+from lgtm_ai.review import CodeReviewer
+from lgtm_ai.review.batch import BatchReviewer, BatchReviewResult
+from lgtm_ai.review.schemas import PRCodeContext
+from lgtm_ai.server.scheduler import ReviewScheduler
+from lgtm_ai.server.webhooks import ReviewJob
+from pydantic_ai.models.openai import OpenAIChatModel
+from pydantic_ai.usage import RunUsage
+
+
+def _get_job(pr_number: int, head_sha: str) -> ReviewJob:
+    return ReviewJob(
+        target=PRUrl(
+            full_url=f"https://github.com/foo/bar/pull/{pr_number}",
+            base_url="https://github.com",
+            repo_path="foo/bar",
+            pr_number=pr_number,
+            source=PRSource.github,
+        ),
+        head_sha=head_sha,
+    )
+
+
+class StubReviewer:
+    def __init__(self) -> None:
+        self.started: list[tuple[int, str]] = []
+        self.completed: list[tuple[int, str]] = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, job: ReviewJob) -> None:
+        self.started.append((job.target.pr_number, job.head_sha))
+        await self.release.wait()
+        self.completed.append((job.target.pr_number, job.head_sha))
+
+    async def wait_started(self, count: int) -> None:
+        async with asyncio.timeout(1):
+            while len(self.started) < count:
+                await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_queued_jobs_of_the_same_pr_are_coalesced() -> None:
+    reviewer = StubReviewer()
+    async with ReviewScheduler(reviewer, workers=1) as scheduler:
+        scheduler.submit(_get_job(1, "a"))
+        await reviewer.wait_started(1)  # The only worker is now busy
+        for head_sha in ("b", "c", "d"):
+            scheduler.submit(_get_job(2, head_sha))
+        reviewer.release.set()
+        await scheduler.join()
+
+    assert reviewer.completed == [(1, "a"), (2, "d")]
+
+
+@pytest.mark.asyncio
+async def test_outdated_reviews_are_cancelled() -> None:
+    reviewer = StubReviewer()
+    async with ReviewScheduler(reviewer, workers=2) as scheduler:
+        scheduler.submit(_get_job(1, "a"))
+        scheduler.submit(_get_job(2, "a"))
+        await reviewer.wait_started(2)
+        scheduler.submit(_get_job(1, "b"))
+        # Pushes of the commit that is already being reviewed are ignored
+        scheduler.submit(_get_job(2, "a"))
+        await reviewer.wait_started(3)
+        reviewer.release.set()
+        await scheduler.join()
+
+    assert reviewer.started == [(1, "a"), (2, "a"), (1, "b")]
+    assert sorted(reviewer.completed) == [(1, "b"), (2, "a")]
+
+
+@pytest.mark.asyncio
+async def test_failed_reviews_do_not_stop_workers() -> None:
+    reviewed: list[int] = []
+
+    async def review(job: ReviewJob) -> None:
+        if job.target.pr_number == 1:
+            raise ValueError("boom")
+        reviewed.append(job.target.pr_number)
+
+    async with ReviewScheduler(review, workers=1) as scheduler:
+        scheduler.submit(_get_job(1, "a"))
+        scheduler.submit(_get_job(2, "a"))
+        await scheduler.join()
+
+    assert reviewed == [2]
+
+
+def _mock_mr(head_sha: str) -> mock.Mock:
+    m_mr = mock.Mock(title=f"title at {head_sha}", description="", target_branch="main", source_branch="feature")
+    m_mr.diffs.list.return_value = [mock.Mock(id=1)]
+    m_mr.diffs.get.return_value = mock.Mock(
+        id=1,
+        head_commit_sha=head_sha,
+        diffs=[
+            {
+                "diff": f"@@ -1 +1 @@\n-a\n+{head_sha}",
+                "new_path": "a.py",
+                "old_path": "a.py",
+                "new_file": False,
+                "deleted_file": False,
+                "renamed_file": False,
+            }
+        ],
+    )
+    return m_mr
+
+
+@pytest.mark.asyncio
+async def test_reviews_of_new_pushes_use_the_new_head() -> None:
+    head_sha = "aaa"
+    m_project = mock.Mock()
+    m_project.mergerequests.get.side_effect = lambda pr_number: _mock_mr(head_sha)
+    m_gitlab = mock.Mock()
+    m_gitlab.projects.get.return_value = m_project
+    git_client = GitlabClient(m_gitlab, formatter=MarkDownFormatter())
+    agent = mock.Mock()
+    agent.run = mock.AsyncMock(
+        return_value=mock.Mock(output=ReviewResponse(summary="a", raw_score=5), usage=lambda: RunUsage(requests=1))
+    )
+    code_reviewer = CodeReviewer(
+        reviewer_agent=agent,
+        summarizing_agent=agent,
+        model=mock.Mock(spec=OpenAIChatModel, model_name=DEFAULT_AI_MODEL),
+        git_client=git_client,
+        context_retriever=mock.Mock(
+            get_code_context=mock.Mock(return_value=PRCodeContext(file_contents=[])),
+            get_additional_context=mock.Mock(return_value=None),
+        ),
+        config=ResolvedConfig(ai_api_key="", git_api_key=""),
+    )
+    # The git client is shared by all the reviews, as in `lgtm serve`
+    batch_reviewer = BatchReviewer(lambda target: code_reviewer, concurrency=1)
+    results: list[BatchReviewResult] = []
+
+    async def review_job(job: ReviewJob) -> None:
+        results.append(await batch_reviewer.review_target(job.target, head_sha=job.head_sha))
+
+    async with ReviewScheduler(review_job, workers=1) as scheduler:
+        scheduler.submit(_get_job(1, "aaa"))
+        await scheduler.join()
+        head_sha = "bbb"
+        scheduler.submit(_get_job(1, "bbb"))
+        await scheduler.join()
+        # The webhook of a push that is not the head of the PR anymore
+        scheduler.submit(_get_job(1, "ccc"))
+        await scheduler.join()
+
+    assert [result.review.metadata.head_sha if result.review else None for result in results] == ["aaa", "bbb", None]
+    assert [result.error for result in results] == [None, None, None]
+    assert '"line": "bbb"' in agent.run.call_args_list[2].kwargs["user_prompt"]
+    assert "title at bbb" in agent.run.call_args_list[2].kwargs["user_prompt"]
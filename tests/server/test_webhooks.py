@@ -0,0 +1,126 @@
+import hashlib
+import hmac
+import json
+from typing import Any
+
+import pytest
+from lgtm_ai.base.schemas import PRSource, PRUrl
+from lgtm_ai.server.exceptions import InvalidWebhookError, UnauthorizedWebhookError
+from lgtm_ai.server.webhooks import ReviewJob, parse_webhook
+
+
+def _github_payload(action: str = "synchronize", *, draft: bool = False) -> dict[str, Any]:
+    return {
+        "action": action,
+        "pull_request": {
+            "html_url": "https://github.com/foo/bar/pull/1",
+            "number": 1,
+            "draft": draft,
+            "head": {"sha": "abc"},
+        },
+        "repository": {"full_name": "foo/bar"},
+    }
+
+
+def _gitlab_payload(action: str = "update", **attributes: object) -> dict[str, Any]:
+    return {
+        "object_kind": "merge_request",
+        "project": {"path_with_namespace": "foo/bar"},
+        "object_attributes": {
+            "action": action,
+            "iid": 2,
+            "url": "https://gitlab.example.com/foo/bar/-/merge_requests/2",
+            "last_commit": {"id": "def"},
+            "oldrev": "abc",
+        }
+        | attributes,
+    }
+
+
+def _sign(body: bytes, secret: str) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def test_parse_github_webhook() -> None:
+    body = json.dumps(_github_payload()).encode()
+
+    job = parse_webhook(
+        {"x-github-event": "pull_request", "x-hub-signature-256": _sign(body, "secret")}, body, secret="secret"
+    )
+
+    assert job == ReviewJob(
+        target=PRUrl(
+            full_url="https://github.com/foo/bar/pull/1",
+            base_url="https://github.com",
+            repo_path="foo/bar",
+            pr_number=1,
+            source=PRSource.github,
+        ),
+        head_sha="abc",
+    )
+
+
+def test_parse_gitlab_webhook() -> None:
+    job = parse_webhook(
+        {"x-gitlab-event": "Merge Request Hook", "x-gitlab-token": "secret"},
+        json.dumps(_gitlab_payload()).encode(),
+        secret="secret",
+    )
+
+    assert job == ReviewJob(
+        target=PRUrl(
+            full_url="https://gitlab.example.com/foo/bar/-/merge_requests/2",
+            base_url="https://gitlab.example.com",
+            repo_path="foo/bar",
+            pr_number=2,
+            source=PRSource.gitlab,
+        ),
+        head_sha="def",
+    )
+
+
+@pytest.mark.parametrize(
+    ("headers", "payload"),
+    [
+        pytest.param({"x-github-event": "ping"}, {"zen": "hi"}, id="github-ping"),
+        pytest.param({"x-github-event": "pull_request"}, _github_payload("closed"), id="github-closed"),
+        pytest.param({"x-github-event": "pull_request"}, _github_payload(draft=True), id="github-draft"),
+        pytest.param({"x-gitlab-event": "Note Hook"}, {"object_attributes": {}}, id="gitlab-note"),
+        pytest.param({"x-gitlab-event": "Merge Request Hook"}, _gitlab_payload("merge"), id="gitlab-merged"),
+        pytest.param({"x-gitlab-event": "Merge Request Hook"}, _gitlab_payload(oldrev=None), id="gitlab-no-commits"),
+        pytest.param({"x-gitlab-event": "Merge Request Hook"}, _gitlab_payload(draft=True), id="gitlab-draft"),
+    ],
+)
+def test_events_without_reviews_are_ignored(headers: dict[str, str], payload: dict[str, Any]) -> None:
+    if payload.get("object_attributes", {}).get("oldrev", "") is None:
+        del payload["object_attributes"]["oldrev"]
+
+    assert parse_webhook(headers, json.dumps(payload).encode(), secret=None) is None
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {"x-github-event": "pull_request"},
+        {"x-github-event": "pull_request", "x-hub-signature-256": "sha256=invalid"},
+        {"x-gitlab-event": "Merge Request Hook"},
+        {"x-gitlab-event": "Merge Request Hook", "x-gitlab-token": "invalid"},
+    ],
+)
+def test_webhooks_must_be_authenticated(headers: dict[str, str]) -> None:
+    with pytest.raises(UnauthorizedWebhookError):
+        parse_webhook(headers, json.dumps(_github_payload()).encode(), secret="secret")
+
+
+@pytest.mark.parametrize(
+    ("headers", "body"),
+    [
+        ({"content-type": "application/json"}, b"{}"),
+        ({"x-github-event": "pull_request"}, b"not json"),
+        ({"x-github-event": "pull_request"}, b"[]"),
+        ({"x-github-event": "pull_request"}, b'{"action": "opened", "pull_request": {}}'),
+    ],
+)
+def test_invalid_webhooks(headers: dict[str, str], body: bytes) -> None:
+    with pytest.raises(InvalidWebhookError):
+        parse_webhook(headers, body, secret=None)
@@ -1,11 +1,13 @@
+import json
 import logging
+from collections.abc import Callable
 from pathlib import Path
 from unittest import mock
 
 import click
 import pytest
 from click.testing import CliRunner
-from lgtm_ai.__main__ import _set_logging_level, guide, review
+from lgtm_ai.__main__ import _set_logging_level, guide, review, review_batch
 from lgtm_ai.base.exceptions import NothingToReviewError
 from lgtm_ai.base.schemas import IssuesPlatform, OutputFormat
 
@@ -362,3 +364,107 @@ def test_guide_no_files(format: OutputFormat, expected_output: str) -> None:
 
     assert result.exit_code == 0
     assert expected_output in result.output
+
+
+def test_review_streams_comments() -> None:
+    runner = CliRunner()
+    comment = mock.Mock()
+
+    def _review(target: object, *, on_comment: Callable[[object], None]) -> mock.Mock:
+        on_comment(comment)
+        return mock.MagicMock()
+
+    with (
+        mock.patch("lgtm_ai.__main__.get_git_client"),
+        mock.patch("lgtm_ai.__main__.CodeReviewer.review", side_effect=_review),
+        mock.patch("lgtm_ai.__main__.JsonFormatter") as m_formatter,
+    ):
+        result = runner.invoke(
+            review,
+            [
+                "--ai-api-key",
+                "fake-token",
+                "--git-api-key",
+                "fake-token",
+                "https://gitlab.com/user/repo/-/merge_requests/1",
+                "--output-format",
+                "json",
+                "--stream",
+            ],
+        )
+
+    assert result.exit_code == 0
+    m_formatter.assert_called_once_with(indent=None)
+    m_formatter().format_review_comment.assert_called_once_with(comment)
+
+
+def test_review_batch(tmp_path: Path) -> None:
+    runner = CliRunner()
+    targets_file = tmp_path / "targets.txt"
+    targets_file.write_text(
+        "# Nightly sweep\nhttps://gitlab.com/user/repo/-/merge_requests/2\n\nhttps://github.com/user/repo/pull/3\n"
+    )
+    output_dir = tmp_path / "results"
+
+    with (
+        mock.patch("lgtm_ai.__main__.get_git_client") as m_get_git_client,
+        mock.patch("lgtm_ai.__main__.CodeReviewer") as m_code_reviewer,
+        mock.patch("lgtm_ai.__main__.get_reviewer_agent_with_settings") as m_get_reviewer_agent,
+    ):
+        m_code_reviewer.return_value.areview = mock.AsyncMock(side_effect=NothingToReviewError)
+        result = runner.invoke(
+            review_batch,
+            [
+                "--ai-api-key",
+                "fake-token",
+                "--git-api-key",
+                "fake-token",
+                "https://gitlab.com/user/repo/-/merge_requests/1",
+                "--targets-file",
+                str(targets_file),
+                "--output-dir",
+                str(output_dir),
+            ],
+            catch_exceptions=False,
+        )
+
+    assert result.exit_code == 0
+    assert sorted(path.name for path in output_dir.iterdir()) == [
+        "github.com_user_repo_pull_3.json",
+        "gitlab.com_user_repo_-_merge_requests_1.json",
+        "gitlab.com_user_repo_-_merge_requests_2.json",
+    ]
+    # Clients and agents are shared between PRs of the same git service
+    assert m_get_git_client.call_count == 2
+    assert m_code_reviewer.call_count == 2
+    assert m_get_reviewer_agent.call_count == 1
+
+
+def test_review_batch_reads_stdin_and_fails_on_errors() -> None:
+    runner = CliRunner()
+
+    with (
+        mock.patch("lgtm_ai.__main__.get_git_client"),
+        mock.patch("lgtm_ai.__main__.CodeReviewer") as m_code_reviewer,
+    ):
+        m_code_reviewer.return_value.areview = mock.AsyncMock(side_effect=ValueError("boom"))
+        result = runner.invoke(
+            review_batch,
+            ["--ai-api-key", "fake-token", "--git-api-key", "fake-token", "--targets-file", "-"],
+            input="https://gitlab.com/user/repo/-/merge_requests/1\n",
+        )
+
+    assert result.exit_code == 1
+    assert json.loads(result.stdout.splitlines()[0]) == {
+        "url": "https://gitlab.com/user/repo/-/merge_requests/1",
+        "review": None,
+        "error": "boom",
+    }
+    assert "Failed to review 1 pull requests" in result.output
+
+
+def test_review_batch_without_targets() -> None:
+    result = CliRunner().invoke(review_batch, ["--ai-api-key", "fake-token", "--git-api-key", "fake-token"])
+
+    assert result.exit_code == 2
+    assert "No pull request URLs given" in result.output